@@ -13,4 +13,22 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DesignTemplate.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once the app registry is ready
+from collab import websocket  # noqa: E402
+from live import stream  # noqa: E402
+from DesignTemplate.staticfiles import StaticFilesASGIApplication  # noqa: E402
+
+# Serve collected static files (hashed, precompressed) ahead of Django
+django_application = StaticFilesASGIApplication(django_application)
+
+
+async def application(scope, receive, send):
+    # Long-lived event streams skip Django's per-request thread
+    if scope['type'] == 'http' and stream.PATH.match(scope['path']):
+        await stream.application(scope, receive, send)
+    elif scope['type'] == 'websocket':
+        await websocket.application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,187 @@
+"""
+Response compression for HTML, JSON and other text responses.
+
+``CompressionMiddleware`` picks brotli (when the ``brotli`` package is
+installed) or gzip from the request's Accept-Encoding and compresses
+responses of a compressible type that are at least COMPRESSION_MIN_SIZE
+bytes. Responses that already have a Content-Encoding (e.g. gzipped preview
+bundles), opt out with ``Cache-Control: no-transform`` or aren't 200s pass
+through untouched.
+
+Streaming responses are compressed chunk by chunk, flushing after each one
+so that a client sees every chunk as soon as the view yields it.
+
+Responses with an ETag are the same bytes every time the ETag is, so their
+compressed bodies are kept in a per-process LRU (COMPRESSION_CACHE_BYTES)
+keyed by ETag and coding and reused instead of being compressed again.
+
+Compressed ETags are made weak, as Django's GZipMiddleware does, so
+conditional requests still match in views that compare them. Django masks
+the CSRF token differently in every response, which defeats BREACH-style
+guessing of it through compressed sizes.
+"""
+
+import zlib
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from metrics.registry import CACHE_REQUESTS
+from .staticfiles import brotli, parse_accept_encoding
+
+MIN_SIZE = getattr(settings, 'COMPRESSION_MIN_SIZE', 512)
+GZIP_LEVEL = getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6)
+BROTLI_QUALITY = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+CACHE_BYTES = getattr(settings, 'COMPRESSION_CACHE_BYTES', 16 * 1024 * 1024)
+
+COMPRESSIBLE_TYPES = (
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+)
+
+
+class GzipCoder:
+    name = 'gzip'
+
+    def compress(self, data):
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    def stream(self):
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        return (
+            lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH),
+            compressor.flush,
+        )
+
+
+class BrotliCoder:
+    name = 'br'
+
+    def compress(self, data):
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+
+    def stream(self):
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return lambda chunk: compressor.process(chunk) + compressor.flush(), compressor.finish
+
+
+# In server preference order
+CODERS = [coder for coder in (BrotliCoder() if brotli else None, GzipCoder()) if coder]
+
+
+class CompressedBodyCache:
+    """Byte-bounded LRU of compressed bodies, keyed by (ETag, coding)"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body
+
+    def set(self, key, body):
+        if len(body) > self.max_bytes // 8:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+def is_compressible(content_type):
+    content_type = content_type.split(';', 1)[0].strip().lower()
+    return content_type.startswith('text/') or content_type in COMPRESSIBLE_TYPES or content_type.endswith('+json')
+
+
+def choose_coder(accept_encoding):
+    accepted = parse_accept_encoding(accept_encoding)
+    for coder in CODERS:
+        if coder.name in accepted:
+            return coder
+    return None
+
+
+def compress_stream(chunks, coder):
+    compress, finish = coder.stream()
+    for chunk in chunks:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+async def compress_async_stream(chunks, coder):
+    compress, finish = coder.stream()
+    async for chunk in chunks:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+class CompressionMiddleware:
+    """Compress text responses with the best coding the client accepts"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cache = CompressedBodyCache(CACHE_BYTES)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.status_code != 200
+            or response.has_header('Content-Encoding')
+            or 'no-transform' in response.get('Cache-Control', '').lower()
+            or not is_compressible(response.get('Content-Type', ''))
+        ):
+            return response
+        if not response.streaming and len(response.content) < MIN_SIZE:
+            return response
+
+        # The body now depends on Accept-Encoding, whichever coding is chosen
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coder = choose_coder(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coder is None:
+            return response
+
+        etag = response.get('ETag')
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compress_async_stream(response.streaming_content, coder)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, coder)
+            del response['Content-Length']
+        else:
+            key = (etag, coder.name) if etag else None
+            body = self.cache.get(key) if key else None
+            if key:
+                CACHE_REQUESTS.inc(cache='compressed_body', result='miss' if body is None else 'hit')
+            if body is None:
+                body = coder.compress(response.content)
+                if len(body) >= len(response.content):
+                    return response
+                if key:
+                    self.cache.set(key, body)
+            response.content = body
+            response['Content-Length'] = str(len(body))
+
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coder.name
+        return response
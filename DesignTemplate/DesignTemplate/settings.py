@@ -44,10 +44,23 @@ INSTALLED_APPS = [
     # Local apps
     'accounts',
     'playground',
+    'taskqueue',
+    'analytics',
+    'recommendations',
+    'timelines',
+    'live',
+    'collab',
+    'metrics',
+    'leaderboards',
+    'notifications',
 ]
 
 MIDDLEWARE = [
+    # First, so request timings cover the whole stack
+    'metrics.instrumentation.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Before anything that reads or changes the response body
+    'DesignTemplate.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -86,6 +99,21 @@ DATABASES = {
     }
 }
 
+# Snippet sharding (playground.sharding): each user's snippets, with their
+# likes, views, comments and revisions, live in one of SNIPPET_SHARDS picked
+# by a hash of the user id; everything else stays in 'default'. Locally the
+# shards are SQLite files next to db.sqlite3. After changing the count run
+# `migrate --database shardN` for new shards, then `rebalance_shards`. The
+# sharding tests run with --settings=DesignTemplate.sharded_settings.
+SNIPPET_SHARD_COUNT = 0  # 0: everything in 'default'
+SNIPPET_SHARDS = [f'shard{i}' for i in range(SNIPPET_SHARD_COUNT)]
+DATABASES.update({
+    alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / f'{alias}.sqlite3'}
+    for alias in SNIPPET_SHARDS
+})
+DATABASE_ROUTERS = ['playground.sharding.ShardRouter']
+SNIPPET_FEED_INDEX_SECONDS = 30  # the merged cross-shard feed index is cached this long
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -125,10 +153,39 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
+# collectstatic writes hashed, minified and precompressed (gzip/brotli) files;
+# wsgi.py serves them from STATIC_ROOT with immutable caching headers.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'DesignTemplate.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+STATIC_MAX_AGE = 60 * 60 * 24 * 365  # One year for hashed static files
+
+# Dynamic responses (DesignTemplate.compression); brotli is used when installed
+COMPRESSION_MIN_SIZE = 512               # bytes; smaller bodies aren't worth it
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5           # 10-11 are for precompressed files only
+COMPRESSION_CACHE_BYTES = 16 * 1024 * 1024  # compressed bodies reused by ETag
+
 # Media files (for user-uploaded thumbnails)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Avatar processing: square variants (px) written as AVIF/WebP/JPEG; uploads
+# larger than AVATAR_SYNC_MAX_BYTES are processed off the request thread.
+AVATAR_SIZES = (48, 96, 256)
+AVATAR_SYNC_MAX_BYTES = 512 * 1024
+
+# Remote avatar_url images are proxied and cached on local disk
+AVATAR_PROXY_FETCHER = 'accounts.avatar_proxy.UrllibFetcher'
+AVATAR_PROXY_CACHE_DIR = BASE_DIR / 'avatar_cache'
+AVATAR_PROXY_MAX_CACHE_BYTES = 50 * 1024 * 1024
+AVATAR_PROXY_TTL = 60 * 60 * 24  # Revalidate remote avatars daily
+
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
@@ -143,6 +200,99 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Pagination
 SNIPPETS_PER_PAGE = 20
 
+# Most snippets one /api/snippets/ batch request may ask for
+SNIPPET_BATCH_MAX_IDS = 100
+
+# Most snippets one /api/snippets/bulk/ request may change or delete
+SNIPPET_BULK_MAX_IDS = 500
+
+# Snippet code fields at least this many characters long are stored zlib-compressed
+COMPRESSED_TEXT_THRESHOLD = 1024
+
+# Snippet revision history: a full keyframe every N revisions bounds
+# reconstruction; saves within the coalesce window update the newest revision.
+REVISION_KEYFRAME_INTERVAL = 50
+REVISION_COALESCE_SECONDS = 120
+
+# Background tasks: run `python manage.py run_tasks` alongside the web server.
+# With TASKQUEUE_EAGER = True tasks run in-process right after commit instead.
+TASKQUEUE_EAGER = False
+
+# View analytics: run `python manage.py rollup_views` hourly (e.g. from cron).
+# Raw views are pruned after rollup once older than the retention period.
+ANALYTICS_SETTLE_SECONDS = 300
+ANALYTICS_RAW_RETENTION_DAYS = 30
+ANALYTICS_HOURLY_RETENTION_DAYS = 30
+
+# Admin changelists for large tables stop counting exactly past this many rows
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Following feeds: new snippets are copied into each follower's timeline,
+# except for authors with more followers than this (merged in at read time)
+TIMELINE_FANOUT_LIMIT = 5000
+
+# Live counters on snippet pages (Server-Sent Events; needs an ASGI server).
+# LocalBroker only reaches connections in the same process.
+LIVE_BROKER = 'live.broker.LocalBroker'
+LIVE_COALESCE_SECONDS = 1.0
+LIVE_HEARTBEAT_SECONDS = 25
+LIVE_MAX_PENDING_COMMENTS = 20
+
+# Live Share editing sessions (WebSockets; needs an ASGI server). Session state
+# lives in the worker process, so run a single worker or route by snippet.
+COLLAB_BATCH_SECONDS = 0.05       # outgoing events are batched per participant
+COLLAB_COMPACT_SECONDS = 10       # how often edits are written back to the Snippet
+COLLAB_HISTORY = 1000             # ops kept for transforming late client edits
+COLLAB_MAX_BACKLOG = 100          # queued batches before a slow client is dropped
+COLLAB_INVITE_MAX_AGE = 7 * 24 * 3600
+
+# Snippet preview documents are written here (with a gzipped copy) when a
+# snippet is saved and served from disk; None assembles them per request.
+PREVIEW_BUNDLE_ROOT = BASE_DIR / 'preview_cache'
+
+# Embeds (/embed/, /oembed/). Versioned embed URLs are cached for a year;
+# redirects and oEmbed JSON are cached this long at the edge and purged by
+# surrogate key on save/delete through EMBED_PURGER (None: no purges), e.g.
+# 'playground.embeds.HttpPurger' with EMBED_PURGE_URL and EMBED_PURGE_HEADERS
+EMBED_BROWSER_MAX_AGE = 60
+EMBED_EDGE_MAX_AGE = 60 * 60 * 24
+EMBED_PURGER = None
+
+# Prometheus metrics at /metrics (metrics app). With several worker processes
+# set METRICS_DIR to a directory they share, emptied on deploy; each process
+# writes its samples there every METRICS_FLUSH_SECONDS and scrapes add them up
+METRICS_DIR = None
+METRICS_FLUSH_SECONDS = 5
+# Scrapers send `Authorization: Bearer <METRICS_TOKEN>`; set it whenever a
+# proxy sits in front (requests it forwards never pass the address check).
+# Without a token, only direct requests from METRICS_ALLOWED_IPS may scrape.
+METRICS_TOKEN = None
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']  # empty: anyone may scrape
+
+# Deleted snippets and accounts are hidden at once and purged by
+# `manage.py purge_deleted` in small transactions, pausing between them
+PURGE_BATCH_SIZE = 1000
+PURGE_PAUSE_SECONDS = 0.05
+
+# Leaderboards (/api/leaderboards/creators/, /api/leaderboards/snippets/) by
+# week, month and all time. After changing the points, recompute the scores
+# with `manage.py rebuild_leaderboards` (and any past periods still shown)
+LEADERBOARD_LIKE_POINTS = 1
+LEADERBOARD_FORK_POINTS = 3
+
+# Notifications of likes, forks and comments on your snippets, coalesced per
+# snippet until read. Schedule `manage.py send_digests` (e.g. hourly) to email
+# what's new, at most every NOTIFICATION_DIGEST_HOURS per user
+NOTIFICATION_DIGEST_HOURS = 24
+NOTIFICATION_DIGEST_ITEMS = 10    # listed per digest; the rest are counted
+NOTIFICATION_SITE_URL = 'http://localhost:8000'  # for links in emails
+
+# Outgoing email is written to files here in development; use the SMTP
+# backend in production (tests switch to the locmem backend on their own)
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_FILE_PATH = BASE_DIR / 'sent_emails'
+DEFAULT_FROM_EMAIL = 'Code Playground <noreply@localhost>'
+
 # Login/Logout redirect URLs
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
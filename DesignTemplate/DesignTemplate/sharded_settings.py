@@ -0,0 +1,16 @@
+"""
+Settings with snippet data spread over three shards, for running the tests
+that need them (the rest of the suite expects everything in 'default'):
+
+    python manage.py test playground.tests.ShardingTests --settings=DesignTemplate.sharded_settings
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES
+
+SNIPPET_SHARD_COUNT = 3
+SNIPPET_SHARDS = [f'shard{i}' for i in range(SNIPPET_SHARD_COUNT)]
+DATABASES.update({
+    alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / f'{alias}.sqlite3'}
+    for alias in SNIPPET_SHARDS
+})
@@ -0,0 +1,354 @@
+"""
+Static asset pipeline for DesignTemplate.
+
+``collectstatic`` runs through ``CompressedManifestStaticFilesStorage``, which
+writes hashed filenames, minifies CSS/JS and stores precompressed ``.gz`` and
+``.br`` variants next to each hashed file. ``StaticFilesApplication`` wraps the
+WSGI application (``StaticFilesASGIApplication`` the ASGI one) and serves those
+files with far-future, immutable caching.
+"""
+
+import asyncio
+import gzip
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from email.utils import formatdate
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip variants are always written
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.svg', '.html', '.txt', '.map', '.xml')
+
+# (encoding, file suffix), in server preference order
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+CSS_TOKEN_RE = re.compile(
+    r'''(?P<string>"(?:[^"\\\n]|\\.)*"?|'(?:[^'\\\n]|\\.)*'?)'''
+    r'|(?P<space>(?:\s|/\*.*?(?:\*/|$))+)'
+    r'''|(?P<other>[^"'/\s{};:,>]+|.)''',
+    re.DOTALL,
+)
+# Whitespace next to these is never significant; before ':' it is (``a :hover``)
+CSS_TIGHT_AFTER = '{};:,>'
+CSS_TIGHT_BEFORE = '{};,>'
+
+
+def minify_css(source):
+    """
+    Strip comments and redundant whitespace from a stylesheet.
+
+    Quoted strings are copied through untouched, and a comment counts as
+    whitespace so it never joins the tokens on either side of it.
+    """
+    out = []
+    pending_space = False
+    for match in CSS_TOKEN_RE.finditer(source):
+        kind, token = match.lastgroup, match.group()
+        if kind == 'space':
+            pending_space = True
+            continue
+        last = out[-1][-1] if out else ''
+        if pending_space and last and last not in CSS_TIGHT_AFTER and token not in CSS_TIGHT_BEFORE:
+            out.append(' ')
+        pending_space = False
+        if token == '}' and last == ';':
+            out.pop()
+        out.append(token)
+    return ''.join(out)
+
+
+# Tokens after which a '/' starts a regular expression rather than a division
+JS_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^') | {
+    '', 'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw',
+    'instanceof', 'yield', 'await',
+}
+JS_WORD_RE = re.compile(r'[\w$]+')
+
+
+def minify_js(source):
+    """
+    Conservatively minify JavaScript.
+
+    Comments and indentation are removed, but line breaks are kept so that
+    automatic semicolon insertion behaves exactly as in the original file.
+    String, template and regular expression literals are copied through
+    untouched; a '/' starts a regular expression when the token before it
+    can't end an expression (see JS_REGEX_AFTER).
+    """
+    out = []
+    i = 0
+    length = len(source)
+    at_line_start = True
+    previous = ''  # the last token copied, ignoring whitespace and comments
+    while i < length:
+        char = source[i]
+        nxt = source[i + 1] if i + 1 < length else ''
+
+        if char in '\'"`':
+            end = i + 1
+            while end < length and source[end] != char:
+                if source[end] == '\\':
+                    end += 1
+                elif source[end] == '\n' and char != '`':
+                    break
+                end += 1
+            out.append(source[i:end + 1])
+            i = end + 1
+            at_line_start = False
+            previous = char
+        elif char == '/' and nxt == '/':
+            while i < length and source[i] != '\n':
+                i += 1
+        elif char == '/' and nxt == '*':
+            end = source.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+        elif char == '/' and previous in JS_REGEX_AFTER:
+            end = i + 1
+            in_class = False
+            while end < length and source[end] != '\n':
+                if source[end] == '\\':
+                    end += 1
+                elif source[end] == '[':
+                    in_class = True
+                elif source[end] == ']':
+                    in_class = False
+                elif source[end] == '/' and not in_class:
+                    break
+                end += 1
+            out.append(source[i:end + 1])
+            i = end + 1
+            at_line_start = False
+            previous = ')'
+        elif char == '\\':
+            out.append(source[i:i + 2])
+            i += 2
+            at_line_start = False
+            previous = 'a'
+        elif char == '\n':
+            while out and out[-1] in ' \t':
+                out.pop()
+            if out and out[-1] != '\n':
+                out.append('\n')
+            at_line_start = True
+            i += 1
+        elif char in ' \t\r':
+            if not at_line_start and out and out[-1] not in ' \n':
+                out.append(' ')
+            i += 1
+        elif char in '+-' and nxt == char:
+            # ``i++ / 2`` divides
+            out.append(char * 2)
+            i += 2
+            at_line_start = False
+            previous = ')'
+        else:
+            word = JS_WORD_RE.match(source, i)
+            previous = word.group() if word else char
+            out.append(previous)
+            at_line_start = False
+            i += len(previous)
+    return ''.join(out).strip() + '\n'
+
+
+MINIFIERS = {
+    '.css': minify_css,
+    '.js': minify_js,
+}
+
+
+def compress_file(path):
+    """Write .gz (and .br when available) variants of ``path`` if they are smaller"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also minifies and precompresses hashed files"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not dry_run and hashed_name and not isinstance(processed, Exception):
+                # Vendored .min files are already minified (and keep their license headers)
+                self.optimize(hashed_name, minify='.min.' not in os.path.basename(name).lower())
+            yield name, hashed_name, processed
+
+    def optimize(self, name, minify=True):
+        """Minify and compress one collected file in place"""
+        ext = os.path.splitext(name)[1].lower()
+        path = self.path(name)
+        minifier = MINIFIERS.get(ext) if minify else None
+        if minifier is not None:
+            with open(path, encoding='utf-8') as f:
+                minified = minifier(f.read())
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(minified)
+        if ext in COMPRESSIBLE_EXTENSIONS:
+            compress_file(path)
+
+
+class StaticFile:
+    """A collected file and its precompressed variants"""
+
+    def __init__(self, path, immutable, max_age):
+        self.path = path
+        stat = os.stat(path)
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        if immutable:
+            cache_control = f'public, max-age={max_age}, immutable'
+        else:
+            cache_control = 'public, max-age=60'
+        self.headers = [
+            ('Content-Type', content_type),
+            ('Cache-Control', cache_control),
+            ('Last-Modified', formatdate(stat.st_mtime, usegmt=True)),
+        ]
+        self.etag_base = f'{int(stat.st_mtime):x}-{stat.st_size:x}'
+        self.variants = {None: (path, stat.st_size)}
+        for encoding, suffix in ENCODINGS:
+            if os.path.exists(path + suffix):
+                self.variants[encoding] = (path + suffix, os.path.getsize(path + suffix))
+
+    def select(self, accept_encoding):
+        """Return (encoding, path, size) for the best variant the client accepts"""
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding, _ in ENCODINGS:
+            if encoding in self.variants and encoding in accepted:
+                return (encoding,) + self.variants[encoding]
+        return (None,) + self.variants[None]
+
+
+def parse_accept_encoding(header):
+    """Return the set of content codings a client accepts"""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        if coding and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.lower())
+    return accepted
+
+
+class StaticFilesApplication:
+    """
+    WSGI middleware serving files from STATIC_ROOT ahead of Django.
+
+    Hashed names listed in the manifest are served with an immutable,
+    one-year Cache-Control; precompressed variants are picked from the
+    request's Accept-Encoding.
+    """
+
+    def __init__(self, application, root=None, prefix=None, max_age=None):
+        self.application = application
+        self.root = str(root or settings.STATIC_ROOT or '')
+        self.prefix = prefix or settings.STATIC_URL or ''
+        if not self.prefix.startswith(('/', 'http://', 'https://', '//')):
+            self.prefix = '/' + self.prefix
+        self.max_age = max_age if max_age is not None else settings.STATIC_MAX_AGE
+        self.files = self.scan() if self.prefix.startswith('/') and not self.prefix.startswith('//') else {}
+
+    def scan(self):
+        if not os.path.isdir(self.root):
+            return {}
+        hashed = set()
+        manifest_path = os.path.join(self.root, ManifestStaticFilesStorage.manifest_name)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                hashed = set(json.load(f).get('paths', {}).values())
+        suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        files = {}
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(suffixes):
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                files[self.prefix + name] = StaticFile(path, name in hashed, self.max_age)
+        return files
+
+    def __call__(self, environ, start_response):
+        method = environ.get('REQUEST_METHOD')
+        static_file = None
+        if method in ('GET', 'HEAD'):
+            static_file = self.files.get(posixpath.normpath(environ.get('PATH_INFO', '')))
+        if static_file is None:
+            return self.application(environ, start_response)
+        return self.serve(static_file, environ, start_response, head=method == 'HEAD')
+
+    def respond(self, static_file, accept_encoding, if_none_match):
+        """(status, headers, path of the body or None) for a request of ``static_file``"""
+        encoding, path, size = static_file.select(accept_encoding)
+        etag = f'"{static_file.etag_base}{"-" + encoding if encoding else ""}"'
+        headers = static_file.headers + [('ETag', etag), ('Vary', 'Accept-Encoding')]
+
+        if etag in (tag.strip() for tag in if_none_match.split(',')) or if_none_match.strip() == '*':
+            return 304, headers, None
+
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        headers.append(('Content-Length', str(size)))
+        return 200, headers, path
+
+    def serve(self, static_file, environ, start_response, head=False):
+        status, headers, path = self.respond(
+            static_file, environ.get('HTTP_ACCEPT_ENCODING', ''), environ.get('HTTP_IF_NONE_MATCH', '')
+        )
+        start_response('304 Not Modified' if status == 304 else '200 OK', headers)
+        if path is None or head:
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return file_wrapper(open(path, 'rb'), 8192)
+
+
+class StaticFilesASGIApplication(StaticFilesApplication):
+    """
+    ASGI middleware serving files from STATIC_ROOT ahead of Django, as
+    StaticFilesApplication does under WSGI. Files are read in a thread so a
+    large one never blocks the event loop.
+    """
+
+    chunk_size = 64 * 1024
+
+    async def __call__(self, scope, receive, send):
+        static_file = None
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            static_file = self.files.get(posixpath.normpath(scope['path']))
+        if static_file is None:
+            return await self.application(scope, receive, send)
+        request_headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        status, headers, path = self.respond(
+            static_file, request_headers.get('accept-encoding', ''), request_headers.get('if-none-match', '')
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        })
+        if path is None or scope['method'] == 'HEAD':
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        with open(path, 'rb') as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, self.chunk_size)
+                more = len(chunk) == self.chunk_size
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': more})
+                if not more:
+                    return
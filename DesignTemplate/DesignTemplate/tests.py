@@ -0,0 +1,281 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import zlib
+from unittest import mock
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from . import compression
+from .staticfiles import StaticFilesApplication, StaticFilesASGIApplication, minify_css, minify_js
+
+
+class MinifyCSSTests(SimpleTestCase):
+
+    def test_strips_comments_and_whitespace(self):
+        source = '/* header */\n.card ,\n.tile > a {\n    color: red ;\n    margin: 0 auto;\n}\n'
+        self.assertEqual(minify_css(source), '.card,.tile>a{color:red;margin:0 auto}')
+
+    def test_strings_are_copied_untouched(self):
+        source = '.a::before { content: "a : b ; { } /* not a comment */"; }\n.b::after { content: \'x , y\' }'
+        self.assertEqual(
+            minify_css(source),
+            '.a::before{content:"a : b ; { } /* not a comment */"}.b::after{content:\'x , y\'}',
+        )
+
+    def test_escaped_quotes_stay_inside_strings(self):
+        self.assertEqual(minify_css('a { content: "say \\"hi , there\\"" ; }'), 'a{content:"say \\"hi , there\\""}')
+
+    def test_descendant_pseudo_selectors_keep_their_space(self):
+        self.assertEqual(minify_css('nav :hover , a :not(.b) { color: red }'), 'nav :hover,a :not(.b){color:red}')
+        self.assertEqual(minify_css('a:hover { color: red }'), 'a:hover{color:red}')
+
+    def test_comments_do_not_join_tokens(self):
+        self.assertEqual(minify_css('.a/**/.b { margin: 0/**/auto }'), '.a .b{margin:0 auto}')
+
+
+class MinifyJSTests(SimpleTestCase):
+
+    def test_strips_comments_and_indentation_but_keeps_lines(self):
+        source = '// leading\nfunction f(a, b) {\n    /* block */\n    return a +   b;  // trailing\n}\n'
+        self.assertEqual(minify_js(source), 'function f(a, b) {\nreturn a + b;\n}\n')
+
+    def test_strings_are_copied_untouched(self):
+        source = "var s = 'a // b', t = \"/* c */\", u = `d\n    // e`;\n"
+        self.assertEqual(minify_js(source), source)
+
+    def test_regex_literals_are_copied_untouched(self):
+        for source in (
+            "var re = /['\"]/g;\n",
+            'var re = /\\/\\/ not a comment/;\n',
+            'var re = /[/]+  x/;\n',
+            'if (/a  "b/.test(s)) go();\n',
+            'return /  \\d+ /.exec(s);\n',
+            "s.replace(/'/g, '');\n",
+        ):
+            with self.subTest(source=source):
+                self.assertEqual(minify_js(source), source)
+
+    def test_division_is_not_a_regex(self):
+        self.assertEqual(minify_js('var x = a / b / c;  // half\n'), 'var x = a / b / c;\n')
+        self.assertEqual(minify_js("var y = (a) / 2, z = n[0] / 'x'.length;\n"), "var y = (a) / 2, z = n[0] / 'x'.length;\n")
+        self.assertEqual(minify_js('var w = i++ / 2;  // next\n'), 'var w = i++ / 2;\n')
+
+
+class StaticFilesTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.css = b'.card{color:red}' * 100
+        for name, data in (
+            ('app.0123abcd.css', self.css),
+            ('app.0123abcd.css.gz', gzip.compress(self.css)),
+            ('robots.txt', b'User-agent: *'),
+            ('staticfiles.json', json.dumps({'paths': {'app.css': 'app.0123abcd.css'}}).encode()),
+        ):
+            with open(os.path.join(self.root, name), 'wb') as f:
+                f.write(data)
+        self.passed_on = []
+
+    def wsgi(self, path, method='GET', **environ):
+        def django(environ, start_response):
+            self.passed_on.append(environ['PATH_INFO'])
+            start_response('404 Not Found', [])
+            return [b'django']
+
+        app = StaticFilesApplication(django, root=self.root, prefix='/static/', max_age=31536000)
+        response = {}
+
+        def start_response(status, headers):
+            response.update(status=int(status.split()[0]), headers=dict(headers))
+
+        body = b''.join(app({'REQUEST_METHOD': method, 'PATH_INFO': path, **environ}, start_response))
+        return response['status'], response['headers'], body
+
+    def asgi(self, path, method='GET', **headers):
+        async def django(scope, receive, send):
+            self.passed_on.append(scope['path'])
+            await send({'type': 'http.response.start', 'status': 404, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b'django'})
+
+        app = StaticFilesASGIApplication(django, root=self.root, prefix='/static/', max_age=31536000)
+        app.chunk_size = 500
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'headers': [(name.replace('_', '-').encode(), value.encode()) for name, value in headers.items()],
+        }
+        return app, scope, send, messages
+
+    async def run_asgi(self, path, method='GET', **headers):
+        app, scope, send, messages = self.asgi(path, method, **headers)
+        await app(scope, None, send)
+        start, *body = messages
+        response_headers = {name.decode(): value.decode() for name, value in start['headers']}
+        self.assertFalse(body[-1].get('more_body', False))
+        return start['status'], response_headers, b''.join(message['body'] for message in body)
+
+    def test_hashed_files_are_immutable_and_precompressed(self):
+        status, headers, body = self.wsgi('/static/app.0123abcd.css', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual((status, headers['Content-Encoding']), (200, 'gzip'))
+        self.assertEqual(gzip.decompress(body), self.css)
+        self.assertEqual(headers['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+
+        status, headers, body = self.wsgi('/static/robots.txt', HTTP_IF_NONE_MATCH='"x"')
+        self.assertEqual((status, headers['Cache-Control'], body), (200, 'public, max-age=60', b'User-agent: *'))
+        self.assertNotIn('Content-Encoding', headers)
+        status, _, body = self.wsgi('/static/robots.txt', HTTP_IF_NONE_MATCH=headers['ETag'])
+        self.assertEqual((status, body), (304, b''))
+
+        self.assertEqual(self.wsgi('/static/missing.css')[2], b'django')
+        self.assertEqual(self.wsgi('/static/robots.txt', 'POST')[2], b'django')
+        self.assertEqual(self.passed_on, ['/static/missing.css', '/static/robots.txt'])
+
+    async def test_asgi_serves_the_same_responses(self):
+        for path, headers in (
+            ('/static/app.0123abcd.css', {'accept_encoding': 'gzip'}),
+            ('/static/app.0123abcd.css', {}),
+            ('/static/robots.txt', {}),
+        ):
+            with self.subTest(path=path, headers=headers):
+                environ = {f'HTTP_{name.upper()}': value for name, value in headers.items()}
+                status, expected, body = self.wsgi(path, **environ)
+                self.assertEqual(
+                    await self.run_asgi(path, **headers),
+                    (status, {name.lower(): value for name, value in expected.items()}, body),
+                )
+
+        etag = (await self.run_asgi('/static/robots.txt'))[1]['etag']
+        self.assertEqual((await self.run_asgi('/static/robots.txt', if_none_match=etag))[::2], (304, b''))
+        self.assertEqual((await self.run_asgi('/static/robots.txt', 'HEAD'))[::2], (200, b''))
+        self.assertEqual((await self.run_asgi('/static/missing.css'))[::2], (404, b'django'))
+        self.assertEqual(self.passed_on, ['/static/missing.css'])
+
+
+class CompressionTests(SimpleTestCase):
+
+    def setUp(self):
+        self.body = b'<p>Hello, compression</p>\n' * 100
+        self.responses = []
+
+    def respond(self, response, accept_encoding='gzip', middleware=None):
+        middleware = middleware or compression.CompressionMiddleware(lambda request: response)
+        request = RequestFactory().get('/', headers={'accept_encoding': accept_encoding})
+        return middleware(request)
+
+    def html(self, body=None, **headers):
+        return HttpResponse(self.body if body is None else body, headers=headers)
+
+    def test_the_best_accepted_coding_is_used(self):
+        for accept_encoding, coding in (
+            ('gzip, deflate, br', 'br'),
+            ('br;q=0, gzip', 'gzip'),
+            ('GZIP', 'gzip'),
+            ('deflate', None),
+            ('', None),
+        ):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.respond(self.html(), accept_encoding)
+                self.assertEqual(response.get('Content-Encoding'), coding)
+                self.assertEqual(response['Vary'], 'Accept-Encoding')
+                if coding == 'gzip':
+                    self.assertEqual(gzip.decompress(response.content), self.body)
+                    self.assertEqual(response['Content-Length'], str(len(response.content)))
+                elif coding == 'br':
+                    self.assertEqual(compression.brotli.decompress(response.content), self.body)
+                else:
+                    self.assertEqual(response.content, self.body)
+
+    def test_vary_is_added_to_the_existing_header(self):
+        response = self.respond(self.html(Vary='Cookie'))
+        self.assertEqual(response['Vary'], 'Cookie, Accept-Encoding')
+
+    def test_some_responses_pass_through_untouched(self):
+        # Stored, not deflated: still big and compressible
+        encoded = gzip.compress(self.body, compresslevel=0)
+        for response in (
+            self.html(encoded, **{'Content-Encoding': 'gzip'}),
+            self.html(**{'Cache-Control': 'no-transform'}),
+            self.html(**{'Content-Type': 'image/png'}),
+            self.html(b'<p>short</p>'),
+            HttpResponse(self.body, status=404),
+        ):
+            with self.subTest(headers=dict(response.headers), status=response.status_code):
+                body = response.content
+                response = self.respond(response)
+                self.assertEqual(response.content, body)
+                self.assertNotIn('Vary', response)
+                self.assertEqual(response.get('Content-Encoding'), 'gzip' if body == encoded else None)
+
+        # Random bytes don't get any smaller
+        response = self.respond(self.html(os.urandom(2000)))
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_streams_are_flushed_chunk_by_chunk(self):
+        chunks = [b'<li>%d</li>' % i * 10 for i in range(5)]
+        response = self.respond(StreamingHttpResponse(iter(chunks)))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response)
+
+        # Every chunk can be decoded as soon as it arrives
+        decompressor = zlib.decompressobj(31)
+        for chunk, compressed in zip(chunks, response.streaming_content):
+            self.assertEqual(decompressor.decompress(compressed), chunk)
+        self.assertEqual(decompressor.decompress(b''.join(response.streaming_content)), b'')
+        self.assertTrue(decompressor.eof)
+
+    async def test_async_streams_are_compressed(self):
+        async def chunks():
+            for i in range(5):
+                yield b'<li>%d</li>' % i * 10
+
+        response = self.respond(StreamingHttpResponse(chunks()), 'br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(compression.brotli.decompress(body), b''.join(b'<li>%d</li>' % i * 10 for i in range(5)))
+
+    def test_bodies_are_reused_by_etag(self):
+        middleware = compression.CompressionMiddleware(lambda request: self.responses.pop(0))
+        self.responses = [self.html(ETag='"v1"'), self.html(b'changed' * 100, ETag='"v1"'), self.html(ETag='"v1"')]
+        first = self.respond(None, middleware=middleware)
+        self.assertEqual(first['ETag'], 'W/"v1"')
+
+        # The same ETag means the same body, so it isn't compressed again
+        with mock.patch.object(compression.GzipCoder, 'compress') as compress:
+            self.assertEqual(self.respond(None, middleware=middleware).content, first.content)
+        compress.assert_not_called()
+        # A different coding is cached separately
+        second = self.respond(None, 'br', middleware=middleware)
+        self.assertEqual(compression.brotli.decompress(second.content), self.body)
+
+    def test_the_cache_evicts_the_least_recently_used(self):
+        cache = compression.CompressedBodyCache(800)
+        for key in 'abc':
+            cache.set(key, b'x' * 100)
+        self.assertEqual(cache.get('a'), b'x' * 100)
+        # Too big to be worth a place
+        cache.set('huge', b'x' * 101)
+        self.assertIsNone(cache.get('huge'))
+
+        for key in 'defghi':
+            cache.set(key, b'x' * 100)
+        # 'b' was read least recently
+        self.assertEqual(list(cache.entries), ['c', 'a', *'defghi'])
+        self.assertEqual(cache.size, 800)
+        cache.set('a', b'y' * 50)
+        cache.set('j', b'x' * 100)
+        cache.set('k', b'x' * 100)
+        self.assertEqual(list(cache.entries), [*'efghi', 'a', 'j', 'k'])
+        self.assertEqual(cache.size, 750)
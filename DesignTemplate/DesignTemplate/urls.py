@@ -8,6 +8,13 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('playground.urls')),
     path('accounts/', include('accounts.urls')),
+    path('', include('analytics.urls')),
+    path('', include('timelines.urls')),
+    path('', include('live.urls')),
+    path('', include('collab.urls')),
+    path('', include('metrics.urls')),
+    path('', include('leaderboards.urls')),
+    path('', include('notifications.urls')),
 ]
 
 # Serve media files in development
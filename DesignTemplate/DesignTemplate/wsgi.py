@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DesignTemplate.settings')
 
 application = get_wsgi_application()
+
+# Serve collected static files (hashed, precompressed) ahead of Django
+from DesignTemplate.staticfiles import StaticFilesApplication  # noqa: E402
+
+application = StaticFilesApplication(application)
@@ -1,10 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Activity
+from playground.admin_performance import LargeTableAdmin, SoftDeleteAdmin
+from .models import User, Activity, Follow
 
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(SoftDeleteAdmin, BaseUserAdmin):
     """Enhanced admin for custom User model"""
     list_display = ['username', 'email', 'first_name', 'last_name', 'streak_count', 'total_views', 'total_likes', 'is_staff']
     list_filter = ['is_staff', 'is_superuser', 'is_active', 'date_joined']
@@ -17,6 +18,9 @@ class UserAdmin(BaseUserAdmin):
         ('Gamification Stats', {
             'fields': ('streak_count', 'total_views', 'total_likes')
         }),
+        ('Social Graph', {
+            'fields': ('followers_count', 'following_count')
+        }),
     )
 
 
@@ -27,3 +31,17 @@ class ActivityAdmin(admin.ModelAdmin):
     list_filter = ['date', 'user']
     search_fields = ['user__username']
     date_hierarchy = 'date'
+
+
+@admin.register(Follow)
+class FollowAdmin(LargeTableAdmin):
+    """Admin for follow relationships"""
+    list_display = ['follower', 'following', 'created_at']
+    list_select_related = ['follower', 'following']
+    search_fields = ['follower__username', 'following__username']
+    search_help_text = 'Exact username'
+    raw_id_fields = ['follower', 'following']
+    # created_at isn't indexed; page by primary key instead
+    keyset_field = None
+    sortable_by = []
+    readonly_fields = ['created_at']
@@ -0,0 +1,287 @@
+"""
+Local caching proxy for remote ``User.avatar_url`` images.
+
+Remote avatars are fetched once through a pluggable fetcher, validated,
+resized and stored on disk under AVATAR_PROXY_CACHE_DIR. The cache is
+bounded by AVATAR_PROXY_MAX_CACHE_BYTES with least-recently-used eviction
+(file mtimes double as access times). Entries older than AVATAR_PROXY_TTL
+are revalidated with a conditional request; if the remote host is down a
+stale copy keeps being served.
+"""
+
+import hashlib
+import http.client
+import io
+import ipaddress
+import json
+import os
+import socket
+import ssl
+import threading
+import time
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+from metrics.registry import CACHE_REQUESTS
+
+from .images import encode, strip_metadata
+
+CACHE_DIR = str(getattr(settings, 'AVATAR_PROXY_CACHE_DIR', settings.BASE_DIR / 'avatar_cache'))
+MAX_CACHE_BYTES = getattr(settings, 'AVATAR_PROXY_MAX_CACHE_BYTES', 50 * 1024 * 1024)
+MAX_SOURCE_BYTES = getattr(settings, 'AVATAR_PROXY_MAX_SOURCE_BYTES', 5 * 1024 * 1024)
+TTL = getattr(settings, 'AVATAR_PROXY_TTL', 60 * 60 * 24)
+SIZE = getattr(settings, 'AVATAR_PROXY_SIZE', 256)
+TIMEOUT = getattr(settings, 'AVATAR_PROXY_TIMEOUT', 5)
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP', 'AVIF'}
+MAX_PIXELS = 40_000_000
+
+# Striped locks so concurrent requests for one avatar trigger a single fetch
+_locks = [threading.Lock() for _ in range(64)]
+
+
+class FetchError(Exception):
+    """Raised when a remote avatar can't be fetched or isn't a valid image"""
+
+
+class FetchResult:
+    def __init__(self, status, body=b'', etag=None, last_modified=None):
+        self.status = status
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class UrllibFetcher:
+    """
+    Fetch avatars over HTTP(S), refusing private and loopback addresses.
+
+    Every hop of a redirect is checked like the first URL, and the
+    connection goes to the address that was checked rather than resolving
+    the name again, so neither a redirect nor DNS rebinding can reach an
+    internal host. TLS certificates are still verified against the name.
+    """
+
+    max_redirects = 3
+
+    def fetch(self, url, etag=None, last_modified=None):
+        headers = {'User-Agent': 'CodePlayground-AvatarProxy/1.0'}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        for _ in range(self.max_redirects + 1):
+            try:
+                status, location, body, response_headers = self.request(url, headers)
+            except (http.client.HTTPException, OSError) as e:
+                raise FetchError(f'Avatar fetch failed: {e}')
+            if status in (301, 302, 303, 307, 308) and location:
+                url = urljoin(url, location)
+                continue
+            if status == 304:
+                return FetchResult(304, etag=etag, last_modified=last_modified)
+            if status != 200:
+                raise FetchError(f'Avatar fetch failed with HTTP {status}')
+            if len(body) > MAX_SOURCE_BYTES:
+                raise FetchError('Remote avatar is too large')
+            return FetchResult(200, body, response_headers.get('ETag'), response_headers.get('Last-Modified'))
+        raise FetchError('Too many redirects')
+
+    def request(self, url, headers):
+        """GET ``url`` from its checked address: (status, Location, body, headers)"""
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise FetchError(f'Unsupported avatar URL: {url}')
+        try:
+            port = parts.port or (443 if parts.scheme == 'https' else 80)
+        except ValueError:
+            raise FetchError(f'Unsupported avatar URL: {url}')
+        address = self.check_host(parts.hostname, port)
+
+        if parts.scheme == 'https':
+            connection = http.client.HTTPSConnection(
+                parts.hostname, port, timeout=TIMEOUT, context=ssl.create_default_context()
+            )
+        else:
+            connection = http.client.HTTPConnection(parts.hostname, port, timeout=TIMEOUT)
+        # Connect to the checked address; Host, SNI and certificate checks still use the name
+        connection._create_connection = lambda _, *args: socket.create_connection((address, port), *args)
+        try:
+            connection.request('GET', urlunsplit(('', '', parts.path or '/', parts.query, '')), headers=headers)
+            response = connection.getresponse()
+            body = response.read(MAX_SOURCE_BYTES + 1) if response.status == 200 else b''
+            return response.status, response.headers.get('Location'), body, response.headers
+        finally:
+            connection.close()
+
+    def check_host(self, hostname, port=None):
+        """The address to connect to for ``hostname``; raises FetchError unless all its addresses are public"""
+        try:
+            infos = socket.getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise FetchError(f'Cannot resolve {hostname}: {e}')
+        addresses = [info[4][0] for info in infos]
+        for address in addresses:
+            ip = ipaddress.ip_address(address.split('%')[0])
+            if not ip.is_global:
+                raise FetchError(f'Refusing to fetch avatar from non-public address {ip}')
+        if not addresses:
+            raise FetchError(f'Cannot resolve {hostname}')
+        return addresses[0]
+
+
+class StubFetcher:
+    """In-memory fetcher for tests and offline development"""
+
+    responses = {}
+    calls = []
+
+    def fetch(self, url, etag=None, last_modified=None):
+        self.calls.append((url, etag, last_modified))
+        if url not in self.responses:
+            raise FetchError(f'No stub response for {url}')
+        body = self.responses[url]
+        digest = '"%s"' % hashlib.sha1(body).hexdigest()
+        if etag == digest:
+            return FetchResult(304, etag=etag)
+        return FetchResult(200, body, etag=digest)
+
+
+def get_fetcher():
+    return import_string(getattr(settings, 'AVATAR_PROXY_FETCHER', 'accounts.avatar_proxy.UrllibFetcher'))()
+
+
+def cache_key(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def url_version(url):
+    """Short version token for proxy URLs, changes whenever avatar_url changes"""
+    return cache_key(url)[:12]
+
+
+def _paths(key):
+    return os.path.join(CACHE_DIR, f'{key}.jpg'), os.path.join(CACHE_DIR, f'{key}.json')
+
+
+def _lock_for(key):
+    return _locks[int(key[:8], 16) % len(_locks)]
+
+
+def process_image(body):
+    """Validate remote image bytes and return a metadata-free square JPEG"""
+    try:
+        probe = Image.open(io.BytesIO(body))
+        probe.verify()
+        image = Image.open(io.BytesIO(body))
+        if image.format not in ALLOWED_FORMATS:
+            raise FetchError(f'Unsupported image format {image.format}')
+        if image.width * image.height > MAX_PIXELS:
+            raise FetchError('Remote avatar has too many pixels')
+        image.load()
+    except FetchError:
+        raise
+    except Exception as e:
+        raise FetchError(f'Invalid image: {e}')
+    image = ImageOps.fit(strip_metadata(image), (SIZE, SIZE), Image.LANCZOS)
+    return encode(image, 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True})
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_entry(key, url, data, result, meta=None):
+    image_path, meta_path = _paths(key)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    if data is not None:
+        tmp = f'{image_path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, image_path)
+        meta = {
+            'url': url,
+            'digest': hashlib.sha1(data).hexdigest(),
+            'size': len(data),
+        }
+    meta.update({
+        'etag': result.etag or meta.get('etag'),
+        'last_modified': result.last_modified or meta.get('last_modified'),
+        'fetched_at': time.time(),
+    })
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return meta
+
+
+def evict(max_bytes=None):
+    """Delete least recently used entries until the cache fits in ``max_bytes``"""
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    try:
+        names = [name for name in os.listdir(CACHE_DIR) if name.endswith('.jpg')]
+    except FileNotFoundError:
+        return 0
+    entries = []
+    total = 0
+    for name in names:
+        try:
+            stat = os.stat(os.path.join(CACHE_DIR, name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name[:-4]))
+        total += stat.st_size
+    if total <= max_bytes:
+        return 0
+    evicted = 0
+    for _, size, key in sorted(entries):
+        for path in _paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+        evicted += 1
+        if total <= max_bytes * 0.9:
+            break
+    return evicted
+
+
+def get_cached_avatar(url):
+    """
+    Return (path, meta) for a proxied copy of ``url``, fetching when needed.
+
+    Returns (None, None) if the avatar can't be fetched and nothing is cached.
+    """
+    key = cache_key(url)
+    image_path, meta_path = _paths(key)
+    with _lock_for(key):
+        meta = _read_meta(meta_path)
+        if meta and os.path.exists(image_path):
+            os.utime(image_path)  # Mark as recently used
+            if time.time() - meta['fetched_at'] < TTL:
+                CACHE_REQUESTS.inc(cache='avatar', result='hit')
+                return image_path, meta
+            CACHE_REQUESTS.inc(cache='avatar', result='stale')
+            try:
+                result = get_fetcher().fetch(url, meta.get('etag'), meta.get('last_modified'))
+                if result.status == 304:
+                    return image_path, _write_entry(key, url, None, result, meta)
+                return image_path, _write_entry(key, url, process_image(result.body), result)
+            except FetchError:
+                return image_path, meta  # Serve stale rather than fail
+
+        CACHE_REQUESTS.inc(cache='avatar', result='miss')
+        try:
+            result = get_fetcher().fetch(url)
+            meta = _write_entry(key, url, process_image(result.body), result)
+        except FetchError:
+            return None, None
+    evict()
+    return image_path, meta
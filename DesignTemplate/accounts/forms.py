@@ -1,5 +1,6 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
+from .images import delete_variants, schedule_avatar_processing
 from .models import User
 
 
@@ -46,3 +47,16 @@ class UserSettingsForm(forms.ModelForm):
             cleaned_data['avatar_url'] = ''
         
         return cleaned_data
+    
+    def save(self, commit=True):
+        user = super().save(commit=False)
+        avatar_changed = 'avatar' in self.changed_data
+        stale_variants = user.avatar_variants
+        if avatar_changed:
+            user.avatar_variants = {}
+        if commit:
+            user.save()
+            if avatar_changed:
+                delete_variants(stale_variants)
+                schedule_avatar_processing(user)
+        return user
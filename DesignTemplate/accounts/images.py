@@ -0,0 +1,155 @@
+"""
+Avatar upload processing.
+
+Uploaded avatars are re-encoded without metadata and resized into square
+variants (AVIF/WebP with a JPEG fallback) stored next to the original under
+``avatars/variants/<user id>/``. Originals in formats browsers can't show
+(or Pillow can't write) are kept as PNG or JPEG, and the upload is only
+deleted once its replacement is saved. The resulting map is kept on
+``User.avatar_variants``::
+
+    {"96": {"avif": "avatars/variants/7/me-96.avif", "webp": ..., "jpeg": ...}}
+"""
+
+import io
+import logging
+import os
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+AVATAR_SIZES = getattr(settings, 'AVATAR_SIZES', (48, 96, 256))
+AVATAR_SYNC_MAX_BYTES = getattr(settings, 'AVATAR_SYNC_MAX_BYTES', 512 * 1024)
+
+# (format key, Pillow format, extension, save options), best first
+VARIANT_FORMATS = [
+    ('avif', 'AVIF', 'avif', {'quality': 60}),
+    ('webp', 'WEBP', 'webp', {'quality': 80, 'method': 6}),
+    ('jpeg', 'JPEG', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+]
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+# Pillow format -> extension of the stripped originals kept as uploaded; others become PNG or JPEG
+ORIGINAL_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def supported_formats():
+    """Variant formats the installed Pillow can encode"""
+    return [fmt for fmt in VARIANT_FORMATS if fmt[0] == 'jpeg' or features.check(fmt[0])]
+
+
+def strip_metadata(image):
+    """Return a copy of ``image`` with EXIF orientation applied and all metadata dropped"""
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    clean = Image.new(image.mode, image.size)
+    clean.paste(image)
+    return clean
+
+
+def original_format_for(image, source_format):
+    """The format to keep a stripped original in: its own if browsers show it and Pillow writes it"""
+    Image.init()
+    if source_format in ORIGINAL_FORMATS and source_format in Image.SAVE:
+        return source_format
+    return 'PNG' if image.mode == 'RGBA' else 'JPEG'
+
+
+def encode(image, pil_format, options):
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if image.mode == 'RGBA' else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def delete_variants(variants):
+    for formats in (variants or {}).values():
+        for name in formats.values():
+            default_storage.delete(name)
+
+
+def process_avatar(user_id):
+    """Strip, resize and convert the user's uploaded avatar into responsive variants"""
+    from .models import User
+
+    user = User.objects.filter(pk=user_id).first()
+    if user is None or not user.avatar:
+        return {}
+
+    with user.avatar.open('rb') as f:
+        source = Image.open(f)
+        source.load()
+        source_format = {'MPO': 'JPEG'}.get(source.format, source.format)
+    image = strip_metadata(source)
+    original_format = original_format_for(image, source_format)
+
+    # Everything is encoded before storage is touched, so a failure leaves the upload as it was
+    original_name = user.avatar.name
+    directory, filename = posixpath.split(original_name)
+    stem = os.path.splitext(filename)[0]
+    original = encode(image, original_format, {'quality': 90} if original_format == 'JPEG' else {})
+    encoded = {}
+    for size in AVATAR_SIZES:
+        resized = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        for key, pil_format, ext, options in supported_formats():
+            encoded[str(size), key, ext] = encode(resized, pil_format, options)
+
+    # The metadata-free copy gets a name of its own; the upload is deleted once it's replaced
+    if original_format != source_format:
+        original_name = posixpath.join(directory, f'{stem}.{ORIGINAL_FORMATS[original_format]}')
+    saved_original = default_storage.save(original_name, ContentFile(original))
+    variants = {}
+    for (size, key, ext), data in encoded.items():
+        name = default_storage.save(f'avatars/variants/{user.pk}/{stem}-{size}.{ext}', ContentFile(data))
+        variants.setdefault(size, {})[key] = name
+
+    # Only publish the variants if the avatar wasn't replaced meanwhile
+    updated = User.objects.filter(pk=user.pk, avatar=user.avatar.name).update(
+        avatar=saved_original, avatar_variants=variants
+    )
+    if updated:
+        default_storage.delete(user.avatar.name)
+        delete_variants(user.avatar_variants)
+    else:
+        default_storage.delete(saved_original)
+        delete_variants(variants)
+    return variants
+
+
+def _process_avatar_safely(user_id):
+    try:
+        process_avatar(user_id)
+    except Exception:
+        logger.exception('Avatar processing failed for user %s', user_id)
+
+
+def schedule_avatar_processing(user):
+    """
+    Process a freshly uploaded avatar.
+
+    Small uploads are processed inline after commit; anything over
+    AVATAR_SYNC_MAX_BYTES is queued for the task worker so the request
+    returns immediately.
+    """
+    from taskqueue.queue import enqueue
+
+    if not user.avatar:
+        return
+    if user.avatar.size > AVATAR_SYNC_MAX_BYTES:
+        enqueue(
+            'accounts.process_avatar',
+            {'user_id': user.pk},
+            idempotency_key=f'avatar:{user.pk}:{user.avatar.name}',
+        )
+    else:
+        transaction.on_commit(lambda: _process_avatar_safely(user.pk))
@@ -1,11 +1,21 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+from django.core.files.storage import default_storage
 from django.db import models
+from django.urls import reverse
+
+
+class UserManager(BaseUserManager):
+    """Default manager; leaves out deleted users waiting to be purged"""
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 
 class User(AbstractUser):
     """Extended user model for Social Code Playground"""
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True, help_text="Uploaded profile picture")
     avatar_url = models.URLField(blank=True, null=True, help_text="Profile picture URL")
+    avatar_variants = models.JSONField(default=dict, blank=True, help_text="Resized avatar files by size and format")
     bio = models.TextField(max_length=500, blank=True, help_text="User biography")
     tech_stack_tags = models.JSONField(default=list, blank=True, help_text="Technologies the user works with")
     github_profile = models.URLField(blank=True, null=True, help_text="GitHub profile URL")
@@ -16,22 +26,58 @@ class User(AbstractUser):
     total_views = models.IntegerField(default=0, help_text="Total views across all snippets")
     total_likes = models.IntegerField(default=0, help_text="Total likes received")
     
+    # Social graph counters, kept in step with Follow rows
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+    
+    # Database holding the user's snippets (see playground.sharding); empty is 'default'
+    shard = models.CharField(max_length=100, blank=True, default='', editable=False)
+    
+    # Set on delete; the account and everything it owns are purged in the background
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = UserManager()
+    all_objects = models.Manager()
+    
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
         ordering = ['-date_joined']
+        indexes = [
+            models.Index(fields=['deleted_at'], name='user_deleted_idx', condition=models.Q(deleted_at__isnull=False)),
+        ]
     
     def __str__(self):
         return self.username
     
-    def get_avatar_display(self):
+    def get_avatar_display(self, size=None):
         """Return the avatar URL, prioritizing uploaded file over URL"""
         if self.avatar:
-            return self.avatar.url
-        return self.avatar_url or None
+            sources = self.get_avatar_sources(size)
+            return sources.get('jpeg') or self.avatar.url
+        if self.avatar_url:
+            # Remote avatars are served through the local caching proxy
+            from .avatar_proxy import url_version
+            url = reverse('accounts:avatar_proxy', kwargs={'username': self.username})
+            return f'{url}?v={url_version(self.avatar_url)}'
+        return None
+    
+    def get_avatar_sources(self, size=None):
+        """Return {format: url} for the smallest processed variant covering ``size`` pixels"""
+        if not self.avatar_variants:
+            return {}
+        sizes = sorted(int(s) for s in self.avatar_variants)
+        if size is None:
+            chosen = sizes[-1]
+        else:
+            chosen = next((s for s in sizes if s >= size), sizes[-1])
+        return {
+            fmt: default_storage.url(name)
+            for fmt, name in self.avatar_variants[str(chosen)].items()
+        }
     
     def update_stats(self):
         """Update total views and likes from all snippets"""
@@ -56,3 +102,20 @@ class Activity(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.date}"
+
+
+class Follow(models.Model):
+    """``follower`` sees ``following``'s new snippets in their following feed"""
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following_set')
+    following = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follower_set')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('follower', 'following')
+        indexes = [
+            # Fan-out walks an author's followers in follower order
+            models.Index(fields=['following', 'follower']),
+        ]
+    
+    def __str__(self):
+        return f"{self.follower.username} follows {self.following.username}"
@@ -0,0 +1,39 @@
+"""Deferred bookkeeping for user activity and avatars"""
+
+from collections import Counter
+from datetime import date
+
+from django.db.models import F
+
+from taskqueue.queue import task
+from .images import process_avatar
+from .models import Activity
+
+
+@task('accounts.record_activity', batch=True)
+def record_activity(payloads):
+    """Fold snippet/fork events into the daily Activity rows"""
+    snippets = Counter()
+    forks = Counter()
+    for p in payloads:
+        key = (p['user_id'], p['date'])
+        snippets[key] += p.get('snippets', 0)
+        forks[key] += p.get('forks', 0)
+
+    for user_id, day in set(snippets) | set(forks):
+        key = (user_id, day)
+        activity, created = Activity.objects.get_or_create(
+            user_id=user_id,
+            date=date.fromisoformat(day),
+            defaults={'snippet_count': snippets[key], 'fork_count': forks[key]},
+        )
+        if not created:
+            Activity.objects.filter(pk=activity.pk).update(
+                snippet_count=F('snippet_count') + snippets[key],
+                fork_count=F('fork_count') + forks[key],
+            )
+
+
+@task('accounts.process_avatar', max_attempts=3)
+def process_avatar_task(user_id):
+    process_avatar(user_id)
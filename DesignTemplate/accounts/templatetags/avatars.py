@@ -0,0 +1,32 @@
+from django import template
+
+from ..images import MIME_TYPES
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar_url(user, size=None):
+    """Best single URL for a user's avatar at ``size`` pixels"""
+    return user.get_avatar_display(size) or ''
+
+
+@register.inclusion_tag('accounts/avatar_picture.html')
+def avatar_picture(user, size, style=''):
+    """Render a <picture> with AVIF/WebP sources, a JPEG fallback and 2x srcsets"""
+    base = user.get_avatar_sources(size)
+    retina = user.get_avatar_sources(size * 2)
+    sources = []
+    for fmt in ('avif', 'webp'):
+        if fmt in base:
+            srcset = base[fmt]
+            if retina.get(fmt) and retina[fmt] != base[fmt]:
+                srcset += f', {retina[fmt]} 2x'
+            sources.append({'type': MIME_TYPES[fmt], 'srcset': srcset})
+    return {
+        'user': user,
+        'size': size,
+        'style': style,
+        'sources': sources,
+        'src': user.get_avatar_display(size),
+    }
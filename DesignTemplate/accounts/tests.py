@@ -1,3 +1,272 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from . import avatar_proxy
+from .avatar_proxy import FetchError, StubFetcher, UrllibFetcher
+from .images import process_avatar
+from .models import User
+
+XPM = b'''/* XPM */
+static char *avatar[] = {
+"4 4 2 1",
+"a c #FF0000",
+"b c #0000FF",
+"abab",
+"baba",
+"abab",
+"baba"
+};
+'''
+
+
+def png(color=(200, 40, 40)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def jpeg_with_exif():
+    exif = Image.Exif()
+    exif[0x010F] = 'Secret Camera Co'
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), (10, 200, 30)).save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class AvatarProcessingTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user('pic', 'pic@example.com', 'password')
+
+    def upload(self, name, data):
+        self.user.avatar = SimpleUploadedFile(name, data)
+        self.user.save()
+        return self.user.avatar.name
+
+    def test_original_is_stripped_and_variants_written(self):
+        uploaded = self.upload('me.jpg', jpeg_with_exif())
+        variants = process_avatar(self.user.pk)
+        self.user.refresh_from_db()
+
+        self.assertEqual(self.user.avatar_variants, variants)
+        self.assertIn('jpeg', variants['96'])
+        self.assertTrue(self.user.avatar.name.endswith('.jpg'))
+        self.assertNotEqual(self.user.avatar.name, uploaded)
+        self.assertFalse(default_storage.exists(uploaded))
+        with default_storage.open(self.user.avatar.name) as f:
+            self.assertNotIn(0x010F, Image.open(f).getexif())
+        with default_storage.open(variants['48']['jpeg']) as f:
+            self.assertEqual(Image.open(f).size, (48, 48))
+
+    def test_formats_pillow_cannot_write_are_kept_as_png_or_jpeg(self):
+        uploaded = self.upload('me.xpm', XPM)
+        process_avatar(self.user.pk)
+        self.user.refresh_from_db()
+
+        self.assertTrue(self.user.avatar.name.endswith(('.png', '.jpg')))
+        self.assertFalse(default_storage.exists(uploaded))
+        with default_storage.open(self.user.avatar.name) as f:
+            self.assertEqual(Image.open(f).size, (4, 4))
+
+    def test_failed_encode_keeps_the_upload(self):
+        uploaded = self.upload('me.jpg', jpeg_with_exif())
+        with mock.patch('accounts.images.encode', side_effect=OSError('encoder unavailable')):
+            with self.assertRaises(OSError):
+                process_avatar(self.user.pk)
+        self.user.refresh_from_db()
+
+        self.assertEqual(self.user.avatar.name, uploaded)
+        self.assertTrue(default_storage.exists(uploaded))
+        self.assertEqual(self.user.avatar_variants, {})
+
+    def test_avatar_replaced_meanwhile_is_left_alone(self):
+        self.upload('first.jpg', jpeg_with_exif())
+        newer = 'avatars/newer.jpg'
+
+        def replace_meanwhile():
+            User.objects.filter(pk=self.user.pk).update(avatar=newer)
+            return [('jpeg', 'JPEG', 'jpg', {})]
+
+        with mock.patch('accounts.images.supported_formats', side_effect=replace_meanwhile):
+            process_avatar(self.user.pk)
+        self.user.refresh_from_db()
+
+        self.assertEqual(self.user.avatar.name, newer)
+        self.assertEqual(self.user.avatar_variants, {})
+        self.assertEqual(default_storage.listdir(f'avatars/variants/{self.user.pk}'), ([], []))
+        self.assertEqual(default_storage.listdir('avatars')[1], ['first.jpg'])
+
+
+@override_settings(AVATAR_PROXY_FETCHER='accounts.avatar_proxy.StubFetcher')
+class AvatarProxyTests(TestCase):
+    url = 'https://avatars.example.com/pic.png'
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        for patch in (
+            mock.patch.object(avatar_proxy, 'CACHE_DIR', cache_dir),
+            mock.patch.object(StubFetcher, 'responses', {self.url: png()}),
+            mock.patch.object(StubFetcher, 'calls', []),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.user = User.objects.create_user('remote', 'remote@example.com', 'password', avatar_url=self.url)
+
+    def expire(self):
+        _, meta_path = avatar_proxy._paths(avatar_proxy.cache_key(self.url))
+        meta = avatar_proxy._read_meta(meta_path)
+        meta['fetched_at'] = time.time() - avatar_proxy.TTL - 1
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    def test_fetches_once_then_serves_from_cache(self):
+        path, meta = avatar_proxy.get_cached_avatar(self.url)
+        self.assertEqual(avatar_proxy.get_cached_avatar(self.url), (path, meta))
+        self.assertEqual(StubFetcher.calls, [(self.url, None, None)])
+        with Image.open(path) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (avatar_proxy.SIZE, avatar_proxy.SIZE)))
+
+    def test_stale_entry_is_revalidated(self):
+        _, meta = avatar_proxy.get_cached_avatar(self.url)
+        self.expire()
+        path, revalidated = avatar_proxy.get_cached_avatar(self.url)
+        self.assertEqual(StubFetcher.calls[-1][1], meta['etag'])
+        self.assertEqual(revalidated['digest'], meta['digest'])
+
+        StubFetcher.responses[self.url] = png((0, 0, 255))
+        self.expire()
+        _, refetched = avatar_proxy.get_cached_avatar(self.url)
+        self.assertNotEqual(refetched['digest'], meta['digest'])
+
+    def test_stale_copy_is_served_when_the_remote_fails(self):
+        path, meta = avatar_proxy.get_cached_avatar(self.url)
+        self.expire()
+        del StubFetcher.responses[self.url]
+        self.assertEqual(avatar_proxy.get_cached_avatar(self.url)[0], path)
+        self.assertEqual(avatar_proxy.get_cached_avatar('https://avatars.example.com/missing.png'), (None, None))
+
+    def test_invalid_images_are_not_cached(self):
+        StubFetcher.responses[self.url] = b'<html>not an image</html>'
+        self.assertEqual(avatar_proxy.get_cached_avatar(self.url), (None, None))
+
+    def test_view_caches_no_longer_than_the_proxy(self):
+        url = self.user.get_avatar_display()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Cache-Control'], f'public, max-age={avatar_proxy.TTL}')
+
+        response = self.client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_view_404s_without_an_avatar(self):
+        del StubFetcher.responses[self.url]
+        self.assertEqual(self.client.get(reverse('accounts:avatar_proxy', args=['remote'])).status_code, 404)
+        User.objects.filter(pk=self.user.pk).update(avatar_url='')
+        self.assertEqual(self.client.get(reverse('accounts:avatar_proxy', args=['remote'])).status_code, 404)
+
+    def test_evicts_least_recently_used(self):
+        for i in range(3):
+            StubFetcher.responses[f'{self.url}?{i}'] = png((i, 0, 0))
+            path, _ = avatar_proxy.get_cached_avatar(f'{self.url}?{i}')
+            os.utime(path, (i, i))
+        size = os.path.getsize(path)
+        self.assertEqual(avatar_proxy.evict(max_bytes=size * 2), 2)
+        self.assertTrue(os.path.exists(path))
+
+
+class AvatarServer(BaseHTTPRequestHandler):
+    """Serves an avatar at /pic.png and redirects from /to/<location>"""
+
+    def do_GET(self):
+        if self.path == '/pic.png':
+            body = png()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path.startswith('/to/'):
+            self.send_response(302)
+            self.send_header('Location', self.path[len('/to/'):])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self.send_error(404)
+
+    def log_message(self, *args):
+        pass
+
+
+class UrllibFetcherTests(SimpleTestCase):
+    """The fetcher against a local server standing in for the public host avatars.test"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), AvatarServer)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+        cls.base = f'http://avatars.test:{cls.server.server_port}'
+
+    def fetcher(self):
+        class Fetcher(UrllibFetcher):
+            # avatars.test counts as public and resolves to the local server; nothing else does
+            def check_host(self, hostname, port=None):
+                if hostname == 'avatars.test':
+                    return '127.0.0.1'
+                return super().check_host(hostname, port)
+        return Fetcher()
+
+    def test_connects_to_the_checked_address(self):
+        # avatars.test isn't in DNS, so this only works if the checked address is used
+        result = self.fetcher().fetch(f'{self.base}/pic.png')
+        self.assertEqual((result.status, result.body), (200, png()))
+
+    def test_follows_redirects_between_public_hosts(self):
+        result = self.fetcher().fetch(f'{self.base}/to/{self.base}/pic.png')
+        self.assertEqual(result.status, 200)
+        result = self.fetcher().fetch(f'{self.base}/to//pic.png')
+        self.assertEqual(result.status, 200)
+
+    def test_redirects_to_internal_addresses_are_refused(self):
+        for target in (
+            f'http://127.0.0.1:{self.server.server_port}/pic.png',
+            'http://169.254.169.254/latest/meta-data/',
+            'http://localhost/',
+            'http://[::1]/',
+            'file:///etc/passwd',
+        ):
+            with self.subTest(target=target), self.assertRaises(FetchError):
+                self.fetcher().fetch(f'{self.base}/to/{target}')
+
+    def test_redirect_loops_stop(self):
+        url = f'{self.base}/pic.png'
+        for _ in range(UrllibFetcher.max_redirects + 1):
+            url = f'{self.base}/to/{url}'
+        with self.assertRaisesMessage(FetchError, 'Too many redirects'):
+            self.fetcher().fetch(url)
+
+    def test_private_addresses_are_refused(self):
+        for host in ('127.0.0.1', '10.1.2.3', '192.168.0.1', '169.254.169.254', '::1'):
+            with self.subTest(host=host), self.assertRaises(FetchError):
+                UrllibFetcher().check_host(host, 80)
@@ -13,4 +13,6 @@ urlpatterns = [
     # User profiles
     path('profile/<str:username>/', views.user_profile, name='profile'),
     path('settings/', views.user_settings, name='settings'),
+    path('avatar/<str:username>/', views.proxied_avatar, name='avatar_proxy'),
+    path('api/follow/<str:username>/', views.follow_user, name='follow'),
 ]
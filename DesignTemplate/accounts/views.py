@@ -3,9 +3,13 @@ from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Count
-from .models import User, Activity
+from django.http import FileResponse, Http404, HttpResponseNotModified, JsonResponse
+from django.views.decorators.http import require_GET, require_POST
+from . import avatar_proxy
+from .models import User, Activity, Follow
 from .forms import CustomUserCreationForm, UserSettingsForm
 from playground.models import Snippet
+from timelines import fanout
 from datetime import date, timedelta
 
 
@@ -28,7 +32,9 @@ def user_profile(request, username):
     profile_user = get_object_or_404(User, username=username)
     
     # Get user's public snippets
-    snippets = Snippet.objects.filter(user=profile_user, is_public=True).order_by('-created_at')
+    snippets = Snippet.objects.filter(user=profile_user, is_public=True).order_by('-created_at').defer(
+        'html_code', 'css_code', 'js_code'
+    )
     pinned_snippets = snippets.filter(is_pinned=True)[:3]
     
     # Get activity data for contribution graph (last 365 days)
@@ -55,6 +61,10 @@ def user_profile(request, username):
         'pinned_snippets': pinned_snippets,
         'activity_data': activity_data,
         'is_own_profile': request.user == profile_user,
+        'is_following': (
+            request.user.is_authenticated
+            and Follow.objects.filter(follower=request.user, following=profile_user).exists()
+        ),
     }
     return render(request, 'accounts/profile.html', context)
 
@@ -74,3 +84,44 @@ def user_settings(request):
         form = UserSettingsForm(instance=request.user)
     
     return render(request, 'accounts/settings.html', {'form': form})
+
+
+@login_required
+@require_POST
+def follow_user(request, username):
+    """Toggle following a user"""
+    author = get_object_or_404(User, username=username)
+    if author == request.user:
+        return JsonResponse({'success': False, 'error': 'You cannot follow yourself'}, status=400)
+    
+    following = fanout.follow(request.user, author)
+    if not following:
+        fanout.unfollow(request.user, author)
+    
+    author.refresh_from_db(fields=['followers_count'])
+    return JsonResponse({'success': True, 'following': following, 'followers_count': author.followers_count})
+
+
+@require_GET
+def proxied_avatar(request, username):
+    """Serve a user's remote avatar_url from the local avatar cache"""
+    profile_user = get_object_or_404(User, username=username)
+    if not profile_user.avatar_url:
+        raise Http404('No remote avatar')
+    
+    path, meta = avatar_proxy.get_cached_avatar(profile_user.avatar_url)
+    if path is None:
+        raise Http404('Avatar unavailable')
+    
+    etag = f'"{meta["digest"]}"'
+    # The ?v= version only changes with avatar_url, not with the image behind it,
+    # so browsers may keep a copy no longer than the proxy does before revalidating
+    cache_control = f'public, max-age={avatar_proxy.TTL}'
+    
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(path, 'rb'), content_type='image/jpeg')
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
@@ -0,0 +1,47 @@
+from django.contrib import admin
+from .models import (
+    DailySnippetViews, DailyUserAgentViews, HourlySnippetViews, RollupCursor, UniqueViewerSketch,
+)
+
+
+@admin.register(HourlySnippetViews)
+class HourlySnippetViewsAdmin(admin.ModelAdmin):
+    """Admin for hourly view rollups"""
+    list_display = ['snippet', 'hour', 'views', 'unique_viewers']
+    raw_id_fields = ['snippet']
+    date_hierarchy = 'hour'
+
+
+@admin.register(DailySnippetViews)
+class DailySnippetViewsAdmin(admin.ModelAdmin):
+    """Admin for daily view rollups"""
+    list_display = ['snippet', 'day', 'views', 'unique_viewers']
+    raw_id_fields = ['snippet']
+    date_hierarchy = 'day'
+
+
+@admin.register(DailyUserAgentViews)
+class DailyUserAgentViewsAdmin(admin.ModelAdmin):
+    """Admin for daily user agent rollups"""
+    list_display = ['snippet', 'day', 'family', 'views']
+    list_filter = ['family']
+    raw_id_fields = ['snippet']
+    date_hierarchy = 'day'
+
+
+@admin.register(RollupCursor)
+class RollupCursorAdmin(admin.ModelAdmin):
+    """Admin for rollup progress"""
+    list_display = ['name', 'position', 'updated_at']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(UniqueViewerSketch)
+class UniqueViewerSketchAdmin(admin.ModelAdmin):
+    """Admin for HyperLogLog unique viewer sketches"""
+    list_display = ['snippet', 'day', 'estimate', 'updated_at']
+    search_fields = ['snippet__title']
+    raw_id_fields = ['snippet']
+    date_hierarchy = 'day'
+    exclude = ['registers']
+    readonly_fields = ['snippet', 'day', 'estimate', 'updated_at']
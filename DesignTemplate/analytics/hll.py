@@ -0,0 +1,78 @@
+"""
+HyperLogLog distinct counting.
+
+With PRECISION = 12 a sketch has 4096 one-byte registers and estimates
+cardinality with a relative standard error of 1.04 / sqrt(4096) ~= 1.6%
+(about 3.3% at two standard errors, 5% at three). Below roughly 10k items
+linear counting takes over and small counts are close to exact. Sketches
+merge losslessly by taking the register-wise maximum, so the sketch of a
+union (a week, all time) is built from daily sketches in constant memory.
+
+Registers are stored zlib-compressed; a sketch that has seen a handful of
+viewers is mostly zeros and packs into a couple of hundred bytes, a full one
+into under 2 KB.
+"""
+
+import math
+import zlib
+from hashlib import blake2b
+
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+HASH_BITS = 64
+STANDARD_ERROR = 1.04 / math.sqrt(REGISTERS)
+
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+_SUFFIX_BITS = HASH_BITS - PRECISION
+_SUFFIX_MASK = (1 << _SUFFIX_BITS) - 1
+
+
+def _hash(item):
+    return int.from_bytes(blake2b(item.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    __slots__ = ('registers',)
+
+    def __init__(self, registers=None):
+        self.registers = bytearray(registers) if registers else bytearray(REGISTERS)
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(zlib.decompress(bytes(data))) if data else cls()
+
+    def to_bytes(self):
+        return zlib.compress(bytes(self.registers), 9)
+
+    def add(self, item):
+        """Add a string; returns True if the sketch changed"""
+        h = _hash(item)
+        index = h >> _SUFFIX_BITS
+        # Position of the leftmost 1-bit in the remaining bits, from 1
+        rank = _SUFFIX_BITS - (h & _SUFFIX_MASK).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def update(self, other):
+        """Merge another sketch into this one (union)"""
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self):
+        zeros = self.registers.count(0)
+        if zeros == REGISTERS:
+            return 0
+        raw = _ALPHA * REGISTERS * REGISTERS / math.fsum(2.0 ** -r for r in self.registers)
+        if raw <= 2.5 * REGISTERS and zeros:
+            # Small range correction: linear counting is far more accurate here
+            return round(REGISTERS * math.log(REGISTERS / zeros))
+        return round(raw)
+
+
+def merge(sketches):
+    """Union of an iterable of sketches, folded one at a time"""
+    result = HyperLogLog()
+    for sketch in sketches:
+        result.update(sketch)
+    return result
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics import rollup
+from playground import sharding
+
+
+class Command(BaseCommand):
+    help = 'Roll up raw snippet views into hourly/daily analytics and prune old views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-prune', action='store_true', help='Keep raw views past retention')
+        parser.add_argument(
+            '--max-buckets', type=int, default=None,
+            help='Stop after this many hours/days per rollup (resume on the next run)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        hours = days = pruned = 0
+        # Views and their rollups live on the snippets' shards, each with its own cursors
+        for alias in sharding.databases():
+            with sharding.use(alias):
+                hours += rollup.rollup_hours(max_buckets=options['max_buckets'])
+                days += rollup.rollup_days(max_buckets=options['max_buckets'])
+                pruned += 0 if options['no_prune'] else rollup.prune()
+        self.stdout.write(
+            f'Rolled up {hours} hours and {days} days, pruned {pruned} raw views '
+            f'in {time.monotonic() - started:.2f}s'
+        )
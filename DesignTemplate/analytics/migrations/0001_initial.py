@@ -0,0 +1,76 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('playground', '0005_view_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20, unique=True)),
+                ('position', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySnippetViews',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('unique_viewers', models.PositiveIntegerField(default=0)),
+                ('snippet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_views', to='playground.snippet')),
+            ],
+            options={
+                'verbose_name': 'Daily snippet views',
+                'verbose_name_plural': 'Daily snippet views',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['day'], name='analytics_d_day_360d7e_idx')],
+                'unique_together': {('snippet', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyUserAgentViews',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('family', models.CharField(help_text='Browser family, e.g. Chrome or Bot', max_length=20)),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('snippet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_agent_views', to='playground.snippet')),
+            ],
+            options={
+                'verbose_name': 'Daily user agent views',
+                'verbose_name_plural': 'Daily user agent views',
+                'ordering': ['-day', '-views'],
+                'indexes': [models.Index(fields=['day'], name='analytics_d_day_dda850_idx')],
+                'unique_together': {('snippet', 'day', 'family')},
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlySnippetViews',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Start of the hour (UTC)')),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('unique_viewers', models.PositiveIntegerField(default=0)),
+                ('snippet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_views', to='playground.snippet')),
+            ],
+            options={
+                'verbose_name': 'Hourly snippet views',
+                'verbose_name_plural': 'Hourly snippet views',
+                'ordering': ['-hour'],
+                'indexes': [models.Index(fields=['hour'], name='analytics_h_hour_284bbd_idx')],
+                'unique_together': {('snippet', 'hour')},
+            },
+        ),
+    ]
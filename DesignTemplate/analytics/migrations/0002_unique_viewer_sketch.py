@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('playground', '0005_view_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UniqueViewerSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(blank=True, help_text='UTC day; empty for the all-time sketch', null=True)),
+                ('registers', models.BinaryField(default=b'', help_text='zlib-compressed HyperLogLog registers')),
+                ('estimate', models.PositiveIntegerField(default=0, help_text='Estimated distinct viewers')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('snippet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='viewer_sketches', to='playground.snippet')),
+            ],
+            options={
+                'verbose_name': 'Unique viewer sketch',
+                'verbose_name_plural': 'Unique viewer sketches',
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('snippet', 'day'), name='unique_viewer_sketch_day'), models.UniqueConstraint(condition=models.Q(('day__isnull', True)), fields=('snippet',), name='unique_viewer_sketch_all_time')],
+            },
+        ),
+    ]
@@ -0,0 +1,98 @@
+from django.db import models
+
+from playground.models import Snippet
+
+
+class HourlySnippetViews(models.Model):
+    """Views of a snippet within one clock hour, rolled up from playground.View"""
+    snippet = models.ForeignKey(Snippet, on_delete=models.CASCADE, related_name='hourly_views')
+    hour = models.DateTimeField(help_text="Start of the hour (UTC)")
+    views = models.PositiveIntegerField(default=0)
+    unique_viewers = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('snippet', 'hour')
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+        ordering = ['-hour']
+        verbose_name = 'Hourly snippet views'
+        verbose_name_plural = 'Hourly snippet views'
+    
+    def __str__(self):
+        return f"{self.snippet_id} @ {self.hour:%Y-%m-%d %H:00}: {self.views}"
+
+
+class DailySnippetViews(models.Model):
+    """Views of a snippet within one UTC day, rolled up from playground.View"""
+    snippet = models.ForeignKey(Snippet, on_delete=models.CASCADE, related_name='daily_views')
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    unique_viewers = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('snippet', 'day')
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+        ordering = ['-day']
+        verbose_name = 'Daily snippet views'
+        verbose_name_plural = 'Daily snippet views'
+    
+    def __str__(self):
+        return f"{self.snippet_id} @ {self.day}: {self.views}"
+
+
+class DailyUserAgentViews(models.Model):
+    """Views of a snippet within one UTC day by user agent family"""
+    snippet = models.ForeignKey(Snippet, on_delete=models.CASCADE, related_name='user_agent_views')
+    day = models.DateField()
+    family = models.CharField(max_length=20, help_text="Browser family, e.g. Chrome or Bot")
+    views = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('snippet', 'day', 'family')
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+        ordering = ['-day', '-views']
+        verbose_name = 'Daily user agent views'
+        verbose_name_plural = 'Daily user agent views'
+    
+    def __str__(self):
+        return f"{self.snippet_id} @ {self.day} {self.family}: {self.views}"
+
+
+class RollupCursor(models.Model):
+    """How far a rollup has processed raw View rows (exclusive upper bound)"""
+    name = models.CharField(max_length=20, unique=True)
+    position = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} rolled up to {self.position}"
+
+
+class UniqueViewerSketch(models.Model):
+    """HyperLogLog sketch of a snippet's distinct viewers for one day, or all time"""
+    snippet = models.ForeignKey(Snippet, on_delete=models.CASCADE, related_name='viewer_sketches')
+    day = models.DateField(null=True, blank=True, help_text="UTC day; empty for the all-time sketch")
+    registers = models.BinaryField(default=b'', help_text="zlib-compressed HyperLogLog registers")
+    estimate = models.PositiveIntegerField(default=0, help_text="Estimated distinct viewers")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['snippet', 'day'], name='unique_viewer_sketch_day'),
+            models.UniqueConstraint(
+                fields=['snippet'],
+                condition=models.Q(day__isnull=True),
+                name='unique_viewer_sketch_all_time',
+            ),
+        ]
+        ordering = ['-day']
+        verbose_name = 'Unique viewer sketch'
+        verbose_name_plural = 'Unique viewer sketches'
+    
+    def __str__(self):
+        return f"{self.snippet_id} @ {self.day or 'all time'}: ~{self.estimate}"
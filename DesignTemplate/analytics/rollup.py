@@ -0,0 +1,170 @@
+"""
+Incremental rollups of raw ``playground.View`` rows.
+
+Each rollup keeps a cursor (``RollupCursor``) marking the end of the last
+bucket it finished. A run processes whole buckets from the cursor up to the
+last bucket that ended at least ANALYTICS_SETTLE_SECONDS ago, so views still
+sitting in uncommitted task batches aren't missed. Every bucket is rebuilt
+from scratch and the cursor advanced in the same transaction, which makes
+runs idempotent and safe to interrupt.
+
+Raw rows are pruned once they are older than ANALYTICS_RAW_RETENTION_DAYS
+and both rollups have moved past them; hourly rows are kept for
+ANALYTICS_HOURLY_RETENTION_DAYS while daily rows are kept forever.
+"""
+
+from collections import Counter
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, DateField, DateTimeField, Value
+from django.utils import timezone
+
+from playground.models import View
+from .models import DailySnippetViews, DailyUserAgentViews, HourlySnippetViews, RollupCursor
+from .useragents import family
+
+SETTLE = timedelta(seconds=getattr(settings, 'ANALYTICS_SETTLE_SECONDS', 300))
+RAW_RETENTION = timedelta(days=getattr(settings, 'ANALYTICS_RAW_RETENTION_DAYS', 30))
+HOURLY_RETENTION = timedelta(days=getattr(settings, 'ANALYTICS_HOURLY_RETENTION_DAYS', 30))
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+
+def floor_hour(dt):
+    return dt.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(dt):
+    return datetime.combine(dt.astimezone(dt_timezone.utc).date(), time(), tzinfo=dt_timezone.utc)
+
+
+def first_view_at(since=None):
+    views = View.objects.order_by('created_at')
+    if since is not None:
+        views = views.filter(created_at__gte=since)
+    return views.values_list('created_at', flat=True).first()
+
+
+def get_position(name):
+    """Where rollup ``name`` resumes, or None when it has never run"""
+    return RollupCursor.objects.filter(name=name).values_list('position', flat=True).first()
+
+
+def _rollup(name, floor, step, build, now=None, max_buckets=None):
+    """Roll up whole buckets from the cursor; returns the number processed"""
+    end = floor((now or timezone.now()) - SETTLE)
+    processed = 0
+    while max_buckets is None or processed < max_buckets:
+        position = get_position(name)
+        # Skip straight to the next bucket that has any views in it
+        first = first_view_at(position)
+        if first is None or first >= end:
+            if position is not None and position < end:
+                RollupCursor.objects.filter(name=name).update(position=end)
+            return processed
+        start = floor(first)
+        
+        # On the shard being rolled up (see playground.sharding)
+        with transaction.atomic(using=RollupCursor.objects.db):
+            cursor, _ = RollupCursor.objects.select_for_update().get_or_create(
+                name=name, defaults={'position': start}
+            )
+            if cursor.position > start:
+                # Another run got here first
+                continue
+            build(start, start + step)
+            cursor.position = start + step
+            cursor.save(update_fields=['position', 'updated_at'])
+        processed += 1
+    return processed
+
+
+def _views_between(start, stop):
+    return View.objects.filter(created_at__gte=start, created_at__lt=stop).order_by()
+
+
+def _insert_from(model, fields, queryset):
+    """INSERT INTO model (fields) SELECT ...; rows never round-trip through Python"""
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    connection = connections[queryset.db]
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(model._meta.get_field(name).column) for name in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {qn(model._meta.db_table)} ({columns}) {sql}', params)
+
+
+def _counts(views, bucket, field):
+    """Per-snippet views/unique viewers with the bucket as a constant column"""
+    return views.values('snippet_id').annotate(
+        bucket=Value(bucket, output_field=field),
+        views=Count('id'),
+        unique_viewers=Count('user_id', distinct=True),
+    )
+
+
+def build_hour(start, stop):
+    HourlySnippetViews.objects.filter(hour=start).delete()
+    _insert_from(
+        HourlySnippetViews, ['snippet', 'hour', 'views', 'unique_viewers'],
+        _counts(_views_between(start, stop), start, DateTimeField()),
+    )
+
+
+def build_day(start, stop):
+    day = start.date()
+    views = _views_between(start, stop)
+    DailySnippetViews.objects.filter(day=day).delete()
+    _insert_from(
+        DailySnippetViews, ['snippet', 'day', 'views', 'unique_viewers'],
+        _counts(views, day, DateField()),
+    )
+    
+    # Group on the raw header in SQL; there are far fewer distinct user
+    # agents than views, so classifying them in Python stays cheap.
+    families = Counter()
+    for row in views.values('snippet_id', 'user_agent').annotate(views=Count('id')):
+        families[row['snippet_id'], family(row['user_agent'])] += row['views']
+    DailyUserAgentViews.objects.filter(day=day).delete()
+    DailyUserAgentViews.objects.bulk_create([
+        DailyUserAgentViews(snippet_id=snippet_id, day=day, family=name, views=count)
+        for (snippet_id, name), count in families.items()
+    ])
+
+
+def rollup_hours(now=None, max_buckets=None):
+    return _rollup('hourly', floor_hour, HOUR, build_hour, now, max_buckets)
+
+
+def rollup_days(now=None, max_buckets=None):
+    return _rollup('daily', floor_day, DAY, build_day, now, max_buckets)
+
+
+def prune(now=None, batch_size=10000):
+    """
+    Delete raw views past retention that both rollups have covered, plus
+    expired hourly rows. Deletes in batches to keep transactions short.
+    Returns the number of raw views deleted.
+    """
+    now = now or timezone.now()
+    positions = [get_position('hourly'), get_position('daily')]
+    if None in positions:
+        return 0
+    cutoff = min(now - RAW_RETENTION, *positions)
+    
+    deleted = 0
+    while True:
+        ids = list(
+            View.objects.filter(created_at__lt=cutoff)
+            .order_by('created_at')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        View.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+    
+    HourlySnippetViews.objects.filter(hour__lt=floor_hour(now - HOURLY_RETENTION)).delete()
+    return deleted
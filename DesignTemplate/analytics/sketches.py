@@ -0,0 +1,76 @@
+"""Per-snippet unique viewer counts backed by HyperLogLog sketches"""
+
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+
+from playground.models import Snippet
+from .hll import HyperLogLog, merge
+from .models import UniqueViewerSketch
+
+
+def viewer_key(payload):
+    """Identify a viewer by account when signed in, otherwise by IP address"""
+    if payload.get('user_id'):
+        return f"user:{payload['user_id']}"
+    return f"ip:{payload.get('ip_address', '')}"
+
+
+def record_viewers(payloads):
+    """
+    Fold a batch of record_view payloads into the daily and all-time
+    sketches, writing each touched sketch once.
+    """
+    today = timezone.now().date()
+    viewers = defaultdict(set)
+    for p in payloads:
+        if p.get('viewed_at'):
+            day = parse_datetime(p['viewed_at']).date()
+        else:
+            # Payloads queued before views carried their time
+            day = date.fromisoformat(p['date']) if p.get('date') else today
+        key = viewer_key(p)
+        viewers[p['snippet_id'], day].add(key)
+        viewers[p['snippet_id'], None].add(key)
+    
+    # Snippets deleted while their views sat in the queue are skipped
+    snippet_ids = {
+        str(pk) for pk in Snippet.objects.filter(pk__in={s for s, _ in viewers}).values_list('pk', flat=True)
+    }
+    wanted = {k: v for k, v in viewers.items() if k[0] in snippet_ids}
+    if not wanted:
+        return
+    UniqueViewerSketch.objects.bulk_create(
+        [UniqueViewerSketch(snippet_id=snippet_id, day=day) for snippet_id, day in wanted],
+        ignore_conflicts=True,
+    )
+    
+    days = {day for _, day in wanted if day is not None}
+    rows = UniqueViewerSketch.objects.select_for_update().filter(
+        Q(day__in=days) | Q(day__isnull=True), snippet_id__in=snippet_ids
+    )
+    now = timezone.now()
+    changed = []
+    for row in rows:
+        keys = wanted.get((str(row.snippet_id), row.day))
+        if not keys:
+            continue
+        sketch = HyperLogLog.from_bytes(row.registers)
+        if any([sketch.add(key) for key in keys]):
+            row.registers = sketch.to_bytes()
+            row.estimate = sketch.estimate()
+            row.updated_at = now
+            changed.append(row)
+    UniqueViewerSketch.objects.bulk_update(changed, ['registers', 'estimate', 'updated_at'])
+
+
+def unique_viewers(snippet, days=None):
+    """Estimated distinct viewers of a snippet, all time or over the last ``days`` days"""
+    if days is None:
+        return snippet.viewer_sketches.filter(day__isnull=True).values_list('estimate', flat=True).first() or 0
+    since = timezone.now().date() - timedelta(days=days - 1)
+    rows = snippet.viewer_sketches.filter(day__gte=since).values_list('registers', flat=True)
+    return merge(HyperLogLog.from_bytes(data) for data in rows.iterator()).estimate()
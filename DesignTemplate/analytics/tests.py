@@ -0,0 +1,199 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from accounts.models import User
+from playground.models import Snippet, View
+from playground.tasks import record_view
+from . import rollup
+from .hll import STANDARD_ERROR, HyperLogLog, merge
+from .models import DailySnippetViews, DailyUserAgentViews, HourlySnippetViews, RollupCursor, UniqueViewerSketch
+from .sketches import unique_viewers
+
+
+def sketch_of(items):
+    sketch = HyperLogLog()
+    for item in items:
+        sketch.add(item)
+    return sketch
+
+
+class HyperLogLogTests(SimpleTestCase):
+
+    def test_empty_sketch(self):
+        self.assertEqual(HyperLogLog().estimate(), 0)
+
+    def test_estimates_within_three_standard_errors(self):
+        for n in (1, 10, 100, 1000, 10000, 100000):
+            estimate = sketch_of(f'viewer-{i}' for i in range(n)).estimate()
+            self.assertLessEqual(abs(estimate - n), max(1, 3 * STANDARD_ERROR * n), f'n={n} estimate={estimate}')
+
+    def test_error_rate_matches_documented_standard_error(self):
+        # RMS relative error over many independent sketches of 20k items,
+        # past the linear counting range, should be close to 1.04/sqrt(m)
+        n, trials = 20000, 40
+        errors = [
+            (sketch_of(f'{trial}:{i}' for i in range(n)).estimate() - n) / n
+            for trial in range(trials)
+        ]
+        rms = (sum(e * e for e in errors) / trials) ** 0.5
+        self.assertLess(rms, 1.5 * STANDARD_ERROR)
+
+    def test_duplicates_are_not_counted(self):
+        sketch = sketch_of(f'viewer-{i % 50}' for i in range(5000))
+        self.assertEqual(sketch.estimate(), 50)
+        self.assertFalse(sketch.add('viewer-1'))
+
+    def test_merge_is_the_sketch_of_the_union(self):
+        a = sketch_of(f'viewer-{i}' for i in range(0, 30000))
+        b = sketch_of(f'viewer-{i}' for i in range(20000, 50000))
+        merged = merge([a, b])
+        self.assertEqual(merged.registers, sketch_of(f'viewer-{i}' for i in range(50000)).registers)
+        self.assertLessEqual(abs(merged.estimate() - 50000), 3 * STANDARD_ERROR * 50000)
+
+    def test_bytes_round_trip(self):
+        sketch = sketch_of(f'viewer-{i}' for i in range(1000))
+        data = sketch.to_bytes()
+        self.assertLess(len(data), 4096)
+        self.assertEqual(HyperLogLog.from_bytes(data).registers, sketch.registers)
+
+
+class UniqueViewerSketchTests(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.snippet = Snippet.objects.create(user=self.owner, title='Sketchy')
+
+    def view(self, ip, day):
+        return {
+            'snippet_id': str(self.snippet.pk),
+            'user_id': None,
+            'ip_address': ip,
+            'user_agent': '',
+            'date': day.isoformat(),
+        }
+
+    def test_record_view_updates_daily_and_all_time_sketches(self):
+        today = timezone.now().date()
+        yesterday = today - timedelta(days=1)
+        record_view([self.view(f'10.0.0.{i % 200}', today) for i in range(600)])
+        record_view([self.view(f'10.0.1.{i % 150}', yesterday) for i in range(300)])
+        record_view([self.view(f'10.0.0.{i}', yesterday) for i in range(50)])
+        
+        sketches = {s.day: s.estimate for s in UniqueViewerSketch.objects.filter(snippet=self.snippet)}
+        for day, exact in ((today, 200), (yesterday, 200), (None, 350)):
+            self.assertLessEqual(abs(sketches[day] - exact), 3 * STANDARD_ERROR * exact, day)
+        self.assertEqual(unique_viewers(self.snippet), sketches[None])
+        self.assertEqual(unique_viewers(self.snippet, days=1), sketches[today])
+        self.assertLessEqual(abs(unique_viewers(self.snippet, days=7) - 350), 3 * STANDARD_ERROR * 350)
+
+    def test_days_are_merged_not_added(self):
+        today = timezone.now().date()
+        for days_ago in range(3):
+            record_view([self.view('10.0.0.1', today - timedelta(days=days_ago))])
+        self.assertEqual(UniqueViewerSketch.objects.filter(day__isnull=False).count(), 3)
+        self.assertEqual(unique_viewers(self.snippet, days=7), 1)
+        self.assertEqual(unique_viewers(self.snippet, days=2), 1)
+
+    def test_views_of_deleted_snippets_are_skipped(self):
+        payload = self.view('10.0.0.1', timezone.now().date())
+        self.snippet.delete()
+        record_view([payload])
+        self.assertFalse(UniqueViewerSketch.objects.exists())
+
+
+FIREFOX = 'Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0'
+CRAWLER = 'Googlebot/2.1 (+http://www.google.com/bot.html)'
+
+
+class RollupTests(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', 'owner@example.com')
+        self.fan = User.objects.create_user('fan', 'fan@example.com')
+        self.snippet = Snippet.objects.create(user=self.owner, title='Counted')
+        self.other = Snippet.objects.create(user=self.owner, title='Also counted')
+        # The last second of one day and the first of the next
+        self.midnight = datetime(2026, 3, 2, tzinfo=dt_timezone.utc)
+        for at, snippet, user, agent in (
+            (self.midnight - timedelta(hours=1, seconds=1), self.snippet, self.fan, FIREFOX),
+            (self.midnight - timedelta(seconds=1), self.snippet, self.fan, FIREFOX),
+            (self.midnight - timedelta(seconds=1), self.snippet, None, CRAWLER),
+            (self.midnight - timedelta(seconds=1), self.other, self.owner, FIREFOX),
+            (self.midnight, self.snippet, self.owner, FIREFOX),
+            (self.midnight + timedelta(minutes=59), self.snippet, self.fan, CRAWLER),
+        ):
+            View.objects.create(snippet=snippet, user=user, ip_address='10.0.0.1', user_agent=agent, created_at=at)
+        self.now = self.midnight + timedelta(days=1, hours=2)
+
+    def hourly(self):
+        return sorted(HourlySnippetViews.objects.values_list('snippet__title', 'hour', 'views', 'unique_viewers'))
+
+    def daily(self):
+        return sorted(DailySnippetViews.objects.values_list('snippet__title', 'day', 'views', 'unique_viewers'))
+
+    def test_views_land_in_their_hour_and_day(self):
+        self.assertEqual(rollup.rollup_hours(self.now), 3)
+        self.assertEqual(rollup.rollup_days(self.now), 2)
+        before, after = self.midnight - timedelta(hours=1), self.midnight
+        self.assertEqual(self.hourly(), [
+            ('Also counted', before, 1, 1),
+            ('Counted', before - timedelta(hours=1), 1, 1),
+            ('Counted', before, 2, 1),
+            ('Counted', after, 2, 2),
+        ])
+        last_day, first_day = date_of(before), date_of(after)
+        self.assertEqual(self.daily(), [
+            ('Also counted', last_day, 1, 1),
+            ('Counted', last_day, 3, 1),
+            ('Counted', first_day, 2, 2),
+        ])
+        self.assertEqual(
+            sorted(DailyUserAgentViews.objects.filter(snippet=self.snippet).values_list('day', 'family', 'views')),
+            [(last_day, 'Bot', 1), (last_day, 'Firefox', 2), (first_day, 'Bot', 1), (first_day, 'Firefox', 1)],
+        )
+
+    def test_reruns_change_nothing(self):
+        rollup.rollup_hours(self.now)
+        rollup.rollup_days(self.now)
+        hourly, daily = self.hourly(), self.daily()
+        self.assertEqual((rollup.rollup_hours(self.now), rollup.rollup_days(self.now)), (0, 0))
+
+        # Even rebuilding from scratch, every bucket is replaced rather than added to
+        RollupCursor.objects.all().delete()
+        rollup.rollup_hours(self.now)
+        rollup.rollup_days(self.now)
+        self.assertEqual((self.hourly(), self.daily()), (hourly, daily))
+        self.assertEqual(RollupCursor.objects.get(name='daily').position, self.midnight + timedelta(days=1))
+
+    def test_buckets_wait_to_settle(self):
+        # The first day's last hour has ended, but not long enough ago
+        now = self.midnight + rollup.SETTLE / 2
+        self.assertEqual(rollup.rollup_hours(now), 1)
+        self.assertEqual(rollup.rollup_days(now), 0)
+        self.assertFalse(HourlySnippetViews.objects.filter(hour=self.midnight - timedelta(hours=1)).exists())
+        self.assertEqual(rollup.rollup_hours(self.midnight + rollup.SETTLE), 1)
+
+        # max_buckets stops early and the next run carries on
+        self.assertEqual(rollup.rollup_days(self.now, max_buckets=1), 1)
+        self.assertEqual(rollup.rollup_days(self.now), 1)
+
+    def test_prune_keeps_what_the_rollups_have_not_covered(self):
+        later = self.now + rollup.RAW_RETENTION
+        self.assertEqual(rollup.prune(later), 0)
+        rollup.rollup_hours(self.now)
+        rollup.rollup_days(self.now - timedelta(days=1))
+        # Only the first day is in the daily rollup so far
+        self.assertEqual(rollup.prune(later), 4)
+        self.assertEqual(View.objects.count(), 2)
+
+        rollup.rollup_days(self.now)
+        self.assertEqual(rollup.prune(later), 2)
+        self.assertEqual(rollup.prune(self.now + rollup.HOURLY_RETENTION + timedelta(days=1)), 0)
+        self.assertFalse(HourlySnippetViews.objects.exists())
+        self.assertEqual(len(self.daily()), 3)
+
+
+def date_of(dt):
+    return dt.astimezone(dt_timezone.utc).date()
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'analytics'
+
+urlpatterns = [
+    path('api/analytics/<slug:slug>/', views.snippet_analytics, name='snippet'),
+]
@@ -0,0 +1,25 @@
+"""Coarse user agent classification for view analytics"""
+
+import re
+from functools import lru_cache
+
+# Checked in order: several browsers also claim to be Chrome and/or Safari
+FAMILIES = [
+    ('Bot', re.compile(r'bot|crawl|spider|slurp|headless|curl|wget|python-requests|httpclient', re.I)),
+    ('Edge', re.compile(r'Edg(e|A|iOS)?/')),
+    ('Opera', re.compile(r'OPR/|Opera')),
+    ('Samsung', re.compile(r'SamsungBrowser/')),
+    ('Firefox', re.compile(r'Firefox/|FxiOS/')),
+    ('Chrome', re.compile(r'Chrome/|CriOS/|Chromium/')),
+    ('Safari', re.compile(r'Safari/')),
+]
+OTHER = 'Other'
+
+
+@lru_cache(maxsize=4096)
+def family(user_agent):
+    """Browser family for a User-Agent header, e.g. 'Firefox', 'Bot' or 'Other'"""
+    for name, pattern in FAMILIES:
+        if pattern.search(user_agent or ''):
+            return name
+    return OTHER
@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.db.models import Sum
+from django.utils import timezone
+
+from playground import sharding
+from playground.models import Snippet
+from . import rollup, sketches
+
+
+@login_required
+def snippet_analytics(request, slug):
+    """View statistics for one of the user's snippets, served from the rollups"""
+    snippet = get_object_or_404(Snippet, slug=slug, user=request.user)
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 365)
+    except ValueError:
+        days = 30
+    
+    today = timezone.now().date()
+    since = today - timedelta(days=days)
+    daily = snippet.daily_views.filter(day__gte=since).order_by('day')
+    hourly = snippet.hourly_views.filter(hour__gte=timezone.now() - timedelta(hours=48)).order_by('hour')
+    user_agents = (
+        snippet.user_agent_views.filter(day__gte=since)
+        .values('family')
+        .annotate(views=Sum('views'))
+        .order_by('-views')
+    )
+    with sharding.use(snippet._state.db):
+        # Each shard has its own rollup cursors
+        position = rollup.get_position('hourly')
+    
+    return JsonResponse({
+        'success': True,
+        'snippet': snippet.slug,
+        'views_count': snippet.views_count,
+        # HyperLogLog estimates (see analytics.hll for the error bounds)
+        'unique_viewers': sketches.unique_viewers(snippet, days=days),
+        'unique_viewers_all_time': sketches.unique_viewers(snippet),
+        'rolled_up_to': position.isoformat() if position else None,
+        'daily': [
+            {'day': row.day.isoformat(), 'views': row.views, 'unique_viewers': row.unique_viewers}
+            for row in daily
+        ],
+        'hourly': [
+            {'hour': row.hour.isoformat(), 'views': row.views, 'unique_viewers': row.unique_viewers}
+            for row in hourly
+        ],
+        'user_agents': [{'family': row['family'], 'views': row['views']} for row in user_agents],
+    })
@@ -0,0 +1,54 @@
+"""
+Invite links to a snippet's live session.
+
+An invite is the snippet's id and ``invite_key`` signed together, valid for
+COLLAB_INVITE_MAX_AGE. ``revoke`` gives the snippet a new key, which voids
+every invite made so far; guests already connected stay until they leave.
+"""
+
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+
+from playground.models import Snippet
+
+INVITE_SALT = 'collab.invite'
+INVITE_MAX_AGE = getattr(settings, 'COLLAB_INVITE_MAX_AGE', 7 * 24 * 3600)
+
+
+def make_token(snippet):
+    """Signed token letting other signed-in users join the snippet's live session"""
+    return signing.dumps([str(snippet.pk), snippet.invite_key], salt=INVITE_SALT)
+
+
+def expires_at(token):
+    """When ``token`` stops being accepted; raises BadSignature if it isn't one"""
+    signing.loads(token, salt=INVITE_SALT)
+    # The token is payload:timestamp:signature
+    signed_at = signing.b62_decode(token.rsplit(':', 2)[1])
+    return datetime.fromtimestamp(signed_at + INVITE_MAX_AGE, tz=dt_timezone.utc)
+
+
+def revoke(snippet):
+    """Void every invite to ``snippet``"""
+    snippet.invite_key = uuid.uuid4().hex
+    Snippet.objects.filter(pk=snippet.pk).update(invite_key=snippet.invite_key)
+
+
+def can_join(user, snippet, token=None):
+    if not user.is_authenticated:
+        return False
+    if snippet.user_id == user.pk:
+        return True
+    if not token:
+        return False
+    try:
+        invite = signing.loads(token, salt=INVITE_SALT, max_age=INVITE_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    # Tokens made before invites carried a key hold just the id, until the first revoke
+    if invite == str(snippet.pk):
+        return not snippet.invite_key
+    return invite == [str(snippet.pk), snippet.invite_key]
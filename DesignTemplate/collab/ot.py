@@ -0,0 +1,177 @@
+"""
+Operational transformation for plain text.
+
+An operation is a list of components applied left to right: a positive int
+retains that many code units, a negative int deletes that many, and a
+string inserts itself; anything past the last component is retained.
+Offsets and lengths are UTF-16 code units, matching JavaScript string
+indices (see playground.deltas), so the browser and server agree on every
+position. Documents are held as UTF-16-LE bytes for the same reason.
+
+``static/collab/js/ot.js`` implements the same rules in the editor.
+"""
+
+
+import os
+
+
+class OTError(ValueError):
+    """Raised for malformed operations or ones that don't fit the document"""
+
+
+def encode(text):
+    return text.encode('utf-16-le', 'surrogatepass')
+
+
+def decode(data):
+    return data.decode('utf-16-le', 'surrogatepass')
+
+
+def _append(op, component):
+    """Append a component, merging it into the previous one where possible"""
+    if component == 0 or component == '':
+        return
+    if op:
+        last = op[-1]
+        if isinstance(last, str) and isinstance(component, str):
+            op[-1] = last + component
+            return
+        if isinstance(last, int) and isinstance(component, int) and (last > 0) == (component > 0):
+            op[-1] = last + component
+            return
+    op.append(component)
+
+
+def normalize(op):
+    """Validate and canonicalize an operation received from a client"""
+    if not isinstance(op, list):
+        raise OTError('Operation must be a list')
+    result = []
+    for component in op:
+        if isinstance(component, bool) or not isinstance(component, (int, str)):
+            raise OTError(f'Invalid component {component!r}')
+        _append(result, component)
+    if result and isinstance(result[-1], int) and result[-1] > 0:
+        result.pop()
+    return result
+
+
+def base_length(op):
+    return sum(abs(c) for c in op if isinstance(c, int))
+
+
+def apply(document, op):
+    """Apply ``op`` to ``document`` (UTF-16-LE bytes) and return the new bytes"""
+    out = []
+    pos = 0
+    size = len(document) // 2
+    for component in op:
+        if isinstance(component, str):
+            out.append(encode(component))
+            continue
+        end = pos + abs(component)
+        if end > size:
+            raise OTError('Operation runs past the end of the document')
+        if component > 0:
+            out.append(document[pos * 2:end * 2])
+        pos = end
+    out.append(document[pos * 2:])
+    return b''.join(out)
+
+
+def _is_high_surrogate(document, unit):
+    return 0xD8 <= document[unit * 2 + 1] <= 0xDB
+
+
+def diff(old, new):
+    """One splice turning document ``old`` into ``new`` (UTF-16-LE bytes), never splitting a surrogate pair"""
+    old_size, new_size = len(old) // 2, len(new) // 2
+    start = len(os.path.commonprefix([old, new])) // 2
+    if 0 < start < old_size and _is_high_surrogate(old, start - 1):
+        start -= 1
+    suffix = min(len(os.path.commonprefix([old[::-1], new[::-1]])) // 2, min(old_size, new_size) - start)
+    if suffix and _is_high_surrogate(old, old_size - suffix - 1):
+        suffix -= 1
+    return normalize([start, -(old_size - suffix - start), decode(new[start * 2:(new_size - suffix) * 2])])
+
+
+def _components(op):
+    """Yield (kind, size, payload) with inserts as UTF-16-LE bytes"""
+    for component in op:
+        if isinstance(component, str):
+            data = encode(component)
+            yield 'insert', len(data) // 2, data
+        elif component > 0:
+            yield 'retain', component, None
+        else:
+            yield 'delete', -component, None
+
+
+def transform(a, b):
+    """
+    Transform concurrent operations ``a`` and ``b`` (made against the same
+    document) into ``(a', b')`` so that applying a then b' equals applying
+    b then a'. At the same position ``a``'s insert goes first.
+    """
+    xs, ys = list(_components(a)), list(_components(b))
+    # Pad to equal base lengths with the implied trailing retains
+    span_a, span_b = base_length(a), base_length(b)
+    if span_a < span_b:
+        xs.append(('retain', span_b - span_a, None))
+    elif span_b < span_a:
+        ys.append(('retain', span_a - span_b, None))
+
+    a_prime, b_prime = [], []
+    i = j = 0
+    x = xs[0] if xs else None
+    y = ys[0] if ys else None
+    while x is not None or y is not None:
+        if x is not None and x[0] == 'insert':
+            _append(a_prime, decode(x[2]))
+            _append(b_prime, x[1])
+            i += 1
+            x = xs[i] if i < len(xs) else None
+            continue
+        if y is not None and y[0] == 'insert':
+            _append(a_prime, y[1])
+            _append(b_prime, decode(y[2]))
+            j += 1
+            y = ys[j] if j < len(ys) else None
+            continue
+        if x is None or y is None:
+            raise OTError('Operations do not line up')
+        size = min(x[1], y[1])
+        if x[0] == 'retain' and y[0] == 'retain':
+            _append(a_prime, size)
+            _append(b_prime, size)
+        elif x[0] == 'delete' and y[0] == 'retain':
+            _append(a_prime, -size)
+        elif x[0] == 'retain' and y[0] == 'delete':
+            _append(b_prime, -size)
+        # Both deleted the same span: neither side has anything left to do
+        x = (x[0], x[1] - size, None) if x[1] > size else None
+        y = (y[0], y[1] - size, None) if y[1] > size else None
+        if x is None:
+            i += 1
+            x = xs[i] if i < len(xs) else None
+        if y is None:
+            j += 1
+            y = ys[j] if j < len(ys) else None
+    return normalize(a_prime), normalize(b_prime)
+
+
+def transform_cursor(position, op):
+    """Where a cursor at ``position`` ends up after ``op`` (inserts at the cursor push it along)"""
+    pos = 0
+    result = position
+    for component in op:
+        if pos > position:
+            break
+        if isinstance(component, str):
+            result += len(encode(component)) // 2
+        elif component > 0:
+            pos += component
+        else:
+            result -= min(-component, max(position - pos, 0))
+            pos -= component
+    return result
@@ -0,0 +1,309 @@
+"""
+In-memory collaborative editing sessions.
+
+Everyone editing a snippet together shares one ``Session`` holding the
+three code panes as UTF-16 documents, a revision counter and a bounded
+history of recent operations. A client sends its pending ops together with
+the revision they were made against; the session transforms them past
+everything that has happened since (see collab.ot), applies them, and
+queues them for the other participants along with an ack for the sender.
+Outgoing events are collected per participant and flushed at most once
+every COLLAB_BATCH_SECONDS: an edit after a quiet spell goes out at once,
+while a burst of keystrokes costs one frame per client per window.
+
+Sessions are compacted into ``Snippet`` every COLLAB_COMPACT_SECONDS while
+there are unsaved changes, on request, and when the last participant
+leaves; each compaction bumps the snippet's version and records a revision
+like a save does. The write is conditional on the version the session last
+saved or started from. If the snippet was saved some other way meanwhile
+(another tab's autosave, say), the session diffs that save against what it
+last saved, transforms it past the session's own edits and applies it like
+a participant's op, so both sets of changes survive.
+
+State lives in the worker process, so every connection for a snippet must
+reach the same ASGI worker (a single worker, or routing by snippet slug).
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from playground import embeds, previews, revisions, sharding
+from playground.deltas import CODE_FIELDS
+from playground.models import Snippet
+from . import ot
+
+BATCH_SECONDS = getattr(settings, 'COLLAB_BATCH_SECONDS', 0.05)
+COMPACT_SECONDS = getattr(settings, 'COLLAB_COMPACT_SECONDS', 10)
+HISTORY = getattr(settings, 'COLLAB_HISTORY', 1000)
+MAX_BACKLOG = getattr(settings, 'COLLAB_MAX_BACKLOG', 100)
+COLORS = 8
+
+logger = logging.getLogger(__name__)
+
+_sessions = {}
+_participant_ids = itertools.count(1)
+
+
+class Participant:
+    """One connection to a session"""
+
+    __slots__ = ('id', 'name', 'color', 'field', 'offset', 'outbox', 'queue')
+
+    def __init__(self, name, color):
+        self.id = next(_participant_ids)
+        self.name = name
+        self.color = color
+        self.field = CODE_FIELDS[0]
+        self.offset = 0
+        # Events gathered during the current batch window
+        self.outbox = []
+        # Encoded batches waiting for the socket; None closes the connection
+        self.queue = asyncio.Queue(maxsize=MAX_BACKLOG)
+
+    def describe(self):
+        return {'id': self.id, 'name': self.name, 'color': self.color, 'field': self.field, 'offset': self.offset}
+
+
+class SnippetChanged(Exception):
+    """Raised by save_documents when the snippet was saved outside the session"""
+
+    def __init__(self, snippet):
+        super().__init__(f'Snippet {snippet.pk} is at version {snippet.version}')
+        self.snippet = snippet
+
+
+class Session:
+    def __init__(self, snippet):
+        self.snippet_id = snippet.pk
+        self.documents = {field: ot.encode(getattr(snippet, field) or '') for field in CODE_FIELDS}
+        # The stored code as of ``version``, which compaction expects to find
+        self.saved = dict(self.documents)
+        self.version = snippet.version
+        self.revision = 0
+        # (field, op) for the last len(history) revisions
+        self.history = deque(maxlen=HISTORY)
+        self.participants = {}
+        self.dirty = set()
+        self._flush_handle = None
+        self._flushed_at = float('-inf')
+        self._compactor = None
+
+    def join(self, user):
+        participant = Participant(user.username, len(self.participants) % COLORS)
+        self._broadcast({'type': 'join', 'participant': participant.describe()})
+        self.participants[participant.id] = participant
+        if self._compactor is None:
+            self._compactor = asyncio.create_task(self._compact_periodically())
+        init = {
+            'type': 'init',
+            'participant': participant.id,
+            'revision': self.revision,
+            'version': self.version,
+            'documents': {field: ot.decode(document) for field, document in self.documents.items()},
+            'participants': [other.describe() for other in self.participants.values()],
+        }
+        return participant, init
+
+    async def leave(self, participant):
+        self.participants.pop(participant.id, None)
+        self._broadcast({'type': 'leave', 'participant': participant.id})
+        if self.participants:
+            return
+        if self._compactor is not None:
+            self._compactor.cancel()
+            self._compactor = None
+        await self.compact()
+        # Someone may have joined while the last changes were being saved
+        if not self.participants and _sessions.get(self.snippet_id) is self:
+            del _sessions[self.snippet_id]
+
+    def receive(self, participant, base, ops):
+        """
+        Apply a batch of ``[field, op]`` pairs made against revision ``base``.
+
+        The batch is applied as a whole or, if any op is malformed or doesn't
+        fit, not at all.
+        """
+        oldest = self.revision - len(self.history)
+        if type(base) is not int or not oldest <= base <= self.revision:
+            raise ot.OTError('Revision is out of range')
+        if not isinstance(ops, list):
+            raise ot.OTError('Ops must be a list')
+        # Ops since ``base`` per field, transformed past each op of the batch in turn
+        concurrent = {field: [] for field in self.documents}
+        for field, op in itertools.islice(self.history, base - oldest, None):
+            concurrent[field].append(op)
+        documents = dict(self.documents)
+        applied = []
+        for item in ops:
+            if not isinstance(item, list) or len(item) != 2 or item[0] not in self.documents:
+                raise ot.OTError('Malformed op')
+            field, op = item[0], ot.normalize(item[1])
+            pending = concurrent[field]
+            for i, other in enumerate(pending):
+                op, pending[i] = ot.transform(op, other)
+            documents[field] = ot.apply(documents[field], op)
+            applied.append((field, op))
+        for field, op in applied:
+            self._apply(field, documents[field], op, participant)
+        self._send(participant, {'type': 'ack', 'revision': self.revision})
+
+    def _apply(self, field, document, op, participant=None):
+        """Make ``document`` (the result of ``op``) current and pass ``op`` on to everyone else"""
+        self.documents[field] = document
+        self.history.append((field, op))
+        self.revision += 1
+        self.dirty.add(field)
+        for other in self.participants.values():
+            if other.field == field:
+                other.offset = ot.transform_cursor(other.offset, op)
+        self._broadcast({
+            'type': 'op',
+            'revision': self.revision,
+            'field': field,
+            'op': op,
+            'participant': participant.id if participant else None,
+        }, exclude=participant)
+
+    def merge(self, snippet):
+        """Take in code saved outside the session since ``version``, on top of the session's own edits"""
+        for field in CODE_FIELDS:
+            stored = ot.encode(getattr(snippet, field) or '')
+            if stored == self.saved[field]:
+                continue
+            theirs = ot.diff(self.saved[field], stored)
+            ours = ot.diff(self.saved[field], self.documents[field])
+            op, _ = ot.transform(theirs, ours)
+            self._apply(field, ot.apply(self.documents[field], op), op)
+            self.saved[field] = stored
+        self.version = snippet.version
+
+    def move_cursor(self, participant, field, offset):
+        if field not in self.documents or not isinstance(offset, int):
+            raise ot.OTError('Malformed cursor')
+        participant.field = field
+        participant.offset = max(0, min(offset, len(self.documents[field]) // 2))
+        self._broadcast(
+            {'type': 'cursor', 'participant': participant.id, 'field': field, 'offset': participant.offset},
+            exclude=participant,
+        )
+
+    async def compact(self, retry=True):
+        """Write unsaved panes to the snippet"""
+        if not self.dirty:
+            return
+        fields = sorted(self.dirty)
+        self.dirty.clear()
+        # A lone surrogate (half an emoji) can't be stored; save it as U+FFFD
+        documents = {field: self.documents[field].decode('utf-16-le', 'replace') for field in fields}
+        try:
+            self.version = await sync_to_async(save_documents)(self.snippet_id, documents, self.version)
+        except Snippet.DoesNotExist:
+            self.close('This snippet was deleted')
+            return
+        except SnippetChanged as e:
+            self.dirty.update(fields)
+            self.merge(e.snippet)
+            if retry:
+                await self.compact(retry=False)
+            return
+        except Exception:
+            self.dirty.update(fields)
+            raise
+        self.saved.update({field: ot.encode(value) for field, value in documents.items()})
+        self._broadcast({'type': 'saved', 'version': self.version})
+
+    def close(self, reason):
+        """Disconnect everyone, e.g. once the snippet is gone"""
+        self._broadcast({'type': 'error', 'error': reason})
+        self._flush()
+        for participant in self.participants.values():
+            try:
+                # After the error, unless there's no room left for it to be read
+                participant.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                self._disconnect(participant)
+        if self._compactor is not None:
+            self._compactor.cancel()
+            self._compactor = None
+        self.dirty.clear()
+        if _sessions.get(self.snippet_id) is self:
+            del _sessions[self.snippet_id]
+
+    async def _compact_periodically(self):
+        while True:
+            await asyncio.sleep(COMPACT_SECONDS)
+            try:
+                await self.compact()
+            except Exception:
+                # Changes stay dirty and are retried next time
+                logger.exception('Compacting collab session for snippet %s failed', self.snippet_id)
+
+    def _broadcast(self, event, exclude=None):
+        for participant in self.participants.values():
+            if participant is not exclude:
+                self._send(participant, event)
+
+    def _send(self, participant, event):
+        participant.outbox.append(event)
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            delay = max(0, self._flushed_at + BATCH_SECONDS - loop.time())
+            self._flush_handle = loop.call_later(delay, self._flush)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._flushed_at = asyncio.get_running_loop().time()
+        for participant in self.participants.values():
+            if not participant.outbox:
+                continue
+            message = json.dumps({'type': 'batch', 'events': participant.outbox}, separators=(',', ':'))
+            participant.outbox = []
+            try:
+                participant.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Too far behind to catch up; it reconnects and starts from a fresh copy
+                self._disconnect(participant)
+
+    def _disconnect(self, participant):
+        while not participant.queue.empty():
+            participant.queue.get_nowait()
+        participant.queue.put_nowait(None)
+
+
+def save_documents(snippet_id, documents, version):
+    """
+    Compact session documents into the snippet if it's still at ``version``;
+    returns its new version, or raises SnippetChanged with the snippet as
+    it is now.
+    """
+    alias = sharding.locate(snippet_id=snippet_id)
+    with sharding.atomic(alias):
+        snippets = Snippet.objects.using(alias).filter(pk=snippet_id)
+        updated = snippets.filter(version=version).update(
+            **documents, version=version + 1, updated_at=timezone.now()
+        )
+        snippet = snippets.get()
+        if not updated:
+            raise SnippetChanged(snippet)
+        revisions.record_revision(snippet)
+        previews.schedule(snippet)
+        embeds.purge(snippet)
+    return snippet.version
+
+
+def get_session(snippet):
+    """The live session for ``snippet``, starting one from its saved code if needed"""
+    session = _sessions.get(snippet.pk)
+    if session is None:
+        session = _sessions[snippet.pk] = Session(snippet)
+    return session
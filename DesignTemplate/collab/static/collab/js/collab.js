@@ -0,0 +1,382 @@
+// ========================
+// Operational Transform
+// ========================
+// Same rules as collab/ot.py: a positive number retains that many UTF-16
+// code units, a negative number deletes that many, a string is inserted.
+
+const OT = {
+    isRetain: c => typeof c === 'number' && c > 0,
+    isDelete: c => typeof c === 'number' && c < 0,
+    isInsert: c => typeof c === 'string',
+
+    push(op, c) {
+        if (c === 0 || c === '' || c === undefined) return;
+        const last = op[op.length - 1];
+        if (typeof last === 'string' && typeof c === 'string') {
+            op[op.length - 1] = last + c;
+        } else if (typeof last === 'number' && typeof c === 'number' && (last > 0) === (c > 0)) {
+            op[op.length - 1] = last + c;
+        } else {
+            op.push(c);
+        }
+    },
+
+    normalize(op) {
+        const result = [];
+        op.forEach(c => OT.push(result, c));
+        if (OT.isRetain(result[result.length - 1])) result.pop();
+        return result;
+    },
+
+    baseLength: op => op.reduce((n, c) => n + (typeof c === 'number' ? Math.abs(c) : 0), 0),
+
+    // Split component c after n units: [head, tail]
+    split(c, n) {
+        if (typeof c === 'string') return [c.slice(0, n), c.slice(n)];
+        return c > 0 ? [n, c - n] : [-n, c + n];
+    },
+
+    size: c => typeof c === 'string' ? c.length : Math.abs(c),
+
+    // [a', b'] such that applying a then b' equals b then a'; a's inserts go first
+    transform(a, b) {
+        const xs = a.slice();
+        const ys = b.slice();
+        const spanA = OT.baseLength(a);
+        const spanB = OT.baseLength(b);
+        if (spanA < spanB) xs.push(spanB - spanA);
+        if (spanB < spanA) ys.push(spanA - spanB);
+
+        const aPrime = [];
+        const bPrime = [];
+        let i = 0, j = 0;
+        let x = xs[i++], y = ys[j++];
+        while (x !== undefined || y !== undefined) {
+            if (OT.isInsert(x)) {
+                OT.push(aPrime, x);
+                OT.push(bPrime, x.length);
+                x = xs[i++];
+                continue;
+            }
+            if (OT.isInsert(y)) {
+                OT.push(aPrime, y.length);
+                OT.push(bPrime, y);
+                y = ys[j++];
+                continue;
+            }
+            if (x === undefined || y === undefined) throw new Error('Operations do not line up');
+            const n = Math.min(OT.size(x), OT.size(y));
+            if (OT.isRetain(x) && OT.isRetain(y)) {
+                OT.push(aPrime, n);
+                OT.push(bPrime, n);
+            } else if (OT.isDelete(x) && OT.isRetain(y)) {
+                OT.push(aPrime, -n);
+            } else if (OT.isRetain(x) && OT.isDelete(y)) {
+                OT.push(bPrime, -n);
+            }
+            x = OT.size(x) > n ? OT.split(x, n)[1] : xs[i++];
+            y = OT.size(y) > n ? OT.split(y, n)[1] : ys[j++];
+        }
+        return [OT.normalize(aPrime), OT.normalize(bPrime)];
+    },
+
+    // One op equivalent to applying a and then b
+    compose(a, b) {
+        const result = [];
+        let i = 0, j = 0;
+        let x = a[i++], y = b[j++];
+        while (x !== undefined || y !== undefined) {
+            if (OT.isDelete(x)) {
+                OT.push(result, x);
+                x = a[i++];
+            } else if (OT.isInsert(y)) {
+                OT.push(result, y);
+                y = b[j++];
+            } else if (x === undefined) {
+                // Past the end of a: b applies to retained text
+                OT.push(result, y);
+                y = b[j++];
+            } else if (y === undefined) {
+                OT.push(result, x);
+                x = a[i++];
+            } else {
+                const n = Math.min(OT.size(x), OT.size(y));
+                const head = OT.split(x, n)[0];
+                if (OT.isDelete(y)) {
+                    // Deleting freshly inserted text cancels out
+                    if (OT.isRetain(x)) OT.push(result, -n);
+                } else {
+                    OT.push(result, head);
+                }
+                x = OT.size(x) > n ? OT.split(x, n)[1] : a[i++];
+                y = OT.size(y) > n ? OT.split(y, n)[1] : b[j++];
+            }
+        }
+        return OT.normalize(result);
+    },
+
+    transformCursor(position, op) {
+        let pos = 0;
+        let result = position;
+        for (const c of op) {
+            if (pos > position) break;
+            if (OT.isInsert(c)) {
+                result += c.length;
+            } else if (OT.isRetain(c)) {
+                pos += c;
+            } else {
+                result -= Math.min(-c, Math.max(position - pos, 0));
+                pos -= c;
+            }
+        }
+        return result;
+    },
+};
+
+// ========================
+// Live Session Client
+// ========================
+
+const COLLAB_BATCH_MS = 50;
+const COLLAB_CURSOR_MS = 100;
+const COLLAB_RECONNECT_MS = 2000;
+
+class CollabClient {
+    // editors: {html_code: monacoEditor, ...}
+    constructor(url, editors, callbacks = {}) {
+        this.url = url;
+        this.editors = editors;
+        this.callbacks = callbacks;
+        this.revision = 0;
+        this.inflight = [];
+        this.buffer = [];
+        this.participants = new Map();
+        this.decorations = new Map();
+        this.applyingRemote = false;
+        this.closed = false;
+
+        for (const [field, editor] of Object.entries(editors)) {
+            editor.onDidChangeModelContent(e => this.onLocalChange(field, e));
+            editor.onDidChangeCursorPosition(() => this.onCursor(field));
+        }
+        this.connect();
+    }
+
+    connect() {
+        this.socket = new WebSocket(this.url);
+        this.socket.onmessage = e => this.onMessage(JSON.parse(e.data));
+        this.socket.onclose = e => {
+            this.ready = false;
+            this.setStatus('Reconnecting…', true);
+            // 4003/4004: no access or no snippet, retrying won't help
+            if (!this.closed && e.code !== 4003 && e.code !== 4004) {
+                setTimeout(() => this.connect(), COLLAB_RECONNECT_MS);
+            }
+        };
+    }
+
+    setStatus(text, isError = false) {
+        if (this.callbacks.status) this.callbacks.status(text, isError);
+    }
+
+    onMessage(message) {
+        if (message.type === 'init') {
+            this.onInit(message);
+        } else if (message.type === 'batch') {
+            message.events.forEach(event => this.onEvent(event));
+        } else if (message.type === 'error') {
+            console.error('Live session error:', message.error);
+        }
+    }
+
+    onInit(message) {
+        const hadPending = this.inflight.length || this.buffer.length;
+        this.participantId = message.participant;
+        this.revision = message.revision;
+        this.inflight = [];
+        this.buffer = [];
+        for (const [field, editor] of Object.entries(this.editors)) {
+            const serverText = message.documents[field];
+            const localText = editor.getValue();
+            if (hadPending && serverText !== localText) {
+                // Edits made while disconnected: resend them as one splice
+                const splice = computeSplice(serverText, localText);
+                this.buffer.push([field, OT.normalize([splice.start, -(splice.end - splice.start), splice.text])]);
+            } else if (serverText !== localText) {
+                this.applyingRemote = true;
+                editor.getModel().setValue(serverText);
+                this.applyingRemote = false;
+            }
+        }
+        this.participants.clear();
+        message.participants.forEach(p => this.participants.set(p.id, p));
+        this.ready = true;
+        this.renderPresence();
+        this.setStatus('Live');
+        this.scheduleFlush();
+    }
+
+    onEvent(event) {
+        switch (event.type) {
+            case 'op':
+                this.onRemoteOp(event);
+                break;
+            case 'ack':
+                this.revision = event.revision;
+                this.inflight = [];
+                this.scheduleFlush();
+                break;
+            case 'cursor': {
+                const participant = this.participants.get(event.participant);
+                if (participant) Object.assign(participant, { field: event.field, offset: event.offset });
+                this.renderPresence();
+                break;
+            }
+            case 'join':
+                this.participants.set(event.participant.id, event.participant);
+                this.renderPresence();
+                break;
+            case 'leave':
+                this.participants.delete(event.participant);
+                this.renderPresence();
+                break;
+            case 'saved':
+                this.setStatus('Live · saved');
+                if (this.callbacks.saved) this.callbacks.saved(event.version);
+                break;
+            case 'error':
+                this.closed = true;
+                this.setStatus(event.error, true);
+                break;
+        }
+    }
+
+    onRemoteOp(event) {
+        let op = event.op;
+        // Move the server's op past our unacknowledged edits, and those past it
+        for (const pending of [this.inflight, this.buffer]) {
+            for (const entry of pending) {
+                if (entry[0] !== event.field) continue;
+                [entry[1], op] = OT.transform(entry[1], op);
+            }
+        }
+        this.revision = event.revision;
+        this.applyToEditor(event.field, op);
+        for (const participant of this.participants.values()) {
+            if (participant.field === event.field) {
+                participant.offset = OT.transformCursor(participant.offset, op);
+            }
+        }
+        this.renderPresence();
+    }
+
+    applyToEditor(field, op) {
+        const model = this.editors[field].getModel();
+        const edits = [];
+        let pos = 0;
+        for (const c of op) {
+            if (OT.isRetain(c)) {
+                pos += c;
+                continue;
+            }
+            const start = model.getPositionAt(pos);
+            const end = OT.isDelete(c) ? model.getPositionAt(pos - c) : start;
+            const last = edits[edits.length - 1];
+            if (last && last.end === pos) {
+                // A delete followed by an insert at the same spot is one edit
+                last.text += OT.isInsert(c) ? c : '';
+                if (OT.isDelete(c)) {
+                    last.range = new monaco.Range(last.range.startLineNumber, last.range.startColumn, end.lineNumber, end.column);
+                    last.end = pos - c;
+                }
+            } else {
+                edits.push({
+                    range: new monaco.Range(start.lineNumber, start.column, end.lineNumber, end.column),
+                    text: OT.isInsert(c) ? c : '',
+                    end: OT.isDelete(c) ? pos - c : pos,
+                });
+            }
+            if (OT.isDelete(c)) pos -= c;
+        }
+        this.applyingRemote = true;
+        try {
+            model.pushEditOperations([], edits.map(({ range, text }) => ({ range, text })), () => null);
+        } finally {
+            this.applyingRemote = false;
+        }
+    }
+
+    onLocalChange(field, e) {
+        if (this.applyingRemote) return;
+        // Offsets in one event refer to the text before it; apply from the end
+        const changes = e.changes.slice().sort((a, b) => b.rangeOffset - a.rangeOffset);
+        for (const change of changes) {
+            const op = OT.normalize([change.rangeOffset, -change.rangeLength, change.text]);
+            const last = this.buffer[this.buffer.length - 1];
+            if (last && last[0] === field) {
+                // Keystrokes between flushes are sent as a single op
+                last[1] = OT.compose(last[1], op);
+            } else {
+                this.buffer.push([field, op]);
+            }
+        }
+        this.scheduleFlush();
+    }
+
+    scheduleFlush() {
+        if (this.flushTimer) return;
+        this.flushTimer = setTimeout(() => {
+            this.flushTimer = null;
+            this.flush();
+        }, COLLAB_BATCH_MS);
+    }
+
+    flush() {
+        // One batch in flight at a time; the ack triggers the next
+        if (!this.ready || this.inflight.length || !this.buffer.length) return;
+        this.inflight = this.buffer;
+        this.buffer = [];
+        this.send({ type: 'ops', revision: this.revision, ops: this.inflight });
+    }
+
+    onCursor(field) {
+        clearTimeout(this.cursorTimer);
+        this.cursorTimer = setTimeout(() => {
+            const editor = this.editors[field];
+            const offset = editor.getModel().getOffsetAt(editor.getPosition());
+            if (this.ready) this.send({ type: 'cursor', field, offset });
+        }, COLLAB_CURSOR_MS);
+    }
+
+    save() {
+        this.flush();
+        if (this.ready) this.send({ type: 'save' });
+    }
+
+    send(message) {
+        if (this.socket.readyState === WebSocket.OPEN) this.socket.send(JSON.stringify(message));
+    }
+
+    renderPresence() {
+        for (const [field, editor] of Object.entries(this.editors)) {
+            const model = editor.getModel();
+            const decorations = [];
+            for (const participant of this.participants.values()) {
+                if (participant.id === this.participantId || participant.field !== field) continue;
+                const position = model.getPositionAt(participant.offset);
+                decorations.push({
+                    range: new monaco.Range(position.lineNumber, position.column, position.lineNumber, position.column),
+                    options: {
+                        beforeContentClassName: `collab-cursor collab-color-${participant.color}`,
+                        hoverMessage: { value: participant.name },
+                        stickiness: 1,
+                    },
+                });
+            }
+            this.decorations.set(field, editor.deltaDecorations(this.decorations.get(field) || [], decorations));
+        }
+        if (this.callbacks.presence) {
+            this.callbacks.presence([...this.participants.values()], this.participantId);
+        }
+    }
+}
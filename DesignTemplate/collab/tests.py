@@ -0,0 +1,342 @@
+import json
+import random
+from datetime import datetime, timedelta
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core import signing
+from django.test import Client, SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from playground.models import Revision, Snippet
+from . import invites, ot, sessions, websocket
+from .sessions import Session
+
+ALPHABET = 'ab\n😀é'
+
+
+def random_text(rng, size):
+    return ''.join(rng.choice(ALPHABET) for _ in range(size))
+
+
+def random_op(rng, document):
+    """A random operation on ``document`` (UTF-16-LE bytes), made the way an editor would"""
+    size = len(document) // 2
+    op, pos = [], 0
+    while pos < size and rng.random() < 0.7:
+        step = rng.randint(0, size - pos)
+        op.append(step)
+        pos += step
+        kind = rng.random()
+        if kind < 0.4 and pos < size:
+            deleted = rng.randint(1, size - pos)
+            op.append(-deleted)
+            pos += deleted
+        elif kind < 0.8:
+            op.append(random_text(rng, rng.randint(1, 3)))
+    return ot.normalize(op)
+
+
+class OTTests(SimpleTestCase):
+
+    def test_transformed_operations_converge(self):
+        rng = random.Random(39)
+        for _ in range(2000):
+            document = ot.encode(random_text(rng, rng.randint(0, 12)))
+            a, b = random_op(rng, document), random_op(rng, document)
+            a_prime, b_prime = ot.transform(a, b)
+            self.assertEqual(
+                ot.apply(ot.apply(document, a), b_prime),
+                ot.apply(ot.apply(document, b), a_prime),
+                (ot.decode(document), a, b),
+            )
+
+    def test_inserts_at_the_same_place_put_the_first_operation_first(self):
+        document = ot.encode('ac')
+        a, b = ot.transform([1, 'x'], [1, 'y'])
+        self.assertEqual(ot.decode(ot.apply(ot.apply(document, [1, 'x']), b)), 'axyc')
+        self.assertEqual(ot.decode(ot.apply(ot.apply(document, [1, 'y']), a)), 'axyc')
+
+    def test_positions_count_utf16_units(self):
+        self.assertEqual(ot.decode(ot.apply(ot.encode('😀b'), [2, 'x'])), '😀xb')
+        with self.assertRaises(ot.OTError):
+            ot.apply(ot.encode('😀'), [3])
+
+    def test_cursors_follow_edits(self):
+        for position, op, expected in (
+            (3, ['ab'], 5),
+            (3, [3, 'ab'], 5),
+            (3, [4, 'ab'], 3),
+            (3, [-2], 1),
+            (3, [1, -5], 1),
+            (3, [5, -1], 3),
+        ):
+            with self.subTest(position=position, op=op):
+                self.assertEqual(ot.transform_cursor(position, op), expected)
+
+    def test_diff_rebuilds_the_new_document_without_splitting_pairs(self):
+        rng = random.Random(40)
+        for _ in range(2000):
+            old = ot.encode(random_text(rng, rng.randint(0, 8)))
+            new = ot.encode(random_text(rng, rng.randint(0, 8)))
+            op = ot.diff(old, new)
+            self.assertEqual(ot.apply(old, op), new)
+            # Encoding strictly fails on a lone surrogate
+            for component in op:
+                if isinstance(component, str):
+                    component.encode('utf-16-le')
+        self.assertEqual(ot.diff(ot.encode('😀'), ot.encode('😃')), [-2, '😃'])
+
+    def test_malformed_operations_are_rejected(self):
+        for op in ('ab', None, [True], [1.5], [[1]], [None]):
+            with self.subTest(op=op), self.assertRaises(ot.OTError):
+                ot.normalize(op)
+        self.assertEqual(ot.normalize([1, 2, 'a', 'b', -1, -1, 3]), [3, 'ab', -2])
+
+
+class SessionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('host', 'host@example.com')
+        self.guest = User.objects.create_user('guest', 'guest@example.com')
+        self.snippet = Snippet.objects.create(user=self.user, title='Shared', js_code='let a = 1;\n')
+        self.received = {}
+
+    def start(self):
+        """A session on the snippet with both users in it, without the periodic compactor"""
+        session = Session(self.snippet)
+        host, _ = session.join(self.user)
+        guest, _ = session.join(self.guest)
+        session._compactor.cancel()
+        return session, host, guest
+
+    def events(self, session, participant, kind):
+        """Events of ``kind`` sent to ``participant`` so far"""
+        session._flush()
+        received = self.received.setdefault(participant.id, [])
+        while not participant.queue.empty():
+            message = participant.queue.get_nowait()
+            received += json.loads(message)['events'] if message else [{'type': 'disconnect'}]
+        return [event for event in received if event['type'] == kind]
+
+    def js(self, session):
+        return ot.decode(session.documents['js_code'])
+
+    async def test_concurrent_ops_are_rebased_and_broadcast(self):
+        session, host, guest = self.start()
+        session.receive(host, 0, [['js_code', [8, -1, '42']]])
+        # Made against revision 0, before the host's edit
+        session.receive(guest, 0, [['js_code', [4, -1, 'b']], ['js_code', [11, '// b\n']]])
+
+        self.assertEqual(self.js(session), 'let b = 42;\n// b\n')
+        self.assertEqual(session.revision, 3)
+        self.assertEqual(self.events(session, host, 'ack'), [{'type': 'ack', 'revision': 1}])
+        self.assertEqual(self.events(session, guest, 'ack'), [{'type': 'ack', 'revision': 3}])
+        # The host replays the guest's rebased ops on top of its own edit
+        document = ot.encode('let a = 42;\n')
+        for event in self.events(session, host, 'op'):
+            self.assertEqual(event['participant'], guest.id)
+            document = ot.apply(document, event['op'])
+        self.assertEqual(ot.decode(document), self.js(session))
+
+    async def test_cursors_move_with_other_peoples_edits(self):
+        session, host, guest = self.start()
+        session.move_cursor(guest, 'js_code', 6)
+        session.receive(host, 0, [['js_code', ['// \n']]])
+        self.assertEqual(guest.offset, 10)
+
+    async def test_base_outside_the_history_is_rejected(self):
+        with mock.patch.object(sessions, 'HISTORY', 2):
+            session, host, guest = self.start()
+        for _ in range(3):
+            session.receive(host, session.revision, [['js_code', ['x']]])
+        for base in (0, -1, 4, '3', None, True):
+            with self.subTest(base=base), self.assertRaisesMessage(ot.OTError, 'Revision is out of range'):
+                session.receive(guest, base, [['js_code', ['y']]])
+        # Revision 1 is the oldest the last two ops can be rebased onto
+        session.receive(guest, 1, [['js_code', ['y']]])
+        self.assertEqual(self.js(session), 'yxxxlet a = 1;\n')
+
+    async def test_a_malformed_batch_changes_nothing(self):
+        session, host, guest = self.start()
+        for ops in (
+            'ops',
+            [['js_code', ['ok']], ['py_code', ['x']]],
+            [['js_code', ['ok']], ['js_code']],
+            [['js_code', ['ok']], ['js_code', [1, True]]],
+            [['js_code', ['ok']], ['js_code', [500, 'x']]],
+            [['js_code', ['ok']], ['js_code', 'x']],
+        ):
+            with self.subTest(ops=ops), self.assertRaises(ot.OTError):
+                session.receive(host, 0, ops)
+        self.assertEqual((self.js(session), session.revision, session.dirty), ('let a = 1;\n', 0, set()))
+        self.assertEqual(self.events(session, guest, 'op'), [])
+
+    async def test_compaction_saves_and_bumps_the_version(self):
+        session, host, guest = self.start()
+        session.receive(host, 0, [['js_code', [8, -1, '2']]])
+        await session.compact()
+
+        snippet = await Snippet.objects.aget(pk=self.snippet.pk)
+        self.assertEqual((snippet.js_code, snippet.version), ('let a = 2;\n', 1))
+        self.assertEqual(session.dirty, set())
+        self.assertEqual(self.events(session, guest, 'saved'), [{'type': 'saved', 'version': 1}])
+        self.assertTrue(await Revision.objects.filter(snippet_id=self.snippet.pk).aexists())
+
+    async def test_saves_made_outside_the_session_are_merged(self):
+        session, host, guest = self.start()
+        session.receive(host, 0, [['js_code', [8, -1, '2']]])
+        # Another tab autosaves a different line meanwhile
+        await Snippet.objects.filter(pk=self.snippet.pk).aupdate(
+            js_code='let a = 1;\nlet c = 3;\n', css_code='a{}', version=1
+        )
+        await session.compact()
+
+        snippet = await Snippet.objects.aget(pk=self.snippet.pk)
+        self.assertEqual((snippet.js_code, snippet.css_code, snippet.version), ('let a = 2;\nlet c = 3;\n', 'a{}', 2))
+        self.assertEqual(self.js(session), snippet.js_code)
+        self.assertEqual(session.version, 2)
+        # Everyone, the host included, gets the outside edit as an op of its own
+        for participant in (host, guest):
+            ops = [event for event in self.events(session, participant, 'op') if event['participant'] is None]
+            self.assertEqual([event['field'] for event in ops], ['css_code', 'js_code'])
+
+    async def test_deleted_snippet_closes_the_session(self):
+        session, host, guest = self.start()
+        session.receive(host, 0, [['js_code', ['x']]])
+        await Snippet.objects.filter(pk=self.snippet.pk).adelete()
+        await session.compact()
+        self.assertEqual(self.events(session, guest, 'error'), [{'type': 'error', 'error': 'This snippet was deleted'}])
+        self.assertEqual(len(self.events(session, guest, 'disconnect')), 1)
+
+
+class InviteTests(TestCase):
+
+    def setUp(self):
+        self.host = User.objects.create_user('host', 'host@example.com')
+        self.guest = User.objects.create_user('guest', 'guest@example.com')
+        self.snippet = Snippet.objects.create(user=self.host, title='Shared')
+
+    def invite(self):
+        self.client.force_login(self.host)
+        return self.client.post(reverse('collab:invite', args=[self.snippet.slug])).json()
+
+    def test_invites_let_guests_join_until_they_expire(self):
+        result = self.invite()
+        token = parse_qs(urlsplit(result['url']).query)['collab'][0]
+        self.assertTrue(invites.can_join(self.guest, self.snippet, token))
+        self.assertFalse(invites.can_join(self.guest, Snippet.objects.create(user=self.host, title='Other'), token))
+
+        expires = datetime.fromisoformat(result['expires_at'])
+        self.assertAlmostEqual(expires, timezone.now() + timedelta(seconds=invites.INVITE_MAX_AGE), delta=timedelta(seconds=5))
+        with mock.patch('time.time', return_value=expires.timestamp() + 1):
+            self.assertFalse(invites.can_join(self.guest, self.snippet, token))
+        with self.assertRaises(signing.BadSignature):
+            invites.expires_at(token[:-1])
+
+    def test_revoking_voids_every_invite(self):
+        token = invites.make_token(self.snippet)
+        legacy = signing.dumps(str(self.snippet.pk), salt=invites.INVITE_SALT)
+        self.assertTrue(invites.can_join(self.guest, self.snippet, legacy))
+
+        # Only the owner can revoke
+        self.client.force_login(self.guest)
+        self.assertEqual(self.client.post(reverse('collab:revoke_invites', args=[self.snippet.slug])).status_code, 404)
+        self.client.force_login(self.host)
+        self.assertTrue(self.client.post(reverse('collab:revoke_invites', args=[self.snippet.slug])).json()['success'])
+
+        snippet = Snippet.objects.get(pk=self.snippet.pk)
+        for old in (token, legacy):
+            self.assertFalse(invites.can_join(self.guest, snippet, old))
+        self.assertTrue(invites.can_join(self.guest, snippet, invites.make_token(snippet)))
+        self.assertTrue(invites.can_join(self.host, snippet))
+
+
+class WebSocketTests(TestCase):
+
+    def setUp(self):
+        self.host = User.objects.create_user('host', 'host@example.com')
+        self.guest = User.objects.create_user('guest', 'guest@example.com')
+        self.snippet = Snippet.objects.create(user=self.host, title='Shared', js_code='let a = 1;\n')
+        self.cookies = {}
+        for user in (self.host, self.guest):
+            client = Client()
+            client.force_login(user)
+            self.cookies[user.pk] = client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    async def connect(self, user, token=None):
+        """A connection for ``user``, and the close code if it was refused"""
+        scope = {
+            'type': 'websocket',
+            'path': f'/ws/collab/{self.snippet.slug}/',
+            'query_string': f'token={token}'.encode() if token else b'',
+            'headers': [
+                (b'host', b'testserver'),
+                (b'cookie', f'{settings.SESSION_COOKIE_NAME}={self.cookies[user.pk]}'.encode()),
+            ],
+        }
+        socket = ApplicationCommunicator(websocket.application, scope)
+        await socket.send_input({'type': 'websocket.connect'})
+        message = await socket.receive_output(timeout=1)
+        if message['type'] == 'websocket.close':
+            return socket, message['code']
+        self.assertEqual(message['type'], 'websocket.accept')
+        return socket, None
+
+    async def receive(self, socket):
+        return json.loads((await socket.receive_output(timeout=1))['text'])
+
+    async def until(self, socket, kind):
+        """Events from batches up to and including the first one with an event of ``kind``"""
+        received = []
+        while not any(event['type'] == kind for event in received):
+            received += (await self.receive(socket))['events']
+        return received
+
+    async def events(self, socket, kind):
+        return [event for event in await self.until(socket, kind) if event['type'] == kind]
+
+    async def send(self, socket, message):
+        await socket.send_input({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def test_a_session_end_to_end(self):
+        host, refused = await self.connect(self.host)
+        self.assertIsNone(refused)
+        init = await self.receive(host)
+        self.assertEqual((init['type'], init['documents']['js_code']), ('init', 'let a = 1;\n'))
+
+        # Guests need an invite
+        self.assertEqual((await self.connect(self.guest))[1], websocket.CLOSE_FORBIDDEN)
+        guest, _ = await self.connect(self.guest, invites.make_token(self.snippet))
+        self.assertEqual([p['name'] for p in (await self.receive(guest))['participants']], ['host', 'guest'])
+        self.assertEqual((await self.events(host, 'join'))[0]['participant']['name'], 'guest')
+
+        await self.send(host, {'type': 'ops', 'revision': 0, 'ops': [['js_code', [8, -1, '2']]]})
+        self.assertEqual(await self.events(host, 'ack'), [{'type': 'ack', 'revision': 1}])
+        [op] = await self.events(guest, 'op')
+        self.assertEqual((op['op'], op['revision']), ([8, -1, '2'], 1))
+
+        # A save made elsewhere meanwhile is merged on compaction
+        await Snippet.objects.filter(pk=self.snippet.pk).aupdate(js_code='let a = 1;\nlet b;\n', version=1)
+        await self.send(guest, {'type': 'save'})
+        self.assertEqual(await self.events(host, 'saved'), [{'type': 'saved', 'version': 2}])
+        snippet = await Snippet.objects.aget(pk=self.snippet.pk)
+        self.assertEqual(snippet.js_code, 'let a = 2;\nlet b;\n')
+        # The guest gets the outside edit as an op of its own
+        ops = [event for event in await self.until(guest, 'saved') if event['type'] == 'op']
+        self.assertEqual([(op['participant'], op['revision']) for op in ops], [(None, 2)])
+
+        # A malformed message closes only its own connection
+        await self.send(guest, {'type': 'ops', 'revision': 99, 'ops': []})
+        self.assertEqual(await self.receive(guest), {'type': 'error', 'error': 'Revision is out of range'})
+        self.assertEqual(await guest.receive_output(timeout=1), {'type': 'websocket.close', 'code': websocket.CLOSE_INVALID})
+        await guest.wait(timeout=1)
+        self.assertEqual((await self.events(host, 'leave'))[0]['type'], 'leave')
+
+        await host.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await host.wait(timeout=1)
+        self.assertNotIn(self.snippet.pk, sessions._sessions)
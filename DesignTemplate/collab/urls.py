@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = 'collab'
+
+urlpatterns = [
+    path('api/collab/<slug:slug>/invite/', views.invite, name='invite'),
+    path('api/collab/<slug:slug>/invite/revoke/', views.revoke_invites, name='revoke_invites'),
+]
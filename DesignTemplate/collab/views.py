@@ -0,0 +1,32 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.views.decorators.http import require_POST
+
+from playground.models import Snippet
+from . import invites
+
+
+@login_required
+@require_POST
+def invite(request, slug):
+    """Editor link that lets other signed-in users join the live session (owner only)"""
+    snippet = get_object_or_404(Snippet, slug=slug, user=request.user)
+    token = invites.make_token(snippet)
+    url = reverse('playground:editor_edit', args=[snippet.slug]) + '?' + urlencode({'collab': token})
+    return JsonResponse({
+        'success': True,
+        'url': request.build_absolute_uri(url),
+        'expires_at': invites.expires_at(token).isoformat(),
+    })
+
+
+@login_required
+@require_POST
+def revoke_invites(request, slug):
+    """Void every invite link made so far (owner only)"""
+    snippet = get_object_or_404(Snippet, slug=slug, user=request.user)
+    invites.revoke(snippet)
+    return JsonResponse({'success': True})
@@ -0,0 +1,127 @@
+"""
+WebSocket endpoint for live editing, mounted next to Django in asgi.py.
+
+    /ws/collab/<slug>/?token=<invite token>
+
+Messages are JSON text frames. Clients send ``{"type": "ops", "revision":
+n, "ops": [[field, op], ...]}``, ``{"type": "cursor", "field": f, "offset":
+n}`` and ``{"type": "save"}``. The server answers with one ``init`` frame
+and then ``batch`` frames carrying a list of op/ack/cursor/join/leave/saved
+events (see collab.sessions).
+"""
+
+import asyncio
+import json
+import re
+from importlib import import_module
+from urllib.parse import parse_qs, urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import aget_user
+from django.http import HttpRequest
+from django.http.cookie import parse_cookie
+
+from playground.models import Snippet
+from . import ot
+from .invites import can_join
+from .sessions import get_session
+
+PATH = re.compile(r'^/ws/collab/(?P<slug>[-\w]+)/$')
+MAX_MESSAGE = getattr(settings, 'COLLAB_MAX_MESSAGE', 256 * 1024)
+
+# Close codes (4000-4999 are free for applications)
+CLOSE_INVALID = 4000
+CLOSE_FORBIDDEN = 4003
+CLOSE_NOT_FOUND = 4004
+CLOSE_TOO_SLOW = 4008
+
+
+def header(scope, name):
+    for key, value in scope.get('headers', ()):
+        if key == name:
+            return value.decode('latin-1')
+    return ''
+
+
+def same_origin(scope):
+    """Browsers send cookies cross-site on WebSocket handshakes, so check Origin like CSRF would"""
+    origin = header(scope, b'origin')
+    if not origin:
+        return True
+    if origin in getattr(settings, 'CSRF_TRUSTED_ORIGINS', ()):
+        return True
+    return urlsplit(origin).netloc == header(scope, b'host')
+
+
+async def get_user(scope):
+    request = HttpRequest()
+    engine = import_module(settings.SESSION_ENGINE)
+    session_key = parse_cookie(header(scope, b'cookie')).get(settings.SESSION_COOKIE_NAME)
+    request.session = engine.SessionStore(session_key)
+    return await aget_user(request)
+
+
+def find_snippet(slug, user, token):
+    snippet = Snippet.objects.filter(slug=slug).first()
+    if snippet is None:
+        return None, CLOSE_NOT_FOUND
+    if not can_join(user, snippet, token):
+        return None, CLOSE_FORBIDDEN
+    return snippet, None
+
+
+async def application(scope, receive, send):
+    match = PATH.match(scope['path'])
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if match is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    if not same_origin(scope):
+        await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+        return
+
+    user = await get_user(scope)
+    token = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token', [None])[0]
+    snippet, error = await sync_to_async(find_snippet)(match['slug'], user, token)
+    if error:
+        await send({'type': 'websocket.close', 'code': error})
+        return
+
+    await send({'type': 'websocket.accept'})
+    session = get_session(snippet)
+    participant, init = session.join(user)
+    await send({'type': 'websocket.send', 'text': json.dumps(init, separators=(',', ':'))})
+    sender = asyncio.create_task(pump(participant.queue, send))
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            text = message.get('text') or ''
+            if len(text) > MAX_MESSAGE:
+                raise ot.OTError('Message too large')
+            data = json.loads(text)
+            kind = data.get('type')
+            if kind == 'ops':
+                session.receive(participant, data.get('revision'), data.get('ops'))
+            elif kind == 'cursor':
+                session.move_cursor(participant, data.get('field'), data.get('offset'))
+            elif kind == 'save':
+                await session.compact()
+    except (ValueError, AttributeError) as e:
+        # OTError is a ValueError too; the client reconnects from a fresh copy
+        await send({'type': 'websocket.send', 'text': json.dumps({'type': 'error', 'error': str(e)})})
+        await send({'type': 'websocket.close', 'code': CLOSE_INVALID})
+    finally:
+        sender.cancel()
+        await session.leave(participant)
+
+
+async def pump(queue, send):
+    """Write queued batches to the socket until the session drops this participant"""
+    while (message := await queue.get()) is not None:
+        await send({'type': 'websocket.send', 'text': message})
+    await send({'type': 'websocket.close', 'code': CLOSE_TOO_SLOW})
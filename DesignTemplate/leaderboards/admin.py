@@ -0,0 +1,22 @@
+from django.contrib import admin
+from .models import CreatorScore, SnippetScore
+
+
+@admin.register(CreatorScore)
+class CreatorScoreAdmin(admin.ModelAdmin):
+    """Admin for creator leaderboard scores"""
+    list_display = ['user', 'period', 'score', 'updated_at']
+    list_filter = ['period']
+    search_fields = ['user__username']
+    raw_id_fields = ['user']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(SnippetScore)
+class SnippetScoreAdmin(admin.ModelAdmin):
+    """Admin for snippet leaderboard scores"""
+    # Snippets may live on another database, so they're shown by id
+    list_display = ['snippet_id', 'period', 'score', 'updated_at']
+    list_filter = ['period']
+    raw_id_fields = ['snippet']
+    readonly_fields = ['updated_at']
@@ -0,0 +1,71 @@
+"""
+A Fenwick (binary indexed) tree counting scores, for rank lookups.
+
+Node ``i`` counts the subjects whose score is in ``(i - lowbit(i), i]``, where
+``lowbit(i)`` is the lowest set bit of ``i``. Scores run from 1 to SIZE; scores
+of zero or less aren't stored, and larger ones are counted as SIZE. Moving
+one subject's score changes at most 2 * (BITS + 1) nodes. Counting the
+subjects above a score reads at most BITS + 2 nodes. Both costs are
+O(log SIZE), however many subjects there are.
+
+The nodes are kept sparsely as ``ScoreCount`` rows; a missing node is zero.
+"""
+
+from collections import Counter
+
+BITS = 31
+SIZE = 1 << BITS
+
+
+def index(score):
+    """The tree position of ``score``, or None when it isn't counted"""
+    if score <= 0:
+        return None
+    return min(score, SIZE)
+
+
+def _update_path(i):
+    while i <= SIZE:
+        yield i
+        i += i & -i
+
+
+def _prefix_path(i):
+    while i > 0:
+        yield i
+        i -= i & -i
+
+
+def moves(changes):
+    """{node: change in count} for (old score, new score) pairs, one per subject"""
+    nodes = Counter()
+    for old, new in changes:
+        old, new = index(old), index(new)
+        if old == new:
+            continue
+        if old is not None:
+            for node in _update_path(old):
+                nodes[node] -= 1
+        if new is not None:
+            for node in _update_path(new):
+                nodes[node] += 1
+    return {node: count for node, count in nodes.items() if count}
+
+
+def build(scores):
+    """{node: count} of a tree holding ``scores``"""
+    return moves((0, score) for score in scores)
+
+
+def rank_nodes(score):
+    """The nodes ``count_above`` reads"""
+    i = index(score)
+    return {SIZE, *(_prefix_path(i) if i else ())}
+
+
+def count_above(nodes, score):
+    """How many counted scores are higher than ``score``, from {node: count} covering rank_nodes(score)"""
+    i = index(score)
+    at_or_below = sum(nodes.get(node, 0) for node in _prefix_path(i)) if i else 0
+    # The root covers every score
+    return nodes.get(SIZE, 0) - at_or_below
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from leaderboards import scores
+
+
+class Command(BaseCommand):
+    help = 'Recompute leaderboard scores and rank counts from likes and forks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'periods', nargs='*',
+            help="Period keys such as all, 2026-W07 or 2026-02 (default: this week, this month and all)"
+        )
+
+    def handle(self, *args, **options):
+        periods = options['periods'] or scores.period_keys()
+        for period in periods:
+            try:
+                scores.period_range(period)
+            except ValueError:
+                raise CommandError(f'Not a period: {period}')
+        
+        started = time.monotonic()
+        written = scores.rebuild(periods)
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'Rebuilt {", ".join(periods)} ({written} scores) in {elapsed:.2f}s')
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('playground', '0008_snippet_location'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(help_text="'creators' or 'snippets'", max_length=10)),
+                ('period', models.CharField(max_length=10)),
+                ('node', models.BigIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Score count',
+                'verbose_name_plural': 'Score counts',
+                'unique_together': {('board', 'period', 'node')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CreatorScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(help_text="'all', an ISO week (2026-W07) or a month (2026-02)", max_length=10)),
+                ('score', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Creator score',
+                'verbose_name_plural': 'Creator scores',
+                'indexes': [models.Index(fields=['period', '-score', 'user'], name='leaderboard_period_6314e9_idx')],
+                'unique_together': {('period', 'user')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SnippetScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(help_text="'all', an ISO week (2026-W07) or a month (2026-02)", max_length=10)),
+                ('score', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('snippet', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='playground.snippet')),
+            ],
+            options={
+                'verbose_name': 'Snippet score',
+                'verbose_name_plural': 'Snippet scores',
+                'indexes': [models.Index(fields=['period', '-score', 'snippet'], name='leaderboard_period_1c3021_idx')],
+                'unique_together': {('period', 'snippet')},
+            },
+        ),
+    ]
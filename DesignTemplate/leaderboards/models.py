@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.db import models
+
+from playground.models import Snippet
+
+
+class CreatorScore(models.Model):
+    """A user's points in one leaderboard period, kept up to date by the task worker"""
+    # Rows outlive purged accounts until the next rebuild, so no constraint or cascade
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False
+    )
+    period = models.CharField(max_length=10, help_text="'all', an ISO week (2026-W07) or a month (2026-02)")
+    score = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('period', 'user')
+        indexes = [
+            # A page of a leaderboard is one range scan of this index
+            models.Index(fields=['period', '-score', 'user']),
+        ]
+        verbose_name = 'Creator score'
+        verbose_name_plural = 'Creator scores'
+    
+    def __str__(self):
+        return f"{self.user_id} in {self.period}: {self.score}"
+
+
+class SnippetScore(models.Model):
+    """A snippet's points in one leaderboard period, kept up to date by the task worker"""
+    snippet = models.ForeignKey(Snippet, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    period = models.CharField(max_length=10, help_text="'all', an ISO week (2026-W07) or a month (2026-02)")
+    score = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('period', 'snippet')
+        indexes = [
+            models.Index(fields=['period', '-score', 'snippet']),
+        ]
+        verbose_name = 'Snippet score'
+        verbose_name_plural = 'Snippet scores'
+    
+    def __str__(self):
+        return f"{self.snippet_id} in {self.period}: {self.score}"
+
+
+class ScoreCount(models.Model):
+    """One node of a board period's Fenwick tree of scores (see leaderboards.fenwick)"""
+    board = models.CharField(max_length=10, help_text="'creators' or 'snippets'")
+    period = models.CharField(max_length=10)
+    node = models.BigIntegerField()
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('board', 'period', 'node')
+        verbose_name = 'Score count'
+        verbose_name_plural = 'Score counts'
+    
+    def __str__(self):
+        return f"{self.board} {self.period} node {self.node}: {self.count}"
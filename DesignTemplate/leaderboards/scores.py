@@ -0,0 +1,237 @@
+"""
+Leaderboards of creators and snippets by week, month and all time.
+
+A snippet earns LEADERBOARD_LIKE_POINTS per like and LEADERBOARD_FORK_POINTS
+per fork, and its owner earns the same. Points count towards the ISO week
+and the month the like or fork happened in, and towards 'all'; an unlike
+takes its point back from the like's periods, though no score goes below
+zero. The task worker applies them
+with ``award`` in the transaction that bumps the counters, so the score
+tables are always sorted by their (period, -score) index and a page of a
+leaderboard is one range scan of it.
+
+A rank ("you are #1,234 this week") is the number of higher scores plus
+one, read from a Fenwick tree of each board period's scores (see
+leaderboards.fenwick) kept next to the scores: a lookup reads at most 33
+rows, however many users are ranked. Ties share a rank; subjects without
+points aren't ranked.
+
+``rebuild`` recomputes periods from the likes and forks themselves, after
+changing the points or to drop purged users and snippets.
+"""
+
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, prefetch_related_objects
+from django.utils import timezone
+
+from playground import sharding
+from playground.models import Like, Snippet, SnippetLocation
+from . import fenwick
+from .models import CreatorScore, ScoreCount, SnippetScore
+
+LIKE_POINTS = getattr(settings, 'LEADERBOARD_LIKE_POINTS', 1)
+FORK_POINTS = getattr(settings, 'LEADERBOARD_FORK_POINTS', 3)
+
+# Board name -> (score model, subject field)
+BOARDS = {
+    'creators': (CreatorScore, 'user_id'),
+    'snippets': (SnippetScore, 'snippet_id'),
+}
+PERIODS = ('week', 'month', 'all')
+IN_CHUNK = 500
+
+
+def period_key(kind, when=None):
+    """The key of the week, month or all-time period containing ``when`` (default: now)"""
+    if kind == 'all':
+        return 'all'
+    day = timezone.localdate(when)
+    if kind == 'week':
+        year, week, _ = day.isocalendar()
+        return f'{year}-W{week:02d}'
+    return f'{day.year}-{day.month:02d}'
+
+
+def period_keys(when=None):
+    return [period_key(kind, when) for kind in PERIODS]
+
+
+def period_range(key):
+    """(start, end) datetimes of a period key, or (None, None) for 'all'"""
+    if key == 'all':
+        return None, None
+    if '-W' in key:
+        year, week = key.split('-W')
+        first = date.fromisocalendar(int(year), int(week), 1)
+        last = first + timedelta(days=7)
+    else:
+        year, month = map(int, key.split('-'))
+        first = date(year, month, 1)
+        last = date(year + month // 12, month % 12 + 1, 1)
+    return tuple(timezone.make_aware(datetime.combine(day, time())) for day in (first, last))
+
+
+def _chunks(items, size=IN_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def award(awards):
+    """Add (snippet id, owner id, when, points) tuples to both boards' scores"""
+    deltas = {board: Counter() for board in BOARDS}
+    for snippet_id, user_id, when, points in awards:
+        for period in period_keys(when):
+            deltas['snippets'][period, str(snippet_id)] += points
+            deltas['creators'][period, str(user_id)] += points
+    for board, changes in deltas.items():
+        _apply(board, {key: delta for key, delta in changes.items() if delta})
+
+
+def _apply(board, deltas):
+    """Add {(period, subject): points} to a board, moving the changed scores in the rank trees"""
+    if not deltas:
+        return
+    model, field = BOARDS[board]
+    model.objects.bulk_create(
+        [model(period=period, **{field: subject}) for period, subject in deltas],
+        ignore_conflicts=True,
+    )
+    by_period = defaultdict(list)
+    for period, subject in deltas:
+        by_period[period].append(subject)
+    rows = model.objects.select_for_update().filter(
+        Q(*[Q(period=period, **{f'{field}__in': subjects}) for period, subjects in by_period.items()], _connector=Q.OR)
+    )
+    now = timezone.now()
+    changed, moved = [], defaultdict(list)
+    for row in rows:
+        old = row.score
+        # An unlike of a like made before its period was scored takes nothing back
+        row.score = max(old + deltas[row.period, str(getattr(row, field))], 0)
+        row.updated_at = now
+        changed.append(row)
+        moved[row.period].append((old, row.score))
+    model.objects.bulk_update(changed, ['score', 'updated_at'])
+    for period, changes in moved.items():
+        _count(board, period, fenwick.moves(changes))
+
+
+def _count(board, period, nodes):
+    """Add {node: change} to a board period's rank tree"""
+    if not nodes:
+        return
+    ScoreCount.objects.bulk_create(
+        [ScoreCount(board=board, period=period, node=node) for node in nodes],
+        ignore_conflicts=True,
+    )
+    # Nearly every change is +1 or -1, so this is a couple of UPDATEs
+    by_change = defaultdict(list)
+    for node, change in nodes.items():
+        by_change[change].append(node)
+    for change, batch in by_change.items():
+        for chunk in _chunks(batch):
+            ScoreCount.objects.filter(board=board, period=period, node__in=chunk).update(count=F('count') + change)
+
+
+def position(board, period, subject_id):
+    """(rank, score) of a subject on a board period; rank is None without points"""
+    model, field = BOARDS[board]
+    score = model.objects.filter(period=period, **{field: subject_id}).values_list('score', flat=True).first() or 0
+    if score <= 0:
+        return None, score
+    nodes = dict(
+        ScoreCount.objects.filter(board=board, period=period, node__in=fenwick.rank_nodes(score))
+        .values_list('node', 'count')
+    )
+    return fenwick.count_above(nodes, score) + 1, score
+
+
+def top(board, period, limit=20):
+    """
+    [(rank, score, user or snippet)] of a board period, best first.
+
+    Inactive users and hidden or deleted snippets are skipped but keep their
+    place in the ranking until the next rebuild.
+    """
+    model, field = BOARDS[board]
+    rows = model.objects.filter(period=period, score__gt=0).order_by('-score', field)
+    entries, scanned, rank, last_score = [], 0, 0, None
+    while len(entries) < limit:
+        page = list(rows.values_list(field, 'score')[scanned:scanned + limit * 2])
+        if not page:
+            break
+        subjects = _subjects(board, [subject for subject, _ in page])
+        for subject, score in page:
+            scanned += 1
+            if score != last_score:
+                rank, last_score = scanned, score
+            if subject in subjects and len(entries) < limit:
+                entries.append((rank, score, subjects[subject]))
+    return entries
+
+
+def _subjects(board, ids):
+    """{id: user or snippet} of the listable subjects among ``ids``"""
+    if board == 'creators':
+        User = CreatorScore._meta.get_field('user').related_model
+        return User.objects.filter(pk__in=ids, is_active=True).only('username', 'streak_count').in_bulk()
+    snippets = Snippet.objects.filter(is_public=True).only('slug', 'title', 'user')
+    found = {snippet.pk: snippet for snippet in sharding.fetch(snippets, ids)}
+    prefetch_related_objects(list(found.values()), 'user')
+    return found
+
+
+def points(period):
+    """{snippet id: points} earned in a period, counted from the likes and forks"""
+    start, end = period_range(period)
+    earned = Counter()
+    for alias in sharding.databases():
+        likes = Like.objects.using(alias).order_by()
+        forks = Snippet.all_objects.using(alias).filter(forked_from__isnull=False).order_by()
+        if start is not None:
+            likes = likes.filter(created_at__gte=start, created_at__lt=end)
+            forks = forks.filter(created_at__gte=start, created_at__lt=end)
+        for snippet_id, count in likes.values('snippet_id').annotate(n=Count('pk')).values_list('snippet_id', 'n'):
+            earned[snippet_id] += count * LIKE_POINTS
+        for snippet_id, count in forks.values('forked_from_id').annotate(n=Count('pk')).values_list('forked_from_id', 'n'):
+            earned[snippet_id] += count * FORK_POINTS
+    return earned
+
+
+def rebuild(periods=None):
+    """Recompute periods (default: the current week and month, and all time); returns rows written"""
+    written = 0
+    for period in periods or period_keys():
+        earned = points(period)
+        owners = {}
+        for chunk in _chunks(earned):
+            owners.update(SnippetLocation.objects.filter(snippet_id__in=chunk).values_list('snippet_id', 'user_id'))
+        by_creator = Counter()
+        for snippet_id, value in earned.items():
+            if snippet_id in owners:
+                by_creator[owners[snippet_id]] += value
+        by_snippet = {snippet_id: value for snippet_id, value in earned.items() if snippet_id in owners}
+
+        with transaction.atomic():
+            for board, scores in (('creators', by_creator), ('snippets', by_snippet)):
+                model, field = BOARDS[board]
+                model.objects.filter(period=period).delete()
+                model.objects.bulk_create(
+                    [model(period=period, score=score, **{field: subject}) for subject, score in scores.items() if score > 0],
+                    batch_size=1000,
+                )
+                ScoreCount.objects.filter(board=board, period=period).delete()
+                ScoreCount.objects.bulk_create(
+                    [
+                        ScoreCount(board=board, period=period, node=node, count=count)
+                        for node, count in fenwick.build(scores.values()).items()
+                    ],
+                    batch_size=1000,
+                )
+                written += len(scores)
+    return written
@@ -0,0 +1,131 @@
+import random
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from accounts.models import User
+from playground.models import Like, Snippet
+from playground.tasks import adjust_likes
+from . import fenwick, scores
+from .models import CreatorScore, ScoreCount, SnippetScore
+
+
+def brute_rank(all_scores, score):
+    return sum(1 for other in all_scores if other > score) + 1
+
+
+class FenwickTests(SimpleTestCase):
+
+    def assertRanks(self, tree, all_scores, probes):
+        for score in probes:
+            nodes = {node: tree.get(node, 0) for node in fenwick.rank_nodes(score)}
+            self.assertEqual(
+                fenwick.count_above(nodes, score),
+                sum(1 for other in all_scores if other > 0 and other > score),
+                score,
+            )
+
+    def test_counts_match_a_sort_as_scores_move(self):
+        rng = random.Random(48)
+        all_scores = [rng.choice([0, 1, 2, 5, rng.randint(-3, 1000)]) for _ in range(300)]
+        tree = fenwick.build(all_scores)
+        probes = [-1, 0, 1, 2, 3, 5, 999, 1000, fenwick.SIZE, fenwick.SIZE + 5]
+        self.assertRanks(tree, all_scores, probes)
+
+        for _ in range(500):
+            i = rng.randrange(len(all_scores))
+            old, new = all_scores[i], max(all_scores[i] + rng.randint(-3, 3), 0)
+            for node, change in fenwick.moves([(old, new)]).items():
+                tree[node] = tree.get(node, 0) + change
+            all_scores[i] = new
+        self.assertRanks(tree, all_scores, probes + all_scores[:20])
+
+    def test_scores_past_the_top_share_the_last_position(self):
+        tree = fenwick.build([fenwick.SIZE + 1, fenwick.SIZE * 2, 7])
+        nodes = {node: tree.get(node, 0) for node in fenwick.rank_nodes(7)}
+        self.assertEqual(fenwick.count_above(nodes, 7), 2)
+        nodes = {node: tree.get(node, 0) for node in fenwick.rank_nodes(fenwick.SIZE)}
+        self.assertEqual(fenwick.count_above(nodes, fenwick.SIZE), 0)
+
+    def test_lookups_read_few_nodes(self):
+        for score in (1, 12345, fenwick.SIZE - 1, fenwick.SIZE):
+            self.assertLessEqual(len(fenwick.rank_nodes(score)), fenwick.BITS + 2)
+        self.assertEqual(fenwick.moves([(3, 3), (0, -2)]), {})
+
+
+class ScoreTests(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'creator{i}', f'creator{i}@example.com') for i in range(6)]
+        self.snippets = [Snippet.objects.create(user=user, title=f'By {user.username}') for user in self.users]
+        self.now = timezone.now()
+
+    def award(self, *points):
+        """Award each snippet its points now"""
+        scores.award(
+            (snippet.pk, snippet.user_id, self.now, value) for snippet, value in zip(self.snippets, points)
+        )
+
+    def ranks(self, board='creators', period='all'):
+        subjects = self.users if board == 'creators' else self.snippets
+        return [scores.position(board, period, subject.pk)[0] for subject in subjects]
+
+    def test_ranks_match_a_sort_with_ties(self):
+        rng = random.Random(49)
+        totals = [0] * len(self.snippets)
+        for _ in range(20):
+            points = [rng.randint(-1, 3) for _ in self.snippets]
+            self.award(*points)
+            totals = [max(total + value, 0) for total, value in zip(totals, points)]
+            expected = [brute_rank(totals, total) if total > 0 else None for total in totals]
+            for board in scores.BOARDS:
+                self.assertEqual(self.ranks(board), expected)
+                self.assertEqual(self.ranks(board, scores.period_key('week', self.now)), expected)
+
+        # Ties share a rank, and the next one skips past them
+        CreatorScore.objects.all().delete()
+        ScoreCount.objects.all().delete()
+        self.award(5, 3, 3, 1, 0, 5)
+        self.assertEqual(self.ranks(), [1, 3, 3, 5, None, 1])
+        self.assertEqual(
+            [(rank, score) for rank, score, _ in scores.top('creators', 'all')],
+            [(1, 5), (1, 5), (3, 3), (3, 3), (5, 1)],
+        )
+
+    def test_unlikes_from_before_scoring_keep_scores_at_zero(self):
+        self.award(1)
+        self.award(-3)
+        self.assertEqual(scores.position('snippets', 'all', self.snippets[0].pk), (None, 0))
+        self.award(2, 1)
+        self.assertEqual(self.ranks('snippets')[:2], [1, 2])
+
+    def test_likes_award_their_periods(self):
+        last_month = self.now - timedelta(days=40)
+        snippet, fan = self.snippets[0], self.users[1]
+        like = Like.objects.create(user=fan, snippet=snippet)
+        adjust_likes([{'snippet_id': str(snippet.pk), 'delta': 1, 'liked_at': last_month.isoformat()}])
+
+        periods = dict(SnippetScore.objects.filter(snippet=snippet).values_list('period', 'score'))
+        self.assertEqual(periods, dict.fromkeys(scores.period_keys(last_month), scores.LIKE_POINTS))
+        self.assertEqual(scores.position('creators', 'all', snippet.user_id), (1, scores.LIKE_POINTS))
+        self.assertEqual(scores.position('creators', scores.period_key('month'), snippet.user_id)[0], None)
+
+        # Unliking takes the point back from the like's periods
+        like.delete()
+        adjust_likes([{'snippet_id': str(snippet.pk), 'delta': -1, 'liked_at': last_month.isoformat()}])
+        self.assertEqual(set(SnippetScore.objects.values_list('score', flat=True)), {0})
+        self.assertEqual(scores.top('snippets', 'all'), [])
+
+    def test_rebuild_matches_the_awarded_scores(self):
+        for snippet, fan in zip(self.snippets, self.users[1:]):
+            Like.objects.create(user=fan, snippet=snippet)
+            adjust_likes([{'snippet_id': str(snippet.pk), 'delta': 1, 'liked_at': self.now.isoformat()}])
+        Snippet.objects.create(user=self.users[2], title='Fork', forked_from=self.snippets[0])
+        self.award(scores.FORK_POINTS)
+        awarded = sorted(SnippetScore.objects.filter(period='all').values_list('snippet', 'score'))
+        ranks = self.ranks('snippets')
+
+        scores.rebuild(['all'])
+        self.assertEqual(sorted(SnippetScore.objects.filter(period='all').values_list('snippet', 'score')), awarded)
+        self.assertEqual(self.ranks('snippets'), ranks)
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'leaderboards'
+
+urlpatterns = [
+    path('api/leaderboards/<str:board>/', views.leaderboard, name='board'),
+]
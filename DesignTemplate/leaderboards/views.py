@@ -0,0 +1,57 @@
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from playground.models import Snippet
+from . import scores
+
+
+@require_safe
+def leaderboard(request, board):
+    """Top creators or snippets of this week, this month or all time, with a position to look up"""
+    if board not in scores.BOARDS:
+        raise Http404
+    kind = request.GET.get('period', 'week')
+    if kind not in scores.PERIODS:
+        return JsonResponse({'success': False, 'error': 'Period must be week, month or all'}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        limit = 20
+    
+    period = scores.period_key(kind)
+    entries = []
+    for rank, score, subject in scores.top(board, period, limit):
+        if board == 'creators':
+            entries.append({
+                'rank': rank,
+                'score': score,
+                'username': subject.username,
+                'streak': subject.streak_count,
+            })
+        else:
+            entries.append({
+                'rank': rank,
+                'score': score,
+                'slug': subject.slug,
+                'title': subject.title,
+                'username': subject.user.username,
+            })
+    
+    # "Your position": the signed-in creator, or the snippet asked about
+    me = None
+    if board == 'creators' and request.user.is_authenticated:
+        rank, score = scores.position(board, period, request.user.pk)
+        me = {'rank': rank, 'score': score, 'username': request.user.username}
+    elif board == 'snippets' and request.GET.get('snippet'):
+        snippet = get_object_or_404(Snippet, slug=request.GET['snippet'], is_public=True)
+        rank, score = scores.position(board, period, snippet.pk)
+        me = {'rank': rank, 'score': score, 'slug': snippet.slug}
+    
+    return JsonResponse({
+        'success': True,
+        'board': board,
+        'period': period,
+        'entries': entries,
+        'me': me,
+    })
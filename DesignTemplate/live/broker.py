@@ -0,0 +1,171 @@
+"""
+Push channel for live snippet counters and comments.
+
+Views publish small events (``{'counts': {'likes': 1}}``, ``{'comment':
+{...}}``) to a per-snippet channel once their transaction commits. Each
+open Server-Sent Events connection holds a ``Subscription`` that folds
+incoming events together: counter deltas are summed and only the newest
+LIVE_MAX_PENDING_COMMENTS comments are kept, so a slow client costs a fixed
+amount of memory no matter how busy the snippet is.
+
+Coalescing happens once per channel, not per connection: each event loop
+has one ``Hub`` per watched snippet that receives every message, and once
+per LIVE_COALESCE_SECONDS passes the merged result to its subscriptions.
+A burst of N likes on a page with M viewers costs N merges plus M
+deliveries per window, not N * M.
+
+The broker is pluggable through LIVE_BROKER. ``LocalBroker`` delivers
+within this process only, which covers a single ASGI worker; more workers
+need a broker that relays between processes (e.g. over Redis pub/sub) with
+the same ``subscribe``/``publish`` interface.
+"""
+
+import asyncio
+import threading
+from collections import Counter, deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+COALESCE_SECONDS = getattr(settings, 'LIVE_COALESCE_SECONDS', 1.0)
+MAX_PENDING_COMMENTS = getattr(settings, 'LIVE_MAX_PENDING_COMMENTS', 20)
+
+
+class LocalBroker:
+    """In-process pub/sub; publishers may be on any thread"""
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel, callback):
+        """Call ``callback(message)`` for each message on ``channel``; returns an unsubscribe function"""
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(callback)
+
+        def unsubscribe():
+            with self._lock:
+                callbacks = self._channels.get(channel)
+                if callbacks is not None:
+                    callbacks.discard(callback)
+                    if not callbacks:
+                        del self._channels[channel]
+        return unsubscribe
+
+    def publish(self, channel, message):
+        with self._lock:
+            callbacks = list(self._channels.get(channel, ()))
+        for callback in callbacks:
+            callback(message)
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._channels.get(channel, ()))
+            return sum(len(callbacks) for callbacks in self._channels.values())
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'LIVE_BROKER', 'live.broker.LocalBroker'))()
+
+
+def channel_name(snippet_id):
+    return f'snippet:{snippet_id}'
+
+
+def publish(snippet_id, counts=None, comment=None):
+    """Broadcast counter deltas and/or a new comment for a snippet after commit"""
+    message = {}
+    if counts:
+        message['counts'] = counts
+    if comment:
+        message['comment'] = comment
+    broker = get_broker()
+    transaction.on_commit(lambda: broker.publish(channel_name(snippet_id), message))
+
+
+class Hub:
+    """
+    One event loop's view of a channel: merges everything published in a
+    coalescing window and hands the result to each subscription at once
+    """
+
+    def __init__(self, snippet_id, loop):
+        self.key = (loop, snippet_id)
+        self.loop = loop
+        self.subscriptions = set()
+        self.counts = Counter()
+        self.comments = deque(maxlen=MAX_PENDING_COMMENTS)
+        self.flush_handle = None
+        self.unsubscribe = get_broker().subscribe(channel_name(snippet_id), self.deliver)
+
+    def deliver(self, message):
+        # Publishers run on request threads; merge on the hub's loop
+        try:
+            self.loop.call_soon_threadsafe(self._merge, message)
+        except RuntimeError:
+            # The loop closed before the hub unsubscribed
+            pass
+
+    def _merge(self, message):
+        self.counts.update(message.get('counts', {}))
+        if 'comment' in message:
+            self.comments.append(message['comment'])
+        if self.flush_handle is None:
+            self.flush_handle = self.loop.call_later(COALESCE_SECONDS, self._flush)
+
+    def _flush(self):
+        self.flush_handle = None
+        counts = {name: value for name, value in self.counts.items() if value}
+        comments = list(self.comments)
+        self.counts.clear()
+        self.comments.clear()
+        for subscription in self.subscriptions:
+            subscription.push(counts, comments)
+
+    def close(self):
+        self.unsubscribe()
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+
+
+# (loop, snippet_id) -> Hub; only touched from the loop that owns the hub
+_hubs = {}
+
+
+class Subscription:
+    """One connection's updates not yet written to it"""
+
+    __slots__ = ('hub', 'counts', 'comments', 'ready')
+
+    def __init__(self, snippet_id, loop):
+        self.hub = _hubs.get((loop, snippet_id))
+        if self.hub is None:
+            self.hub = _hubs[(loop, snippet_id)] = Hub(snippet_id, loop)
+        self.hub.subscriptions.add(self)
+        self.counts = Counter()
+        self.comments = deque(maxlen=MAX_PENDING_COMMENTS)
+        self.ready = asyncio.Event()
+
+    def push(self, counts, comments):
+        self.counts.update(counts)
+        self.comments.extend(comments)
+        self.ready.set()
+
+    def drain(self):
+        """Return and reset (counts, comments) accumulated since the last drain"""
+        counts = {name: value for name, value in self.counts.items() if value}
+        comments = list(self.comments)
+        self.counts.clear()
+        self.comments.clear()
+        self.ready.clear()
+        return counts, comments
+
+    def close(self):
+        self.hub.subscriptions.discard(self)
+        if not self.hub.subscriptions:
+            self.hub.close()
+            del _hubs[self.hub.key]
@@ -0,0 +1,109 @@
+import asyncio
+import resource
+import ssl
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Hold many idle Server-Sent Events connections open against a running ASGI server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Event stream URL, e.g. http://127.0.0.1:8000/api/events/<slug>/')
+        parser.add_argument('--connections', type=int, default=10000)
+        parser.add_argument('--hold', type=float, default=60, help='Seconds to keep every connection open')
+        parser.add_argument('--rate', type=int, default=1000, help='New connections per second')
+        parser.add_argument('--timeout', type=float, default=10, help='Seconds to wait for response headers')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme not in ('http', 'https'):
+            raise CommandError('Only http:// and https:// URLs are supported')
+        # Every connection is a file descriptor
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = options['connections'] + 100
+        if soft < wanted:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+        stats = asyncio.run(self.run(url, options))
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss >> 10
+        self.stdout.write(
+            f"Connected {stats['connected']}/{options['connections']}, "
+            f"peak open {stats['peak']}, events {stats['events']}, pings {stats['pings']}, "
+            f"median connect {stats['connect_ms']:.1f}ms, client peak RSS {rss}MB"
+        )
+        failures = {key[5:]: value for key, value in stats.items() if key.startswith('fail:')}
+        if failures:
+            self.stdout.write(f'Failures: {failures}')
+
+    async def run(self, url, options):
+        stats = Counter()
+        latencies = []
+        deadline = time.monotonic() + options['connections'] / options['rate'] + options['hold']
+        open_now = 0
+
+        async def connection():
+            nonlocal open_now
+            started = time.monotonic()
+            try:
+                reader, writer = await asyncio.wait_for(self.open(url), options['timeout'])
+                status = await asyncio.wait_for(self.read_headers(reader), options['timeout'])
+            except (OSError, asyncio.TimeoutError) as e:
+                stats[f'fail:{type(e).__name__}'] += 1
+                return
+            if status != 200:
+                stats[f'fail:HTTP {status}'] += 1
+                writer.close()
+                return
+            latencies.append((time.monotonic() - started) * 1000)
+            stats['connected'] += 1
+            open_now += 1
+            stats['peak'] = max(stats['peak'], open_now)
+            try:
+                while (remaining := deadline - time.monotonic()) > 0:
+                    line = await asyncio.wait_for(reader.readline(), remaining)
+                    if not line:
+                        stats['fail:closed by server'] += 1
+                        break
+                    if line.startswith(b'event:'):
+                        stats['events'] += 1
+                    elif line.startswith(b':'):
+                        stats['pings'] += 1
+            except asyncio.TimeoutError:
+                pass
+            except OSError as e:
+                stats[f'fail:{type(e).__name__}'] += 1
+            finally:
+                open_now -= 1
+                writer.close()
+
+        tasks = []
+        for _ in range(options['connections']):
+            tasks.append(asyncio.create_task(connection()))
+            await asyncio.sleep(1 / options['rate'])
+        await asyncio.gather(*tasks)
+        latencies.sort()
+        stats['connect_ms'] = latencies[len(latencies) // 2] if latencies else 0
+        return stats
+
+    async def open(self, url):
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        context = ssl.create_default_context() if url.scheme == 'https' else None
+        reader, writer = await asyncio.open_connection(url.hostname, port, ssl=context)
+        path = url.path + (f'?{url.query}' if url.query else '')
+        writer.write(
+            f'GET {path or "/"} HTTP/1.1\r\nHost: {url.netloc}\r\n'
+            f'Accept: text/event-stream\r\nCache-Control: no-cache\r\n\r\n'.encode('ascii')
+        )
+        await writer.drain()
+        return reader, writer
+
+    async def read_headers(self, reader):
+        status_line = await reader.readline()
+        parts = status_line.split()
+        status = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+        while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        return status
@@ -0,0 +1,88 @@
+"""
+Raw ASGI endpoint for the live event stream, mounted in front of Django in
+asgi.py.
+
+Django's ASGI handler keeps a worker thread (and with it a database
+connection) for each request until its response is finished, so ten
+thousand open streams would mean ten thousand threads. Here the snippet
+lookup borrows the shared sync thread for a moment, and from then on a
+connection is just a coroutine and its ``Subscription``.
+"""
+
+import asyncio
+import re
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from django.http import HttpRequest
+from django.http.cookie import parse_cookie
+
+from playground.models import Snippet
+from .views import event_stream
+
+PATH = re.compile(r'^/api/events/(?P<slug>[-\w]+)/$')
+
+HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    # Stop nginx from buffering the stream
+    (b'x-accel-buffering', b'no'),
+]
+
+
+def find_snippet(slug, cookie):
+    """Primary key of the snippet if the cookie's user may watch it, else None"""
+    close_old_connections()
+    try:
+        snippet = Snippet.objects.only('pk', 'is_public', 'user_id').filter(slug=slug).first()
+        if snippet is None:
+            return None
+        if not snippet.is_public:
+            request = HttpRequest()
+            engine = import_module(settings.SESSION_ENGINE)
+            request.session = engine.SessionStore(parse_cookie(cookie).get(settings.SESSION_COOKIE_NAME))
+            if get_user(request).pk != snippet.user_id:
+                return None
+        return snippet.pk
+    finally:
+        # No request_finished signal fires for this connection
+        close_old_connections()
+
+
+async def application(scope, receive, send):
+    match = PATH.match(scope['path'])
+    cookie = b''.join(value for key, value in scope['headers'] if key == b'cookie').decode('latin-1')
+    snippet_id = await sync_to_async(find_snippet)(match['slug'], cookie)
+    if snippet_id is None:
+        await send({'type': 'http.response.start', 'status': 404, 'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': b'Snippet not found'})
+        return
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': HEADERS})
+    streaming = asyncio.ensure_future(stream(snippet_id, send))
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    await asyncio.wait([streaming, disconnected], return_when=asyncio.FIRST_COMPLETED)
+    streaming.cancel()
+    disconnected.cancel()
+    # Let the stream unsubscribe before the connection is reported closed
+    await asyncio.gather(streaming, disconnected, return_exceptions=True)
+
+
+async def stream(snippet_id, send):
+    events = event_stream(snippet_id)
+    try:
+        async for chunk in events:
+            await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+    except OSError:
+        # The client went away mid-write
+        pass
+    finally:
+        await events.aclose()
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
@@ -0,0 +1,169 @@
+import asyncio
+from unittest import mock
+
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.test import Client, SimpleTestCase, TestCase
+from django.urls import reverse
+
+from accounts.models import User
+from playground.models import Snippet
+from . import broker, stream, views
+
+
+def isolate(test):
+    """A fresh broker, and events coalesced over 10ms instead of a second"""
+    local = broker.LocalBroker()
+    for patch in (
+        mock.patch.object(broker, 'get_broker', return_value=local),
+        mock.patch.object(broker, 'COALESCE_SECONDS', 0.01),
+        mock.patch.object(broker, 'MAX_PENDING_COMMENTS', 3),
+    ):
+        patch.start()
+        test.addCleanup(patch.stop)
+    return local
+
+
+class BrokerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.broker = isolate(self)
+        self.channel = broker.channel_name('s1')
+
+    async def settle(self):
+        await asyncio.sleep(broker.COALESCE_SECONDS * 3)
+
+    async def test_a_window_of_events_reaches_each_connection_merged(self):
+        loop = asyncio.get_running_loop()
+        first, second = broker.Subscription('s1', loop), broker.Subscription('s1', loop)
+        self.assertIs(first.hub, second.hub)
+        # One broker subscription for the channel, however many connections
+        self.assertEqual(self.broker.subscriber_count(self.channel), 1)
+
+        for i in range(5):
+            self.broker.publish(self.channel, {'counts': {'likes': 1, 'views': 2}, 'comment': {'n': i}})
+        self.broker.publish(self.channel, {'counts': {'likes': -5}})
+        self.broker.publish(broker.channel_name('s2'), {'counts': {'likes': 1}})
+        await asyncio.wait_for(first.ready.wait(), 1)
+
+        # Likes cancelled out; only the newest comments are kept
+        for subscription in (first, second):
+            self.assertEqual(subscription.drain(), ({'views': 10}, [{'n': 2}, {'n': 3}, {'n': 4}]))
+            self.assertFalse(subscription.ready.is_set())
+            self.assertEqual(subscription.drain(), ({}, []))
+
+    async def test_a_slow_connection_keeps_folding_windows_together(self):
+        subscription = broker.Subscription('s1', asyncio.get_running_loop())
+        for i in range(4):
+            self.broker.publish(self.channel, {'counts': {'comments': 1}, 'comment': {'n': i}})
+            await self.settle()
+        self.assertEqual(subscription.drain(), ({'comments': 4}, [{'n': 1}, {'n': 2}, {'n': 3}]))
+
+    async def test_the_last_connection_closing_drops_the_hub(self):
+        loop = asyncio.get_running_loop()
+        first, second = broker.Subscription('s1', loop), broker.Subscription('s1', loop)
+        hub = first.hub
+        first.close()
+        self.assertIn(hub.key, broker._hubs)
+
+        # A pending window is dropped with the hub
+        self.broker.publish(self.channel, {'counts': {'likes': 1}})
+        await asyncio.sleep(0)
+        self.assertIsNotNone(hub.flush_handle)
+        second.close()
+        self.assertNotIn(hub.key, broker._hubs)
+        self.assertEqual(self.broker.subscriber_count(), 0)
+        self.assertTrue(hub.flush_handle.cancelled())
+        await self.settle()
+        self.assertEqual(second.drain(), ({}, []))
+
+        # Later connections start a new hub
+        third = broker.Subscription('s1', loop)
+        self.assertIsNot(third.hub, hub)
+        third.close()
+
+
+class PublishTests(TestCase):
+
+    def test_events_are_sent_once_the_transaction_commits(self):
+        local = isolate(self)
+        received = []
+        local.subscribe(broker.channel_name('s1'), received.append)
+        with self.captureOnCommitCallbacks(execute=True):
+            broker.publish('s1', counts={'likes': 1}, comment={'text': 'Hi'})
+            broker.publish('s1')
+            self.assertEqual(received, [])
+        self.assertEqual(received, [{'counts': {'likes': 1}, 'comment': {'text': 'Hi'}}, {}])
+
+
+class StreamTests(TestCase):
+
+    def setUp(self):
+        self.broker = isolate(self)
+        self.owner = User.objects.create_user('streamer', 'streamer@example.com')
+        self.snippet = Snippet.objects.create(user=self.owner, title='Live')
+        self.private = Snippet.objects.create(user=self.owner, title='Secret', is_public=False)
+        client = Client()
+        client.force_login(self.owner)
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    async def connect(self, snippet, cookie=''):
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': f'/api/events/{snippet.slug}/',
+            'headers': [(b'cookie', cookie.encode())] if cookie else [],
+        }
+        connection = ApplicationCommunicator(stream.application, scope)
+        await connection.send_input({'type': 'http.request', 'body': b''})
+        start = await connection.receive_output(timeout=1)
+        return connection, start
+
+    async def body(self, connection):
+        return (await connection.receive_output(timeout=1))['body'].decode()
+
+    async def test_events_stream_until_the_client_disconnects(self):
+        connection, start = await self.connect(self.snippet)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream; charset=utf-8'), start['headers'])
+        self.assertEqual(await self.body(connection), 'retry: 5000\n\n')
+
+        channel = broker.channel_name(self.snippet.pk)
+        self.assertEqual(self.broker.subscriber_count(channel), 1)
+        for delta in (1, 1, 1):
+            self.broker.publish(channel, {'counts': {'likes': delta}})
+        self.broker.publish(channel, {'counts': {'comments': 1}, 'comment': {'text': 'Nice'}})
+        self.assertEqual(await self.body(connection), 'event: counts\ndata: {"likes":3,"comments":1}\n\n')
+        self.assertEqual(await self.body(connection), 'event: comment\ndata: {"text":"Nice"}\n\n')
+
+        await connection.send_input({'type': 'http.disconnect'})
+        await connection.wait(timeout=1)
+        self.assertEqual(self.broker.subscriber_count(), 0)
+        self.assertEqual(broker._hubs, {})
+
+    @mock.patch.object(views, 'HEARTBEAT_SECONDS', 0.01)
+    async def test_idle_streams_are_kept_alive(self):
+        connection, _ = await self.connect(self.snippet)
+        await self.body(connection)
+        self.assertEqual(await self.body(connection), ': ping\n\n')
+        await connection.send_input({'type': 'http.disconnect'})
+        await connection.wait(timeout=1)
+
+    async def test_private_snippets_stream_to_their_owner_only(self):
+        for snippet, cookie, status in (
+            (self.private, '', 404),
+            (self.private, 'sessionid=forged', 404),
+            (self.private, self.cookie, 200),
+        ):
+            with self.subTest(snippet=snippet.title, cookie=cookie):
+                connection, start = await self.connect(snippet, cookie)
+                self.assertEqual(start['status'], status)
+                await connection.send_input({'type': 'http.disconnect'})
+                await connection.wait(timeout=1)
+        self.assertEqual((await self.connect(Snippet(slug='no-such-slug')))[1]['status'], 404)
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+    def test_wsgi_workers_answer_no_content(self):
+        # EventSource doesn't reconnect after a 204
+        response = self.client.get(reverse('live:snippet_events', args=[self.snippet.slug]))
+        self.assertEqual((response.status_code, response.content), (204, b''))
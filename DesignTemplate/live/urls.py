@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'live'
+
+urlpatterns = [
+    path('api/events/<slug:slug>/', views.snippet_events, name='snippet_events'),
+]
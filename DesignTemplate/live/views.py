@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from .broker import Subscription
+
+HEARTBEAT_SECONDS = getattr(settings, 'LIVE_HEARTBEAT_SECONDS', 25)
+RETRY_MS = 5000
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+async def event_stream(snippet_id):
+    """Yield coalesced SSE events for a snippet until the client disconnects"""
+    subscription = Subscription(snippet_id, asyncio.get_running_loop())
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        while True:
+            try:
+                await asyncio.wait_for(subscription.ready.wait(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield ': ping\n\n'
+                continue
+            counts, comments = subscription.drain()
+            if counts:
+                yield format_event('counts', counts)
+            for comment in comments:
+                yield format_event('comment', comment)
+    finally:
+        subscription.close()
+
+
+def snippet_events(request, slug):
+    """
+    Live counter and comment stream for a snippet (Server-Sent Events).
+
+    Under ASGI this path is served by live.stream before it reaches Django.
+    Anything that gets here is a WSGI worker, which would be tied up for the
+    life of the connection, so answer 204: EventSource won't reconnect.
+    """
+    return HttpResponse(status=204)
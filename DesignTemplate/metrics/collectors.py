@@ -0,0 +1,22 @@
+"""Gauges computed when /metrics is scraped"""
+
+from django.db.models import Count
+
+from taskqueue.models import Task
+from .registry import collector
+
+
+@collector
+def task_queue():
+    rows = (
+        Task.objects.filter(status__in=['queued', 'running'])
+        .values_list('name', 'status')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    return [(
+        'taskqueue_tasks',
+        'gauge',
+        'Tasks waiting or running, by task name',
+        [({'name': name, 'status': status}, count) for name, status, count in rows],
+    )]
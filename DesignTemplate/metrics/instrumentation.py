@@ -0,0 +1,42 @@
+"""Request and database instrumentation feeding metrics.registry"""
+
+import time
+
+from .registry import DB_CONNECTIONS, DB_QUERIES, DB_QUERY_SECONDS, REQUEST_DURATION, REQUESTS
+
+
+class MetricsMiddleware:
+    """Time every request and count responses, labelled by URL name"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        # URL names, not paths, keep the number of label values bounded
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        method = request.method if request.method in KNOWN_METHODS else 'other'
+        REQUEST_DURATION.observe(elapsed, view=view, method=method)
+        REQUESTS.inc(view=view, method=method, status=response.status_code)
+        return response
+
+
+KNOWN_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+def instrument_connection(sender, connection, **kwargs):
+    DB_CONNECTIONS.inc(alias=connection.alias)
+    connection.execute_wrappers.append(count_queries)
+
+
+def count_queries(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        alias = context['connection'].alias
+        DB_QUERIES.inc(alias=alias)
+        DB_QUERY_SECONDS.inc(time.perf_counter() - started, alias=alias)
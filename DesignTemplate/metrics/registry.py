@@ -0,0 +1,254 @@
+"""
+Counters and histograms in Prometheus text format, safe for pre-forked
+workers.
+
+Each process keeps its samples in memory; updating one is a dict update
+under a lock. When METRICS_DIR is set, every process also writes its
+cumulative samples to ``<METRICS_DIR>/<pid>-<start>.json`` at most every
+METRICS_FLUSH_SECONDS (and at exit), and ``/metrics`` adds up the files of
+all processes, so whichever worker answers the scrape reports the totals.
+Files of processes that have exited are folded into ``archived.json`` so
+counters never go backwards when workers are recycled. Without METRICS_DIR
+each process reports only its own samples.
+
+All stored samples are additive (counter values, per-bucket histogram
+counts and sums); gauges are computed at scrape time by collectors.
+"""
+
+import atexit
+import bisect
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+
+from django.conf import settings
+
+METRICS_DIR = getattr(settings, 'METRICS_DIR', None)
+FLUSH_SECONDS = getattr(settings, 'METRICS_FLUSH_SECONDS', 5)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+ARCHIVE = 'archived.json'
+
+_lock = threading.Lock()
+# (metric name, label values) -> list of additive values
+_samples = {}
+_metrics = {}
+_collectors = []
+_file_name = f'{os.getpid()}-{int(time.time() * 1000)}.json'
+_flushed_at = time.monotonic()
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics[name] = self
+
+    def _key(self, labels):
+        return self.name, tuple(str(labels[label]) for label in self.labelnames)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            values = _samples.get(key)
+            if values is None:
+                values = _samples[key] = [0]
+            values[0] += amount
+        _maybe_flush()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # The last slot counts values above every bucket (+Inf), then the sum
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            values = _samples.get(key)
+            if values is None:
+                values = _samples[key] = [0] * (len(self.buckets) + 2)
+            values[index] += 1
+            values[-1] += value
+        _maybe_flush()
+
+
+def collector(func):
+    """Register ``func() -> [(name, kind, documentation, [(labels dict, value)])]`` for scrape time"""
+    _collectors.append(func)
+    return func
+
+
+def _maybe_flush():
+    if METRICS_DIR and time.monotonic() - _flushed_at > FLUSH_SECONDS:
+        flush()
+
+
+def _snapshot():
+    with _lock:
+        return [[name, list(labels), list(values)] for (name, labels), values in _samples.items()]
+
+
+def flush():
+    """Write this process's samples to its file in METRICS_DIR"""
+    global _flushed_at
+    _flushed_at = time.monotonic()
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, _file_name)
+    temp = f'{path}.{threading.get_ident()}.tmp'
+    with open(temp, 'w') as f:
+        json.dump(_snapshot(), f, separators=(',', ':'))
+    os.replace(temp, path)
+
+
+def _reset_after_fork():
+    # A forked worker starts from zero under its own file; the parent reports what it counted
+    global _file_name, _flushed_at, _lock
+    _lock = threading.Lock()
+    _samples.clear()
+    _file_name = f'{os.getpid()}-{int(time.time() * 1000)}.json'
+    _flushed_at = time.monotonic()
+
+
+atexit.register(flush)
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _merge(total, rows):
+    for name, labels, values in rows:
+        key = name, tuple(labels)
+        current = total.get(key)
+        if current is None:
+            total[key] = list(values)
+        else:
+            for i, value in enumerate(values):
+                current[i] += value
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return []
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def aggregate():
+    """Samples of every process (or just this one without METRICS_DIR)"""
+    if not METRICS_DIR:
+        total = {}
+        _merge(total, _snapshot())
+        return total
+    flush()
+    with open(os.path.join(METRICS_DIR, '.lock'), 'w') as lock:
+        # One scrape at a time, so no file is counted both before and after archiving
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive_path = os.path.join(METRICS_DIR, ARCHIVE)
+        archived = {}
+        _merge(archived, _load(archive_path))
+        total = {key: list(values) for key, values in archived.items()}
+        dead = []
+        for entry in os.scandir(METRICS_DIR):
+            if not entry.name.endswith('.json') or entry.name == ARCHIVE:
+                continue
+            rows = _load(entry.path)
+            _merge(total, rows)
+            if not _alive(int(entry.name.split('-', 1)[0])):
+                _merge(archived, rows)
+                dead.append(entry.path)
+        if dead:
+            temp = archive_path + '.tmp'
+            with open(temp, 'w') as f:
+                json.dump([[name, list(labels), values] for (name, labels), values in archived.items()], f)
+            os.replace(temp, archive_path)
+            for path in dead:
+                os.remove(path)
+    return total
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    samples = aggregate()
+    by_metric = {}
+    for (name, labels), values in samples.items():
+        by_metric.setdefault(name, []).append((labels, values))
+
+    lines = []
+    for name, metric in sorted(_metrics.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for labels, values in sorted(by_metric.get(name, ())):
+            pairs = list(zip(metric.labelnames, labels))
+            if metric.kind == 'counter':
+                lines.append(f'{name}{_labels(pairs)} {_number(values[0])}')
+                continue
+            cumulative = 0
+            for bound, count in zip((*metric.buckets, math.inf), values):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(pairs + [("le", _number(bound))])} {_number(cumulative)}')
+            lines.append(f'{name}_sum{_labels(pairs)} {_number(values[-1])}')
+            lines.append(f'{name}_count{_labels(pairs)} {_number(cumulative)}')
+    for func in _collectors:
+        for name, kind, documentation, samples in func():
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{_labels(sorted(labels.items()))} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time spent handling requests, by URL name', ['view', 'method']
+)
+REQUESTS = Counter('http_requests_total', 'Responses sent, by URL name and status code', ['view', 'method', 'status'])
+DB_QUERIES = Counter('db_queries_total', 'Database queries executed', ['alias'])
+DB_QUERY_SECONDS = Counter('db_query_seconds_total', 'Time spent in database queries', ['alias'])
+DB_CONNECTIONS = Counter('db_connections_opened_total', 'Database connections opened', ['alias'])
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups, by cache and result (hit or miss)', ['cache', 'result'])
+EVENTS = Counter(
+    'playground_events_total', 'Snippet views, likes, unlikes, forks, saves, autosaves, comments and deletes', ['event']
+)
@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from taskqueue.models import Task
+from . import registry, views
+
+
+class RegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        # Metrics made here stay out of the real registry
+        for patch in (
+            mock.patch.dict(registry._metrics, clear=True),
+            mock.patch.dict(registry._samples, clear=True),
+            mock.patch.object(registry, '_collectors', []),
+            mock.patch.object(registry, 'METRICS_DIR', None),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.hits = registry.Counter('hits_total', 'Hits, by page', ['page'])
+        self.latency = registry.Histogram('latency_seconds', 'Latency', ['page'], buckets=(0.1, 1))
+
+    def test_counters_and_histograms_render_in_the_exposition_format(self):
+        self.hits.inc(page='home')
+        self.hits.inc(2, page='a "quoted"\nname')
+        for value in (0.05, 0.5, 0.5, 3):
+            self.latency.observe(value, page='home')
+
+        self.assertEqual(registry.render(), '\n'.join([
+            '# HELP hits_total Hits, by page',
+            '# TYPE hits_total counter',
+            'hits_total{page="a \\"quoted\\"\\nname"} 2',
+            'hits_total{page="home"} 1',
+            '# HELP latency_seconds Latency',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{page="home",le="0.1"} 1',
+            'latency_seconds_bucket{page="home",le="1"} 3',
+            'latency_seconds_bucket{page="home",le="+Inf"} 4',
+            'latency_seconds_sum{page="home"} 4.05',
+            'latency_seconds_count{page="home"} 4',
+        ]) + '\n')
+
+    def test_collectors_add_gauges_at_scrape_time(self):
+        registry.collector(lambda: [('queue_depth', 'gauge', 'Waiting', [({'name': 'x'}, 3), ({}, 0.5)])])
+        self.assertIn('# TYPE queue_depth gauge\nqueue_depth{name="x"} 3\nqueue_depth 0.5\n', registry.render())
+
+    def test_processes_are_added_up_and_exited_ones_archived(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        patch = mock.patch.object(registry, 'METRICS_DIR', directory)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        def write(name, hits):
+            with open(os.path.join(directory, name), 'w') as f:
+                json.dump([['hits_total', ['home'], [hits]]], f)
+
+        # Another live worker, and one that has exited
+        write(f'{os.getpid()}-1.json', 10)
+        write('999999999-1.json', 100)
+        self.hits.inc(page='home')
+
+        for _ in range(2):
+            self.assertEqual(registry.aggregate()[('hits_total', ('home',))], [111])
+        self.assertFalse(os.path.exists(os.path.join(directory, '999999999-1.json')))
+        with open(os.path.join(directory, registry.ARCHIVE)) as f:
+            self.assertEqual(json.load(f), [['hits_total', ['home'], [100]]])
+
+
+class ScrapeTests(TestCase):
+
+    def scrape(self, **headers):
+        return self.client.get('/metrics', headers=headers).status_code
+
+    def test_allowed_addresses_scrape_directly(self):
+        Task.objects.create(name='playground.record_view')
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn('taskqueue_tasks{name="playground.record_view",status="queued"} 1', response.content.decode())
+        with mock.patch.object(views, 'ALLOWED_IPS', ['10.0.0.1']):
+            self.assertEqual(self.scrape(), 403)
+        with mock.patch.object(views, 'ALLOWED_IPS', []):
+            self.assertEqual(self.scrape(x_forwarded_for='203.0.113.9'), 200)
+
+    def test_requests_through_a_proxy_are_not_trusted_by_address(self):
+        self.assertEqual(self.scrape(x_forwarded_for='203.0.113.9'), 403)
+        self.assertEqual(self.scrape(x_forwarded_for='127.0.0.1'), 403)
+
+    def test_a_configured_token_is_required(self):
+        with mock.patch.object(views, 'TOKEN', 's3cret'):
+            self.assertEqual(self.scrape(), 403)
+            self.assertEqual(self.scrape(authorization='Bearer wrong'), 403)
+            self.assertEqual(self.scrape(authorization='Basic s3cret'), 403)
+            self.assertEqual(self.scrape(authorization='Bearer s3cret', x_forwarded_for='203.0.113.9'), 200)
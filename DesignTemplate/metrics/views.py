@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from . import registry
+
+TOKEN = getattr(settings, 'METRICS_TOKEN', None)
+ALLOWED_IPS = getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+
+
+def allowed(request):
+    """A scrape with the bearer token, or without one configured, straight from an allowed address"""
+    if TOKEN:
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and constant_time_compare(token, TOKEN)
+    if not ALLOWED_IPS:
+        return True
+    # Behind a reverse proxy REMOTE_ADDR is the proxy's, whoever the client is
+    if 'X-Forwarded-For' in request.headers:
+        return False
+    return request.META.get('REMOTE_ADDR') in ALLOWED_IPS
+
+
+def metrics(request):
+    """Prometheus scrape endpoint"""
+    if not allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,26 @@
+from django.contrib import admin
+from playground.admin_performance import LargeTableAdmin
+from .models import Inbox, Notification
+
+
+@admin.register(Notification)
+class NotificationAdmin(LargeTableAdmin):
+    """Admin for coalesced notifications"""
+    # Snippets may live on another database, so they're shown by id
+    list_display = ['recipient', 'verb', 'snippet_id', 'count', 'actor', 'updated_at', 'read_at']
+    list_select_related = ['recipient', 'actor']
+    list_filter = ['verb']
+    raw_id_fields = ['recipient', 'snippet', 'actor']
+    search_fields = ['recipient__username']
+    search_help_text = 'Exact username'
+    sortable_by = []
+    keyset_field = 'updated_at'
+
+
+@admin.register(Inbox)
+class InboxAdmin(admin.ModelAdmin):
+    """Admin for unread counts and digest settings"""
+    list_display = ['user', 'unread', 'notified_at', 'digested_at', 'email_digest']
+    list_filter = ['email_digest']
+    search_fields = ['user__username']
+    raw_id_fields = ['user']
@@ -0,0 +1,102 @@
+"""
+Email digests of new notifications.
+
+``send_digests`` emails each user whose inbox has had notifications since
+their last digest, at most every NOTIFICATION_DIGEST_HOURS. Inboxes are
+walked in primary key order in batches; each batch costs one query for the
+users, one for their unread notifications, one per shard for the snippet
+titles and one UPDATE moving the digest bookmarks, and its messages go to
+the email backend over a single connection.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .inbox import describe, with_snippets
+from .models import Inbox, Notification
+
+DIGEST_HOURS = getattr(settings, 'NOTIFICATION_DIGEST_HOURS', 24)
+DIGEST_ITEMS = getattr(settings, 'NOTIFICATION_DIGEST_ITEMS', 10)
+SITE_URL = getattr(settings, 'NOTIFICATION_SITE_URL', 'http://localhost:8000').rstrip('/')
+BATCH_SIZE = 500
+
+
+def due(now):
+    """Inboxes with notifications newer than their last digest, which was long enough ago"""
+    return Inbox.objects.filter(email_digest=True, notified_at__isnull=False).filter(
+        Q(digested_at__isnull=True)
+        | Q(digested_at__lte=now - timedelta(hours=DIGEST_HOURS), notified_at__gt=F('digested_at'))
+    )
+
+
+def build(user, since, notifications):
+    """The digest EmailMessage for ``user``, from their [(notification, snippet)] since ``since``"""
+    shown = notifications[:DIGEST_ITEMS]
+    context = {
+        'user': user,
+        'since': since,
+        'items': [
+            {'text': describe(notification, snippet.title), 'url': SITE_URL + snippet.get_absolute_url()}
+            for notification, snippet in shown
+        ],
+        'more': len(notifications) - len(shown),
+        'site_url': SITE_URL,
+    }
+    count = len(notifications)
+    subject = f'{count} new notification{"s" if count != 1 else ""} on your snippets'
+    body = render_to_string('notifications/digest.txt', context)
+    return mail.EmailMessage(subject, body, to=[user.email])
+
+
+def send_batch(inboxes, now, connection, dry_run=False):
+    """Email the digests of a batch of due inboxes; returns (digests, notifications) sent"""
+    since = {inbox.user_id: inbox.digested_at for inbox in inboxes}
+    users = (
+        get_user_model().objects.filter(pk__in=list(since), is_active=True)
+        .exclude(email='').only('username', 'email').in_bulk()
+    )
+    oldest = min((when for when in since.values() if when), default=None)
+    rows = Notification.objects.filter(
+        recipient_id__in=list(users), read_at__isnull=True, updated_at__lte=now
+    ).select_related('actor').order_by('recipient_id', '-updated_at', '-id')
+    if oldest and all(since.values()):
+        rows = rows.filter(updated_at__gt=oldest)
+
+    per_user = {}
+    for notification, snippet in with_snippets(list(rows)):
+        after = since[notification.recipient_id]
+        if after is None or notification.updated_at > after:
+            per_user.setdefault(notification.recipient_id, []).append((notification, snippet))
+
+    messages = [build(users[user_id], since[user_id], items) for user_id, items in per_user.items()]
+    if not dry_run:
+        if messages:
+            connection.send_messages(messages)
+        # Bookmarks move for inboxes with nothing to send too, so they aren't due again
+        Inbox.objects.filter(user_id__in=list(since)).update(digested_at=now)
+    return len(messages), sum(len(items) for items in per_user.values())
+
+
+def send_digests(batch_size=BATCH_SIZE, dry_run=False, now=None):
+    """Email every due digest; returns (digests, notifications) sent"""
+    now = now or timezone.now()
+    inboxes = due(now).order_by('user_id').only('user_id', 'digested_at')
+    sent = notified = 0
+    last_id = 0
+    connection = mail.get_connection()
+    with connection:
+        while True:
+            batch = list(inboxes.filter(user_id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            digests, items = send_batch(batch, now, connection, dry_run)
+            sent += digests
+            notified += items
+            last_id = batch[-1].user_id
+    return sent, notified
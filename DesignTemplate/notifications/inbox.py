@@ -0,0 +1,199 @@
+"""
+Notifications for snippet owners: likes, forks and comments.
+
+``notify`` queues a compact event from the request and the task worker
+delivers events in batches. Events of one kind on one snippet are coalesced
+into a single unread Notification ("alice and 11 others liked X") that
+counts up until it's read; the next event after that starts a new one. A
+partial unique index on unread (recipient, verb, snippet) makes delivery an
+upsert: insert-or-ignore, a locked read and one bulk update per batch.
+
+Each user's Inbox row holds their unread count, adjusted as notifications
+are created and read, so the badge is a primary key lookup instead of a
+COUNT(*). Both paths lock the Inbox row before any Notification row, which
+keeps "mark all read" exact while deliveries are running. A notification
+purged with its snippet isn't taken off the count; marking everything read
+resets it.
+"""
+
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from playground import sharding
+from playground.models import Snippet
+from taskqueue.queue import enqueue
+from .models import Inbox, Notification
+
+PAGE_SIZE = 20
+DELIVER_CHUNK = 500
+
+PHRASES = {
+    'like': 'liked',
+    'fork': 'forked',
+    'comment': 'commented on',
+}
+
+
+def notify(verb, snippet, actor):
+    """Queue a notification for the owner of ``snippet``; nobody is notified of their own actions"""
+    if snippet.user_id == actor.pk:
+        return
+    enqueue('notifications.deliver', {
+        'verb': verb,
+        'snippet_id': str(snippet.pk),
+        'recipient_id': snippet.user_id,
+        'actor_id': actor.pk,
+    })
+
+
+def _chunks(items, size=DELIVER_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def deliver(events):
+    """Add (verb, snippet id, recipient id, actor id) events to notifications; returns how many were new"""
+    # {(recipient, verb, snippet): [events, last actor]}
+    grouped = {}
+    for verb, snippet_id, recipient_id, actor_id in events:
+        key = (recipient_id, verb, str(snippet_id))
+        grouped.setdefault(key, [0, None])
+        grouped[key][0] += 1
+        grouped[key][1] = actor_id
+    created = 0
+    for chunk in _chunks(sorted(grouped)):
+        with transaction.atomic():
+            created += _upsert({key: grouped[key] for key in chunk})
+    return created
+
+
+def _upsert(grouped):
+    now = timezone.now()
+    stamp = connections[router.db_for_write(Inbox)].ops.adapt_datetimefield_value(now)
+    # Inboxes are locked first, in key order, like in mark_read
+    recipients = sorted({recipient_id for recipient_id, _, _ in grouped})
+    inboxes = _lock_or_create(
+        Inbox.objects.filter(user_id__in=recipients).order_by('user_id').values_list('user_id', flat=True),
+        recipients,
+        lambda user_id: Inbox(user_id=user_id),
+    )
+
+    rows = Notification.objects.filter(read_at__isnull=True).values_list(
+        'recipient_id', 'verb', 'snippet_id', 'id', 'count'
+    )
+    found = {}
+    for recipient_id, verb, snippet_id, row_id, count in _lock_or_create(
+        rows.filter(snippet_id__in={snippet_id for _, _, snippet_id in grouped}),
+        list(grouped),
+        lambda key: Notification(recipient_id=key[0], verb=key[1], snippet_id=key[2]),
+        key=lambda row: (row[0], row[1], str(row[2])),
+    ):
+        found[recipient_id, verb, str(snippet_id)] = (row_id, count)
+
+    changed, new = [], defaultdict(int)
+    for key, (events, actor_id) in grouped.items():
+        if key not in found:
+            continue
+        row_id, count = found[key]
+        if not count:
+            new[key[0]] += 1
+        changed.append((events, actor_id, stamp, row_id))
+    _update_many(Notification, 'count = count + %s, actor_id = %s, updated_at = %s', 'id', changed)
+    _update_many(
+        Inbox, 'unread = unread + %s, notified_at = %s', 'user_id',
+        [(new[user_id], stamp, user_id) for user_id in inboxes],
+    )
+    return sum(new.values())
+
+
+def _lock_or_create(rows, keys, make, key=lambda row: row):
+    """Lock ``rows`` for update, inserting rows for the ``keys`` none of them has first; returns the rows"""
+    rows = rows.select_for_update()
+    locked = list(rows)
+    present = {key(row) for row in locked}
+    missing = [k for k in keys if k not in present]
+    if missing:
+        rows.model.objects.bulk_create([make(k) for k in missing], ignore_conflicts=True)
+        locked = list(rows.all())
+    return locked
+
+
+def _update_many(model, assignments, key, params):
+    """One UPDATE statement run for each parameter row; bulk_update's CASE expressions cost far more"""
+    if not params:
+        return
+    connection = connections[router.db_for_write(model)]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(f'UPDATE {table} SET {assignments} WHERE {connection.ops.quote_name(key)} = %s', params)
+
+
+def unread_count(user):
+    inbox = Inbox.objects.filter(user=user).values_list('unread', flat=True).first()
+    return max(inbox or 0, 0)
+
+
+def mark_read(user, ids=None):
+    """Mark the user's notifications ``ids`` (default: all) read; returns how many were unread"""
+    now = timezone.now()
+    with transaction.atomic():
+        inbox = Inbox.objects.select_for_update().filter(user=user).first()
+        unread = Notification.objects.filter(recipient=user, read_at__isnull=True)
+        if ids is not None:
+            unread = unread.filter(pk__in=ids)
+        marked = unread.update(read_at=now)
+        if inbox:
+            inbox.unread = 0 if ids is None else max(inbox.unread - marked, 0)
+            inbox.save(update_fields=['unread'])
+    return marked
+
+
+def describe(notification, title):
+    """'alice and 11 others liked “Title”'"""
+    actor = notification.actor
+    who = actor.username if actor and actor.is_active else 'Someone'
+    others = notification.count - 1
+    if others > 0:
+        who = f'{who} and {others} other{"s" if others > 1 else ""}'
+    return f'{who} {PHRASES[notification.verb]} “{title}”'
+
+
+def with_snippets(notifications):
+    """[(notification, snippet)] with the snippets loaded from their shards; deleted ones are left out"""
+    snippets = Snippet.objects.only('slug', 'title', 'user')
+    found = {snippet.pk: snippet for snippet in sharding.fetch(snippets, {n.snippet_id for n in notifications})}
+    return [(n, found[n.snippet_id]) for n in notifications if n.snippet_id in found]
+
+
+def encode_cursor(notification):
+    return f'{notification.updated_at.isoformat()}|{notification.pk}'
+
+
+def decode_cursor(cursor):
+    value, sep, pk = (cursor or '').rpartition('|')
+    position = parse_datetime(value) if sep else None
+    if position is None:
+        return None
+    try:
+        return position, Notification._meta.pk.to_python(pk)
+    except ValidationError:
+        return None
+
+
+def read_page(user, cursor=None, limit=PAGE_SIZE):
+    """A page of ``user``'s notifications, newest first: ([(notification, snippet)], next cursor or None)"""
+    rows = Notification.objects.filter(recipient=user).select_related('actor').order_by('-updated_at', '-id')
+    cursor = decode_cursor(cursor)
+    if cursor is not None:
+        position, pk = cursor
+        # The redundant upper bound lets the database range-scan the index
+        rows = rows.filter(Q(updated_at__lt=position) | Q(updated_at=position, id__lt=pk), updated_at__lte=position)
+    rows = list(rows[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return with_snippets(rows[:limit]), next_cursor
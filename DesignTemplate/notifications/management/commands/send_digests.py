@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications import digests
+
+
+class Command(BaseCommand):
+    help = 'Email digests of new notifications to the users due one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=digests.BATCH_SIZE, help='Users per batch')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Build the digests without sending them or moving the bookmarks'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        sent, items = digests.send_digests(options['batch_size'], options['dry_run'])
+        elapsed = time.monotonic() - started
+        verb = 'Built' if options['dry_run'] else 'Sent'
+        self.stdout.write(f'{verb} {sent} digests ({items} notifications) in {elapsed:.2f}s')
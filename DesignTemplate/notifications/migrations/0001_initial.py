@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0006_user_shard'),
+        ('playground', '0008_snippet_location'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Inbox',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='inbox', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.IntegerField(default=0, help_text='Unread notifications')),
+                ('notified_at', models.DateTimeField(blank=True, help_text='When a notification last arrived', null=True)),
+                ('digested_at', models.DateTimeField(blank=True, help_text='When the last email digest was sent', null=True)),
+                ('email_digest', models.BooleanField(default=True, help_text='Email a digest of new notifications')),
+            ],
+            options={
+                'verbose_name': 'Inbox',
+                'verbose_name_plural': 'Inboxes',
+            },
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verb', models.CharField(choices=[('like', 'Like'), ('fork', 'Fork'), ('comment', 'Comment')], max_length=10)),
+                ('count', models.IntegerField(default=0, help_text='Events coalesced into this notification')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, help_text='When the latest event arrived; the sort key')),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('actor', models.ForeignKey(blank=True, help_text='Whoever acted last', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+                ('snippet', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='playground.snippet')),
+            ],
+            options={
+                'verbose_name': 'Notification',
+                'verbose_name_plural': 'Notifications',
+                'indexes': [models.Index(fields=['recipient', '-updated_at', '-id'], name='notificatio_recipie_d62bbf_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('read_at__isnull', True)), fields=('recipient', 'verb', 'snippet'), name='notification_unread_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from playground.models import Snippet
+
+
+class Notification(models.Model):
+    """Likes, forks or comments on one of a user's snippets, coalesced until read"""
+    
+    VERB_CHOICES = [
+        ('like', 'Like'),
+        ('fork', 'Fork'),
+        ('comment', 'Comment'),
+    ]
+    
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
+    verb = models.CharField(max_length=10, choices=VERB_CHOICES)
+    snippet = models.ForeignKey(Snippet, on_delete=models.CASCADE, related_name='+', db_constraint=False)  # Sharded
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+        help_text="Whoever acted last"
+    )
+    count = models.IntegerField(default=0, help_text="Events coalesced into this notification")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(default=timezone.now, help_text="When the latest event arrived; the sort key")
+    read_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            # New events are added to the one unread notification of their kind
+            models.UniqueConstraint(
+                fields=['recipient', 'verb', 'snippet'],
+                condition=models.Q(read_at__isnull=True),
+                name='notification_unread_uniq',
+            ),
+        ]
+        indexes = [
+            # A page of notifications (and a digest's) is one range scan of this index
+            models.Index(fields=['recipient', '-updated_at', '-id']),
+        ]
+        verbose_name = 'Notification'
+        verbose_name_plural = 'Notifications'
+    
+    def __str__(self):
+        return f"{self.count} {self.verb} on {self.snippet_id} for {self.recipient_id}"
+
+
+class Inbox(models.Model):
+    """A user's unread notification count and digest bookmark, kept so neither needs a COUNT(*)"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='inbox')
+    unread = models.IntegerField(default=0, help_text="Unread notifications")
+    notified_at = models.DateTimeField(null=True, blank=True, help_text="When a notification last arrived")
+    digested_at = models.DateTimeField(null=True, blank=True, help_text="When the last email digest was sent")
+    email_digest = models.BooleanField(default=True, help_text="Email a digest of new notifications")
+    
+    class Meta:
+        verbose_name = 'Inbox'
+        verbose_name_plural = 'Inboxes'
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.unread} unread"
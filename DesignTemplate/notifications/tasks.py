@@ -0,0 +1,10 @@
+"""Deferred notification delivery"""
+
+from taskqueue.queue import task
+from . import inbox
+
+
+@task('notifications.deliver', batch=True)
+def deliver(payloads):
+    """Coalesce queued like, fork and comment events into their recipients' notifications"""
+    inbox.deliver((p['verb'], p['snippet_id'], p['recipient_id'], p['actor_id']) for p in payloads)
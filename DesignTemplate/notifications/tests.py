@@ -0,0 +1,101 @@
+from django.test import TestCase, override_settings
+
+from accounts.models import User
+from playground.models import Snippet
+from . import inbox
+from .models import Inbox, Notification
+
+
+class InboxTests(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', 'owner@example.com')
+        self.fans = [User.objects.create_user(f'fan{i}', f'fan{i}@example.com') for i in range(3)]
+        self.snippet = Snippet.objects.create(user=self.owner, title='Hello')
+        self.other = Snippet.objects.create(user=self.owner, title='World')
+
+    def event(self, fan, verb='like', snippet=None):
+        return (verb, (snippet or self.snippet).pk, self.owner.pk, fan.pk)
+
+    def unread(self):
+        return Notification.objects.filter(recipient=self.owner, read_at__isnull=True)
+
+    def assertUnreadCount(self, expected):
+        self.assertEqual(inbox.unread_count(self.owner), expected)
+        self.assertEqual(self.unread().count(), expected)
+
+    def test_events_of_one_kind_coalesce(self):
+        self.assertEqual(inbox.deliver([self.event(fan) for fan in self.fans]), 1)
+
+        notification = Notification.objects.get()
+        self.assertEqual((notification.count, notification.actor), (3, self.fans[-1]))
+        self.assertEqual(inbox.describe(notification, 'Hello'), 'fan2 and 2 others liked “Hello”')
+        self.assertUnreadCount(1)
+
+    def test_only_new_notifications_add_to_the_unread_count(self):
+        inbox.deliver([self.event(self.fans[0])])
+        # The same unread notification counts up
+        self.assertEqual(inbox.deliver([self.event(self.fans[1])]), 0)
+        self.assertEqual(Notification.objects.get().count, 2)
+        self.assertUnreadCount(1)
+
+        # Another verb or snippet is a notification of its own, in one batch with an existing one
+        self.assertEqual(inbox.deliver([
+            self.event(self.fans[2]),
+            self.event(self.fans[2], verb='comment'),
+            self.event(self.fans[2], snippet=self.other),
+        ]), 2)
+        self.assertEqual(Notification.objects.get(verb='like', snippet_id=self.snippet.pk).count, 3)
+        self.assertUnreadCount(3)
+
+    def test_events_after_reading_start_a_new_notification(self):
+        inbox.deliver([self.event(self.fans[0])])
+        inbox.mark_read(self.owner)
+        self.assertUnreadCount(0)
+
+        self.assertEqual(inbox.deliver([self.event(self.fans[1])]), 1)
+        self.assertEqual(Notification.objects.filter(verb='like').count(), 2)
+        self.assertEqual(self.unread().get().count, 1)
+        self.assertUnreadCount(1)
+
+    def test_marking_some_read_keeps_the_count_exact(self):
+        inbox.deliver([
+            self.event(self.fans[0]),
+            self.event(self.fans[0], verb='fork'),
+            self.event(self.fans[0], snippet=self.other),
+        ])
+        like, fork, other = (
+            Notification.objects.get(verb='like', snippet_id=self.snippet.pk),
+            Notification.objects.get(verb='fork'),
+            Notification.objects.get(snippet_id=self.other.pk),
+        )
+        self.assertUnreadCount(3)
+
+        self.assertEqual(inbox.mark_read(self.owner, [like.pk]), 1)
+        self.assertUnreadCount(2)
+        # Already read, or someone else's: nothing changes
+        stranger = User.objects.create_user('stranger', 'stranger@example.com')
+        self.assertEqual(inbox.mark_read(self.owner, [like.pk]), 0)
+        self.assertEqual(inbox.mark_read(stranger, [fork.pk]), 0)
+        self.assertUnreadCount(2)
+
+        self.assertEqual(inbox.mark_read(self.owner, [fork.pk, other.pk, like.pk]), 2)
+        self.assertUnreadCount(0)
+        self.assertEqual(inbox.mark_read(self.owner), 0)
+        self.assertUnreadCount(0)
+
+    def test_marking_all_read_resets_a_drifted_count(self):
+        inbox.deliver([self.event(self.fans[0]), self.event(self.fans[0], snippet=self.other)])
+        # A notification purged with its snippet stays counted until everything is read
+        Notification.objects.filter(snippet_id=self.other.pk).delete()
+        self.assertEqual(inbox.unread_count(self.owner), 2)
+        self.assertEqual(inbox.mark_read(self.owner), 1)
+        self.assertUnreadCount(0)
+
+    @override_settings(TASKQUEUE_EAGER=True)
+    def test_notify_skips_the_owners_own_actions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            inbox.notify('like', self.snippet, self.owner)
+            inbox.notify('like', self.snippet, self.fans[0])
+        self.assertEqual(list(Notification.objects.values_list('actor', flat=True)), [self.fans[0].pk])
+        self.assertEqual(Inbox.objects.get(user=self.owner).unread, 1)
@@ -0,0 +1,11 @@
+from django.urls import path
+from . import views
+
+app_name = 'notifications'
+
+urlpatterns = [
+    path('api/notifications/', views.notification_list, name='list'),
+    path('api/notifications/unread/', views.unread_count, name='unread'),
+    path('api/notifications/read/', views.mark_read, name='read'),
+    path('api/notifications/digest/', views.digest_settings, name='digest'),
+]
@@ -0,0 +1,70 @@
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST, require_safe
+
+from . import inbox
+from .models import Inbox
+
+
+@login_required
+@require_safe
+def notification_list(request):
+    """A page of the current user's notifications, newest first"""
+    page, next_cursor = inbox.read_page(request.user, request.GET.get('before'))
+    return JsonResponse({
+        'success': True,
+        'notifications': [
+            {
+                'id': notification.pk,
+                'verb': notification.verb,
+                'count': notification.count,
+                'text': inbox.describe(notification, snippet.title),
+                'snippet': snippet.slug,
+                'unread': notification.read_at is None,
+                'updated_at': notification.updated_at.isoformat(),
+            }
+            for notification, snippet in page
+        ],
+        'next': next_cursor,
+        'unread': inbox.unread_count(request.user),
+    })
+
+
+@login_required
+@require_safe
+def unread_count(request):
+    """The current user's unread notification count, for the badge"""
+    return JsonResponse({'success': True, 'unread': inbox.unread_count(request.user)})
+
+
+@login_required
+@require_POST
+def mark_read(request):
+    """Mark some (``ids``) or all of the current user's notifications read"""
+    try:
+        data = json.loads(request.body or '{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    ids = data.get('ids')
+    if ids is not None and not (isinstance(ids, list) and all(isinstance(pk, int) for pk in ids)):
+        return JsonResponse({'success': False, 'error': 'ids must be a list of notification ids'}, status=400)
+    
+    marked = inbox.mark_read(request.user, ids)
+    return JsonResponse({'success': True, 'marked': marked, 'unread': inbox.unread_count(request.user)})
+
+
+@login_required
+@require_POST
+def digest_settings(request):
+    """Turn the current user's email digests on or off"""
+    try:
+        data = json.loads(request.body or '{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    if not isinstance(data.get('email_digest'), bool):
+        return JsonResponse({'success': False, 'error': 'email_digest must be true or false'}, status=400)
+    
+    Inbox.objects.update_or_create(user=request.user, defaults={'email_digest': data['email_digest']})
+    return JsonResponse({'success': True, 'email_digest': data['email_digest']})
@@ -1,15 +1,98 @@
 from django.contrib import admin
-from .models import Snippet, Like, View, Comment
+from django.db import DEFAULT_DB_ALIAS
+from . import sharding
+from .admin_performance import LargeTableAdmin, SoftDeleteAdmin
+from .deltas import CODE_FIELDS
+from .models import Snippet, Like, View, Comment, Revision
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """
+    The snippet database a changelist reads. A changelist can't merge rows
+    from several databases, so with sharding on it lists one shard at a time,
+    'default' first; change pages find their row's shard by primary key.
+    """
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in sharding.databases() if alias != DEFAULT_DB_ALIAS]
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': DEFAULT_DB_ALIAS,
+        }
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': self.value() == alias,
+                'query_string': changelist.get_query_string({self.parameter_name: alias}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        alias = self.value()
+        return queryset.using(alias if alias in sharding.databases() else DEFAULT_DB_ALIAS)
+
+
+class ShardedAdmin(admin.ModelAdmin):
+    """
+    Adds the shard picker to changelists of sharded models when sharding is
+    on, and loads related rows outside the shard (users) with a second
+    query, as a join on the shard would find none.
+    """
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        return [ShardFilter, *list_filter] if sharding.enabled() else list_filter
+
+    def list_relations(self, request):
+        """The foreign keys the changelist would select_related"""
+        fields = super().get_list_select_related(request)
+        if not isinstance(fields, bool):
+            return list(fields)
+        list_display = self.get_list_display(request)
+        return [
+            field.name for field in self.model._meta.concrete_fields
+            if field.many_to_one and (fields or field.name in list_display)
+        ]
+
+    def get_list_select_related(self, request):
+        if not sharding.enabled():
+            return super().get_list_select_related(request)
+        return [
+            name for name in self.list_relations(request)
+            if sharding.is_sharded(self.model._meta.get_field(name).related_model)
+        ]
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if not sharding.enabled():
+            return queryset
+        return queryset.prefetch_related(*(
+            name for name in self.list_relations(request)
+            if not sharding.is_sharded(self.model._meta.get_field(name).related_model)
+        ))
+
+
+@admin.display(description='Snippet')
+def snippet_title(obj):
+    return obj.snippet.title
 
 
 @admin.register(Snippet)
-class SnippetAdmin(admin.ModelAdmin):
+class SnippetAdmin(SoftDeleteAdmin, ShardedAdmin, LargeTableAdmin):
     """Admin for Snippet model"""
     list_display = ['title', 'user', 'environment', 'is_public', 'views_count', 'likes_count', 'forks_count', 'created_at']
-    list_filter = ['environment', 'is_public', 'created_at', 'updated_at']
-    search_fields = ['title', 'description', 'user__username']
+    list_filter = ['environment', 'is_public', 'created_at']
+    list_select_related = ['user']
+    list_defer = CODE_FIELDS
+    search_fields = ['slug', '^title', '^user__username']
+    search_help_text = 'Exact slug, or the start of a title or username'
+    autocomplete_fields = ['user']
+    raw_id_fields = ['forked_from']
     prepopulated_fields = {'slug': ('title',)}
-    date_hierarchy = 'created_at'
     readonly_fields = ['id', 'views_count', 'likes_count', 'forks_count', 'created_at', 'updated_at']
     
     fieldsets = (
@@ -38,26 +121,36 @@ class SnippetAdmin(admin.ModelAdmin):
 
 
 @admin.register(Like)
-class LikeAdmin(admin.ModelAdmin):
+class LikeAdmin(ShardedAdmin, LargeTableAdmin):
     """Admin for Like model"""
-    list_display = ['user', 'snippet', 'created_at']
+    list_display = ['user', snippet_title, 'created_at']
     list_filter = ['created_at']
-    search_fields = ['user__username', 'snippet__title']
-    date_hierarchy = 'created_at'
+    list_select_related = ['user', 'snippet']
+    list_defer = [f'snippet__{field}' for field in CODE_FIELDS]
+    search_fields = ['^user__username', 'snippet__slug']
+    search_help_text = 'Start of a username, or exact snippet slug'
+    raw_id_fields = ['user', 'snippet']
+    # Only the indexed column; sorting by anything else means sorting every row
+    sortable_by = ['created_at']
 
 
 @admin.register(View)
-class ViewAdmin(admin.ModelAdmin):
+class ViewAdmin(ShardedAdmin, LargeTableAdmin):
     """Admin for View model"""
-    list_display = ['snippet', 'user', 'ip_address', 'created_at']
+    list_display = [snippet_title, 'user', 'ip_address', 'created_at']
     list_filter = ['created_at']
-    search_fields = ['snippet__title', 'user__username', 'ip_address']
-    date_hierarchy = 'created_at'
+    list_select_related = ['user', 'snippet']
+    list_defer = [f'snippet__{field}' for field in CODE_FIELDS]
+    search_fields = ['^user__username', 'snippet__slug']
+    search_help_text = 'Start of a username, or exact snippet slug'
+    raw_id_fields = ['user', 'snippet']
+    # Only the indexed column; sorting by anything else means sorting every row
+    sortable_by = ['created_at']
     readonly_fields = ['created_at']
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ShardedAdmin):
     """Admin for Comment model"""
     list_display = ['user', 'snippet', 'text_preview', 'created_at']
     list_filter = ['created_at']
@@ -69,3 +162,14 @@ class CommentAdmin(admin.ModelAdmin):
         """Show first 50 characters of comment"""
         return obj.text[:50] + '...' if len(obj.text) > 50 else obj.text
     text_preview.short_description = 'Comment Preview'
+
+
+@admin.register(Revision)
+class RevisionAdmin(ShardedAdmin):
+    """Admin for Revision model"""
+    list_display = ['snippet', 'number', 'title', 'is_keyframe', 'size', 'created_at']
+    list_filter = ['is_keyframe']
+    search_fields = ['snippet__title']
+    raw_id_fields = ['snippet']
+    exclude = ['data']
+    readonly_fields = ['snippet', 'number', 'title', 'is_keyframe', 'size', 'created_at']
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_save
 
 
 class PlaygroundConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'playground'
+
+    def ready(self):
+        from . import sharding
+        post_save.connect(sharding.place_user, sender=settings.AUTH_USER_MODEL)
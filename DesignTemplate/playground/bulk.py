@@ -0,0 +1,91 @@
+"""
+Changing many of one owner's snippets at once.
+
+``update`` and ``delete`` take an owner and the ids or slugs of some of
+their snippets, and work in one transaction on the owner's shard. The
+ownership check is part of the UPDATE itself (``WHERE user_id = owner``),
+not a lookup per snippet; snippets of other users are simply not found.
+
+Side effects are emitted once per batch instead of once per snippet: one
+CDN purge for the surrogate keys of every changed snippet, and one INSERT of
+timeline fan-out or retraction tasks for the snippets whose visibility
+changed. Changed snippets get a new version and updated_at, so editors open
+on them see a conflict and the next ``build_similarity`` run re-indexes them.
+"""
+
+from collections import defaultdict
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from timelines import fanout
+from . import embeds, purge, sharding
+from .models import Snippet
+
+FLAGS = ('is_public', 'is_pinned')
+
+
+def owned(owner, ids=(), slugs=()):
+    """The owner's snippets among ``ids`` and ``slugs``, on their shard"""
+    return Snippet.objects.using(sharding.shard_of(owner)).filter(
+        Q(pk__in=list(ids)) | Q(slug__in=list(slugs)), user=owner
+    )
+
+
+def retag(tags, replace=None, add=(), remove=()):
+    """``tags`` replaced by ``replace`` (if given), then with ``add`` appended and ``remove`` dropped"""
+    tags = list(tags if replace is None else replace)
+    tags += [tag for tag in add if tag not in tags]
+    return [tag for tag in tags if tag not in remove]
+
+
+def update(owner, ids=(), slugs=(), flags=None, tags=None, add_tags=(), remove_tags=()):
+    """
+    Set ``flags`` ({'is_public': bool, 'is_pinned': bool}) and retag the
+    owner's snippets among ``ids`` and ``slugs``; returns {id: slug} of the
+    snippets that changed. Snippets already as asked are left alone.
+    """
+    flags = flags or {}
+    alias = sharding.shard_of(owner)
+    snippets = owned(owner, ids, slugs)
+    with sharding.atomic(alias):
+        rows = snippets.select_for_update().values_list('pk', 'slug', 'tags', *FLAGS)
+        # {new tags: snippet ids}; every row shares one group unless tags are edited per row
+        groups, changed, published, hidden = defaultdict(list), {}, [], []
+        for pk, slug, old_tags, *old_flags in rows:
+            old = dict(zip(FLAGS, old_flags))
+            new_tags = retag(old_tags, tags, add_tags, remove_tags)
+            if new_tags == old_tags and all(old[flag] == value for flag, value in flags.items()):
+                continue
+            groups[tuple(new_tags) if new_tags != old_tags else None].append(pk)
+            changed[str(pk)] = slug
+            if flags.get('is_public') is True and not old['is_public']:
+                published.append(pk)
+            elif flags.get('is_public') is False and old['is_public']:
+                hidden.append(pk)
+        if not changed:
+            return {}
+
+        now = timezone.now()
+        for new_tags, group in groups.items():
+            changes = dict(flags, version=F('version') + 1, updated_at=now)
+            if new_tags is not None:
+                changes['tags'] = list(new_tags)
+            # Still filtered by owner: the ownership check is the WHERE clause
+            snippets.filter(pk__in=group).update(**changes)
+
+        embeds.purge_keys([embeds.snippet_key(pk) for group in groups.values() for pk in group])
+        if published:
+            fanout.schedule_many(published, public=True)
+        if hidden:
+            fanout.schedule_many(hidden, public=False)
+    return changed
+
+
+def delete(owner, ids=(), slugs=()):
+    """Delete the owner's snippets among ``ids`` and ``slugs``; returns {id: slug} of those deleted"""
+    snippets = owned(owner, ids, slugs)
+    with sharding.atomic(sharding.shard_of(owner)):
+        slugs_by_id = dict(snippets.select_for_update().values_list('pk', 'slug'))
+        deleted = purge.delete_snippets(snippets)
+    return {str(pk): slugs_by_id[pk] for pk in deleted}
@@ -0,0 +1,72 @@
+"""
+Helpers for the editor's delta-save protocol.
+
+The editor sends each changed code pane as a single splice against the last
+saved text, identified by content hashes::
+
+    {"base": sha256(old), "start": 10, "end": 12, "text": "xy", "hash": sha256(new)}
+
+Offsets are UTF-16 code units, matching JavaScript string indices, so text
+containing emoji or other astral characters splices identically on both ends.
+"""
+
+import hashlib
+
+CODE_FIELDS = ('html_code', 'css_code', 'js_code')
+
+
+class DeltaError(ValueError):
+    """Raised when a delta does not apply cleanly to the stored text"""
+
+
+class MalformedDelta(ValueError):
+    """Raised for a delta no stored text could take: bad types, or offsets outside its own base"""
+
+
+def check_delta(delta):
+    """Raise MalformedDelta unless ``delta`` has the shape described above"""
+    if not isinstance(delta, dict):
+        raise MalformedDelta('A delta must be an object')
+    for key in ('base', 'text', 'hash'):
+        if not isinstance(delta.get(key, ''), str):
+            raise MalformedDelta(f'Delta {key} must be a string')
+    for key in ('start', 'end'):
+        # bool is an int subclass, but true isn't an offset
+        if type(delta.get(key)) is not int or delta[key] < 0:
+            raise MalformedDelta(f'Delta {key} must be a non-negative integer')
+    if delta['start'] > delta['end']:
+        raise MalformedDelta('Delta start is after its end')
+
+
+def content_hash(text):
+    """SHA-256 hex digest of the UTF-8 encoded text"""
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+def apply_splice(text, start, end, insert):
+    """Replace UTF-16 code units [start, end) of ``text`` with ``insert``"""
+    encoded = (text or '').encode('utf-16-le')
+    units = len(encoded) // 2
+    if not (0 <= start <= end <= units):
+        raise MalformedDelta(f'Splice {start}:{end} out of range for {units} code units')
+    try:
+        return (encoded[:start * 2] + insert.encode('utf-16-le') + encoded[end * 2:]).decode('utf-16-le')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        raise MalformedDelta('Splice splits a surrogate pair')
+
+
+def apply_delta(current, delta):
+    """
+    Apply one field delta, verifying the base and result hashes.
+
+    Raises DeltaError when the delta was made against other text (the
+    client should resync) and MalformedDelta when it's wrong on its own
+    terms, including offsets outside the text it was made against.
+    """
+    check_delta(delta)
+    if delta.get('base') != content_hash(current):
+        raise DeltaError('Delta base does not match the stored text')
+    result = apply_splice(current, delta['start'], delta['end'], delta.get('text', ''))
+    if 'hash' in delta and delta['hash'] != content_hash(result):
+        raise DeltaError('Delta result does not match the expected hash')
+    return result
@@ -0,0 +1,121 @@
+"""
+Embedding snippets on other sites: an embed route and oEmbed.
+
+``/embed/<slug>/<token>/`` serves the preview document of one state of a
+public snippet. The token comes from ``updated_at`` (and the preview shell),
+so the URL changes whenever the snippet does and the response can be cached
+for a year by browsers and shared caches alike. ``/embed/<slug>/`` redirects
+to the current URL, and ``/oembed/`` (linked from snippet pages for oEmbed
+discovery) returns an iframe pointing at it; both are cached at the edge for
+EMBED_EDGE_MAX_AGE but only briefly by browsers.
+
+Every embed response carries a ``Surrogate-Key`` header naming the snippet
+and its owner. When a snippet is saved or deleted (or its owner deleted),
+those keys are purged from the CDN through the EMBED_PURGER backend, from
+the task worker. With no purger configured nothing is queued.
+"""
+
+import logging
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from taskqueue.queue import enqueue
+from . import previews
+
+BROWSER_MAX_AGE = getattr(settings, 'EMBED_BROWSER_MAX_AGE', 60)
+EDGE_MAX_AGE = getattr(settings, 'EMBED_EDGE_MAX_AGE', 60 * 60 * 24)
+WIDTH = getattr(settings, 'EMBED_WIDTH', 800)
+HEIGHT = getattr(settings, 'EMBED_HEIGHT', 450)
+PURGER = getattr(settings, 'EMBED_PURGER', None)
+PURGE_URL = getattr(settings, 'EMBED_PURGE_URL', '')
+PURGE_METHOD = getattr(settings, 'EMBED_PURGE_METHOD', 'POST')
+PURGE_HEADERS = getattr(settings, 'EMBED_PURGE_HEADERS', {})
+PURGE_TIMEOUT = getattr(settings, 'EMBED_PURGE_TIMEOUT', 10)
+
+logger = logging.getLogger(__name__)
+
+
+class PurgeError(Exception):
+    """Raised when the CDN rejects a purge; the task is retried"""
+
+
+def token(snippet):
+    """Changes whenever the snippet (or the preview shell) does"""
+    return f'{int(snippet.updated_at.timestamp() * 1000):x}-{previews.shell_hash(snippet.environment)}'
+
+
+def embed_url(request, snippet):
+    return request.build_absolute_uri(
+        reverse('playground:embed_version', kwargs={'slug': snippet.slug, 'token': token(snippet)})
+    )
+
+
+def oembed_url(request, snippet):
+    """The oEmbed endpoint for a snippet page, for discovery links"""
+    return request.build_absolute_uri(reverse('playground:oembed')) + '?' + urllib.parse.urlencode({
+        'url': request.build_absolute_uri(reverse('playground:detail', kwargs={'slug': snippet.slug})),
+        'format': 'json',
+    })
+
+
+def snippet_key(snippet_id):
+    return f'snippet-{snippet_id.hex}'
+
+
+def user_key(user_id):
+    return f'user-{user_id}'
+
+
+def surrogate_keys(snippet):
+    return [snippet_key(snippet.pk), user_key(snippet.user_id)]
+
+
+def purge(snippet):
+    """Queue a CDN purge of everything cached for ``snippet``"""
+    purge_keys([snippet_key(snippet.pk)])
+
+
+def purge_keys(keys):
+    if PURGER:
+        enqueue('playground.purge_embeds', {'keys': list(keys)})
+
+
+def get_purger():
+    return import_string(PURGER)()
+
+
+class HttpPurger:
+    """
+    Purge by surrogate key with one HTTP request to EMBED_PURGE_URL.
+
+    The keys go space-separated in a ``Surrogate-Key`` header, which suits
+    Fastly's purge-by-key API (with ``Fastly-Key`` in EMBED_PURGE_HEADERS)
+    and Varnish setups that ban on a request header.
+    """
+
+    def purge(self, keys):
+        request = urllib.request.Request(
+            PURGE_URL,
+            method=PURGE_METHOD,
+            headers={**PURGE_HEADERS, 'Surrogate-Key': ' '.join(keys)},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=PURGE_TIMEOUT) as response:
+                response.read()
+        except (urllib.error.URLError, OSError) as e:
+            raise PurgeError(f'Purging {len(keys)} surrogate keys failed: {e}')
+
+
+class StubPurger:
+    """Records purged keys instead of calling a CDN, for tests and development"""
+
+    purged = []
+
+    def purge(self, keys):
+        logger.info('Purging surrogate keys %s', ' '.join(keys))
+        self.purged.append(list(keys))
@@ -0,0 +1,120 @@
+"""
+Transparent compressed storage for large text columns.
+
+``CompressedTextField`` keeps a plain text column, so small values and rows
+written before the field existed stay readable as-is. Values of at least
+``compress_threshold`` characters (default COMPRESSED_TEXT_THRESHOLD) are
+stored as a marker followed by base64-encoded zlib data, which typically
+shrinks HTML/CSS/JS several times over even after the encoding overhead. Anything that already starts with the
+marker is always compressed, so stored values are never ambiguous.
+
+Decompression is lazy: rows load the compressed string, and the text is only
+inflated (once) when the attribute is first read on the instance.
+"""
+
+import base64
+import zlib
+
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+MARKER = '\x01z:'
+DEFAULT_THRESHOLD = 1024
+
+
+def compress_text(value):
+    return MARKER + base64.b64encode(zlib.compress(value.encode('utf-8'), 6)).decode('ascii')
+
+
+def decompress_text(value):
+    return zlib.decompress(base64.b64decode(value[len(MARKER):])).decode('utf-8')
+
+
+class CompressedText:
+    """A compressed value loaded from the database but not yet inflated"""
+
+    __slots__ = ('raw',)
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def decompress(self):
+        return decompress_text(self.raw)
+
+    def __str__(self):
+        return self.decompress()
+
+    def __eq__(self, other):
+        if isinstance(other, CompressedText):
+            return self.raw == other.raw
+        return self.decompress() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'<CompressedText: {len(self.raw)} chars stored>'
+
+
+class CompressedTextAttribute(DeferredAttribute):
+    """Inflate a CompressedText the first time the attribute is read"""
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedText):
+            value = value.decompress()
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        # A data descriptor, so __get__ runs even once the value is in __dict__
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    descriptor_class = CompressedTextAttribute
+
+    def __init__(self, *args, compress_threshold=None, **kwargs):
+        self.compress_threshold = compress_threshold
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.compress_threshold is not None:
+            kwargs['compress_threshold'] = self.compress_threshold
+        return name, path, args, kwargs
+
+    @property
+    def threshold(self):
+        if self.compress_threshold is not None:
+            return self.compress_threshold
+        # Read on every save, so overriding the setting takes effect
+        return getattr(settings, 'COMPRESSED_TEXT_THRESHOLD', DEFAULT_THRESHOLD)
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, str) and value.startswith(MARKER):
+            return CompressedText(value)
+        return value
+
+    def to_python(self, value):
+        if isinstance(value, CompressedText):
+            return value.decompress()
+        return super().to_python(value)
+
+    def get_prep_value(self, value):
+        if isinstance(value, CompressedText):
+            return value.raw
+        value = super().get_prep_value(value)
+        if value is None:
+            return value
+        if value.startswith(MARKER):
+            return compress_text(value)
+        if len(value) >= self.threshold:
+            compressed = compress_text(value)
+            if len(compressed) < len(value):
+                return compressed
+        return value
+
+    def value_to_string(self, obj):
+        # Serialize (dumpdata) the readable text, not the stored form
+        return self.value_from_object(obj)
@@ -0,0 +1,44 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from playground import purge
+
+
+class Command(BaseCommand):
+    help = 'Purge deleted snippets and users, and everything that depends on them, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=purge.BATCH_SIZE, help='Rows deleted per statement')
+        parser.add_argument(
+            '--pause', type=float, default=purge.PAUSE_SECONDS,
+            help='Seconds to wait after each batch, leaving the database to other writers'
+        )
+        parser.add_argument(
+            '--max-seconds', type=float, default=None,
+            help='Stop after this long (resume on the next run)'
+        )
+        parser.add_argument('--sleep', type=float, default=10.0, help='Seconds to wait when nothing is deleted')
+        parser.add_argument('--once', action='store_true', help='Purge what is pending and exit')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        stats = Counter()
+        try:
+            while True:
+                remaining = None
+                if options['max_seconds']:
+                    remaining = options['max_seconds'] - (time.monotonic() - started)
+                    if remaining <= 0:
+                        break
+                done = purge.purge_pending(remaining, options['batch_size'], options['pause'], stats)
+                if options['once'] or not done:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        
+        elapsed = time.monotonic() - started
+        summary = ', '.join(f'{count} {label}' for label, count in stats.most_common()) or 'nothing'
+        self.stdout.write(f'Purged {summary} in {elapsed:.2f}s')
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from playground import rebalance
+
+
+class Command(BaseCommand):
+    help = "Move users' snippets, likes, views and comments to the shard they hash to, e.g. after adding shards"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=rebalance.BATCH_SIZE, help='Rows copied per statement')
+        parser.add_argument(
+            '--max-seconds', type=float, default=None,
+            help='Stop starting new moves after this long (resume on the next run)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be moved')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        deadline = started + options['max_seconds'] if options['max_seconds'] else None
+        users = snippets = strays = dropped = 0
+        pending = rebalance.pending()
+        if options['dry_run']:
+            found = list(rebalance.strays())
+            self.stdout.write(f'{len(pending)} users to move, {len(found)} users with stray snippets')
+            return
+        
+        for user in pending:
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            moved = rebalance.move_user(user, options['batch_size'])
+            if moved is not None:
+                users += 1
+                snippets += moved
+        for alias, user_id, target in rebalance.strays():
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            moved, removed = rebalance.settle_strays(alias, user_id, target, options['batch_size'])
+            strays += moved
+            dropped += removed
+        
+        self.stdout.write(
+            f'Moved {users} users ({snippets} snippets) and {strays} stray snippets, '
+            f'dropped {dropped} stale copies in {time.monotonic() - started:.2f}s'
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playground', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snippet',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
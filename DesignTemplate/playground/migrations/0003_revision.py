@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playground', '0002_snippet_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Revision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(help_text='1-based revision number')),
+                ('title', models.CharField(max_length=200)),
+                ('is_keyframe', models.BooleanField(default=True, help_text='Full snapshot rather than a reverse delta')),
+                ('data', models.BinaryField(help_text='zlib-compressed JSON snapshot or delta')),
+                ('size', models.PositiveIntegerField(default=0, help_text='Total characters of code at this revision')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('snippet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='playground.snippet')),
+            ],
+            options={
+                'verbose_name': 'Revision',
+                'verbose_name_plural': 'Revisions',
+                'ordering': ['-number'],
+                'unique_together': {('snippet', 'number')},
+            },
+        ),
+    ]
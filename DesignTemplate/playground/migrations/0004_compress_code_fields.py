@@ -0,0 +1,78 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:26
+
+import playground.fields
+from django.db import migrations, models, transaction
+
+CODE_FIELDS = ('html_code', 'css_code', 'js_code')
+CHUNK_SIZE = 500
+
+
+def iter_chunks(Snippet):
+    """Yield snippets in primary key order, CHUNK_SIZE rows at a time"""
+    last_pk = None
+    while True:
+        chunk = Snippet.objects.order_by('pk').only('pk', *CODE_FIELDS)
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        chunk = list(chunk[:CHUNK_SIZE])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def compress_existing(apps, schema_editor):
+    Snippet = apps.get_model('playground', 'Snippet')
+    for chunk in iter_chunks(Snippet):
+        with transaction.atomic():
+            for snippet in chunk:
+                # Reading inflates, writing through the field compresses
+                Snippet.objects.filter(pk=snippet.pk).update(
+                    **{field: getattr(snippet, field) for field in CODE_FIELDS}
+                )
+
+
+def decompress_existing(apps, schema_editor):
+    Snippet = apps.get_model('playground', 'Snippet')
+    for chunk in iter_chunks(Snippet):
+        with transaction.atomic():
+            for snippet in chunk:
+                Snippet.objects.filter(pk=snippet.pk).update(**{
+                    field: models.Value(getattr(snippet, field), output_field=models.TextField())
+                    for field in CODE_FIELDS
+                })
+
+
+class Migration(migrations.Migration):
+
+    # Each chunk commits on its own so large tables aren't locked for the whole run
+    atomic = False
+
+    dependencies = [
+        ('playground', '0003_revision'),
+    ]
+
+    # The column type doesn't change, so only the migration state is altered
+    # (avoids rebuilding the table on SQLite) before rows are compressed.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='snippet',
+                    name='css_code',
+                    field=playground.fields.CompressedTextField(blank=True, help_text='CSS styles'),
+                ),
+                migrations.AlterField(
+                    model_name='snippet',
+                    name='html_code',
+                    field=playground.fields.CompressedTextField(blank=True, help_text='HTML code'),
+                ),
+                migrations.AlterField(
+                    model_name='snippet',
+                    name='js_code',
+                    field=playground.fields.CompressedTextField(blank=True, help_text='JavaScript code'),
+                ),
+            ],
+        ),
+        migrations.RunPython(compress_existing, decompress_existing),
+    ]
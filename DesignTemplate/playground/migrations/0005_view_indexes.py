@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playground', '0004_compress_code_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='view',
+            index=models.Index(fields=['snippet', 'created_at'], name='playground__snippet_1cb6d5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='view',
+            index=models.Index(fields=['created_at'], name='playground__created_138ff8_idx'),
+        ),
+    ]
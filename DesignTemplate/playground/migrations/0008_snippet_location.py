@@ -0,0 +1,73 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+CHUNK_SIZE = 1000
+
+
+def index_snippets(apps, schema_editor):
+    """Record every existing snippet, deleted ones included, in the directory"""
+    alias = schema_editor.connection.alias
+    Snippet = apps.get_model('playground', 'Snippet')
+    SnippetLocation = apps.get_model('playground', 'SnippetLocation')
+    rows = Snippet.objects.using(alias).order_by('pk').values_list('pk', 'slug', 'user_id')
+    last_pk = None
+    while True:
+        chunk = list((rows if last_pk is None else rows.filter(pk__gt=last_pk))[:CHUNK_SIZE])
+        if not chunk:
+            return
+        SnippetLocation.objects.using(alias).bulk_create([
+            SnippetLocation(snippet_id=pk, slug=slug, user_id=user_id) for pk, slug, user_id in chunk
+        ])
+        last_pk = chunk[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playground', '0007_snippet_deleted_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='like',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='snippet',
+            name='forked_from',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='Original snippet this was forked from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='forks', to='playground.snippet'),
+        ),
+        migrations.AlterField(
+            model_name='snippet',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='snippets', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='view',
+            name='user',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='User who viewed (if authenticated)', null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.CreateModel(
+            name='SnippetLocation',
+            fields=[
+                ('snippet_id', models.UUIDField(primary_key=True, serialize=False)),
+                ('slug', models.SlugField(max_length=250, unique=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Snippet location',
+                'verbose_name_plural': 'Snippet locations',
+            },
+        ),
+        migrations.RunPython(index_snippets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playground', '0008_snippet_location'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='view',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playground', '0009_view_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='snippet',
+            name='title',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+    ]
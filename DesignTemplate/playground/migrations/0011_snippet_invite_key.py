@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playground', '0010_snippet_title_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snippet',
+            name='invite_key',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
@@ -1,9 +1,29 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.utils.text import slugify
 from django.urls import reverse
 import uuid
 
+from . import embeds, previews
+from .deltas import CODE_FIELDS
+from .fields import CompressedTextField
+from .sharding import ShardedQuerySet
+
+# Fields the preview document is built from
+PREVIEW_FIELDS = {*CODE_FIELDS, 'environment'}
+
+
+class ShardedManager(models.Manager.from_queryset(ShardedQuerySet)):
+    """Manager for models stored on snippet shards (see playground.sharding)"""
+
+
+class SnippetManager(ShardedManager):
+    """Default manager; leaves out deleted snippets waiting to be purged"""
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 
 class Snippet(models.Model):
     """User-created code snippets (HTML/CSS/JS)"""
@@ -17,16 +37,18 @@ class Snippet(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
         on_delete=models.CASCADE, 
-        related_name='snippets'
+        related_name='snippets',
+        db_constraint=False,  # Users stay in 'default' when snippets are sharded
     )
-    title = models.CharField(max_length=200)
+    # Indexed for prefix search in the admin
+    title = models.CharField(max_length=200, db_index=True)
     slug = models.SlugField(max_length=250, unique=True, blank=True)
     description = models.TextField(blank=True, help_text="Brief description of the snippet")
     
-    # Code storage
-    html_code = models.TextField(blank=True, help_text="HTML code")
-    css_code = models.TextField(blank=True, help_text="CSS styles")
-    js_code = models.TextField(blank=True, help_text="JavaScript code")
+    # Code storage (compressed above COMPRESSED_TEXT_THRESHOLD characters)
+    html_code = CompressedTextField(blank=True, help_text="HTML code")
+    css_code = CompressedTextField(blank=True, help_text="CSS styles")
+    js_code = CompressedTextField(blank=True, help_text="JavaScript code")
     
     # Metadata
     environment = models.CharField(
@@ -55,6 +77,7 @@ class Snippet(models.Model):
         null=True, 
         blank=True, 
         related_name='forks',
+        db_constraint=False,  # May be on another shard
         help_text="Original snippet this was forked from"
     )
     
@@ -62,15 +85,28 @@ class Snippet(models.Model):
     is_public = models.BooleanField(default=True, help_text="Public snippets appear in feed")
     is_pinned = models.BooleanField(default=False, help_text="Show on user profile")
     
+    # Bumped on every content save; used for optimistic concurrency
+    version = models.PositiveIntegerField(default=0)
+    
+    # Set on delete; the row and its dependents are purged in the background
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    # Signed into Live Share invites; changing it revokes every invite (collab.invites)
+    invite_key = models.CharField(max_length=32, blank=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = SnippetManager()
+    all_objects = ShardedManager()
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['-created_at']),
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['slug']),
+            models.Index(fields=['deleted_at'], name='snippet_deleted_idx', condition=models.Q(deleted_at__isnull=False)),
         ]
         verbose_name = 'Snippet'
         verbose_name_plural = 'Snippets'
@@ -81,11 +117,29 @@ class Snippet(models.Model):
             base_slug = slugify(self.title)
             slug = base_slug
             counter = 1
-            while Snippet.objects.filter(slug=slug).exists():
+            # Deleted snippets keep their slugs until they are purged
+            while SnippetLocation.objects.filter(slug=slug).exists():
                 slug = f"{base_slug}-{counter}"
                 counter += 1
             self.slug = slug
+        if self._state.adding:
+            # The unique slug here also keeps slugs unique across shards
+            SnippetLocation.objects.create(snippet_id=self.pk, slug=self.slug, user_id=self.user_id)
+        update_fields = kwargs.get('update_fields')
+        # Previews and embeds are named by version, so a save outside the views
+        # (the admin, a shell) must bump it too; the views use conditional UPDATEs
+        changes_preview = not self._state.adding and (
+            update_fields is None or not PREVIEW_FIELDS.isdisjoint(update_fields)
+        )
+        if changes_preview:
+            self.version = models.F('version') + 1
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version'}
         super().save(*args, **kwargs)
+        if changes_preview:
+            self.refresh_from_db(fields=['version'])
+            previews.schedule(self)
+            embeds.purge(self)
     
     def __str__(self):
         return f"{self.title} by {self.user.username}"
@@ -106,15 +160,20 @@ class Snippet(models.Model):
 
 class Like(models.Model):
     """Track snippet likes (users can like once per snippet)"""
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_constraint=False)
     snippet = models.ForeignKey(Snippet, on_delete=models.CASCADE, related_name='likes')
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = ShardedManager()
+    
     class Meta:
         unique_together = ('user', 'snippet')
         verbose_name = 'Like'
         verbose_name_plural = 'Likes'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} likes {self.snippet.title}"
@@ -127,17 +186,25 @@ class View(models.Model):
         on_delete=models.CASCADE, 
         null=True, 
         blank=True,
+        db_constraint=False,
         help_text="User who viewed (if authenticated)"
     )
     snippet = models.ForeignKey(Snippet, on_delete=models.CASCADE, related_name='view_records')
     ip_address = models.GenericIPAddressField(help_text="IP address of viewer")
     user_agent = models.CharField(max_length=500, blank=True, help_text="Browser user agent")
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set by the task worker to when the page was viewed, not when the row is written
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    
+    objects = ShardedManager()
     
     class Meta:
         verbose_name = 'View'
         verbose_name_plural = 'Views'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['snippet', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
     
     def __str__(self):
         return f"View of {self.snippet.title} at {self.created_at}"
@@ -145,12 +212,14 @@ class View(models.Model):
 
 class Comment(models.Model):
     """Snippet comments"""
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_constraint=False)
     snippet = models.ForeignKey(Snippet, on_delete=models.CASCADE, related_name='comments')
     text = models.TextField(max_length=1000, help_text="Comment text")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ShardedManager()
+    
     class Meta:
         ordering = ['created_at']
         verbose_name = 'Comment'
@@ -158,3 +227,39 @@ class Comment(models.Model):
     
     def __str__(self):
         return f"Comment by {self.user.username} on {self.snippet.title}"
+
+
+class Revision(models.Model):
+    """Point-in-time snapshot of a snippet's code (see playground.revisions)"""
+    snippet = models.ForeignKey(Snippet, on_delete=models.CASCADE, related_name='revisions')
+    number = models.PositiveIntegerField(help_text="1-based revision number")
+    title = models.CharField(max_length=200)
+    is_keyframe = models.BooleanField(default=True, help_text="Full snapshot rather than a reverse delta")
+    data = models.BinaryField(help_text="zlib-compressed JSON snapshot or delta")
+    size = models.PositiveIntegerField(default=0, help_text="Total characters of code at this revision")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = ShardedManager()
+    
+    class Meta:
+        unique_together = ('snippet', 'number')
+        ordering = ['-number']
+        verbose_name = 'Revision'
+        verbose_name_plural = 'Revisions'
+    
+    def __str__(self):
+        return f"{self.snippet.title} r{self.number}"
+
+
+class SnippetLocation(models.Model):
+    """Directory of snippets in 'default': which user, and so which shard, holds each id and slug"""
+    snippet_id = models.UUIDField(primary_key=True)
+    slug = models.SlugField(max_length=250, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    
+    class Meta:
+        verbose_name = 'Snippet location'
+        verbose_name_plural = 'Snippet locations'
+    
+    def __str__(self):
+        return f"{self.slug} of user {self.user_id}"
@@ -0,0 +1,141 @@
+"""
+Preview documents for snippets.
+
+A preview is the snippet's code dropped into a fixed HTML shell. The shell
+is kept as encoded fragments per environment, built once per process, so a
+preview is a join of bytes. 3D previews load the vendored Three.js build
+through the static pipeline (hashed name, immutable caching) instead of a
+CDN.
+
+When PREVIEW_BUNDLE_ROOT is set, the document for each snippet version is
+also written there, with a .gz variant, by a task queued on save; the
+preview view serves it from disk and only assembles documents for versions
+that haven't been bundled yet. User code goes in exactly as written: the
+minifiers in DesignTemplate.staticfiles are only safe on our own assets.
+
+Bundles live at ``<root>/<snippet id>/<version>-<shell hash>.html``, so a
+new save or a change to the shell (e.g. a Three.js upgrade) gets a new name.
+"""
+
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import threading
+from contextlib import suppress
+from functools import lru_cache
+
+from django.conf import settings
+from django.templatetags.static import static
+
+from metrics.registry import CACHE_REQUESTS
+from taskqueue.queue import enqueue
+
+THREE_JS = 'playground/vendor/three-r129.min.js'
+BUNDLE_ROOT = getattr(settings, 'PREVIEW_BUNDLE_ROOT', None)
+
+# A closing tag inside user CSS/JS would end the element early
+STYLE_END_RE = re.compile(r'</(style)', re.IGNORECASE)
+SCRIPT_END_RE = re.compile(r'</(script)', re.IGNORECASE)
+
+HEAD = (
+    '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="UTF-8">\n'
+    '<meta name="viewport" content="width=device-width, initial-scale=1.0">\n'
+)
+
+
+@lru_cache(maxsize=None)
+def shell(environment):
+    """(before CSS, before HTML, before JS, end) fragments for an environment"""
+    if environment == '3d':
+        head = HEAD + f'<script src="{static(THREE_JS)}"></script>\n<style>body{{margin:0;overflow:hidden}}\n'
+    else:
+        head = HEAD + '<style>'
+    fragments = (head, '</style>\n</head>\n<body>\n', '\n<script>', '</script>\n</body>\n</html>\n')
+    return tuple(fragment.encode('utf-8') for fragment in fragments)
+
+
+@lru_cache(maxsize=None)
+def shell_hash(environment):
+    return hashlib.sha256(b'\0'.join(shell(environment))).hexdigest()[:12]
+
+
+def version_token(snippet):
+    """Changes whenever the snippet's preview document does; used in preview URLs"""
+    return f'{snippet.version}-{shell_hash(snippet.environment)}'
+
+
+def etag(snippet):
+    return f'"{snippet.pk.hex}-{version_token(snippet)}"'
+
+
+def render(snippet):
+    """The full preview document for ``snippet`` as UTF-8 bytes"""
+    css = snippet.css_code or ''
+    js = snippet.js_code or ''
+    head, body, script, end = shell(snippet.environment)
+    return b''.join([
+        head,
+        STYLE_END_RE.sub(r'<\\/\1', css).encode('utf-8'),
+        body,
+        (snippet.html_code or '').encode('utf-8'),
+        script,
+        SCRIPT_END_RE.sub(r'<\\/\1', js).encode('utf-8'),
+        end,
+    ])
+
+
+def bundle_path(snippet):
+    return os.path.join(str(BUNDLE_ROOT), snippet.pk.hex, f'{version_token(snippet)}.html')
+
+
+def write_bundle(snippet):
+    """Write the bundle for the snippet's current version, dropping older ones"""
+    path = bundle_path(snippet)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    document = render(snippet)
+    for name, data in ((path, document), (path + '.gz', gzip.compress(document, compresslevel=9, mtime=0))):
+        # Readers never see a half-written file
+        temp = f'{name}.{os.getpid()}-{threading.get_ident()}.tmp'
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, name)
+    keep = {os.path.basename(path), os.path.basename(path) + '.gz'}
+    for entry in os.scandir(directory):
+        if entry.name not in keep and not entry.name.endswith('.tmp'):
+            with suppress(FileNotFoundError):
+                os.remove(entry.path)
+    return path
+
+
+def load(snippet, gzipped=False):
+    """(document, content coding), from the bundle when there is one (writing it if missing)"""
+    if not BUNDLE_ROOT:
+        return render(snippet), None
+    path = bundle_path(snippet)
+    if os.path.exists(path):
+        CACHE_REQUESTS.inc(cache='preview_bundle', result='hit')
+    else:
+        CACHE_REQUESTS.inc(cache='preview_bundle', result='miss')
+        write_bundle(snippet)
+    if gzipped:
+        path += '.gz'
+    try:
+        with open(path, 'rb') as f:
+            return f.read(), 'gzip' if gzipped else None
+    except FileNotFoundError:
+        # Replaced by a newer save in the meantime
+        return render(snippet), None
+
+
+def remove_bundles(snippet_id):
+    if BUNDLE_ROOT:
+        shutil.rmtree(os.path.join(str(BUNDLE_ROOT), snippet_id.hex), ignore_errors=True)
+
+
+def schedule(snippet):
+    """Queue a rebuild of the snippet's bundle after a save"""
+    if BUNDLE_ROOT:
+        enqueue('playground.build_previews', {'snippet_id': str(snippet.pk)})
@@ -0,0 +1,171 @@
+"""
+Soft deletion of snippets and users, with a background purger.
+
+Deleting only stamps ``deleted_at``. The default managers leave stamped
+rows out, so a deleted snippet or account disappears at once without the
+request touching the (possibly millions of) rows that depend on it.
+
+``manage.py purge_deleted`` then removes stamped rows. Dependents are found
+from the model relations, like Django's deletion collector does:
+
+* cascading relations are deleted, and SET_NULL ones cleared, in batches of
+  PURGE_BATCH_SIZE rows, each its own short transaction, with a pause of
+  PURGE_PAUSE_SECONDS after every batch so other writers get the database;
+* a dependent with dependents of its own (a user's snippets) is purged
+  recursively;
+* the row itself goes last, once nothing refers to it.
+
+Progress lives in the data itself, so an interrupted purge carries on where
+it stopped the next time it runs.
+
+Rows on snippet shards (see playground.sharding) are purged on the database
+they live on: a snippet's on its own, a user's on every one, since they may
+have liked or commented anywhere.
+"""
+
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, models
+from django.utils import timezone
+
+from . import embeds, previews, sharding
+from .models import Snippet, SnippetLocation
+
+BATCH_SIZE = getattr(settings, 'PURGE_BATCH_SIZE', 1000)
+PAUSE_SECONDS = getattr(settings, 'PURGE_PAUSE_SECONDS', 0.05)
+
+
+def delete_snippet(snippet):
+    """Hide a snippet now; its rows are purged later"""
+    Snippet.all_objects.using(snippet._state.db).filter(pk=snippet.pk).update(deleted_at=timezone.now())
+    previews.remove_bundles(snippet.pk)
+    embeds.purge(snippet)
+
+
+def delete_snippets(snippets):
+    """
+    Hide the snippets of the queryset ``snippets`` now, in one UPDATE with
+    one CDN purge for all of them; returns their ids. Call it inside a
+    transaction on their database.
+    """
+    snippets = snippets.filter(deleted_at__isnull=True)
+    snippet_ids = list(snippets.select_for_update().values_list('pk', flat=True))
+    if snippet_ids:
+        snippets.filter(pk__in=snippet_ids).update(deleted_at=timezone.now())
+        for snippet_id in snippet_ids:
+            previews.remove_bundles(snippet_id)
+        embeds.purge_keys([embeds.snippet_key(snippet_id) for snippet_id in snippet_ids])
+    return snippet_ids
+
+
+def delete_user(user):
+    """Hide an account and its snippets now; everything is purged later"""
+    now = timezone.now()
+    User = get_user_model()
+    with sharding.atomic(sharding.shard_of(user)):
+        User.all_objects.filter(pk=user.pk).update(
+            deleted_at=now,
+            is_active=False,
+            # Free the username for new sign-ups; ':' can't appear in a real one
+            username=f'deleted:{user.pk}',
+        )
+        Snippet.all_objects.filter(user=user, deleted_at__isnull=True).update(deleted_at=now)
+        embeds.purge_keys([embeds.user_key(user.pk)])
+
+
+def delete(obj):
+    if isinstance(obj, Snippet):
+        delete_snippet(obj)
+    else:
+        delete_user(obj)
+
+
+@lru_cache(maxsize=None)
+def relations(model):
+    """Reverse relations that make a row depend on a ``model`` row"""
+    return [
+        relation
+        for relation in model._meta.get_fields(include_hidden=True)
+        if relation.auto_created
+        and not relation.concrete
+        and (relation.one_to_many or relation.one_to_one)
+        and relation.on_delete in (models.CASCADE, models.SET_NULL)
+    ]
+
+
+def databases(model, obj):
+    """The databases rows of ``model`` depending on ``obj`` can be in"""
+    if not sharding.is_sharded(model):
+        return [DEFAULT_DB_ALIAS]
+    if sharding.is_sharded(type(obj)):
+        return [obj._state.db]
+    return sharding.databases()
+
+
+def purge(obj, deadline=None, batch_size=BATCH_SIZE, pause=PAUSE_SECONDS, stats=None):
+    """
+    Remove everything depending on ``obj``, then ``obj`` itself.
+
+    Returns False if ``deadline`` (a time.monotonic() value) passed first.
+    ``stats``, if given, counts the rows deleted per model, and those only
+    detached (SET_NULL) per field as ``'<model>.<field> cleared'``.
+    """
+    for relation in relations(type(obj)):
+        model = relation.related_model
+        field = relation.field.attname
+        for alias in databases(model, obj):
+            manager = model._base_manager.db_manager(alias)
+            while True:
+                rows = manager.filter(**{field: obj.pk})
+                if relation.on_delete is models.CASCADE and relations(model):
+                    child = rows.only('pk').order_by('pk').first()
+                    if child is None:
+                        break
+                    if not purge(child, deadline, batch_size, pause, stats):
+                        return False
+                    continue
+                ids = list(rows.order_by().values_list('pk', flat=True)[:batch_size])
+                if not ids:
+                    break
+                # Checked only before real work, so every run gets past relations already done
+                if deadline is not None and time.monotonic() > deadline:
+                    return False
+                if relation.on_delete is models.CASCADE:
+                    manager.filter(pk__in=ids).delete()
+                    key = model._meta.label
+                else:
+                    manager.filter(pk__in=ids).update(**{field: None})
+                    key = f'{model._meta.label}.{relation.field.name} cleared'
+                if stats is not None:
+                    stats[key] += len(ids)
+                if pause:
+                    time.sleep(pause)
+    # Nothing refers to it any more, so the collector has nothing to load
+    type(obj)._base_manager.db_manager(obj._state.db).filter(pk=obj.pk).delete()
+    if isinstance(obj, Snippet):
+        # Its slug is free again
+        SnippetLocation.objects.filter(snippet_id=obj.pk).delete()
+    if stats is not None:
+        stats[obj._meta.label] += 1
+    return True
+
+
+def pending():
+    """Deleted users, then each database's deleted snippets, oldest first"""
+    users = get_user_model()._base_manager.filter(deleted_at__isnull=False)
+    snippets = [Snippet._base_manager.using(alias).filter(deleted_at__isnull=False) for alias in sharding.databases()]
+    for rows in (users, *snippets):
+        # Listed up front: SQLite cursors don't mix with deleting from the same table
+        yield from list(rows.order_by('deleted_at').only('pk'))
+
+
+def purge_pending(max_seconds=None, batch_size=BATCH_SIZE, pause=PAUSE_SECONDS, stats=None):
+    """Purge deleted users and snippets; returns True once none are left"""
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    for obj in pending():
+        if not purge(obj, deadline, batch_size, pause, stats):
+            return False
+    return True
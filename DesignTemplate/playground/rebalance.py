@@ -0,0 +1,148 @@
+"""
+Moving users' snippet data between shards.
+
+After SNIPPET_SHARDS changes, ``sharding.home`` puts some users on another
+shard than ``User.shard`` records. ``move_user`` moves one of them: inside a
+transaction on the old shard it
+
+* write-locks the user's snippets there (on SQLite, the whole shard), so no
+  like, view, comment or edit lands on them while they're copied;
+* copies the snippets and every sharded row hanging off them (likes, views,
+  comments, revisions, signatures, rollups) to the new shard, in one
+  transaction there;
+* switches ``User.shard``, from which point reads go to the new shard;
+* deletes the originals.
+
+Rows keep their primary keys and timestamps, except auto-increment ids,
+which each shard assigns itself. Nothing in 'default' changes apart from
+``User.shard``: the SnippetLocation directory resolves shards through it.
+
+A move can leave rows behind on a database that isn't their owner's: copies
+from a move interrupted before the switch, or a snippet the user created on
+the old shard while being moved. ``settle_strays`` finds them; a snippet
+already on its owner's shard is dropped, any other one is moved there.
+"""
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models import F
+
+from . import sharding
+from .models import Snippet
+
+BATCH_SIZE = getattr(settings, 'SHARD_MOVE_BATCH_SIZE', 1000)
+
+
+def dependents():
+    """Sharded models whose rows belong to a snippet and move with it"""
+    return [
+        model
+        for model in apps.get_models()
+        if sharding.is_sharded(model) and any(field.name == 'snippet' for field in model._meta.concrete_fields)
+    ]
+
+
+def pending():
+    """Active users whose data isn't on their home shard"""
+    users = get_user_model().objects.only('pk', 'shard').order_by('pk')
+    # Listed up front: SQLite cursors don't mix with updating the same table
+    return [user for user in users.iterator() if sharding.shard_of(user) != sharding.home(user.pk)]
+
+
+def _chunks(items, size):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _copy(queryset, target, batch_size):
+    """INSERT the rows of ``queryset`` into ``target`` as stored; no save(), so timestamps are kept"""
+    model = queryset.model
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not (field.primary_key and isinstance(field, models.AutoField))
+    ]
+    connection = connections[target]
+    qn = connection.ops.quote_name
+    sql = (
+        f'INSERT INTO {qn(model._meta.db_table)} ({", ".join(qn(field.column) for field in fields)}) '
+        f'VALUES ({", ".join(["%s"] * len(fields))})'
+    )
+    rows = queryset.order_by().values_list(*(field.attname for field in fields))
+    batch = []
+    with connection.cursor() as cursor:
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append([field.get_db_prep_save(value, connection) for field, value in zip(fields, row)])
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+
+
+def _delete(snippet_ids, alias, batch_size):
+    """Delete snippets and their dependents from ``alias`` without cascading into other databases' tables"""
+    for chunk in _chunks(snippet_ids, batch_size):
+        for model in dependents():
+            model._base_manager.using(alias).filter(snippet_id__in=chunk)._raw_delete(alias)
+        Snippet._base_manager.using(alias).filter(pk__in=chunk)._raw_delete(alias)
+
+
+def _transfer(snippet_ids, source, target, batch_size):
+    """Copy snippets and their dependents, replacing any earlier copies on ``target``"""
+    with transaction.atomic(using=target):
+        _delete(snippet_ids, target, batch_size)
+        for chunk in _chunks(snippet_ids, batch_size):
+            _copy(Snippet._base_manager.using(source).filter(pk__in=chunk), target, batch_size)
+            for model in dependents():
+                _copy(model._base_manager.using(source).filter(snippet_id__in=chunk), target, batch_size)
+
+
+def _lock(alias, user_id):
+    """Write-lock the user's snippets on ``alias`` (inside a transaction there); returns their ids"""
+    snippets = Snippet._base_manager.using(alias).filter(user_id=user_id)
+    # A no-op write: row locks elsewhere, SQLite's database lock here
+    snippets.update(version=F('version'))
+    return list(snippets.values_list('pk', flat=True))
+
+
+def move_user(user, batch_size=BATCH_SIZE):
+    """Move a user's snippet data to their home shard; returns the snippets moved, or None if raced"""
+    source, target = sharding.shard_of(user), sharding.home(user.pk)
+    with transaction.atomic(using=source):
+        snippet_ids = _lock(source, user.pk)
+        _transfer(snippet_ids, source, target, batch_size)
+        switched = get_user_model().all_objects.filter(pk=user.pk, shard=user.shard).update(shard=target)
+        if not switched:
+            # Moved by another run; the copies are cleaned up as strays
+            transaction.set_rollback(True, using=source)
+            return None
+        user.shard = target
+        _delete(snippet_ids, source, batch_size)
+    return len(snippet_ids)
+
+
+def strays():
+    """(database, user id, owner's shard) for users with snippets on a database other than theirs"""
+    User = get_user_model()
+    for alias in sharding.databases():
+        owners = Snippet._base_manager.using(alias).order_by().values_list('user_id', flat=True).distinct()
+        for chunk in _chunks(owners, BATCH_SIZE):
+            for user_id, shard in list(User.all_objects.filter(pk__in=chunk).values_list('pk', 'shard')):
+                if (shard or DEFAULT_DB_ALIAS) != alias:
+                    yield alias, user_id, shard or DEFAULT_DB_ALIAS
+
+
+def settle_strays(alias, user_id, target, batch_size=BATCH_SIZE):
+    """Move a user's snippets on ``alias`` to ``target``, dropping ones already there; returns (moved, dropped)"""
+    with transaction.atomic(using=alias):
+        snippet_ids = _lock(alias, user_id)
+        settled = set()
+        for chunk in _chunks(snippet_ids, batch_size):
+            settled.update(Snippet._base_manager.using(target).filter(pk__in=chunk).values_list('pk', flat=True))
+        missing = [pk for pk in snippet_ids if pk not in settled]
+        _transfer(missing, alias, target, batch_size)
+        _delete(snippet_ids, alias, batch_size)
+    return len(missing), len(settled)
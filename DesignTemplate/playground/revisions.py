@@ -0,0 +1,194 @@
+"""
+Snippet revision history stored as compressed reverse deltas.
+
+The newest revision of a snippet is always a full snapshot. When a new
+revision is recorded, the previous head is rewritten as a delta that turns
+the new head's code back into its own, unless its number is a multiple of
+REVISION_KEYFRAME_INTERVAL, in which case it stays a full keyframe. Any
+revision is therefore rebuilt from the nearest newer keyframe (or the head)
+by applying at most REVISION_KEYFRAME_INTERVAL - 1 deltas.
+
+Deltas are line based. Each code field maps to a list of ops applied to the
+newer text's lines: a positive int copies that many lines, a negative int
+skips that many, and a list inserts those lines. Unchanged fields are omitted.
+"""
+
+import difflib
+import json
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .deltas import CODE_FIELDS
+from .models import Revision
+
+KEYFRAME_INTERVAL = getattr(settings, 'REVISION_KEYFRAME_INTERVAL', 50)
+COALESCE_SECONDS = getattr(settings, 'REVISION_COALESCE_SECONDS', 120)
+
+
+def pack(payload):
+    return zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), 6)
+
+
+def unpack(data):
+    return json.loads(zlib.decompress(bytes(data)).decode('utf-8'))
+
+
+def make_ops(newer, older):
+    """Ops that rebuild ``older`` from ``newer``"""
+    a = newer.splitlines(keepends=True)
+    b = older.splitlines(keepends=True)
+
+    # Trim the common prefix/suffix first; SequenceMatcher is quadratic
+    prefix = 0
+    while prefix < min(len(a), len(b)) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < min(len(a), len(b)) - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+
+    ops = [prefix] if prefix else []
+    middle_a = a[prefix:len(a) - suffix]
+    middle_b = b[prefix:len(b) - suffix]
+    matcher = difflib.SequenceMatcher(None, middle_a, middle_b, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append(i2 - i1)
+        else:
+            if i2 > i1:
+                ops.append(-(i2 - i1))
+            if j2 > j1:
+                ops.append(middle_b[j1:j2])
+    if suffix:
+        ops.append(suffix)
+    return ops
+
+
+def apply_ops(newer, ops):
+    lines = newer.splitlines(keepends=True)
+    out = []
+    pos = 0
+    for op in ops:
+        if isinstance(op, list):
+            out.extend(op)
+        elif op > 0:
+            out.extend(lines[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return ''.join(out)
+
+
+def snapshot(snippet):
+    return {field: getattr(snippet, field) or '' for field in CODE_FIELDS}
+
+
+def reverse_delta(newer, older):
+    return {
+        field: make_ops(newer[field], older[field])
+        for field in CODE_FIELDS
+        if newer[field] != older[field]
+    }
+
+
+def record_revision(snippet):
+    """
+    Record the snippet's current code as its newest revision.
+
+    Saves landing within REVISION_COALESCE_SECONDS of the previous head
+    (typically autosaves) update that head in place instead of growing the
+    history; the delta of the revision before it is rebased onto the new
+    code in the same transaction.
+    """
+    current = snapshot(snippet)
+    # Revisions live on the snippet's shard (see playground.sharding)
+    with transaction.atomic(using=snippet._state.db):
+        head = Revision.objects.filter(snippet=snippet).order_by('-number').first()
+        if head is not None:
+            head_code = unpack(head.data)
+            if head_code == current and head.title == snippet.title:
+                return head
+            if head.created_at >= timezone.now() - timedelta(seconds=COALESCE_SECONDS):
+                # The revision before the head is a delta against the head's code, so it moves with it
+                previous = Revision.objects.filter(
+                    snippet=snippet, number=head.number - 1, is_keyframe=False
+                ).only('data').first()
+                if previous is not None:
+                    previous_code = apply_delta(head_code, unpack(previous.data))
+                    previous.data = pack(reverse_delta(current, previous_code))
+                    previous.save(update_fields=['data'])
+                head.data = pack(current)
+                head.title = snippet.title
+                head.size = sum(len(v) for v in current.values())
+                head.save(update_fields=['data', 'title', 'size'])
+                return head
+            if head.number % KEYFRAME_INTERVAL:
+                head.data = pack(reverse_delta(current, head_code))
+                head.is_keyframe = False
+                head.save(update_fields=['data', 'is_keyframe'])
+
+        try:
+            with transaction.atomic(using=snippet._state.db):
+                return Revision.objects.create(
+                    snippet=snippet,
+                    number=head.number + 1 if head else 1,
+                    title=snippet.title,
+                    is_keyframe=True,
+                    data=pack(current),
+                    size=sum(len(v) for v in current.values()),
+                )
+        except IntegrityError:
+            # A concurrent save recorded this number first; its snapshot wins
+            return None
+
+
+def apply_delta(newer, delta):
+    """The code ``delta`` rebuilds from the ``newer`` code"""
+    return {
+        field: apply_ops(newer[field], delta[field]) if field in delta else newer[field]
+        for field in CODE_FIELDS
+    }
+
+
+def reconstruct(snippet, number):
+    """Return {field: code} for revision ``number``, or None if it doesn't exist"""
+    rows = list(
+        Revision.objects.filter(
+            snippet=snippet,
+            number__gte=number,
+            number__lte=number + KEYFRAME_INTERVAL,
+        ).order_by('number').only('number', 'is_keyframe', 'data')
+    )
+    if not rows or rows[0].number != number:
+        return None
+
+    # Walk up to the nearest full snapshot, then apply deltas back down
+    chain = []
+    for row in rows:
+        chain.append(row)
+        if row.is_keyframe:
+            break
+    code = unpack(chain[-1].data)
+    for row in reversed(chain[:-1]):
+        code = apply_delta(code, unpack(row.data))
+    return code
+
+
+def diff(snippet, number, other):
+    """Unified diffs per code field between two revisions"""
+    old, new = reconstruct(snippet, number), reconstruct(snippet, other)
+    if old is None or new is None:
+        return None
+    return {
+        field: ''.join(difflib.unified_diff(
+            old[field].splitlines(keepends=True),
+            new[field].splitlines(keepends=True),
+            fromfile=f'r{number}/{field}',
+            tofile=f'r{other}/{field}',
+        ))
+        for field in CODE_FIELDS
+        if old[field] != new[field]
+    }
@@ -0,0 +1,325 @@
+"""
+Horizontal sharding of snippet data by user.
+
+Each user's snippets live in one database of SNIPPET_SHARDS together with
+the rows hanging off them (likes, views, comments, revisions, code
+signatures and view rollups), so a snippet page or a burst of likes and
+views touches a single shard. Users, follows, timelines, the similarity
+index, the SnippetLocation directory and the task queue stay in 'default'.
+With no SNIPPET_SHARDS everything is in 'default' and none of this costs a
+query.
+
+A user's shard is stored on the user (``User.shard``; empty means
+'default'). New users are placed by rendezvous hashing of their id over
+SNIPPET_SHARDS, so adding a shard changes the placement only of the users
+who should move onto it; ``manage.py rebalance_shards`` moves them (see
+playground.rebalance).
+
+Queries find their database in three ways:
+
+* ``ShardRouter`` sends rows related to a loaded instance to that
+  instance's database (``snippet.comments``, ``user.snippets``, saving a
+  new snippet or like) and every other model to 'default';
+* ``ShardedQuerySet`` pins a query to a shard when it filters on a shard
+  key: ``user`` for snippets, ``snippet`` for their dependents, or a
+  snippet ``pk``/``slug``, looked up in the SnippetLocation directory;
+* code working through one shard at a time (task batches, rollups,
+  purges, index builds) runs inside ``use(alias)``, and ``scatter`` and
+  ``newest`` read from several shards.
+
+Snippet rows refer to users, and tables in 'default' to snippets, by id
+without database constraints; rows in one shard reference each other with
+ordinary foreign keys.
+"""
+
+import heapq
+from contextlib import contextmanager
+from contextvars import ContextVar
+from hashlib import blake2b
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models import Q, prefetch_related_objects
+
+SHARDS = list(getattr(settings, 'SNIPPET_SHARDS', []))
+NEWEST_CACHE_SECONDS = getattr(settings, 'SNIPPET_FEED_INDEX_SECONDS', 30)
+
+# Models stored on their snippet's shard (a snippet on its owner's)
+SHARDED_MODELS = {
+    'playground.snippet',
+    'playground.like',
+    'playground.view',
+    'playground.comment',
+    'playground.revision',
+    'analytics.hourlysnippetviews',
+    'analytics.dailysnippetviews',
+    'analytics.dailyuseragentviews',
+    'analytics.uniqueviewersketch',
+    'analytics.rollupcursor',
+    'recommendations.snippetsignature',
+}
+
+_current = ContextVar('snippet_shard', default=None)
+
+
+def enabled():
+    return bool(SHARDS)
+
+
+def is_sharded(model):
+    """Whether rows of ``model`` (a model or an instance) live on snippet shards"""
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def databases():
+    """Every database that can hold snippet data"""
+    return list(dict.fromkeys([DEFAULT_DB_ALIAS, *SHARDS]))
+
+
+def home(user_id):
+    """The shard a user belongs on: the highest hash of (shard, user id)"""
+    if not SHARDS:
+        return DEFAULT_DB_ALIAS
+    return max(SHARDS, key=lambda alias: blake2b(f'{alias}:{user_id}'.encode(), digest_size=8).digest())
+
+
+def shard_of(user):
+    return user.shard or DEFAULT_DB_ALIAS
+
+
+def user_shard(user_id):
+    if not SHARDS:
+        return DEFAULT_DB_ALIAS
+    shard = get_user_model().all_objects.filter(pk=user_id).values_list('shard', flat=True).first()
+    return shard or DEFAULT_DB_ALIAS
+
+
+def place_user(sender, instance, created, raw=False, **kwargs):
+    """post_save handler putting new users on their home shard"""
+    if created and not raw and SHARDS and not instance.shard:
+        instance.shard = home(instance.pk)
+        sender.all_objects.filter(pk=instance.pk).update(shard=instance.shard)
+
+
+def locate(snippet_id=None, slug=None):
+    """The database holding a snippet, by id or slug"""
+    if not SHARDS:
+        return DEFAULT_DB_ALIAS
+    lookup = {'snippet_id': snippet_id} if snippet_id is not None else {'slug': slug}
+    SnippetLocation = apps.get_model('playground', 'SnippetLocation')
+    shard = SnippetLocation.objects.filter(**lookup).values_list('user__shard', flat=True).first()
+    return shard or DEFAULT_DB_ALIAS
+
+
+def shards_of(snippet_ids=(), slugs=()):
+    """{alias: snippet ids} for snippets given by id or slug, or None when sharding is off"""
+    if not SHARDS:
+        return None
+    SnippetLocation = apps.get_model('playground', 'SnippetLocation')
+    rows = SnippetLocation.objects.filter(Q(snippet_id__in=list(snippet_ids)) | Q(slug__in=list(slugs)))
+    grouped = {}
+    for snippet_id, shard in rows.values_list('snippet_id', 'user__shard'):
+        grouped.setdefault(shard or DEFAULT_DB_ALIAS, []).append(snippet_id)
+    return grouped
+
+
+def by_database(objs):
+    """{alias: primary keys} of loaded instances"""
+    grouped = {}
+    for obj in objs:
+        grouped.setdefault(obj._state.db, []).append(obj.pk)
+    return grouped
+
+
+def split(items, snippet_id):
+    """{alias: items} by the database of each item's snippet; items of unknown snippets are dropped"""
+    items = list(items)
+    if not SHARDS:
+        return {DEFAULT_DB_ALIAS: items} if items else {}
+    where = {
+        str(pk): alias
+        for alias, ids in shards_of({snippet_id(item) for item in items}).items()
+        for pk in ids
+    }
+    grouped = {}
+    for item in items:
+        alias = where.get(str(snippet_id(item)))
+        if alias is not None:
+            grouped.setdefault(alias, []).append(item)
+    return grouped
+
+
+def scatter(queryset, shards=None, field='pk'):
+    """
+    ``queryset`` evaluated on several databases, results concatenated: on
+    each alias of ``shards`` (as from shards_of) restricted to its snippet
+    ids in ``field``, or on every snippet database when None.
+    """
+    if shards is None:
+        return [row for alias in databases() for row in queryset.using(alias)]
+    return [
+        row
+        for alias, ids in shards.items()
+        for row in queryset.using(alias).filter(**{f'{field}__in': ids})
+    ]
+
+
+def fetch(queryset, snippet_ids, field='pk'):
+    """``queryset`` restricted to the snippets ``snippet_ids`` (in ``field``), from the shards holding them"""
+    if not SHARDS:
+        return list(queryset.filter(**{f'{field}__in': list(snippet_ids)}))
+    return scatter(queryset, shards_of(snippet_ids), field)
+
+
+def newest(queryset, limit):
+    """
+    The ``limit`` newest snippets of ``queryset`` across shards, with users.
+
+    Each shard's newest (created_at, pk) pairs are merged into one index,
+    which is cached for SNIPPET_FEED_INDEX_SECONDS per query; the snippets
+    themselves are then fetched from their shards by primary key, so ones
+    hidden or deleted since drop out.
+    """
+    key = 'snippet-newest:' + blake2b(f'{queryset.query}|{limit}'.encode(), digest_size=16).hexdigest()
+    index = cache.get(key)
+    if index is None:
+        ordered = queryset.order_by('-created_at', '-pk').values_list('created_at', 'pk')
+        streams = [
+            [(created_at, pk, alias) for created_at, pk in ordered.using(alias)[:limit]]
+            for alias in databases()
+        ]
+        index, seen = [], set()
+        for _, pk, alias in heapq.merge(*streams, reverse=True):
+            # A user being moved by rebalance_shards can briefly be on two shards
+            if pk not in seen and len(index) < limit:
+                seen.add(pk)
+                index.append((pk, alias))
+        cache.set(key, index, NEWEST_CACHE_SECONDS)
+
+    shards = {}
+    for pk, alias in index:
+        shards.setdefault(alias, []).append(pk)
+    found = {obj.pk: obj for obj in scatter(queryset, shards)}
+    snippets = [found[pk] for pk, _ in index if pk in found]
+    prefetch_related_objects(snippets, 'user')
+    return snippets
+
+
+def with_users(queryset, *fields):
+    """Load the user foreign keys ``fields`` with a join, or a second query when users live elsewhere"""
+    fields = fields or ('user',)
+    if SHARDS:
+        return queryset.prefetch_related(*fields)
+    return queryset.select_related(*fields)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def use(alias):
+    """Send sharded models with no shard key of their own to ``alias`` inside the block"""
+    token = _current.set(alias)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def atomic(alias):
+    """A transaction on ``alias`` inside one on 'default', where tasks are queued"""
+    with transaction.atomic():
+        if alias == DEFAULT_DB_ALIAS:
+            yield
+        else:
+            with transaction.atomic(using=alias):
+                yield
+
+
+def route(model, lookups):
+    """The shard ``model`` rows matching ``lookups`` (filter or create arguments) are on, if a key pins it"""
+    if model._meta.label_lower == 'playground.snippet':
+        user = lookups.get('user', lookups.get('user_id'))
+        if user is not None:
+            return shard_of(user) if isinstance(user, models.Model) else user_shard(user)
+        for key in ('pk', 'id'):
+            if lookups.get(key) is not None:
+                return locate(snippet_id=lookups[key])
+        if lookups.get('slug'):
+            return locate(slug=lookups['slug'])
+        return None
+    snippet = lookups.get('snippet', lookups.get('snippet_id'))
+    if isinstance(snippet, models.Model):
+        return instance_shard(snippet)
+    if snippet is not None:
+        return locate(snippet_id=snippet)
+    return None
+
+
+def instance_shard(instance):
+    """The shard of a sharded model instance, saved or about to be"""
+    if not instance._state.adding:
+        return instance._state.db
+    opts = instance._meta
+    if opts.label_lower == 'playground.snippet':
+        if opts.get_field('user').is_cached(instance):
+            return shard_of(instance.user)
+        return user_shard(instance.user_id)
+    if any(field.name == 'snippet' for field in opts.concrete_fields):
+        if opts.get_field('snippet').is_cached(instance):
+            return instance_shard(instance.snippet)
+        return locate(snippet_id=instance.snippet_id)
+    return None
+
+
+class ShardRouter:
+    """Sharded models to their snippet's shard, everything else to 'default'"""
+
+    def db_for_read(self, model, **hints):
+        if not SHARDS:
+            return None
+        if not is_sharded(model):
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and is_sharded(instance) and not instance._state.adding:
+            return instance._state.db
+        if current() is not None:
+            return current()
+        if instance is None:
+            return None
+        if is_sharded(instance):
+            return instance_shard(instance)
+        if model._meta.label_lower == 'playground.snippet' and isinstance(instance, get_user_model()):
+            return shard_of(instance)
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Snippet rows point at users, and 'default' rows at snippets, across databases
+        return True
+
+
+class ShardedQuerySet(models.QuerySet):
+    """Pins itself to a shard when filter() or create() is given a shard key (see ``route``)"""
+
+    def _unrouted(self):
+        return SHARDS and self._db is None and not self._hints and current() is None
+
+    def _filter_or_exclude(self, negate, args, kwargs):
+        clone = super()._filter_or_exclude(negate, args, kwargs)
+        if not negate and self._unrouted():
+            clone._db = route(self.model, kwargs)
+        return clone
+
+    def create(self, **kwargs):
+        if self._unrouted():
+            alias = route(self.model, kwargs)
+            if alias is not None:
+                return self.using(alias).create(**kwargs)
+        return super().create(**kwargs)
@@ -65,11 +65,14 @@ require(['vs/editor/editor.main'], function () {
         editor.onDidChangeModelContent(() => {
             clearTimeout(updateTimeout);
             updateTimeout = setTimeout(updatePreview, 500);
+            scheduleAutosave();
         });
     });
 
     // Initial preview render
     updatePreview();
+
+    if (COLLAB_TOKEN) startCollab();
 });
 
 // ========================
@@ -103,7 +106,7 @@ function updatePreview() {
     let fullHTML = '';
 
     if (environment === '3d') {
-        // Inject Three.js CDN for 3D environment
+        // Inject the vendored Three.js build for 3D environment (absolute, blob: documents have no base URL)
         fullHTML = `
             <!DOCTYPE html>
             <html lang="en">
@@ -117,7 +120,7 @@ function updatePreview() {
                     }
                     ${css}
                 </style>
-                <script src="https://cdnjs.cloudflare.com/ajax/libs/three.js/r128/three.min.js"><\/script>
+                <script src="${new URL(THREE_JS_URL, location.href)}"><\/script>
             </head>
             <body>
                 ${html}
@@ -184,8 +187,158 @@ document.getElementById('refresh-preview').addEventListener('click', () => {
 // Environment change handler
 document.getElementById('environment').addEventListener('change', () => {
     updatePreview();
+    scheduleAutosave();
+});
+
+document.getElementById('snippet-title').addEventListener('input', () => {
+    scheduleAutosave();
 });
 
+// ========================
+// Autosave (delta protocol)
+// ========================
+
+const AUTOSAVE_DELAY = 2000;
+let autosaveTimeout;
+let autosaveInFlight = false;
+let autosaveDone = Promise.resolve();  // Settles when the running autosave has its answer
+let autosaveBlocked = false;
+let autosaveFullSync = false;
+
+// What the server currently has, as of SNIPPET_DATA.version
+const savedState = {
+    title: document.getElementById('snippet-title').value,
+    environment: SNIPPET_DATA.environment,
+    html_code: SNIPPET_DATA.html || '',
+    css_code: SNIPPET_DATA.css || '',
+    js_code: SNIPPET_DATA.js || '',
+};
+
+function currentState() {
+    return {
+        title: document.getElementById('snippet-title').value || 'Untitled',
+        environment: document.getElementById('environment').value,
+        html_code: htmlEditor.getValue(),
+        css_code: cssEditor.getValue(),
+        js_code: jsEditor.getValue(),
+    };
+}
+
+function setAutosaveStatus(text, isError = false) {
+    const status = document.getElementById('autosave-status');
+    status.textContent = text;
+    status.classList.toggle('error', isError);
+}
+
+function scheduleAutosave() {
+    // New snippets are created by the explicit Save button; live sessions save themselves
+    if (!SNIPPET_DATA.id || autosaveBlocked || collab) return;
+    clearTimeout(autosaveTimeout);
+    autosaveTimeout = setTimeout(autosave, AUTOSAVE_DELAY);
+}
+
+async function sha256(text) {
+    const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+function isHighSurrogate(code) {
+    return code >= 0xD800 && code <= 0xDBFF;
+}
+
+// Single splice turning oldText into newText (UTF-16 offsets, never splitting surrogate pairs)
+function computeSplice(oldText, newText) {
+    const minLength = Math.min(oldText.length, newText.length);
+    let start = 0;
+    while (start < minLength && oldText[start] === newText[start]) start++;
+    if (start > 0 && isHighSurrogate(oldText.charCodeAt(start - 1))) start--;
+
+    let oldEnd = oldText.length;
+    let newEnd = newText.length;
+    while (oldEnd > start && newEnd > start && oldText[oldEnd - 1] === newText[newEnd - 1]) {
+        oldEnd--;
+        newEnd--;
+    }
+    if (oldEnd < oldText.length && isHighSurrogate(oldText.charCodeAt(oldEnd - 1))) {
+        oldEnd++;
+        newEnd++;
+    }
+    return { start, end: oldEnd, text: newText.slice(start, newEnd) };
+}
+
+async function autosave() {
+    if (!SNIPPET_DATA.id || autosaveBlocked || !htmlEditor) return;
+    if (autosaveInFlight) {
+        scheduleAutosave();
+        return;
+    }
+
+    autosaveInFlight = true;
+    let finished;
+    autosaveDone = new Promise(resolve => { finished = resolve; });
+    try {
+        const state = currentState();
+        const payload = { id: SNIPPET_DATA.id, version: SNIPPET_DATA.version, fields: {}, deltas: {} };
+        let changed = false;
+
+        for (const field of ['title', 'environment']) {
+            if (state[field] !== savedState[field]) {
+                payload.fields[field] = state[field];
+                changed = true;
+            }
+        }
+        for (const field of ['html_code', 'css_code', 'js_code']) {
+            if (state[field] === savedState[field]) continue;
+            changed = true;
+            if (autosaveFullSync || !(window.crypto && crypto.subtle)) {
+                payload.fields[field] = state[field];
+            } else {
+                payload.deltas[field] = {
+                    base: await sha256(savedState[field]),
+                    hash: await sha256(state[field]),
+                    ...computeSplice(savedState[field], state[field]),
+                };
+            }
+        }
+        // Nothing changed since the last save: skip the request entirely
+        if (!changed) return;
+
+        setAutosaveStatus('Saving…');
+        const response = await fetch('/api/autosave/', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': CSRF_TOKEN
+            },
+            body: JSON.stringify(payload)
+        });
+        const result = await response.json();
+
+        if (result.success) {
+            SNIPPET_DATA.version = result.version;
+            Object.assign(savedState, state);
+            autosaveFullSync = false;
+            setAutosaveStatus('All changes saved');
+        } else if (result.resync) {
+            // Our idea of the saved text drifted: resend whole fields once
+            autosaveFullSync = true;
+            scheduleAutosave();
+        } else if (result.conflict) {
+            autosaveBlocked = true;
+            setAutosaveStatus('⚠️ Edited in another tab, reload to continue', true);
+        } else {
+            throw new Error(result.error || 'Autosave failed');
+        }
+    } catch (error) {
+        console.error('Autosave error:', error);
+        setAutosaveStatus('Autosave failed, retrying…', true);
+        scheduleAutosave();
+    } finally {
+        autosaveInFlight = false;
+        finished();
+    }
+}
+
 // ========================
 // Save Snippet
 // ========================
@@ -206,13 +359,26 @@ document.getElementById('save-btn').addEventListener('click', async function ()
         return;
     }
 
+    if (collab) {
+        collab.save();
+        saveSettings();
+        return;
+    }
+
     const saveBtn = this;
     const originalText = saveBtn.innerHTML;
     saveBtn.innerHTML = '<span class="loading">💾 Saving...</span>';
     saveBtn.disabled = true;
 
+    // The save carries the version an autosave still on its way is about to bump
+    clearTimeout(autosaveTimeout);
+    const wasBlocked = autosaveBlocked;
+    autosaveBlocked = true;
+    await autosaveDone;
+
     const data = {
         id: SNIPPET_DATA.id,
+        version: SNIPPET_DATA.version,
         title: document.getElementById('snippet-title').value || 'Untitled',
         html_code: htmlEditor.getValue(),
         css_code: cssEditor.getValue(),
@@ -235,6 +401,9 @@ document.getElementById('save-btn').addEventListener('click', async function ()
 
         console.log('Response status:', response.status);
 
+        if (response.status === 409) {
+            throw new Error('This snippet was changed in another tab. Reload to get the latest version.');
+        }
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
@@ -246,6 +415,7 @@ document.getElementById('save-btn').addEventListener('click', async function ()
             // Update snippet data
             SNIPPET_DATA.id = result.id;
             SNIPPET_DATA.slug = result.slug;
+            SNIPPET_DATA.version = result.version;
 
             // Show success message
             saveBtn.innerHTML = '<span class="icon">✅</span> Saved!';
@@ -270,6 +440,8 @@ document.getElementById('save-btn').addEventListener('click', async function ()
         alert('Error saving snippet: ' + error.message);
         saveBtn.innerHTML = originalText;
         saveBtn.disabled = false;
+        autosaveBlocked = wasBlocked;
+        scheduleAutosave();
     }
 });
 
@@ -318,6 +490,102 @@ if (forkBtn) {
     });
 }
 
+// ========================
+// Live Share (collaborative editing)
+// ========================
+
+let collab = null;
+
+function startCollab() {
+    if (collab || !SNIPPET_DATA.slug) return;
+    const scheme = location.protocol === 'https:' ? 'wss' : 'ws';
+    const query = COLLAB_TOKEN ? `?token=${encodeURIComponent(COLLAB_TOKEN)}` : '';
+    const url = `${scheme}://${location.host}/ws/collab/${SNIPPET_DATA.slug}/${query}`;
+
+    clearTimeout(autosaveTimeout);
+    // Only the code panes are shared; the owner's title and environment go
+    // through the regular save (see saveSettings), and guests can't change them
+    if (COLLAB_TOKEN) {
+        document.getElementById('snippet-title').disabled = true;
+        document.getElementById('environment').disabled = true;
+    }
+
+    collab = new CollabClient(url, { html_code: htmlEditor, css_code: cssEditor, js_code: jsEditor }, {
+        status: setAutosaveStatus,
+        presence: renderPresence,
+        saved: version => { SNIPPET_DATA.version = version; },
+    });
+}
+
+// Save title and environment changes while the session saves the code. No
+// version is sent: the session may bump it at any moment, and these fields
+// aren't part of it.
+async function saveSettings() {
+    const state = currentState();
+    const changed = {};
+    for (const field of ['title', 'environment']) {
+        if (state[field] !== savedState[field]) changed[field] = state[field];
+    }
+    if (!Object.keys(changed).length) return;
+    try {
+        const response = await fetch('/api/save/', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': CSRF_TOKEN
+            },
+            body: JSON.stringify({ id: SNIPPET_DATA.id, ...changed })
+        });
+        const result = await response.json();
+        if (!response.ok || !result.success) {
+            throw new Error(result.error || `HTTP error! status: ${response.status}`);
+        }
+        Object.assign(savedState, changed);
+        SNIPPET_DATA.version = Math.max(SNIPPET_DATA.version, result.version);
+    } catch (error) {
+        console.error('Save error:', error);
+        setAutosaveStatus('Title and environment not saved: ' + error.message, true);
+    }
+}
+
+function renderPresence(participants, selfId) {
+    const container = document.getElementById('collab-presence');
+    container.innerHTML = '';
+    for (const participant of participants) {
+        const badge = document.createElement('span');
+        badge.className = `collab-avatar collab-color-${participant.color}`;
+        badge.textContent = participant.id === selfId ? 'you' : participant.name;
+        badge.title = `Editing ${participant.field.replace('_code', '').toUpperCase()}`;
+        container.appendChild(badge);
+    }
+}
+
+const shareBtn = document.getElementById('share-btn');
+if (shareBtn) {
+    shareBtn.addEventListener('click', async function () {
+        try {
+            const response = await fetch(`/api/collab/${SNIPPET_DATA.slug}/invite/`, {
+                method: 'POST',
+                headers: {
+                    'X-CSRFToken': CSRF_TOKEN
+                }
+            });
+            const result = await response.json();
+            if (!result.success) throw new Error(result.error || 'Could not create link');
+
+            startCollab();
+            try {
+                await navigator.clipboard.writeText(result.url);
+                setAutosaveStatus('Live Share link copied');
+            } catch (error) {
+                prompt('Share this link to edit together:', result.url);
+            }
+        } catch (error) {
+            alert('Error starting Live Share: ' + error.message);
+        }
+    });
+}
+
 // ========================
 // Default Templates
 // ========================
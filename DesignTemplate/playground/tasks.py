@@ -0,0 +1,124 @@
+"""Deferred bookkeeping for snippet views, likes and forks, preview bundles and embed purges"""
+
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from analytics.sketches import record_viewers
+from leaderboards import scores
+from taskqueue.queue import task
+from . import embeds, previews, sharding
+from .deltas import CODE_FIELDS
+from .models import Snippet, View
+
+
+def per_shard(payloads):
+    """{database alias: payloads} by the shard of each payload's snippet"""
+    return sharding.split(payloads, lambda p: p['snippet_id'])
+
+
+def shard_groups(payloads):
+    """The queue's ``split`` for handlers committing once per shard, so a retry only repeats the failed shard"""
+    return list(per_shard(payloads).values())
+
+
+@task('playground.record_view', batch=True, split=shard_groups)
+def record_view(payloads):
+    """Insert View rows, bump view counters and fold viewers into unique-viewer sketches"""
+    for alias, group in per_shard(payloads).items():
+        with sharding.use(alias), transaction.atomic(using=alias):
+            View.objects.bulk_create([
+                View(
+                    snippet_id=p['snippet_id'],
+                    user_id=p['user_id'],
+                    ip_address=p['ip_address'],
+                    user_agent=p['user_agent'][:500],
+                    created_at=_when(p, 'viewed_at'),
+                )
+                for p in group
+                if p.get('user_id')
+            ])
+            per_snippet = Counter(p['snippet_id'] for p in group)
+            _bump(per_snippet, 'views_count', 'total_views')
+            record_viewers(group)
+
+
+@task('playground.adjust_likes', batch=True, split=shard_groups)
+def adjust_likes(payloads):
+    """Apply net like/unlike deltas to snippet and owner counters and the leaderboards"""
+    for alias, group in per_shard(payloads).items():
+        per_snippet = Counter()
+        for p in group:
+            per_snippet[p['snippet_id']] += p['delta']
+        # Awarding inside the shard's transaction rolls the bumps back if it fails
+        with sharding.use(alias), transaction.atomic(using=alias):
+            owners = _bump(per_snippet, 'likes_count', 'total_likes')
+            # An unlike takes its point back from the periods of the like
+            scores.award(
+                (p['snippet_id'], owners[p['snippet_id']], _when(p, 'liked_at'), p['delta'] * scores.LIKE_POINTS)
+                for p in group
+                if p['snippet_id'] in owners
+            )
+
+
+@task('playground.record_fork', batch=True, split=shard_groups)
+def record_fork(payloads):
+    """Bump fork counters on the original snippets and award the forks on the leaderboards"""
+    for alias, group in per_shard(payloads).items():
+        per_snippet = Counter(p['snippet_id'] for p in group)
+        with sharding.use(alias), transaction.atomic(using=alias):
+            for snippet_id, count in per_snippet.items():
+                Snippet.objects.filter(pk=snippet_id).update(forks_count=F('forks_count') + count)
+            owners = {
+                str(pk): user_id
+                for pk, user_id in Snippet.objects.filter(pk__in=list(per_snippet)).values_list('pk', 'user_id')
+            }
+            scores.award(
+                (p['snippet_id'], owners[p['snippet_id']], _when(p, 'forked_at'), scores.FORK_POINTS)
+                for p in group
+                if p['snippet_id'] in owners
+            )
+
+
+@task('playground.build_previews', batch=True)
+def build_previews(payloads):
+    """Rebuild preview bundles for saved snippets, once per snippet per batch"""
+    for alias, group in per_shard(payloads).items():
+        snippet_ids = {p['snippet_id'] for p in group}
+        snippets = Snippet.objects.using(alias).filter(pk__in=snippet_ids)
+        for snippet in snippets.only('pk', 'version', 'environment', *CODE_FIELDS):
+            previews.write_bundle(snippet)
+
+
+@task('playground.purge_embeds', batch=True)
+def purge_embeds(payloads):
+    """Purge cached embeds by surrogate key, one CDN request per batch"""
+    keys = sorted({key for p in payloads for key in p['keys']})
+    embeds.get_purger().purge(keys)
+
+
+def _when(payload, key):
+    """A payload's event time; payloads queued before it was recorded count as now"""
+    return parse_datetime(payload[key]) if payload.get(key) else timezone.now()
+
+
+def _bump(per_snippet, snippet_field, user_field):
+    """Add per-snippet deltas to a snippet counter and the owners' totals; returns {snippet id: owner id}"""
+    User = get_user_model()
+    owners = {
+        str(pk): user_id
+        for pk, user_id in Snippet.objects.filter(pk__in=list(per_snippet)).values_list('pk', 'user_id')
+    }
+    per_owner = Counter()
+    for snippet_id, delta in per_snippet.items():
+        if not delta or snippet_id not in owners:
+            continue
+        Snippet.objects.filter(pk=snippet_id).update(**{snippet_field: F(snippet_field) + delta})
+        per_owner[owners[snippet_id]] += delta
+    for user_id, delta in per_owner.items():
+        User.objects.filter(pk=user_id).update(**{user_field: F(user_field) + delta})
+    return owners
@@ -0,0 +1,12 @@
+from django import template
+from django.urls import reverse
+
+from .. import previews
+
+register = template.Library()
+
+
+@register.simple_tag
+def preview_url(snippet):
+    """Versioned preview URL, cached by browsers until the snippet changes"""
+    return reverse('playground:preview', args=[snippet.slug]) + f'?v={previews.version_token(snippet)}'
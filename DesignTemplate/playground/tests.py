@@ -1,3 +1,966 @@
-from django.test import TestCase
+import importlib
+import itertools
+import json
+import random
+import shutil
+import tempfile
+import uuid
+from collections import Counter
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import TextField, Value
+from django.db.models.functions import Cast
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from taskqueue import queue
+from taskqueue.models import Task
+from . import admin_performance, bulk, embeds, fields, previews, purge, rebalance, revisions, sharding, tasks, views
+from .admin import SnippetAdmin
+from .deltas import content_hash
+from .models import Comment, Like, Revision, Snippet, SnippetLocation, View
+
+
+# Pages render without running collectstatic first
+UNHASHED_STATIC = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class AutosaveTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('saver', 'saver@example.com', 'password')
+        self.snippet = Snippet.objects.create(user=self.user, title='Draft', js_code='let a = 1;\n')
+        self.client.force_login(self.user)
+
+    def post(self, payload):
+        body = payload if isinstance(payload, str) else json.dumps(payload)
+        return self.client.post(reverse('playground:autosave_snippet'), body, content_type='application/json')
+
+    def delta(self, start, end, text, base=None, result=None):
+        old = self.snippet.js_code
+        return {
+            'base': content_hash(old if base is None else base),
+            'start': start,
+            'end': end,
+            'text': text,
+            'hash': content_hash(old[:start] + text + old[end:] if result is None else result),
+        }
+
+    def autosave(self, fields=None, deltas=None, version=None, **extra):
+        return self.post({
+            'id': str(self.snippet.pk),
+            'version': self.snippet.version if version is None else version,
+            'fields': fields or {},
+            'deltas': deltas or {},
+            **extra,
+        })
+
+    def test_applies_a_splice_and_bumps_the_version(self):
+        response = self.autosave(fields={'title': 'Final'}, deltas={'js_code': self.delta(8, 9, '42')})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['saved'], ['js_code', 'title'])
+        self.snippet.refresh_from_db()
+        self.assertEqual((self.snippet.title, self.snippet.js_code, self.snippet.version), ('Final', 'let a = 42;\n', 1))
+
+    def test_unchanged_fields_write_nothing(self):
+        response = self.autosave(fields={'title': 'Draft'})
+        self.assertEqual(response.json(), {'success': True, 'unchanged': True, 'version': 0})
+
+    def test_malformed_requests_are_rejected(self):
+        for payload in ('[]', '"id"', 'null', '{not json'):
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post(payload).status_code, 400)
+        for snippet_id in ('not-a-uuid', None, 7):
+            with self.subTest(snippet_id=snippet_id):
+                self.assertEqual(self.autosave(id=snippet_id).status_code, 400)
+        for version in ('0', None, False, 0.0):
+            with self.subTest(version=version):
+                self.assertEqual(self.post({'id': str(self.snippet.pk), 'version': version}).status_code, 400)
+        self.assertEqual(self.autosave(fields=['title']).status_code, 400)
+
+    def test_fields_must_be_known_and_typed(self):
+        for fields in (
+            {'owner': 'x'},
+            {'version': 5},
+            {'title': 5},
+            {'is_public': 'yes'},
+            {'tags': 'css'},
+            {'tags': ['css', 3]},
+        ):
+            with self.subTest(fields=fields):
+                self.assertEqual(self.autosave(fields=fields).status_code, 400)
+
+    def test_deltas_must_be_well_formed(self):
+        for field, delta in (
+            ('title', self.delta(0, 0, 'x')),
+            ('js_code', 'splice'),
+            ('js_code', dict(self.delta(0, 0, 'x'), start='0')),
+            ('js_code', dict(self.delta(0, 0, 'x'), start=1.5)),
+            ('js_code', dict(self.delta(0, 0, 'x'), end=True)),
+            ('js_code', dict(self.delta(0, 0, 'x'), start=-1)),
+            ('js_code', dict(self.delta(0, 0, 'x'), start=3, end=2)),
+            ('js_code', dict(self.delta(0, 0, 'x'), text=None)),
+            ('js_code', self.delta(0, 500, 'x', result='x')),
+        ):
+            with self.subTest(field=field, delta=delta):
+                response = self.autosave(deltas={field: delta})
+                self.assertEqual(response.status_code, 400)
+        self.snippet.refresh_from_db()
+        self.assertEqual(self.snippet.version, 0)
+
+    def test_stale_base_asks_for_a_resync(self):
+        response = self.autosave(deltas={'js_code': self.delta(0, 0, 'x', base='let a = 0;\n')})
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.json()['resync'])
+
+    def test_stale_version_is_a_conflict(self):
+        response = self.autosave(fields={'title': 'Elsewhere'}, version=3)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['hashes']['js_code'], content_hash(self.snippet.js_code))
+
+    def test_other_users_snippets_are_not_found(self):
+        self.assertEqual(self.autosave(id=str(uuid.uuid4())).status_code, 404)
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        self.client.force_login(other)
+        self.assertEqual(self.autosave(fields={'title': 'Mine'}).status_code, 404)
+
+
+class CompressedTextTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('packer', 'packer@example.com')
+        self.code = 'const x = 1;\n' * 200
+
+    def stored(self, snippet, field='js_code'):
+        """The column's value as written, not as the field reads it"""
+        raw = Snippet.objects.filter(pk=snippet.pk).annotate(raw=Cast(field, TextField()))
+        return raw.values_list('raw', flat=True).get()
+
+    def test_large_values_round_trip_compressed(self):
+        snippet = Snippet.objects.create(user=self.user, title='Big', js_code=self.code, css_code='a{}')
+        self.assertTrue(self.stored(snippet).startswith(fields.MARKER))
+        self.assertLess(len(self.stored(snippet)), len(self.code) // 5)
+        self.assertEqual(self.stored(snippet, 'css_code'), 'a{}')
+
+        loaded = Snippet.objects.get(pk=snippet.pk)
+        self.assertEqual((loaded.js_code, loaded.css_code), (self.code, 'a{}'))
+        # Text that looks like a stored value is compressed too, so it reads back as written
+        snippet.css_code = fields.MARKER + 'not compressed'
+        snippet.save()
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).css_code, fields.MARKER + 'not compressed')
+
+    def test_threshold_follows_the_setting(self):
+        with override_settings(COMPRESSED_TEXT_THRESHOLD=10 ** 6):
+            snippet = Snippet.objects.create(user=self.user, title='Kept', js_code=self.code)
+        self.assertEqual(self.stored(snippet), self.code)
+        with override_settings(COMPRESSED_TEXT_THRESHOLD=20):
+            snippet.save()
+        self.assertTrue(self.stored(snippet).startswith(fields.MARKER))
+
+    def test_values_are_inflated_once_on_first_read(self):
+        Snippet.objects.create(user=self.user, title='Lazy', js_code=self.code)
+        snippet = Snippet.objects.get()
+        self.assertIsInstance(snippet.__dict__['js_code'], fields.CompressedText)
+        with mock.patch.object(fields, 'decompress_text', wraps=fields.decompress_text) as inflate:
+            self.assertEqual(snippet.js_code, self.code)
+            self.assertEqual(snippet.js_code, self.code)
+            # Fields that aren't read are never inflated
+            self.assertEqual(Snippet.objects.get().css_code, '')
+        self.assertEqual(inflate.call_count, 1)
+
+    def test_migration_compresses_legacy_rows_and_back(self):
+        migration = importlib.import_module('playground.migrations.0004_compress_code_fields')
+        snippet = Snippet.objects.create(user=self.user, title='Legacy', css_code='b{}')
+        # As written before the field existed
+        Snippet.objects.filter(pk=snippet.pk).update(js_code=Value(self.code, output_field=TextField()))
+        self.assertEqual(self.stored(snippet), self.code)
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).js_code, self.code)
+
+        migration.compress_existing(django_apps, None)
+        self.assertTrue(self.stored(snippet).startswith(fields.MARKER))
+        self.assertEqual(self.stored(snippet, 'css_code'), 'b{}')
+        migration.decompress_existing(django_apps, None)
+        self.assertEqual(self.stored(snippet), self.code)
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).js_code, self.code)
+
+
+class PreviewTests(TestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        patch = mock.patch.object(previews, 'BUNDLE_ROOT', root)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.user = User.objects.create_user('previewer', 'previewer@example.com')
+        self.snippet = Snippet.objects.create(
+            user=self.user, title='Shown', html_code='<p>one</p>', js_code='let s = `a${`b`}c`; x = a / b / c;'
+        )
+        self.url = reverse('playground:preview', args=[self.snippet.slug])
+
+    def test_user_code_is_not_rewritten(self):
+        document = self.client.get(self.url).content.decode()
+        self.assertIn(self.snippet.js_code, document)
+        self.assertIn(self.snippet.js_code, previews.load(self.snippet)[0].decode())
+
+    def test_conditional_requests_get_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_model_saves_change_the_preview(self):
+        before = self.client.get(self.url)
+        self.snippet.html_code = '<p>two</p>'
+        self.snippet.save()
+        self.assertEqual(self.snippet.version, 1)
+
+        after = self.client.get(self.url, headers={'If-None-Match': before['ETag']})
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertIn(b'<p>two</p>', after.content)
+        embed = self.client.get(reverse('playground:embed_version', args=[self.snippet.slug, embeds.token(self.snippet)]))
+        self.assertIn(b'<p>two</p>', embed.content)
+
+    def test_saves_that_leave_the_code_alone_keep_the_version(self):
+        self.snippet.views_count = 5
+        self.snippet.save(update_fields=['views_count'])
+        self.snippet.refresh_from_db()
+        self.assertEqual(self.snippet.version, 0)
+        self.snippet.environment = '3d'
+        self.snippet.save(update_fields=['environment'])
+        self.snippet.refresh_from_db()
+        self.assertEqual(self.snippet.version, 1)
+
+    def test_only_the_current_versioned_url_is_immutable(self):
+        current = self.client.get(f'{self.url}?v={previews.version_token(self.snippet)}')
+        self.assertIn('immutable', current['Cache-Control'])
+        old_token = previews.version_token(self.snippet)
+        self.snippet.js_code = 'go();'
+        self.snippet.save()
+        stale = self.client.get(f'{self.url}?v={old_token}')
+        self.assertIn('no-cache', stale['Cache-Control'])
+        self.assertNotIn('immutable', stale['Cache-Control'])
+        self.assertIn(b'go();', stale.content)
+
+
+class EmbedTests(TestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        patch = mock.patch.object(previews, 'BUNDLE_ROOT', root)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.user = User.objects.create_user('embedder', 'embedder@example.com')
+        self.snippet = Snippet.objects.create(user=self.user, title='Spinner <3', html_code='<p>spin</p>')
+        self.keys = f'snippet-{self.snippet.pk.hex} user-{self.user.pk}'
+
+    def oembed(self, slug=None, **params):
+        url = 'http://testserver' + reverse('playground:detail', args=[slug or self.snippet.slug])
+        return self.client.get(reverse('playground:oembed'), {'url': url, **params})
+
+    def test_oembed_describes_an_iframe_of_the_current_embed(self):
+        response = self.oembed()
+        self.assertEqual(response['Surrogate-Key'], self.keys)
+        self.assertEqual(response['Cache-Control'], f'public, max-age={embeds.BROWSER_MAX_AGE}, s-maxage={embeds.EDGE_MAX_AGE}')
+        data = response.json()
+        src = 'http://testserver' + reverse('playground:embed_version', args=[self.snippet.slug, embeds.token(self.snippet)])
+        self.assertEqual(data, {
+            'version': '1.0',
+            'type': 'rich',
+            'title': 'Spinner <3',
+            'author_name': 'embedder',
+            'author_url': 'http://testserver' + reverse('accounts:profile', args=['embedder']),
+            'provider_name': 'Code Playground',
+            'provider_url': 'http://testserver/',
+            'cache_age': embeds.EDGE_MAX_AGE,
+            'width': embeds.WIDTH,
+            'height': embeds.HEIGHT,
+            'html': (
+                f'<iframe src="{src}" width="{embeds.WIDTH}" height="{embeds.HEIGHT}" title="Spinner &lt;3" '
+                'sandbox="allow-scripts" loading="lazy" style="border:0"></iframe>'
+            ),
+        })
+
+    @mock.patch.object(embeds, 'WIDTH', 800)
+    @mock.patch.object(embeds, 'HEIGHT', 450)
+    def test_maxwidth_and_maxheight_scale_keeping_the_aspect_ratio(self):
+        for params, size in (
+            ({'maxwidth': '400'}, (400, 225)),
+            ({'maxheight': '90'}, (160, 90)),
+            ({'maxwidth': '400', 'maxheight': '90'}, (160, 90)),
+            ({'maxwidth': '2000', 'maxheight': '2000'}, (800, 450)),
+            ({'maxwidth': '0'}, (1, 1)),
+        ):
+            with self.subTest(params=params):
+                data = self.oembed(**params).json()
+                self.assertEqual((data['width'], data['height']), size)
+                self.assertIn(f'width="{size[0]}" height="{size[1]}"', data['html'])
+        self.assertEqual(self.oembed(maxwidth='wide').status_code, 400)
+
+    def test_oembed_only_describes_public_snippet_pages(self):
+        self.assertEqual(self.oembed(format='xml').status_code, 501)
+        self.assertEqual(self.oembed('no-such-slug').status_code, 404)
+        self.assertEqual(self.client.get(reverse('playground:oembed'), {'url': 'http://testserver/'}).status_code, 404)
+        Snippet.objects.filter(pk=self.snippet.pk).update(is_public=False)
+        self.assertEqual(self.oembed().status_code, 404)
+
+    def test_embeds_redirect_to_their_current_version(self):
+        current = reverse('playground:embed_version', args=[self.snippet.slug, embeds.token(self.snippet)])
+        for token in (None, 'stale'):
+            args = [self.snippet.slug, token] if token else [self.snippet.slug]
+            response = self.client.get(reverse('playground:embed_version' if token else 'playground:embed', args=args))
+            self.assertRedirects(response, current, fetch_redirect_response=False)
+            self.assertEqual(response['Surrogate-Key'], self.keys)
+            self.assertIn(f's-maxage={embeds.EDGE_MAX_AGE}', response['Cache-Control'])
+
+        response = self.client.get(current)
+        self.assertEqual(response['Surrogate-Key'], self.keys)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(b'<p>spin</p>', response.content)
+
+        self.snippet.html_code = '<p>stop</p>'
+        self.snippet.save()
+        self.assertNotEqual(embeds.token(self.snippet), current.rstrip('/').rpartition('/')[2])
+        self.assertEqual(self.client.get(current).status_code, 302)
+
+    @mock.patch.object(embeds, 'PURGER', 'playground.embeds.StubPurger')
+    @mock.patch.object(embeds.StubPurger, 'purged', [])
+    def test_saves_and_deletes_purge_their_keys_in_one_request(self):
+        other = Snippet.objects.create(user=self.user, title='Other')
+        # New snippets have nothing cached yet
+        self.assertFalse(Task.objects.filter(name='playground.purge_embeds').exists())
+        for snippet in (self.snippet, other):
+            snippet.js_code = 'spin();'
+            snippet.save()
+        # Counters aren't in the embed
+        self.snippet.views_count = 3
+        self.snippet.save(update_fields=['views_count'])
+        purge.delete_user(self.user)
+
+        Task.objects.update(run_after=timezone.now())
+        queue.drain()
+        self.assertEqual(embeds.StubPurger.purged, [
+            sorted([f'snippet-{self.snippet.pk.hex}', f'snippet-{other.pk.hex}', f'user-{self.user.pk}']),
+        ])
+
+    def test_nothing_is_queued_without_a_purger(self):
+        self.snippet.js_code = 'spin();'
+        self.snippet.save()
+        embeds.purge_keys(['user-1'])
+        self.assertFalse(Task.objects.filter(name='playground.purge_embeds').exists())
+
+
+class RevisionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('writer', 'writer@example.com', 'password')
+        self.snippet = Snippet.objects.create(user=self.user, title='History')
+        self.expected = {}
+
+    def save(self, js_code, coalesce=False, css_code=''):
+        if not coalesce:
+            # Age the head past the coalescing window
+            Revision.objects.filter(snippet=self.snippet).update(
+                created_at=self.snippet.created_at - timedelta(seconds=revisions.COALESCE_SECONDS + 1)
+            )
+        self.snippet.js_code, self.snippet.css_code = js_code, css_code
+        head = revisions.record_revision(self.snippet)
+        self.expected[head.number] = {'html_code': '', 'css_code': css_code, 'js_code': js_code}
+        return head
+
+    def assertRebuildsEveryRevision(self):
+        for number, code in self.expected.items():
+            self.assertEqual(revisions.reconstruct(self.snippet, number), code, f'r{number}')
+
+    def test_coalesced_save_rebases_the_previous_delta(self):
+        self.assertEqual(self.save('a\nb\nc\n').number, 1)
+        self.assertEqual(self.save('X\nb\nc\n').number, 2)
+        self.assertEqual(self.save('X\nb\nZ\n', coalesce=True).number, 2)
+        self.assertFalse(Revision.objects.get(snippet=self.snippet, number=1).is_keyframe)
+        self.assertEqual(revisions.reconstruct(self.snippet, 1)['js_code'], 'a\nb\nc\n')
+        self.assertRebuildsEveryRevision()
+
+    def test_unchanged_save_records_nothing(self):
+        first = self.save('a\n')
+        self.assertEqual(self.save('a\n').pk, first.pk)
+        self.assertEqual(Revision.objects.filter(snippet=self.snippet).count(), 1)
+
+    @mock.patch.object(revisions, 'KEYFRAME_INTERVAL', 4)
+    def test_random_histories_rebuild_exactly(self):
+        rng = random.Random(31)
+        lines = [f'line {i}\n' for i in range(12)]
+        for _ in range(60):
+            for _ in range(rng.randint(1, 3)):
+                i = rng.randrange(len(lines) + 1)
+                if rng.random() < 0.4 and lines:
+                    del lines[min(i, len(lines) - 1)]
+                else:
+                    lines.insert(i, f'edit {rng.random():.6f}\n')
+            self.save(''.join(lines), coalesce=rng.random() < 0.5, css_code=rng.choice(['', 'a{}', 'b{}']))
+        self.assertGreater(len(self.expected), 10)
+        self.assertRebuildsEveryRevision()
+        self.assertEqual(
+            sorted(Revision.objects.filter(snippet=self.snippet, is_keyframe=True).values_list('number', flat=True)),
+            [n for n in sorted(self.expected) if n % 4 == 0 or n == max(self.expected)],
+        )
+
+
+class ViewTaskTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('viewer', 'viewer@example.com')
+        self.snippet = Snippet.objects.create(user=self.user, title='Seen')
+
+    @override_settings(STORAGES=UNHASHED_STATIC)
+    def test_views_keep_the_time_they_were_made(self):
+        self.client.force_login(self.user)
+        before = timezone.now()
+        self.client.get(reverse('playground:detail', args=[self.snippet.slug]))
+        viewed_at = Task.objects.get(name='playground.record_view').payload['viewed_at']
+        # The worker gets to the task an hour later
+        Task.objects.update(run_after=timezone.now())
+        with mock.patch.object(timezone, 'now', return_value=before + timedelta(hours=1)):
+            queue.drain()
+
+        view = View.objects.get()
+        self.assertEqual(view.created_at.isoformat(), viewed_at)
+        self.assertLess(view.created_at, before + timedelta(minutes=1))
+        self.assertEqual(Snippet.objects.get(pk=self.snippet.pk).views_count, 1)
+
+
+class BatchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('fetcher', 'fetcher@example.com')
+        self.other = User.objects.create_user('hider', 'hider@example.com')
+        self.snippets = [
+            Snippet.objects.create(user=self.other, title=f'Public {i}', js_code=f'go({i});') for i in range(5)
+        ]
+        self.own = Snippet.objects.create(user=self.user, title='Mine', is_public=False)
+        self.hidden = Snippet.objects.create(user=self.other, title='Theirs', is_public=False)
+        Like.objects.create(user=self.user, snippet=self.snippets[1])
+
+    def batch(self, *idents, **params):
+        return self.client.get(reverse('playground:snippet_batch'), {'ids': ','.join(idents), **params})
+
+    def test_rows_come_back_in_order_with_the_missing_listed(self):
+        first, second = self.snippets[:2]
+        absent = str(uuid.uuid4())
+        response = self.batch(second.slug, 'no-such-slug', str(first.pk), absent, second.slug, fields='id,title')
+        self.assertEqual(response.json(), {
+            'success': True,
+            'fields': ['id', 'title'],
+            'snippets': [[str(second.pk), 'Public 1'], [str(first.pk), 'Public 0']],
+            'missing': ['no-such-slug', absent],
+        })
+        # Compact encoding
+        self.assertNotIn(b', ', response.content)
+
+    def test_bad_requests_are_rejected_whole(self):
+        self.assertEqual(self.batch().status_code, 400)
+        self.assertEqual(self.batch(self.snippets[0].slug, fields='title,owner').status_code, 400)
+        with mock.patch.object(views, 'BATCH_MAX_IDS', 2):
+            slugs = [snippet.slug for snippet in self.snippets]
+            self.assertEqual(self.batch(*slugs[:3]).status_code, 400)
+            # Repeats count once
+            self.assertEqual(self.batch(*slugs[:2], slugs[0]).status_code, 200)
+
+    def test_code_is_only_returned_when_asked_for(self):
+        snippet = self.snippets[0]
+        fields = self.batch(snippet.slug).json()['fields']
+        self.assertNotIn('js_code', fields)
+        self.assertEqual(self.batch(snippet.slug, fields='slug,js_code').json()['snippets'], [[snippet.slug, 'go(0);']])
+
+    def test_private_snippets_and_likes_follow_the_viewer(self):
+        idents = [self.own.slug, self.hidden.slug, self.snippets[1].slug, self.snippets[2].slug]
+        anonymous = self.batch(*idents, fields='slug,liked').json()
+        self.assertEqual(anonymous['snippets'], [[self.snippets[1].slug, False], [self.snippets[2].slug, False]])
+        self.assertEqual(anonymous['missing'], [self.own.slug, self.hidden.slug])
+
+        self.client.force_login(self.user)
+        response = self.batch(*idents, fields='slug,user,liked').json()
+        self.assertEqual(response['snippets'], [
+            [self.own.slug, 'fetcher', False],
+            [self.snippets[1].slug, 'hider', True],
+            [self.snippets[2].slug, 'hider', False],
+        ])
+        self.assertEqual(response['missing'], [self.hidden.slug])
+
+    def test_queries_do_not_grow_with_the_ids(self):
+        self.client.force_login(self.user)
+        self.batch(self.snippets[0].slug)
+        slugs = [snippet.slug for snippet in self.snippets]
+        # Session, user, snippets and likes
+        with self.assertNumQueries(4):
+            self.batch(slugs[0])
+        with self.assertNumQueries(4):
+            self.batch(*slugs, str(self.own.pk))
+
+
+class BulkTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com')
+        self.other = User.objects.create_user('neighbour', 'neighbour@example.com')
+        self.public = Snippet.objects.create(user=self.user, title='Public', tags=['css', 'card'])
+        self.private = Snippet.objects.create(user=self.user, title='Private', is_public=False, tags=['card'])
+        self.theirs = Snippet.objects.create(user=self.other, title='Theirs', is_public=False, tags=['card'])
+        self.client.force_login(self.user)
+
+    def post(self, payload):
+        body = payload if isinstance(payload, str) else json.dumps(payload)
+        return self.client.post(reverse('playground:bulk_snippets'), body, content_type='application/json')
+
+    def test_malformed_requests_change_nothing(self):
+        ids = [str(self.public.pk)]
+        for payload in (
+            '{not json',
+            {'action': 'update', 'ids': [], 'is_public': False},
+            {'action': 'update', 'ids': str(self.public.pk), 'is_public': False},
+            {'action': 'update', 'ids': [self.public.pk.int], 'is_public': False},
+            {'action': 'update', 'ids': ids, 'is_public': 'no'},
+            {'action': 'update', 'ids': ids, 'tags': 'css'},
+            {'action': 'update', 'ids': ids, 'add_tags': ['css', 1]},
+            {'action': 'update', 'ids': ids},
+            {'action': 'publish', 'ids': ids},
+        ):
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post(payload).status_code, 400)
+        with mock.patch.object(views, 'BULK_MAX_IDS', 1):
+            payload = {'action': 'delete', 'ids': [self.public.slug, self.private.slug]}
+            self.assertEqual(self.post(payload).status_code, 400)
+        self.assertEqual(Snippet.objects.filter(user=self.user, version=0).count(), 2)
+
+        self.client.logout()
+        self.assertEqual(self.post({'action': 'delete', 'ids': ids}).status_code, 302)
+        self.assertEqual(Snippet.objects.count(), 3)
+
+    def test_only_the_owners_snippets_change(self):
+        response = self.post({
+            'action': 'update',
+            'ids': [self.public.slug, str(self.private.pk), self.theirs.slug, 'no-such-slug'],
+            'is_public': True,
+        })
+        self.assertEqual(response.json(), {
+            'success': True,
+            'action': 'update',
+            'changed': [self.private.slug],
+            # Already public, someone else's, or missing
+            'unchanged': [self.public.slug, self.theirs.slug, 'no-such-slug'],
+        })
+        self.private.refresh_from_db()
+        self.assertEqual((self.private.is_public, self.private.version), (True, 1))
+        self.assertEqual(Snippet.objects.get(pk=self.public.pk).version, 0)
+        self.assertFalse(Snippet.objects.get(pk=self.theirs.pk).is_public)
+        # Only the newly published snippet goes out to timelines
+        self.assertEqual(
+            [task.payload['snippet_id'] for task in Task.objects.filter(name='timelines.fan_out')],
+            [str(self.private.pk)],
+        )
+
+    def test_retagging_updates_once_per_distinct_result(self):
+        self.assertEqual(bulk.retag(['a', 'b'], add=['b', 'c'], remove=['a']), ['b', 'c'])
+        self.assertEqual(bulk.retag(['a'], replace=['x', 'y'], remove=['y']), ['x'])
+        others = [Snippet.objects.create(user=self.user, title=f'More {i}', tags=['card']) for i in range(3)]
+        odd = Snippet.objects.create(user=self.user, title='Odd', tags=['js'])
+        ids = [str(snippet.pk) for snippet in (self.public, self.private, *others, odd)]
+
+        with CaptureQueriesContext(connection) as queries:
+            self.post({'action': 'update', 'ids': ids, 'add_tags': ['new'], 'remove_tags': ['css'], 'is_pinned': True})
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        # One statement for the five now tagged ['card', 'new'], one for the odd one out
+        self.assertEqual(len(updates), 2)
+        for snippet in Snippet.objects.filter(user=self.user):
+            expected = ['js', 'new'] if snippet.pk == odd.pk else ['card', 'new']
+            self.assertEqual((snippet.tags, snippet.is_pinned, snippet.version), (expected, True, 1))
+
+    @mock.patch.object(embeds, 'PURGER', 'playground.embeds.StubPurger')
+    @mock.patch.object(embeds.StubPurger, 'purged', [])
+    def test_delete_hides_the_owners_snippets_and_purges_once(self):
+        response = self.post({'action': 'delete', 'ids': [self.public.slug, self.private.slug, self.theirs.slug]})
+        self.assertEqual(sorted(response.json()['changed']), sorted([self.public.slug, self.private.slug]))
+        self.assertEqual(response.json()['unchanged'], [self.theirs.slug])
+        self.assertEqual(list(Snippet.objects.values_list('pk', flat=True)), [self.theirs.pk])
+        self.assertEqual(Snippet.all_objects.filter(deleted_at__isnull=False).count(), 2)
+
+        self.assertEqual(Task.objects.filter(name='playground.purge_embeds').count(), 1)
+        Task.objects.update(run_after=timezone.now())
+        queue.drain()
+        self.assertEqual(embeds.StubPurger.purged, [sorted(embeds.snippet_key(s.pk) for s in (self.public, self.private))])
+
+        # Deleting again changes nothing
+        response = self.post({'action': 'delete', 'ids': [self.public.slug]})
+        self.assertEqual(response.json()['changed'], [])
+
+
+@override_settings(STORAGES=UNHASHED_STATIC)
+class LargeTableAdminTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', 'admin@example.com', is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin)
+        self.author = User.objects.create_user('Writer', 'writer@example.com')
+        start = timezone.now() - timedelta(days=1)
+        self.snippets = []
+        for i, title in enumerate(['Alpha one', 'Alpha two', 'Beta', 'Gamma', 'Delta']):
+            snippet = Snippet.objects.create(user=self.author if i % 2 else self.admin, title=title)
+            # The last two share a timestamp, so the primary key breaks the tie
+            Snippet.objects.filter(pk=snippet.pk).update(created_at=start + timedelta(minutes=min(i, 3)))
+            self.snippets.append(snippet)
+        self.url = reverse('admin:playground_snippet_changelist')
+
+    def changelist(self, url=None, **params):
+        return self.client.get(url or self.url, params).context['cl']
+
+    def titles(self, cl):
+        return [snippet.title for snippet in cl.result_list]
+
+    def test_pages_follow_the_cursor_newest_first(self):
+        newest_first = sorted(self.snippets, key=lambda s: (Snippet.objects.get(pk=s.pk).created_at, s.pk), reverse=True)
+        pages, url = [], None
+        with mock.patch.object(SnippetAdmin, 'list_per_page', 2):
+            cl = self.changelist()
+            while True:
+                self.assertTrue(cl.keyset)
+                pages.append(self.titles(cl))
+                if not cl.next_cursor:
+                    break
+                cl = self.changelist(self.url + cl.next_page_url())
+        self.assertEqual(pages, [[s.title for s in newest_first[i:i + 2]] for i in (0, 2, 4)])
+        # A malformed cursor starts from the top
+        self.assertEqual(self.titles(self.changelist(after='yesterday|x')), [s.title for s in newest_first])
+
+    def test_counts_are_estimated_past_the_limit(self):
+        cl = self.changelist()
+        self.assertEqual((cl.result_count, cl.paginator.estimated), (5, False))
+        with mock.patch.object(admin_performance, 'EXACT_COUNT_LIMIT', 3):
+            cl = self.changelist()
+            self.assertEqual((cl.result_count, cl.paginator.estimated), (5, True))
+            # Filtered counts stop one row past the limit
+            cl = self.changelist(is_public__exact=1)
+            self.assertEqual((cl.result_count, cl.paginator.estimated), (4, True))
+            self.assertEqual(len(cl.result_list), 5)
+
+    def test_search_matches_slugs_exactly_and_titles_and_usernames_by_prefix(self):
+        for term, expected in (
+            ('Alpha', {'Alpha one', 'Alpha two'}),
+            ('Alpha t', {'Alpha two'}),
+            ('lpha', set()),
+            ('Writ', {'Alpha two', 'Gamma'}),
+            (self.snippets[2].slug, {'Beta'}),
+            (self.snippets[2].slug[1:], set()),
+        ):
+            with self.subTest(term=term):
+                self.assertEqual(set(self.titles(self.changelist(q=term))), expected)
+
+    def test_likes_sort_by_their_indexed_column_only(self):
+        for snippet in self.snippets[:3]:
+            Like.objects.create(user=self.author, snippet=snippet)
+        url = reverse('admin:playground_like_changelist')
+        cl = self.changelist(url, o='3')
+        self.assertFalse(cl.keyset)
+        self.assertEqual([like.snippet.title for like in cl.result_list], ['Alpha one', 'Alpha two', 'Beta'])
+        # Other columns aren't offered for sorting, so their order is ignored
+        self.assertTrue(self.changelist(url, o='1').keyset)
+
+
+class PurgeTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('leaving', 'leaving@example.com')
+        self.other = User.objects.create_user('staying', 'staying@example.com')
+        self.snippets = [Snippet.objects.create(user=self.user, title=f'Mine {i}') for i in range(2)]
+        for snippet in self.snippets:
+            for n in range(3):
+                snippet.js_code = f'v{n}'
+                revisions.record_revision(snippet)
+            Comment.objects.create(user=self.other, snippet=snippet, text='Nice')
+        self.forks = [
+            Snippet.objects.create(user=self.other, title=f'Fork {i}', forked_from=self.snippets[i % 2]) for i in range(3)
+        ]
+        # The leaving user's own activity on the other user's work
+        Like.objects.create(user=self.user, snippet=self.forks[0])
+        Comment.objects.create(user=self.user, snippet=self.forks[0], text='Thanks')
+        self.revisions = Revision.objects.filter(snippet__in=self.snippets).count()
+
+    def assertPurged(self):
+        snippet_ids = [snippet.pk for snippet in self.snippets]
+        self.assertFalse(User.all_objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(Snippet.all_objects.filter(pk__in=snippet_ids).exists())
+        self.assertFalse(SnippetLocation.objects.filter(snippet_id__in=snippet_ids).exists())
+        self.assertFalse(Revision.objects.filter(snippet_id__in=snippet_ids).exists())
+        self.assertEqual(list(Comment.objects.values_list('text', flat=True)), [])
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(
+            list(Snippet.objects.filter(user=self.other).values_list('forked_from', flat=True)), [None] * 3
+        )
+
+    def test_deleting_hides_and_purging_removes(self):
+        purge.delete_user(self.user)
+        self.assertFalse(Snippet.objects.filter(user=self.user).exists())
+        stats = Counter()
+        self.assertTrue(purge.purge_pending(batch_size=2, pause=0, stats=stats))
+
+        self.assertPurged()
+        # Forks are kept, only detached, and not counted as purged snippets
+        self.assertEqual(stats['playground.Snippet'], 2)
+        self.assertEqual(stats['playground.Snippet.forked_from cleared'], 3)
+        self.assertEqual(stats['playground.Revision'], self.revisions)
+        self.assertEqual(stats['playground.Comment'], 3)
+        self.assertEqual(stats['accounts.User'], 1)
+
+    def test_interrupted_purges_resume(self):
+        purge.delete_user(self.user)
+        stats = Counter()
+        runs = 0
+        while True:
+            runs += 1
+            # Each deadline check takes a second, so every run stops after a few batches
+            with mock.patch.object(purge.time, 'monotonic', side_effect=itertools.count()):
+                if purge.purge_pending(max_seconds=3, batch_size=1, pause=0, stats=stats):
+                    break
+            self.assertLess(runs, 100)
+
+        self.assertGreater(runs, 1)
+        self.assertPurged()
+        self.assertEqual(stats['playground.Snippet'], 2)
+        self.assertEqual(stats['playground.Snippet.forked_from cleared'], 3)
+        self.assertEqual(stats['playground.Revision'], self.revisions)
+
+    def test_deleted_snippet_alone_is_purged(self):
+        purge.delete_snippet(self.snippets[0])
+        self.assertTrue(purge.purge_pending(pause=0))
+        self.assertFalse(Snippet.all_objects.filter(pk=self.snippets[0].pk).exists())
+        self.assertTrue(Snippet.objects.filter(pk=self.snippets[1].pk).exists())
+        self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
+
+
+@skipUnless(sharding.enabled(), 'needs SNIPPET_SHARDS; run with --settings=DesignTemplate.sharded_settings')
+class ShardingTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create_user(f'user{i}', f'user{i}@example.com') for i in range(12)]
+        self.user = self.users[0]
+        # A user whose home isn't the first user's, for moves
+        self.away = next(alias for alias in sharding.SHARDS if alias != self.user.shard)
+
+    def where(self, snippet_id):
+        """Every database holding a copy of the snippet"""
+        return [
+            alias for alias in sharding.databases()
+            if Snippet._base_manager.using(alias).filter(pk=snippet_id).exists()
+        ]
+
+    def populate(self, user, count=2):
+        """Snippets for ``user`` with a comment, a like and a revision each"""
+        snippets = []
+        for i in range(count):
+            snippet = Snippet.objects.create(user=user, title=f'{user.username} {i}', js_code=f'// {i}')
+            revisions.record_revision(snippet)
+            Comment.objects.create(user=self.users[1], snippet=snippet, text='Nice')
+            Like.objects.create(user=self.users[2], snippet=snippet)
+            snippets.append(snippet)
+        return snippets
+
+    def test_users_are_spread_over_the_shards(self):
+        for user in self.users:
+            self.assertEqual(user.shard, sharding.home(user.pk))
+            self.assertEqual(User.objects.get(pk=user.pk).shard, user.shard)
+        self.assertGreater(len({user.shard for user in self.users}), 1)
+
+    def test_shard_keys_pin_queries(self):
+        snippet = Snippet.objects.create(user=self.user, title='Pinned')
+        comment = Comment.objects.create(user=self.users[1], snippet=snippet, text='Hi')
+        shard = self.user.shard
+        self.assertEqual(self.where(snippet.pk), [shard])
+        self.assertEqual(comment._state.db, shard)
+
+        for queryset in (
+            Snippet.objects.filter(user=self.user),
+            Snippet.objects.filter(user_id=self.user.pk),
+            Snippet.objects.filter(pk=snippet.pk),
+            Snippet.objects.filter(id=snippet.pk),
+            Snippet.objects.filter(slug=snippet.slug),
+            Comment.objects.filter(snippet=snippet),
+            Comment.objects.filter(snippet_id=snippet.pk),
+            snippet.comments.all(),
+            self.user.snippets.all(),
+        ):
+            with self.subTest(query=str(queryset.query)):
+                self.assertEqual(queryset.db, shard)
+                self.assertTrue(queryset.exists())
+        self.assertEqual(Snippet.objects.get(slug=snippet.slug).pk, snippet.pk)
+
+        # No shard key, or one that's negated, leaves the query to the router
+        self.assertIsNone(Snippet.objects.filter(title='Pinned')._db)
+        self.assertIsNone(Snippet.objects.exclude(user=self.user)._db)
+        with sharding.use(self.away):
+            self.assertEqual(Snippet.objects.filter(title='Pinned').db, self.away)
+            self.assertFalse(Snippet.objects.filter(title='Pinned').exists())
+        self.assertEqual(sharding.locate(slug=snippet.slug), shard)
+        self.assertEqual(sharding.locate(snippet_id=uuid.uuid4()), DEFAULT_DB_ALIAS)
+
+    def test_newest_merges_the_shards_in_order(self):
+        start = timezone.now() - timedelta(days=1)
+        expected = []
+        for minute in range(24):
+            user = self.users[minute % len(self.users)]
+            snippet = Snippet.objects.create(user=user, title=f'{minute}')
+            Snippet.objects.filter(pk=snippet.pk).update(created_at=start + timedelta(minutes=minute))
+            expected.append(snippet.pk)
+        expected.reverse()
+        self.assertGreater(len({user.shard for user in self.users[:24]}), 1)
+
+        for limit in (1, 5, 24, 50):
+            with self.subTest(limit=limit):
+                snippets = sharding.newest(Snippet.objects.all(), limit)
+                self.assertEqual([snippet.pk for snippet in snippets], expected[:limit])
+                self.assertEqual(snippets[0].user.pk, self.users[23 % len(self.users)].pk)
+
+        # The index is cached; snippets deleted since drop out rather than leave a gap filled late
+        Snippet.objects.filter(pk=expected[0]).delete()
+        self.assertEqual([snippet.pk for snippet in sharding.newest(Snippet.objects.all(), 5)], expected[1:5])
+
+    def test_move_user_takes_everything_along(self):
+        home = self.user.shard
+        User.objects.filter(pk=self.user.pk).update(shard=self.away)
+        self.user.refresh_from_db()
+        snippets = self.populate(self.user)
+        created = {snippet.pk: Snippet.objects.get(pk=snippet.pk).created_at for snippet in snippets}
+        self.assertIn(self.user, rebalance.pending())
+
+        self.assertEqual(rebalance.move_user(self.user), 2)
+        self.assertEqual(User.objects.get(pk=self.user.pk).shard, home)
+        self.assertNotIn(self.user, rebalance.pending())
+        for snippet in snippets:
+            self.assertEqual(self.where(snippet.pk), [home])
+            moved = Snippet.objects.get(pk=snippet.pk)
+            self.assertEqual((moved.title, moved.created_at), (snippet.title, created[snippet.pk]))
+            self.assertEqual(moved.comments.count(), 1)
+            self.assertEqual(moved.likes.count(), 1)
+            self.assertEqual(revisions.reconstruct(moved, 1)['js_code'], snippet.js_code)
+        for model in rebalance.dependents():
+            self.assertFalse(model._base_manager.using(self.away).filter(snippet_id__in=created).exists())
+
+    def test_raced_move_rolls_back_and_leaves_strays_to_settle(self):
+        home = self.user.shard
+        User.objects.filter(pk=self.user.pk).update(shard=self.away)
+        self.user.refresh_from_db()
+        snippets = self.populate(self.user)
+        # Another run switches the user first; this one still has the old shard
+        User.objects.filter(pk=self.user.pk).update(shard=home)
+
+        self.assertIsNone(rebalance.move_user(self.user))
+        self.assertEqual(self.user.shard, self.away)
+        for snippet in snippets:
+            # The originals are kept, the copies stay too
+            self.assertEqual(sorted(self.where(snippet.pk)), sorted([home, self.away]))
+        self.assertEqual(list(rebalance.strays()), [(self.away, self.user.pk, home)])
+        # Listed once, from either copy
+        self.assertEqual(
+            sorted(snippet.pk for snippet in sharding.newest(Snippet.objects.all(), 10)),
+            sorted(snippet.pk for snippet in snippets),
+        )
+
+        self.assertEqual(rebalance.settle_strays(self.away, self.user.pk, home), (0, 2))
+        for snippet in snippets:
+            self.assertEqual(self.where(snippet.pk), [home])
+            self.assertEqual(Comment.objects.filter(snippet_id=snippet.pk).count(), 1)
+        self.assertEqual(list(rebalance.strays()), [])
+
+    def test_snippets_left_on_the_old_shard_are_moved(self):
+        # Created on the old shard while the user was being moved
+        with sharding.use(self.away):
+            stray = Snippet.objects.using(self.away).create(user=self.user, title='Late')
+            Comment.objects.using(self.away).create(user=self.users[1], snippet=stray, text='Hi')
+        self.assertEqual(list(rebalance.strays()), [(self.away, self.user.pk, self.user.shard)])
+
+        self.assertEqual(rebalance.settle_strays(self.away, self.user.pk, self.user.shard), (1, 0))
+        self.assertEqual(self.where(stray.pk), [self.user.shard])
+        self.assertEqual(Snippet.objects.get(pk=stray.pk).comments.count(), 1)
+
+    def test_tasks_are_retried_per_shard(self):
+        first = Snippet.objects.create(user=self.user, title='Here')
+        second = Snippet.objects.create(user=next(u for u in self.users if u.shard == self.away), title='There')
+        for snippet in (first, second):
+            queue.enqueue('playground.adjust_likes', {'snippet_id': str(snippet.pk), 'delta': 1})
+        bump = tasks._bump
+
+        def fail_on_away(*args):
+            if sharding.current() == self.away:
+                raise RuntimeError('shard unavailable')
+            return bump(*args)
+
+        with mock.patch.object(tasks, '_bump', side_effect=fail_on_away):
+            self.assertEqual(queue.run_batch(), 2)
+        self.assertEqual(Task.objects.get().payload['snippet_id'], str(second.pk))
+        Task.objects.update(run_after=timezone.now())
+        queue.run_batch()
+
+        self.assertFalse(Task.objects.exists())
+        for snippet in (first, second):
+            self.assertEqual(Snippet.objects.get(pk=snippet.pk).likes_count, 1)
+        self.assertEqual(User.objects.get(pk=self.user.pk).total_likes, 1)
+
+    def test_a_failed_award_rolls_back_its_shards_counters(self):
+        snippet = Snippet.objects.create(user=self.user, title='Here')
+        queue.enqueue('playground.adjust_likes', {'snippet_id': str(snippet.pk), 'delta': 1})
+        with mock.patch.object(tasks.scores, 'award', side_effect=RuntimeError('leaderboards unavailable')):
+            queue.run_batch()
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).likes_count, 0)
+
+        Task.objects.update(run_after=timezone.now())
+        queue.run_batch()
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).likes_count, 1)
+        self.assertEqual(User.objects.get(pk=self.user.pk).total_likes, 1)
+
+    def test_bulk_changes_stay_on_the_owners_shard(self):
+        owner = next(user for user in self.users if user.shard == self.away)
+        neighbour = next(user for user in self.users if user.shard == self.away and user != owner)
+        mine = [Snippet.objects.create(user=owner, title=f'Mine {i}', is_public=False) for i in range(3)]
+        theirs = Snippet.objects.create(user=neighbour, title='Theirs', is_public=False)
+        ids = [snippet.pk for snippet in (*mine, theirs)]
+
+        with CaptureQueriesContext(connections[self.away]) as queries:
+            changed = bulk.update(owner, ids, flags={'is_public': True})
+        self.assertEqual(sorted(changed), sorted(str(snippet.pk) for snippet in mine))
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(set(Snippet.objects.filter(user=owner).values_list('is_public', flat=True)), {True})
+        self.assertFalse(Snippet.objects.get(pk=theirs.pk).is_public)
+
+        self.assertEqual(sorted(bulk.delete(owner, ids)), sorted(changed))
+        self.assertFalse(Snippet.objects.filter(user=owner).exists())
+        self.assertEqual(self.where(mine[0].pk), [self.away])
+
+    @override_settings(STORAGES=UNHASHED_STATIC)
+    def test_admin_lists_one_shard_at_a_time(self):
+        admin = User.objects.create_user('admin', 'admin@example.com', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        snippet = Snippet.objects.create(user=self.user, title='Sharded')
+        changelist = reverse('admin:playground_snippet_changelist')
+
+        self.assertNotContains(self.client.get(changelist), 'Sharded')
+        self.assertContains(self.client.get(changelist, {'shard': self.user.shard}), 'Sharded')
+        self.assertNotContains(self.client.get(changelist, {'shard': self.away}), 'Sharded')
+        response = self.client.get(reverse('admin:playground_snippet_change', args=[snippet.pk]))
+        self.assertContains(response, 'Sharded')
+
+        # Users are read from 'default' next to the shard's likes
+        Like.objects.create(user=admin, snippet=snippet)
+        response = self.client.get(reverse('admin:playground_like_changelist'), {'shard': self.user.shard})
+        self.assertContains(response, 'Sharded')
+        self.assertContains(response, '>admin<')
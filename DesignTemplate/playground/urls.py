@@ -15,10 +15,27 @@ urlpatterns = [
     path('snippet/<slug:slug>/', views.snippet_detail, name='detail'),
     path('snippet/<slug:slug>/preview/', views.snippet_preview, name='preview'),
     
+    # Embeds on other sites
+    path('embed/<slug:slug>/', views.embed, name='embed'),
+    path('embed/<slug:slug>/<str:token>/', views.embed, name='embed_version'),
+    path('oembed/', views.oembed, name='oembed'),
+    
     # API endpoints (AJAX)
     path('api/save/', views.save_snippet, name='save_snippet'),
+    path('api/autosave/', views.autosave_snippet, name='autosave_snippet'),
     path('api/fork/<slug:slug>/', views.fork_snippet, name='fork_snippet'),
     path('api/like/<slug:slug>/', views.like_snippet, name='like_snippet'),
     path('api/comment/<slug:slug>/', views.add_comment, name='add_comment'),
     path('api/delete/<slug:slug>/', views.delete_snippet, name='delete_snippet'),
+    path('api/snippets/', views.snippet_batch, name='snippet_batch'),
+    path('api/snippets/bulk/', views.bulk_snippets, name='bulk_snippets'),
+    
+    # Revision history
+    path('api/revisions/<slug:slug>/', views.snippet_revisions, name='revisions'),
+    path('api/revisions/<slug:slug>/<int:number>/', views.snippet_revision, name='revision'),
+    path(
+        'api/revisions/<slug:slug>/<int:number>/diff/<int:other>/',
+        views.snippet_revision_diff,
+        name='revision_diff',
+    ),
 ]
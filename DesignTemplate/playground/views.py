@@ -1,18 +1,60 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth import login
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from django.db.models import Count
-from .models import Snippet, Like, View, Comment
-from accounts.models import Activity
+from django.contrib.auth import get_user_model, login
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse
+from django.views.decorators.clickjacking import xframe_options_exempt
+from django.views.decorators.http import require_POST, require_safe
+from django.db.models import Count, Prefetch, Q
+from django.urls import Resolver404, resolve, reverse
+from django.utils.html import escape
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from DesignTemplate.staticfiles import parse_accept_encoding
+from .deltas import CODE_FIELDS, DeltaError, MalformedDelta, apply_delta, check_delta, content_hash
+from .models import Snippet, Like, Comment
+from . import bulk, embeds, previews, purge, revisions, sharding
+from taskqueue.queue import enqueue
+from analytics import sketches
+from recommendations.similarity import similar_to
+from timelines import fanout
+from live import broker
+from metrics.registry import EVENTS
+from collab.invites import can_join
+from notifications import inbox
 import json
-from datetime import date
+import uuid
+from urllib.parse import urlsplit
+from datetime import date, datetime
+
+
+# Editable snippet fields and their defaults for new snippets
+SAVE_FIELDS = {
+    'title': 'Untitled',
+    'html_code': '',
+    'css_code': '',
+    'js_code': '',
+    'environment': '2d',
+    'description': '',
+    'tags': [],
+    'is_public': True,
+}
+
+# Fields the batch API can return; the code fields only when asked for by name
+BATCH_FIELDS = [
+    'id', 'slug', 'title', 'description', 'user', 'environment', 'tags', 'is_public', 'forked_from',
+    'views_count', 'likes_count', 'forks_count', 'version', 'created_at', 'updated_at', 'liked',
+    *CODE_FIELDS,
+]
+BATCH_DEFAULT_FIELDS = [field for field in BATCH_FIELDS if field not in CODE_FIELDS]
+BATCH_MAX_IDS = getattr(settings, 'SNIPPET_BATCH_MAX_IDS', 100)
+BULK_MAX_IDS = getattr(settings, 'SNIPPET_BULK_MAX_IDS', 500)
 
 
 def feed(request):
     """Homepage feed showing latest public snippets"""
-    snippets = Snippet.objects.filter(is_public=True).select_related('user')
+    # Cards never show code, so don't load (or inflate) the code columns
+    snippets = Snippet.objects.filter(is_public=True).defer(*CODE_FIELDS)
     
     # Filter by environment if specified
     env = request.GET.get('environment')
@@ -27,8 +69,14 @@ def feed(request):
     # Get popular tags
     popular_tags = ['navbar', '3d', 'animation', 'card', 'button', 'form', 'landing', 'cyberpunk']
     
+    if sharding.enabled():
+        # Merged from every shard's newest; see playground.sharding.newest
+        snippets = sharding.newest(snippets, 20)
+    else:
+        snippets = snippets.select_related('user')[:20]  # Limit to 20 for now
+    
     context = {
-        'snippets': snippets[:20],  # Limit to 20 for now
+        'snippets': snippets,
         'popular_tags': popular_tags,
     }
     return render(request, 'playground/feed.html', context)
@@ -38,15 +86,18 @@ def feed(request):
 def editor(request, slug=None):
     """Code editor page"""
     snippet = None
+    collab_token = ''
     if slug:
         snippet = get_object_or_404(Snippet, slug=slug)
+        collab_token = request.GET.get('collab', '')
         # Check if user owns this snippet
-        if snippet.user != request.user:
+        if snippet.user != request.user and not can_join(request.user, snippet, collab_token):
             # Viewing someone else's snippet in editor = fork
             snippet = None
     
     context = {
         'snippet': snippet,
+        'collab_token': collab_token if snippet else '',
     }
     return render(request, 'playground/editor.html', context)
 
@@ -55,15 +106,16 @@ def snippet_detail(request, slug):
     """Snippet detail page with code display and comments"""
     snippet = get_object_or_404(Snippet, slug=slug)
     
-    # Track view
-    if request.user.is_authenticated:
-        View.objects.create(
-            snippet=snippet,
-            user=request.user,
-            ip_address=get_client_ip(request),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')
-        )
-    snippet.increment_views()
+    # Track view (View row and counters are written by the task worker)
+    enqueue('playground.record_view', {
+        'snippet_id': str(snippet.pk),
+        'user_id': request.user.pk if request.user.is_authenticated else None,
+        'ip_address': get_client_ip(request),
+        'user_agent': request.META.get('HTTP_USER_AGENT', '')[:500],
+        'viewed_at': timezone.now().isoformat(),
+    })
+    broker.publish(snippet.pk, counts={'views': 1})
+    EVENTS.inc(event='view')
     
     # Check if user liked this snippet
     user_liked = False
@@ -73,7 +125,11 @@ def snippet_detail(request, slug):
     context = {
         'snippet': snippet,
         'user_liked': user_liked,
-        'comments': snippet.comments.all().select_related('user'),
+        'comments': sharding.with_users(snippet.comments.all()),
+        'unique_viewers': sketches.unique_viewers(snippet),
+        'unique_viewers_week': sketches.unique_viewers(snippet, days=7),
+        'similar_snippets': similar_to(snippet),
+        'oembed_url': embeds.oembed_url(request, snippet) if snippet.is_public else '',
     }
     return render(request, 'playground/snippet_detail.html', context)
 
@@ -81,26 +137,98 @@ def snippet_detail(request, slug):
 def snippet_preview(request, slug):
     """Render snippet code in an iframe (for thumbnails)"""
     snippet = get_object_or_404(Snippet, slug=slug)
+    etag = previews.etag(snippet)
     
-    # Build HTML document
-    html_doc = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <style>{snippet.css_code}</style>
-        {'<script src="https://cdnjs.cloudflare.com/ajax/libs/three.js/r128/three.min.js"></script>' if snippet.environment == '3d' else ''}
-    </head>
-    <body>
-        {snippet.html_code}
-        <script>{snippet.js_code}</script>
-    </body>
-    </html>
-    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        gzipped = 'gzip' in parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        document, encoding = previews.load(snippet, gzipped)
+        response = HttpResponse(document, content_type='text/html; charset=utf-8')
+        if encoding:
+            response['Content-Encoding'] = encoding
     
-    from django.http import HttpResponse
-    return HttpResponse(html_doc, content_type='text/html')
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept-Encoding'])
+    # Versioned URLs (see the preview_url tag) never change; others revalidate
+    if request.GET.get('v') == previews.version_token(snippet):
+        patch_cache_control(response, max_age=settings.STATIC_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    patch_cache_control(response, **{'public' if snippet.is_public else 'private': True})
+    return response
+
+
+@require_safe
+@xframe_options_exempt
+def embed(request, slug, token=None):
+    """Snippet output for iframes on other sites; versioned URLs are cached for a year"""
+    # Public snippets only, and nothing per-visitor, so caches can share responses
+    snippet = get_object_or_404(Snippet, slug=slug, is_public=True)
+    current = embeds.token(snippet)
+    if token != current:
+        response = HttpResponseRedirect(reverse('playground:embed_version', kwargs={'slug': slug, 'token': current}))
+        patch_cache_control(response, public=True, max_age=embeds.BROWSER_MAX_AGE, s_maxage=embeds.EDGE_MAX_AGE)
+    else:
+        etag = previews.etag(snippet)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            gzipped = 'gzip' in parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+            document, encoding = previews.load(snippet, gzipped)
+            response = HttpResponse(document, content_type='text/html; charset=utf-8')
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Accept-Encoding'])
+        patch_cache_control(
+            response, public=True, max_age=settings.STATIC_MAX_AGE, s_maxage=settings.STATIC_MAX_AGE, immutable=True
+        )
+    response['Surrogate-Key'] = ' '.join(embeds.surrogate_keys(snippet))
+    return response
+
+
+@require_safe
+def oembed(request):
+    """oEmbed (https://oembed.com) JSON for a snippet page URL"""
+    if request.GET.get('format', 'json') != 'json':
+        return JsonResponse({'success': False, 'error': 'Only the json format is supported'}, status=501)
+    try:
+        match = resolve(urlsplit(request.GET.get('url', '')).path)
+    except Resolver404:
+        raise Http404('Not a snippet URL')
+    if match.view_name != 'playground:detail':
+        raise Http404('Not a snippet URL')
+    snippet = get_object_or_404(sharding.with_users(Snippet.objects), slug=match.kwargs['slug'], is_public=True)
+    
+    width, height = embeds.WIDTH, embeds.HEIGHT
+    try:
+        max_width = int(request.GET.get('maxwidth') or width)
+        max_height = int(request.GET.get('maxheight') or height)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'maxwidth and maxheight must be integers'}, status=400)
+    # Scale down keeping the aspect ratio
+    scale = min(1, max_width / width, max_height / height)
+    width, height = max(1, int(width * scale)), max(1, int(height * scale))
+    
+    src = escape(embeds.embed_url(request, snippet))
+    response = JsonResponse({
+        'version': '1.0',
+        'type': 'rich',
+        'title': snippet.title,
+        'author_name': snippet.user.username,
+        'author_url': request.build_absolute_uri(reverse('accounts:profile', kwargs={'username': snippet.user.username})),
+        'provider_name': 'Code Playground',
+        'provider_url': request.build_absolute_uri('/'),
+        'cache_age': embeds.EDGE_MAX_AGE,
+        'width': width,
+        'height': height,
+        'html': (
+            f'<iframe src="{src}" width="{width}" height="{height}" title="{escape(snippet.title)}" '
+            f'sandbox="allow-scripts" loading="lazy" style="border:0"></iframe>'
+        ),
+    })
+    patch_cache_control(response, public=True, max_age=embeds.BROWSER_MAX_AGE, s_maxage=embeds.EDGE_MAX_AGE)
+    response['Surrogate-Key'] = ' '.join(embeds.surrogate_keys(snippet))
+    return response
 
 
 @login_required
@@ -112,71 +240,205 @@ def save_snippet(request):
         
         snippet_id = data.get('id')
         if snippet_id:
-            # Update existing snippet
+            # Update existing snippet, touching only the fields that changed
             snippet = get_object_or_404(Snippet, id=snippet_id, user=request.user)
+            if 'version' in data and data['version'] != snippet.version:
+                return JsonResponse(
+                    {'success': False, 'error': 'Snippet was modified elsewhere', 'version': snippet.version},
+                    status=409,
+                )
+            changed = {
+                field: data[field]
+                for field in SAVE_FIELDS
+                if field in data and data[field] != getattr(snippet, field)
+            }
+            if not changed:
+                return JsonResponse({
+                    'success': True,
+                    'slug': snippet.slug,
+                    'id': snippet.id,
+                    'version': snippet.version,
+                    'unchanged': True,
+                })
+            
+            version = snippet.version
+            with sharding.atomic(snippet._state.db):
+                updated = Snippet.objects.using(snippet._state.db).filter(pk=snippet.pk, version=version).update(
+                    **changed, version=version + 1, updated_at=timezone.now()
+                )
+                if not updated:
+                    return JsonResponse({'success': False, 'error': 'Snippet was modified elsewhere'}, status=409)
+                for field, value in changed.items():
+                    setattr(snippet, field, value)
+                snippet.version = version + 1
+                revisions.record_revision(snippet)
+                previews.schedule(snippet)
+                embeds.purge(snippet)
+                if 'is_public' in changed:
+                    fanout.schedule(snippet)
         else:
             # Create new snippet
             snippet = Snippet(user=request.user)
+            for field, default in SAVE_FIELDS.items():
+                setattr(snippet, field, data.get(field, default))
+            with sharding.atomic(sharding.shard_of(request.user)):
+                snippet.save()
+                revisions.record_revision(snippet)
+                previews.schedule(snippet)
+                if snippet.is_public:
+                    fanout.schedule(snippet)
+                
+                # Track activity
+                enqueue('accounts.record_activity', {
+                    'user_id': request.user.pk,
+                    'date': date.today().isoformat(),
+                    'snippets': 1,
+                })
         
-        snippet.title = data.get('title', 'Untitled')
-        snippet.html_code = data.get('html_code', '')
-        snippet.css_code = data.get('css_code', '')
-        snippet.js_code = data.get('js_code', '')
-        snippet.environment = data.get('environment', '2d')
-        snippet.description = data.get('description', '')
-        snippet.tags = data.get('tags', [])
-        snippet.is_public = data.get('is_public', True)
-        snippet.save()
-        
-        # Track activity
-        activity, created = Activity.objects.get_or_create(
-            user=request.user,
-            date=date.today(),
-            defaults={'snippet_count': 0, 'fork_count': 0}
-        )
-        if created or snippet_id is None:
-            activity.snippet_count += 1
-            activity.save()
-        
+        EVENTS.inc(event='save')
         return JsonResponse({
             'success': True,
             'slug': snippet.slug,
             'id': snippet.id,
+            'version': snippet.version,
         })
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
 
+@login_required
+@require_POST
+def autosave_snippet(request):
+    """
+    Delta autosave for an existing snippet.
+
+    Accepts whole values for small fields and hash-verified splices for the
+    code panes (see playground.deltas). Nothing is written when no field
+    changed; otherwise only the changed columns are updated, guarded by the
+    snippet's version counter so two tabs can't overwrite each other.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'success': False, 'error': 'Expected a JSON object'}, status=400)
+    try:
+        snippet_id = uuid.UUID(str(data.get('id')))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid snippet id'}, status=400)
+    version = data.get('version')
+    if type(version) is not int:
+        return JsonResponse({'success': False, 'error': 'Invalid version'}, status=400)
+    fields, deltas = data.get('fields') or {}, data.get('deltas') or {}
+    if not isinstance(fields, dict) or not isinstance(deltas, dict):
+        return JsonResponse({'success': False, 'error': 'fields and deltas must be objects'}, status=400)
+    for field, value in fields.items():
+        if field not in SAVE_FIELDS:
+            return JsonResponse({'success': False, 'error': f'Unknown field {field}'}, status=400)
+        expected = type(SAVE_FIELDS[field])
+        if type(value) is not expected or (expected is list and not all(isinstance(tag, str) for tag in value)):
+            return JsonResponse({'success': False, 'error': f'Invalid value for {field}'}, status=400)
+    for field, delta in deltas.items():
+        if field not in CODE_FIELDS:
+            return JsonResponse({'success': False, 'error': f'Unknown code field {field}'}, status=400)
+        try:
+            check_delta(delta)
+        except MalformedDelta as e:
+            return JsonResponse({'success': False, 'error': f'{field}: {e}'}, status=400)
+    
+    snippet = get_object_or_404(Snippet, id=snippet_id, user=request.user)
+    if version != snippet.version:
+        return JsonResponse({
+            'success': False,
+            'conflict': True,
+            'version': snippet.version,
+            'hashes': {field: content_hash(getattr(snippet, field)) for field in CODE_FIELDS},
+        }, status=409)
+    
+    changed = {}
+    for field, value in fields.items():
+        if value != getattr(snippet, field):
+            changed[field] = value
+    for field, delta in deltas.items():
+        try:
+            value = apply_delta(getattr(snippet, field), delta)
+        except MalformedDelta as e:
+            return JsonResponse({'success': False, 'error': f'{field}: {e}'}, status=400)
+        except DeltaError as e:
+            return JsonResponse({
+                'success': False,
+                'resync': True,
+                'error': str(e),
+                'version': snippet.version,
+            }, status=409)
+        if value != getattr(snippet, field):
+            changed[field] = value
+    
+    if changed.get('environment', snippet.environment) not in dict(Snippet.ENVIRONMENT_CHOICES):
+        return JsonResponse({'success': False, 'error': 'Invalid environment'}, status=400)
+    
+    if not changed:
+        return JsonResponse({'success': True, 'unchanged': True, 'version': snippet.version})
+    
+    with sharding.atomic(snippet._state.db):
+        updated = Snippet.objects.using(snippet._state.db).filter(pk=snippet.pk, version=version).update(
+            **changed, version=version + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            return JsonResponse({'success': False, 'conflict': True}, status=409)
+        for field, value in changed.items():
+            setattr(snippet, field, value)
+        revisions.record_revision(snippet)
+        previews.schedule(snippet)
+        embeds.purge(snippet)
+        if 'is_public' in changed:
+            fanout.schedule(snippet)
+    EVENTS.inc(event='autosave')
+    
+    return JsonResponse({
+        'success': True,
+        'version': version + 1,
+        'saved': sorted(changed),
+        'hashes': {field: content_hash(changed[field]) for field in CODE_FIELDS if field in changed},
+    })
+
+
 @login_required
 @require_POST
 def fork_snippet(request, slug):
     """Fork a snippet"""
     original = get_object_or_404(Snippet, slug=slug)
     
-    # Create a copy
-    fork = Snippet.objects.create(
-        user=request.user,
-        title=f"{original.title} (Fork)",
-        html_code=original.html_code,
-        css_code=original.css_code,
-        js_code=original.js_code,
-        environment=original.environment,
-        description=original.description,
-        tags=original.tags,
-        forked_from=original,
-    )
-    
-    # Increment fork count on original
-    original.increment_forks()
-    
-    # Track activity
-    activity, created = Activity.objects.get_or_create(
-        user=request.user,
-        date=date.today(),
-        defaults={'snippet_count': 0, 'fork_count': 0}
-    )
-    activity.fork_count += 1
-    activity.save()
+    with sharding.atomic(sharding.shard_of(request.user)):
+        # Create a copy
+        fork = Snippet.objects.create(
+            user=request.user,
+            title=f"{original.title} (Fork)",
+            html_code=original.html_code,
+            css_code=original.css_code,
+            js_code=original.js_code,
+            environment=original.environment,
+            description=original.description,
+            tags=original.tags,
+            forked_from=original,
+        )
+        
+        # Fork counter, activity and followers' timelines are updated by the task worker
+        enqueue('playground.record_fork', {
+            'snippet_id': str(original.pk),
+            'forked_at': fork.created_at.isoformat(),
+        })
+        broker.publish(original.pk, counts={'forks': 1})
+        inbox.notify('fork', original, request.user)
+        EVENTS.inc(event='fork')
+        fanout.schedule(fork)
+        previews.schedule(fork)
+        enqueue('accounts.record_activity', {
+            'user_id': request.user.pk,
+            'date': date.today().isoformat(),
+            'forks': 1,
+        })
     
     return JsonResponse({
         'success': True,
@@ -190,19 +452,25 @@ def like_snippet(request, slug):
     """Toggle like on a snippet"""
     snippet = get_object_or_404(Snippet, slug=slug)
     
-    like, created = Like.objects.get_or_create(user=request.user, snippet=snippet)
+    with sharding.atomic(snippet._state.db):
+        like, created = snippet.likes.get_or_create(user=request.user)
+        if not created:
+            # Unlike
+            like.delete()
+        
+        # Counters are adjusted by the task worker
+        delta = 1 if created else -1
+        enqueue('playground.adjust_likes', {
+            'snippet_id': str(snippet.pk),
+            'delta': delta,
+            'liked_at': like.created_at.isoformat(),
+        })
+        broker.publish(snippet.pk, counts={'likes': delta})
+        if created:
+            inbox.notify('like', snippet, request.user)
+        EVENTS.inc(event='like' if created else 'unlike')
     
-    if not created:
-        # Unlike
-        like.delete()
-        snippet.likes_count -= 1
-        snippet.save()
-        return JsonResponse({'success': True, 'liked': False, 'count': snippet.likes_count})
-    else:
-        # Like
-        snippet.likes_count += 1
-        snippet.save()
-        return JsonResponse({'success': True, 'liked': True, 'count': snippet.likes_count})
+    return JsonResponse({'success': True, 'liked': created, 'count': max(snippet.likes_count + delta, 0)})
 
 
 @login_required
@@ -217,14 +485,18 @@ def add_comment(request, slug):
         snippet=snippet,
         text=data.get('text', '')
     )
+    payload = {
+        'username': comment.user.username,
+        'text': comment.text,
+        'created_at': comment.created_at.isoformat(),
+    }
+    broker.publish(snippet.pk, counts={'comments': 1}, comment=payload)
+    inbox.notify('comment', snippet, request.user)
+    EVENTS.inc(event='comment')
     
     return JsonResponse({
         'success': True,
-        'comment': {
-            'username': comment.user.username,
-            'text': comment.text,
-            'created_at': comment.created_at.isoformat(),
-        }
+        'comment': payload,
     })
 
 
@@ -238,11 +510,188 @@ def delete_snippet(request, slug):
     if snippet.user != request.user:
         return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
     
-    snippet.delete()
+    # Hidden at once; views, likes and comments are purged in the background
+    purge.delete_snippet(snippet)
+    EVENTS.inc(event='delete')
     
     return JsonResponse({'success': True})
 
 
+def get_viewable_snippet(request, slug):
+    """Fetch a snippet by slug, hiding private snippets from everyone but the owner"""
+    snippet = get_object_or_404(Snippet, slug=slug)
+    if not snippet.is_public and snippet.user != request.user:
+        raise Http404('Snippet not found')
+    return snippet
+
+
+def snippet_revisions(request, slug):
+    """List a snippet's revisions, newest first"""
+    snippet = get_viewable_snippet(request, slug)
+    rows = snippet.revisions.values('number', 'title', 'is_keyframe', 'size', 'created_at')
+    return JsonResponse({
+        'success': True,
+        'revisions': [
+            {
+                'number': row['number'],
+                'title': row['title'],
+                'keyframe': row['is_keyframe'],
+                'size': row['size'],
+                'created_at': row['created_at'].isoformat(),
+            }
+            for row in rows
+        ],
+    })
+
+
+def snippet_revision(request, slug, number):
+    """Return the full code of one revision"""
+    snippet = get_viewable_snippet(request, slug)
+    code = revisions.reconstruct(snippet, number)
+    if code is None:
+        raise Http404('Revision not found')
+    return JsonResponse({'success': True, 'number': number, **code})
+
+
+def snippet_revision_diff(request, slug, number, other):
+    """Unified diff of each code field between two revisions"""
+    snippet = get_viewable_snippet(request, slug)
+    diffs = revisions.diff(snippet, number, other)
+    if diffs is None:
+        raise Http404('Revision not found')
+    return JsonResponse({'success': True, 'from': number, 'to': other, 'diff': diffs})
+
+
+def snippet_batch(request):
+    """Metadata, counters and like state for many snippets, by slug or id"""
+    idents = list(dict.fromkeys(
+        ident.strip() for value in request.GET.getlist('ids') for ident in value.split(',') if ident.strip()
+    ))
+    if not idents:
+        return JsonResponse({'success': False, 'error': 'No ids given'}, status=400)
+    if len(idents) > BATCH_MAX_IDS:
+        return JsonResponse({'success': False, 'error': f'At most {BATCH_MAX_IDS} ids per request'}, status=400)
+    
+    fields = BATCH_DEFAULT_FIELDS
+    if request.GET.get('fields'):
+        fields = list(dict.fromkeys(field.strip() for field in request.GET['fields'].split(',') if field.strip()))
+        unknown = [field for field in fields if field not in BATCH_FIELDS]
+        if unknown:
+            return JsonResponse({'success': False, 'error': f'Unknown fields: {", ".join(unknown)}'}, status=400)
+    
+    ids, keys = parse_idents(idents)
+    
+    visible = Q(is_public=True)
+    if request.user.is_authenticated:
+        visible |= Q(user=request.user)
+    load = {'slug', *(field for field in fields if field not in ('id', 'user', 'liked'))}
+    snippets = Snippet.objects.filter(Q(pk__in=ids) | Q(slug__in=idents), visible)
+    if 'user' in fields and sharding.enabled():
+        # Users aren't on the snippet shards, so no join
+        users = Prefetch('user', get_user_model().objects.only('username'))
+        snippets = snippets.only(*load, 'user').prefetch_related(users)
+    elif 'user' in fields:
+        snippets = snippets.select_related('user').only(*load, 'user__username')
+    else:
+        snippets = snippets.only(*load)
+    
+    found = {}
+    for snippet in sharding.scatter(snippets, sharding.shards_of(ids, idents)):
+        found[str(snippet.pk)] = found[snippet.slug] = snippet
+    liked = set()
+    if 'liked' in fields and found and request.user.is_authenticated:
+        liked = set(sharding.scatter(
+            Like.objects.filter(user=request.user).values_list('snippet_id', flat=True),
+            sharding.by_database(set(found.values())),
+            field='snippet_id',
+        ))
+    
+    # Rows of values in ``fields`` order, in the order the ids were given
+    rows, missing = [], []
+    for ident in idents:
+        snippet = found.get(keys[ident]) or found.get(ident)
+        if snippet is None:
+            missing.append(ident)
+        else:
+            rows.append([batch_value(snippet, field, liked) for field in fields])
+    return JsonResponse(
+        {'success': True, 'fields': fields, 'snippets': rows, 'missing': missing},
+        json_dumps_params={'separators': (',', ':')},
+    )
+
+
+def parse_idents(idents):
+    """(ids, {ident: id or slug}): identifiers that parse as UUIDs are ids, anything else is a slug"""
+    ids, keys = [], {}
+    for ident in idents:
+        try:
+            keys[ident] = str(uuid.UUID(ident))
+            ids.append(keys[ident])
+        except ValueError:
+            keys[ident] = ident
+    return ids, keys
+
+
+@login_required
+@require_POST
+def bulk_snippets(request):
+    """Publish, hide, pin, unpin, retag or delete many of the current user's snippets at once"""
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    
+    idents = data.get('ids')
+    if not isinstance(idents, list) or not idents or not all(isinstance(ident, str) for ident in idents):
+        return JsonResponse({'success': False, 'error': 'ids must be a list of snippet ids or slugs'}, status=400)
+    idents = list(dict.fromkeys(idents))
+    if len(idents) > BULK_MAX_IDS:
+        return JsonResponse({'success': False, 'error': f'At most {BULK_MAX_IDS} ids per request'}, status=400)
+    ids, keys = parse_idents(idents)
+    
+    action = data.get('action')
+    if action == 'delete':
+        changed = bulk.delete(request.user, ids, idents)
+        EVENTS.inc(len(changed), event='delete')
+    elif action == 'update':
+        flags = {flag: data[flag] for flag in bulk.FLAGS if flag in data}
+        tag_lists = {key: data[key] for key in ('tags', 'add_tags', 'remove_tags') if key in data}
+        if not all(isinstance(value, bool) for value in flags.values()):
+            return JsonResponse({'success': False, 'error': 'Flags must be true or false'}, status=400)
+        if not all(
+            isinstance(value, list) and all(isinstance(tag, str) for tag in value) for value in tag_lists.values()
+        ):
+            return JsonResponse({'success': False, 'error': 'Tags must be lists of strings'}, status=400)
+        if not flags and not tag_lists:
+            return JsonResponse({'success': False, 'error': 'Nothing to change'}, status=400)
+        changed = bulk.update(
+            request.user, ids, idents, flags,
+            tags=tag_lists.get('tags'),
+            add_tags=tag_lists.get('add_tags', ()),
+            remove_tags=tag_lists.get('remove_tags', ()),
+        )
+    else:
+        return JsonResponse({'success': False, 'error': 'action must be update or delete'}, status=400)
+    
+    # Not found, not the user's, or already as asked
+    slugs = set(changed.values())
+    unchanged = [ident for ident in idents if keys[ident] not in changed and ident not in slugs]
+    return JsonResponse({'success': True, 'action': action, 'changed': list(changed.values()), 'unchanged': unchanged})
+
+
+def batch_value(snippet, field, liked):
+    if field == 'liked':
+        return snippet.pk in liked
+    if field == 'user':
+        return snippet.user.username
+    if field == 'id':
+        return str(snippet.pk)
+    if field == 'forked_from':
+        return str(snippet.forked_from_id) if snippet.forked_from_id else None
+    value = getattr(snippet, field)
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
 def get_client_ip(request):
     """Get client IP address"""
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
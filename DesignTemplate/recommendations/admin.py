@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import SimilarSnippet
+
+
+@admin.register(SimilarSnippet)
+class SimilarSnippetAdmin(admin.ModelAdmin):
+    """Admin for precomputed similar snippets"""
+    list_display = ['snippet', 'similar', 'score']
+    list_select_related = ['snippet__user', 'similar__user']
+    raw_id_fields = ['snippet', 'similar']
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recommendations import similarity
+
+
+class Command(BaseCommand):
+    help = 'Update the similar-snippets index for new and edited snippets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild every snippet, not just stale ones')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Snippets processed per transaction')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        
+        def progress(count, stage):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{count} snippets {stage} ({time.monotonic() - started:.1f}s)')
+        
+        count = similarity.build(full=options['full'], chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(f'Indexed {count} snippets in {time.monotonic() - started:.2f}s')
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('playground', '0006_like_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnippetSignature',
+            fields=[
+                ('snippet', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='playground.snippet')),
+                ('minhash', models.BinaryField(help_text='Packed 32-bit MinHash values')),
+                ('shingle_count', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField(help_text='Snippets updated after this are rebuilt')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LshBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('key', models.BigIntegerField()),
+                ('snippet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='playground.snippet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band', 'key'], name='recommendat_band_9d7b1e_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarSnippet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='playground.snippet')),
+                ('snippet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_snippets', to='playground.snippet')),
+            ],
+            options={
+                'verbose_name': 'Similar snippet',
+                'verbose_name_plural': 'Similar snippets',
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['snippet', '-score'], name='recommendat_snippet_7fbae3_idx')],
+                'unique_together': {('snippet', 'similar')},
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import models
+
+from playground.models import Snippet
+
+
+class SnippetSignature(models.Model):
+    """MinHash signature of a snippet's code (see recommendations.similarity)"""
+    snippet = models.OneToOneField(
+        Snippet, on_delete=models.CASCADE, primary_key=True, related_name='signature'
+    )
+    minhash = models.BinaryField(help_text="Packed 32-bit MinHash values")
+    shingle_count = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(help_text="Snippets updated after this are rebuilt")
+    
+    def __str__(self):
+        return f"Signature of {self.snippet_id}"
+
+
+class LshBucket(models.Model):
+    """One LSH band of a snippet's signature; snippets sharing a bucket are candidates"""
+    snippet = models.ForeignKey(Snippet, on_delete=models.CASCADE, related_name='+', db_constraint=False)
+    band = models.PositiveSmallIntegerField()
+    key = models.BigIntegerField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['band', 'key']),
+        ]
+    
+    def __str__(self):
+        return f"{self.snippet_id} band {self.band}"
+
+
+class SimilarSnippet(models.Model):
+    """Precomputed top-K neighbours of a snippet, read directly by the detail page"""
+    # Snippets may be on any shard (see playground.sharding)
+    snippet = models.ForeignKey(Snippet, on_delete=models.CASCADE, related_name='similar_snippets', db_constraint=False)
+    similar = models.ForeignKey(Snippet, on_delete=models.CASCADE, related_name='+', db_constraint=False)
+    score = models.FloatField()
+    
+    class Meta:
+        unique_together = ('snippet', 'similar')
+        indexes = [
+            models.Index(fields=['snippet', '-score']),
+        ]
+        ordering = ['-score']
+        verbose_name = 'Similar snippet'
+        verbose_name_plural = 'Similar snippets'
+    
+    def __str__(self):
+        return f"{self.snippet_id} ~ {self.similar_id} ({self.score:.2f})"
@@ -0,0 +1,353 @@
+"""
+Precomputed "similar snippets".
+
+A snippet's code is reduced to shingles (three consecutive code tokens) and
+summarised by a 64-value one-permutation MinHash signature: the fraction of
+positions two signatures agree on estimates the Jaccard similarity of their
+shingle sets. Signatures are cut into 16 bands of 4 values, and snippets
+sharing any band bucket (code similarity of roughly 0.5 and up) become
+candidates, together with snippets liked by the same users. Candidates are
+scored on code similarity, shared tags, co-likes and environment, and the
+best TOP_K are stored in SimilarSnippet, so a page view is one indexed query.
+
+``build`` processes only snippets that have no signature or were updated
+since it was computed, a chunk at a time, and offers each of them to its
+neighbours' lists as well, keeping the index roughly symmetric without a
+full rebuild. Scores against snippets that later changed only refresh when
+either side is rebuilt; ``build(full=True)`` recomputes everything.
+"""
+
+import heapq
+import re
+import struct
+from collections import Counter, defaultdict
+from hashlib import blake2b
+
+from django.db.models import F, Q, Window, prefetch_related_objects
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from playground import sharding
+from playground.deltas import CODE_FIELDS
+from playground.models import Like, Snippet
+from .models import LshBucket, SimilarSnippet, SnippetSignature
+
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+TOP_K = 12
+MIN_SCORE = 0.1
+MIN_SHINGLES = 5
+
+BUCKET_CAP = 50  # Candidates taken from any one bucket (forks of a popular snippet)
+CO_LIKE_USERS = 100  # Most recent likers consulted per snippet
+CO_LIKE_LIKES = 100  # Most recent likes consulted per liker
+CO_LIKE_CANDIDATES = 20
+IN_CHUNK = 5000
+
+WEIGHTS = {'code': 0.6, 'tags': 0.2, 'likes': 0.15, 'environment': 0.05}
+
+TOKEN_RE = re.compile(r'[a-z_$][\w$-]+|\d+')
+_SIGNATURE = struct.Struct(f'<{NUM_HASHES}I')
+_BAND = struct.Struct(f'<B{ROWS}I')
+
+
+def shingles(snippet):
+    text = '\n'.join(getattr(snippet, field) or '' for field in CODE_FIELDS).lower()
+    tokens = TOKEN_RE.findall(text)
+    return {' '.join(tokens[i:i + 3]) for i in range(len(tokens) - 2)}
+
+
+def minhash(features):
+    """One-permutation MinHash: one hash per feature, binned by its low bits"""
+    slots = [None] * NUM_HASHES
+    for feature in features:
+        h = int.from_bytes(blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+        index, value = h % NUM_HASHES, h >> 32
+        if slots[index] is None or value < slots[index]:
+            slots[index] = value
+    # Densify: an empty bin borrows the next non-empty bin's value, offset by
+    # the distance, so equal sets still produce equal signatures
+    if all(value is None for value in slots):
+        return None
+    signature = []
+    for i, value in enumerate(slots):
+        distance = 0
+        while value is None:
+            distance += 1
+            value = slots[(i + distance) % NUM_HASHES]
+        signature.append((value + distance * 0x9E3779B1) & 0xFFFFFFFF)
+    return signature
+
+
+def pack(signature):
+    return _SIGNATURE.pack(*signature) if signature else b''
+
+
+def unpack(data):
+    return list(_SIGNATURE.unpack(bytes(data))) if data else None
+
+
+def band_keys(signature):
+    """(band, bucket key) pairs; keys fit a signed 64-bit column"""
+    for band in range(BANDS):
+        chunk = _BAND.pack(band, *signature[band * ROWS:(band + 1) * ROWS])
+        yield band, int.from_bytes(blake2b(chunk, digest_size=8).digest(), 'little') >> 1
+
+
+def code_similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / NUM_HASHES
+
+
+def tag_similarity(a, b):
+    a, b = set(a or ()), set(b or ())
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _chunks(items, size=IN_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _recent(queryset, partition, limit):
+    """Keep the newest ``limit`` rows per ``partition`` value"""
+    return queryset.annotate(
+        position=Window(RowNumber(), partition_by=[F(partition)], order_by=F('created_at').desc())
+    ).filter(position__lte=limit)
+
+
+def bucket_candidates(signatures):
+    """Other snippets sharing an LSH bucket with each signed snippet"""
+    by_key = defaultdict(list)
+    for pk, signature in signatures.items():
+        if signature:
+            for band, key in band_keys(signature):
+                by_key[band, key].append(pk)
+
+    candidates = defaultdict(set)
+    for band in range(BANDS):
+        keys = [key for b, key in by_key if b == band]
+        for batch in _chunks(keys):
+            rows = LshBucket.objects.filter(band=band, key__in=batch).annotate(
+                position=Window(RowNumber(), partition_by=[F('key')], order_by=F('id').desc())
+            ).filter(position__lte=BUCKET_CAP).values_list('key', 'snippet_id')
+            for key, other in rows:
+                for pk in by_key[band, key]:
+                    if other != pk:
+                        candidates[pk].add(other)
+    return candidates
+
+
+def co_likes(snippet_ids):
+    """{snippet: Counter(other snippet: shared likers)} and each snippet's liker count"""
+    likers = defaultdict(set)
+    rows = _recent(Like.objects.filter(snippet_id__in=snippet_ids), 'snippet_id', CO_LIKE_USERS)
+    for snippet_id, user_id in rows.values_list('snippet_id', 'user_id'):
+        likers[snippet_id].add(user_id)
+
+    liked = defaultdict(list)
+    for batch in _chunks(set().union(*likers.values())):
+        # Likers' likes can be on any shard; each contributes its newest
+        rows = _recent(Like.objects.filter(user_id__in=batch), 'user_id', CO_LIKE_LIKES)
+        for user_id, snippet_id in sharding.scatter(rows.values_list('user_id', 'snippet_id')):
+            liked[user_id].append(snippet_id)
+
+    counts = {
+        pk: Counter(other for user_id in users for other in liked[user_id] if other != pk)
+        for pk, users in likers.items()
+    }
+    return counts, {pk: len(users) for pk, users in likers.items()}
+
+
+def score(signature, other_signature, tags, other_tags, shared_likers, likers, same_environment):
+    return (
+        WEIGHTS['code'] * code_similarity(signature, other_signature)
+        + WEIGHTS['tags'] * tag_similarity(tags, other_tags)
+        + WEIGHTS['likes'] * (shared_likers / likers if likers else 0.0)
+        + WEIGHTS['environment'] * same_environment
+    )
+
+
+def sign_chunk(chunk, computed_at):
+    """Store signatures and LSH buckets for a chunk; returns {pk: signature}"""
+    ids = [s.pk for s in chunk]
+    signatures, counts = {}, {}
+    for snippet in chunk:
+        features = shingles(snippet)
+        counts[snippet.pk] = len(features)
+        signatures[snippet.pk] = minhash(features) if len(features) >= MIN_SHINGLES else None
+
+    SnippetSignature.objects.filter(pk__in=ids).delete()
+    SnippetSignature.objects.bulk_create([
+        SnippetSignature(snippet_id=pk, minhash=pack(signatures[pk]), shingle_count=counts[pk],
+                         computed_at=computed_at)
+        for pk in ids
+    ])
+    LshBucket.objects.filter(snippet_id__in=ids).delete()
+    # Only public snippets can be found as someone else's neighbour
+    LshBucket.objects.bulk_create([
+        LshBucket(snippet_id=s.pk, band=band, key=key)
+        for s in chunk
+        if s.is_public and signatures[s.pk]
+        for band, key in band_keys(signatures[s.pk])
+    ])
+    return signatures
+
+
+def rank_chunk(chunk, signatures):
+    """Score each snippet's candidates and store its top TOP_K; returns the rankings"""
+    ids = [s.pk for s in chunk]
+    candidates = bucket_candidates(signatures)
+    shared, likers = co_likes(ids)
+    for pk, counter in shared.items():
+        candidates[pk].update(other for other, _ in counter.most_common(CO_LIKE_CANDIDATES))
+
+    others = set().union(*candidates.values()) if candidates else set()
+    info, other_signatures = {}, dict(signatures)
+    for batch in _chunks(others):
+        for row in sharding.fetch(Snippet.objects.filter(is_public=True).values('pk', 'tags', 'environment'), batch):
+            info[row['pk']] = row
+        for pk, data in sharding.fetch(SnippetSignature.objects.values_list('pk', 'minhash'), batch):
+            other_signatures.setdefault(pk, unpack(data))
+
+    ranked = {}
+    for snippet in chunk:
+        scored = []
+        for other in candidates.get(snippet.pk, ()):
+            row = info.get(other)
+            if row is None:
+                continue
+            value = score(
+                signatures[snippet.pk], other_signatures.get(other), snippet.tags, row['tags'],
+                shared.get(snippet.pk, Counter())[other], likers.get(snippet.pk, 0),
+                snippet.environment == row['environment'],
+            )
+            if value >= MIN_SCORE:
+                scored.append((value, other))
+        ranked[snippet.pk] = heapq.nlargest(TOP_K, scored, key=lambda item: item[0])
+
+    SimilarSnippet.objects.filter(snippet_id__in=ids).delete()
+    SimilarSnippet.objects.bulk_create([
+        SimilarSnippet(snippet_id=pk, similar_id=other, score=value)
+        for pk, items in ranked.items()
+        for value, other in items
+    ])
+    return ranked
+
+
+def offer_to_neighbours(chunk, ranked):
+    """Insert freshly ranked public snippets into their neighbours' top-K lists"""
+    chunk_ids = {s.pk for s in chunk}
+    offers = defaultdict(dict)
+    for snippet in chunk:
+        if snippet.is_public:
+            for value, other in ranked[snippet.pk]:
+                if other not in chunk_ids:
+                    offers[other][snippet.pk] = value
+
+    existing = defaultdict(dict)
+    for batch in _chunks(offers):
+        rows = SimilarSnippet.objects.filter(snippet_id__in=batch).values_list('snippet_id', 'similar_id', 'score')
+        for pk, other, value in rows:
+            existing[pk][other] = value
+
+    rewrite, rows = [], []
+    for pk, incoming in offers.items():
+        current = existing[pk]
+        top = dict(heapq.nlargest(TOP_K, {**current, **incoming}.items(), key=lambda item: item[1]))
+        if top != current:
+            rewrite.append(pk)
+            rows.extend(SimilarSnippet(snippet_id=pk, similar_id=other, score=value) for other, value in top.items())
+    for batch in _chunks(rewrite):
+        SimilarSnippet.objects.filter(snippet_id__in=batch).delete()
+    SimilarSnippet.objects.bulk_create(rows)
+
+
+def stale_snippets():
+    return Snippet.objects.filter(Q(signature__isnull=True) | Q(updated_at__gt=F('signature__computed_at')))
+
+
+def _iter_chunks(snippets, chunk_size):
+    """Yield lists of ``snippets`` in primary key order"""
+    last_pk = None
+    while True:
+        chunk = snippets.order_by('pk')
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def build(full=False, chunk_size=1000, progress=None):
+    """
+    Index stale snippets, or every snippet with ``full``; returns the count.
+
+    A full build signs every snippet before ranking any, so all buckets are
+    in place and neighbour lists come out complete without offers. The
+    incremental build signs and ranks a chunk at a time and offers the
+    results to the neighbours it finds. Snippet shards are processed one
+    after the other (see playground.sharding).
+    """
+    processed = 0
+    fields = ['pk', 'tags', 'environment', 'is_public']
+    if not full:
+        for alias in sharding.databases():
+            with sharding.use(alias):
+                for chunk in _iter_chunks(stale_snippets().only(*fields, *CODE_FIELDS), chunk_size):
+                    # Edits landing after this point are picked up by the next run
+                    computed_at = timezone.now()
+                    with sharding.atomic(alias):
+                        signatures = sign_chunk(chunk, computed_at)
+                        offer_to_neighbours(chunk, rank_chunk(chunk, signatures))
+                    processed += len(chunk)
+                    if progress:
+                        progress(processed, 'indexed')
+        return processed
+
+    for alias in sharding.databases():
+        with sharding.use(alias):
+            for chunk in _iter_chunks(Snippet.objects.only(*fields, *CODE_FIELDS), chunk_size):
+                computed_at = timezone.now()
+                with sharding.atomic(alias):
+                    sign_chunk(chunk, computed_at)
+                processed += len(chunk)
+                if progress:
+                    progress(processed, 'signed')
+    ranked = 0
+    for alias in sharding.databases():
+        with sharding.use(alias):
+            for chunk in _iter_chunks(Snippet.objects.only(*fields), chunk_size):
+                rows = SnippetSignature.objects.filter(pk__in=[s.pk for s in chunk]).values_list('pk', 'minhash')
+                signatures = {pk: unpack(data) for pk, data in rows}
+                with sharding.atomic(alias):
+                    rank_chunk(chunk, signatures)
+                ranked += len(chunk)
+                if progress:
+                    progress(ranked, 'ranked')
+    return processed
+
+
+def similar_to(snippet, limit=6):
+    """Precomputed public neighbours of ``snippet``, best first"""
+    if sharding.enabled():
+        # Neighbours can be on any shard, so no join
+        ids = list(SimilarSnippet.objects.filter(snippet=snippet).values_list('similar_id', flat=True))
+        found = {
+            other.pk: other
+            for other in sharding.fetch(Snippet.objects.filter(is_public=True).defer(*CODE_FIELDS), ids)
+        }
+        similar = [found[pk] for pk in ids if pk in found][:limit]
+        prefetch_related_objects(similar, 'user')
+        return similar
+    rows = (
+        SimilarSnippet.objects.filter(snippet=snippet, similar__is_public=True, similar__deleted_at__isnull=True)
+        .select_related('similar__user')
+        .defer(*(f'similar__{field}' for field in CODE_FIELDS))
+    )
+    return [row.similar for row in rows[:limit]]
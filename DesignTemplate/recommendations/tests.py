@@ -0,0 +1,142 @@
+import random
+
+from django.test import SimpleTestCase, TestCase
+
+from accounts.models import User
+from playground import purge
+from playground.models import Like, Snippet
+from . import similarity
+from .models import LshBucket, SimilarSnippet, SnippetSignature
+
+
+def code(*numbers):
+    """JavaScript with one small function per number"""
+    return '\n'.join(f'function step{n}(value) {{ return value * {n} + offset{n}; }}' for n in numbers)
+
+
+class MinHashTests(SimpleTestCase):
+
+    def test_signatures_depend_only_on_the_set(self):
+        features = [f'token {i}' for i in range(200)]
+        signature = similarity.minhash(features)
+        self.assertEqual(len(signature), similarity.NUM_HASHES)
+        self.assertEqual(similarity.minhash(reversed(features)), signature)
+        self.assertEqual(similarity.minhash(features + features[:10]), signature)
+        self.assertEqual(similarity.unpack(similarity.pack(signature)), signature)
+        self.assertIsNone(similarity.minhash([]))
+        self.assertIsNone(similarity.unpack(similarity.pack(None)))
+
+    def test_small_sets_fill_every_slot(self):
+        signature = similarity.minhash(['one', 'two', 'three'])
+        self.assertEqual(len(signature), similarity.NUM_HASHES)
+        self.assertEqual(similarity.code_similarity(signature, similarity.minhash(['three', 'two', 'one'])), 1.0)
+
+    def test_agreement_estimates_jaccard_similarity(self):
+        rng = random.Random(36)
+        for jaccard in (0.2, 0.5, 0.8):
+            estimates = []
+            for trial in range(20):
+                shared = [f'shared {trial} {i}' for i in range(int(400 * jaccard))]
+                rest = 400 - len(shared)
+                a = shared + [f'a {trial} {i}' for i in range(rest // 2)]
+                b = shared + [f'b {trial} {i}' for i in range(rest - rest // 2)]
+                rng.shuffle(a)
+                estimates.append(similarity.code_similarity(similarity.minhash(a), similarity.minhash(b)))
+            with self.subTest(jaccard=jaccard):
+                self.assertAlmostEqual(sum(estimates) / len(estimates), jaccard, delta=0.05)
+
+    def test_bands_are_shared_where_the_signatures_agree(self):
+        signature = similarity.minhash([f'token {i}' for i in range(200)])
+        keys = list(similarity.band_keys(signature))
+        self.assertEqual([band for band, _ in keys], list(range(similarity.BANDS)))
+        self.assertTrue(all(0 <= key < 2 ** 63 for _, key in keys))
+
+        changed = list(signature)
+        changed[similarity.ROWS * 3] += 1
+        shared = set(keys) & set(similarity.band_keys(changed))
+        self.assertEqual({band for band, _ in keys} - {band for band, _ in shared}, {3})
+
+    def test_shingles_are_three_tokens_from_every_code_field(self):
+        snippet = Snippet(html_code='<div class="Card">', css_code='.card { top: 0 }', js_code='')
+        self.assertEqual(similarity.shingles(snippet), {
+            'div class card', 'class card card', 'card card top', 'card top 0',
+        })
+
+
+class BuildTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('recommender', 'recommender@example.com')
+        self.base = self.create('Base', code(*range(40)))
+        self.near = self.create('Near', code(*range(38), 100, 101))
+        self.far = self.create('Far', code(*range(200, 240)))
+        self.hidden = self.create('Hidden', code(*range(40)), is_public=False)
+        self.short = self.create('Short', 'go();')
+
+    def create(self, title, js_code, **fields):
+        return Snippet.objects.create(user=self.user, title=title, js_code=js_code, **fields)
+
+    def similar(self, snippet):
+        return [other.title for other in similarity.similar_to(snippet)]
+
+    def test_near_copies_are_found_and_unrelated_code_is_not(self):
+        self.assertEqual(similarity.build(), 5)
+        self.assertEqual(self.similar(self.base), ['Near'])
+        self.assertEqual(self.similar(self.near), ['Base'])
+        self.assertEqual(self.similar(self.far), [])
+        # Private snippets get neighbours but are never one
+        self.assertEqual(self.similar(self.hidden), ['Base', 'Near'])
+        self.assertFalse(LshBucket.objects.filter(snippet=self.hidden).exists())
+        # Too little code to sign
+        self.assertEqual(SnippetSignature.objects.get(snippet=self.short).minhash, b'')
+
+        score = SimilarSnippet.objects.get(snippet=self.base, similar=self.near).score
+        self.assertGreater(score, similarity.WEIGHTS['code'] * 0.7)
+
+    def test_builds_only_redo_changed_snippets(self):
+        self.assertEqual(similarity.build(), 5)
+        self.assertEqual(similarity.build(), 0)
+
+        # The far snippet becomes a copy; the base hears about it without being rebuilt
+        self.far.js_code = code(*range(39), 300)
+        self.far.save()
+        indexed = []
+        self.assertEqual(similarity.build(progress=lambda count, stage: indexed.append((count, stage))), 1)
+        self.assertEqual(indexed, [(1, 'indexed')])
+        self.assertEqual(self.similar(self.far), ['Base', 'Near'])
+        self.assertEqual(self.similar(self.base)[0], 'Far')
+        self.assertEqual(sorted(self.similar(self.base)), ['Far', 'Near'])
+
+    def test_a_full_build_matches_the_incremental_one(self):
+        for i in range(6):
+            self.create(f'Variant {i}', code(*range(i, 40 + i)))
+        # Private snippets are never offered to, so only public lists are complete before a rebuild
+        neighbours = SimilarSnippet.objects.filter(snippet__is_public=True).values_list('snippet', 'similar')
+        similarity.build(chunk_size=3)
+        incremental = set(neighbours)
+        self.assertEqual(similarity.build(full=True, chunk_size=4), 11)
+        self.assertEqual(set(neighbours), incremental)
+        self.assertEqual(len(incremental), 8 * 7)
+
+    def test_shared_likers_make_neighbours(self):
+        for i in range(3):
+            fan = User.objects.create_user(f'fan{i}', f'fan{i}@example.com')
+            Like.objects.create(user=fan, snippet=self.far)
+            Like.objects.create(user=fan, snippet=self.short)
+        similarity.build()
+        self.assertEqual(self.similar(self.far), ['Short'])
+        self.assertEqual(self.similar(self.short), ['Far'])
+
+    def test_similar_to_skips_hidden_and_deleted_snippets(self):
+        variants = [self.create(f'Variant {i}', code(*range(i, 40 + i))) for i in range(1, 9)]
+        similarity.build()
+        self.assertEqual(len(self.similar(self.base)), 6)
+        self.assertEqual(len(similarity.similar_to(self.base, limit=20)), 9)
+
+        Snippet.objects.filter(pk=self.near.pk).update(is_public=False)
+        purge.delete_snippet(variants[0])
+        titles = [other.title for other in similarity.similar_to(self.base, limit=20)]
+        self.assertEqual(sorted(titles), sorted(f'Variant {i}' for i in range(2, 9)))
+        # Best first
+        scores = dict(SimilarSnippet.objects.filter(snippet=self.base).values_list('similar__title', 'score'))
+        self.assertEqual(titles, sorted(titles, key=scores.get, reverse=True))
@@ -0,0 +1,17 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    """Admin for queued background tasks"""
+    list_display = ['name', 'status', 'attempts', 'run_after', 'created_at']
+    list_filter = ['status', 'name']
+    search_fields = ['idempotency_key']
+    readonly_fields = ['created_at', 'updated_at']
+    actions = ['requeue']
+    
+    @admin.action(description='Requeue selected tasks')
+    def requeue(self, request, queryset):
+        queryset.update(status='queued', attempts=0, run_after=timezone.now(), locked_by='', locked_until=None)
@@ -0,0 +1,54 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from taskqueue import queue
+from taskqueue.models import Task
+
+
+class Command(BaseCommand):
+    help = 'Run the background task worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Tasks claimed per batch')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain due tasks and exit')
+        parser.add_argument(
+            '--keep-done-days', type=int, default=7,
+            help='Delete completed keyed tasks older than this many days'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        processed = 0
+        last_maintenance = 0
+        
+        try:
+            while True:
+                if time.monotonic() - last_maintenance > 60:
+                    self.maintenance(options['keep_done_days'])
+                    last_maintenance = time.monotonic()
+                
+                count = queue.run_batch(batch_size)
+                processed += count
+                if count:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Processed {processed} tasks in {elapsed:.2f}s '
+            f'({processed / elapsed if elapsed else 0:.0f} tasks/s)'
+        )
+
+    def maintenance(self, keep_done_days):
+        queue.release_expired_leases()
+        cutoff = timezone.now() - timedelta(days=keep_done_days)
+        Task.objects.filter(status='done', updated_at__lt=cutoff).delete()
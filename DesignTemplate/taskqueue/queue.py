@@ -0,0 +1,238 @@
+"""
+A small database-backed task queue.
+
+Handlers register themselves with ``@task`` in an app's ``tasks.py`` and are
+enqueued by name::
+
+    @task('playground.record_view', batch=True)
+    def record_view(payloads):
+        ...
+
+    enqueue('playground.record_view', {'snippet_id': ...})
+
+Task rows are written in the caller's transaction, so deferred work is only
+ever queued for primary writes that actually commit. ``run_tasks`` claims
+due tasks in batches; batch handlers receive every claimed payload for their
+name in one call so they can bulk-insert and aggregate counter updates.
+Failed tasks are retried with exponential backoff up to ``max_attempts``.
+
+A batch handler whose work commits in several independent parts (one
+transaction per snippet shard, say) passes ``split``: a function dividing a
+list of payloads into groups, returning the payload objects themselves.
+Each group then runs, succeeds and is retried on its own, so a retry never
+repeats a part that already committed. Payloads left out of every group are
+dropped and their tasks completed.
+"""
+
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 300
+MAX_BACKOFF_SECONDS = 3600
+
+_registry = {}
+
+
+class TaskHandler:
+    def __init__(self, name, func, batch, max_attempts, split=None):
+        self.name = name
+        self.func = func
+        self.batch = batch
+        self.max_attempts = max_attempts
+        self.split = split
+
+    def run(self, payloads):
+        if self.batch:
+            self.func(payloads)
+        else:
+            for payload in payloads:
+                self.func(**payload)
+
+    def groups(self, tasks):
+        """(groups of tasks run as one unit each, tasks whose payloads ``split`` dropped)"""
+        if self.split is None or not self.batch:
+            return [tasks], []
+        by_payload = {id(t.payload): t for t in tasks}
+        groups = [
+            [by_payload.pop(id(payload)) for payload in payloads]
+            for payloads in self.split([t.payload for t in tasks])
+            if payloads
+        ]
+        return groups, list(by_payload.values())
+
+
+def task(name, batch=False, max_attempts=5, split=None):
+    """Register a task handler under ``name``"""
+    def decorator(func):
+        _registry[name] = TaskHandler(name, func, batch, max_attempts, split)
+        return func
+    return decorator
+
+
+def get_handler(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError(f'No task registered as {name!r}')
+
+
+def is_eager():
+    return getattr(settings, 'TASKQUEUE_EAGER', False)
+
+
+def enqueue(name, payload=None, idempotency_key=None, delay=None):
+    """Queue one task; see ``enqueue_many``"""
+    enqueue_many(name, [payload or {}], [idempotency_key], delay)
+
+
+def enqueue_many(name, payloads, idempotency_keys=None, delay=None):
+    """
+    Queue a task per payload in a single INSERT.
+
+    Payloads whose idempotency key already exists are silently dropped.
+    With TASKQUEUE_EAGER the handler runs immediately after commit instead.
+    """
+    handler = get_handler(name)
+    if not payloads:
+        return
+    if is_eager():
+        transaction.on_commit(lambda: handler.run(list(payloads)))
+        return
+    keys = idempotency_keys or [None] * len(payloads)
+    run_after = timezone.now() + (delay or timedelta())
+    Task.objects.bulk_create(
+        [
+            Task(
+                name=name,
+                payload=payload,
+                idempotency_key=key,
+                max_attempts=handler.max_attempts,
+                run_after=run_after,
+            )
+            for payload, key in zip(payloads, keys)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def release_expired_leases():
+    """Requeue tasks whose worker died while holding them"""
+    return Task.objects.filter(status='running', locked_until__lt=timezone.now()).update(
+        status='queued', locked_by='', locked_until=None
+    )
+
+
+def claim(batch_size):
+    """Lease up to ``batch_size`` due tasks to this worker"""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    due = Task.objects.filter(status='queued', run_after__lte=now).order_by('run_after', 'id')
+    ids = list(due.values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    Task.objects.filter(id__in=ids, status='queued').update(
+        status='running',
+        locked_by=token,
+        locked_until=now + timedelta(seconds=LEASE_SECONDS),
+    )
+    return list(Task.objects.filter(locked_by=token))
+
+
+def _complete(tasks):
+    ids = [t.id for t in tasks]
+    # Keyed tasks are kept so their key keeps deduplicating; the rest go away
+    Task.objects.filter(id__in=ids, idempotency_key__isnull=True).delete()
+    Task.objects.filter(id__in=ids).update(status='done', locked_by='', locked_until=None)
+
+
+def _fail(task_obj, error):
+    attempts = task_obj.attempts + 1
+    backoff = min(2 ** attempts, MAX_BACKOFF_SECONDS)
+    Task.objects.filter(id=task_obj.id).update(
+        status='failed' if attempts >= task_obj.max_attempts else 'queued',
+        attempts=F('attempts') + 1,
+        run_after=timezone.now() + timedelta(seconds=backoff),
+        locked_by='',
+        locked_until=None,
+        last_error=error[:2000],
+    )
+    logger.warning('Task %s #%s failed (attempt %s): %s', task_obj.name, task_obj.id, attempts, error)
+
+
+def _run_group(handler, tasks):
+    """Run tasks of one name; returns (succeeded, failed) lists"""
+    try:
+        with transaction.atomic():
+            handler.run([t.payload for t in tasks])
+        return tasks, []
+    except Exception:
+        if len(tasks) == 1:
+            logger.exception('Task %s failed', handler.name)
+            return [], [(tasks[0], _format_error())]
+
+    # The batch failed: retry one by one so a single bad payload can't
+    # hold back the rest of the batch.
+    succeeded, failed = [], []
+    for task_obj in tasks:
+        try:
+            with transaction.atomic():
+                handler.run([task_obj.payload])
+            succeeded.append(task_obj)
+        except Exception:
+            failed.append((task_obj, _format_error()))
+    return succeeded, failed
+
+
+def _format_error():
+    return traceback.format_exc()
+
+
+def run_batch(batch_size=500):
+    """Claim and process one batch of due tasks; returns the number processed"""
+    tasks = claim(batch_size)
+    groups = {}
+    for task_obj in tasks:
+        groups.setdefault(task_obj.name, []).append(task_obj)
+
+    for name, group in groups.items():
+        try:
+            handler = get_handler(name)
+        except LookupError as e:
+            for task_obj in group:
+                _fail(task_obj, str(e))
+            continue
+        try:
+            parts, dropped = handler.groups(group)
+        except Exception:
+            logger.exception('Splitting %s tasks failed', name)
+            parts, dropped = [group], []
+        if dropped:
+            _complete(dropped)
+        for part in parts:
+            succeeded, failed = _run_group(handler, part)
+            if succeeded:
+                _complete(succeeded)
+            for task_obj, error in failed:
+                _fail(task_obj, error)
+    return len(tasks)
+
+
+def drain(batch_size=500):
+    """Process due tasks until the queue is empty; returns the number processed"""
+    total = 0
+    while True:
+        processed = run_batch(batch_size)
+        if not processed:
+            return total
+        total += processed
@@ -0,0 +1,123 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import queue
+from .models import Task
+
+calls = []
+
+
+@queue.task('tests.batch', batch=True, max_attempts=3)
+def batch(payloads):
+    calls.append([p['n'] for p in payloads])
+    if any(p.get('fail') for p in payloads):
+        raise ValueError('bad payload')
+
+
+@queue.task('tests.single')
+def single(n, fail=False):
+    calls.append(n)
+    if fail:
+        raise ValueError('bad payload')
+
+
+@queue.task('tests.split', batch=True, split=lambda payloads: [[p] for p in payloads if p['n']])
+def split(payloads):
+    batch(payloads)
+
+
+class QueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+        # Failures are logged with their tracebacks
+        patch = mock.patch.object(queue, 'logger')
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def due(self):
+        """Make every queued task due now"""
+        Task.objects.update(run_after=timezone.now())
+
+    def test_batches_run_in_one_call_and_finished_tasks_go_away(self):
+        queue.enqueue_many('tests.batch', [{'n': 1}, {'n': 2}])
+        queue.enqueue('tests.single', {'n': 3})
+        self.assertEqual(queue.run_batch(), 3)
+        self.assertEqual(calls, [[1, 2], 3])
+        self.assertFalse(Task.objects.exists())
+
+    def test_a_failed_batch_falls_back_to_one_task_at_a_time(self):
+        queue.enqueue_many('tests.batch', [{'n': 1}, {'n': 2, 'fail': True}, {'n': 3}])
+        queue.run_batch()
+        self.assertEqual(calls, [[1, 2, 3], [1], [2], [3]])
+        failed = Task.objects.get()
+        self.assertEqual((failed.payload['n'], failed.status, failed.attempts), (2, 'queued', 1))
+        self.assertIn('bad payload', failed.last_error)
+
+    def test_failures_back_off_until_max_attempts(self):
+        queue.enqueue('tests.batch', {'n': 1, 'fail': True})
+        for attempt in (1, 2):
+            before = timezone.now()
+            queue.run_batch()
+            task = Task.objects.get()
+            self.assertEqual((task.status, task.attempts), ('queued', attempt))
+            self.assertGreaterEqual(task.run_after, before + timedelta(seconds=2 ** attempt))
+            # Not due again until the backoff has passed
+            self.assertEqual(queue.run_batch(), 0)
+            self.due()
+        queue.run_batch()
+        self.assertEqual(Task.objects.get().status, 'failed')
+        self.due()
+        self.assertEqual(queue.run_batch(), 0)
+
+    def test_split_groups_run_and_fail_on_their_own(self):
+        queue.enqueue_many('tests.split', [{'n': 1}, {'n': 2, 'fail': True}, {'n': 0}])
+        queue.run_batch()
+        # The payload left out of every group is dropped, not run
+        self.assertEqual(calls, [[1], [2]])
+        self.assertEqual(Task.objects.get().payload['n'], 2)
+
+    def test_expired_leases_are_reclaimed(self):
+        queue.enqueue('tests.single', {'n': 1})
+        claimed = queue.claim(10)
+        self.assertEqual(len(claimed), 1)
+        # Leased to a worker that hasn't finished yet
+        self.assertEqual(queue.claim(10), [])
+        self.assertEqual(queue.release_expired_leases(), 0)
+
+        Task.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(queue.release_expired_leases(), 1)
+        reclaimed = queue.claim(10)
+        self.assertEqual([t.pk for t in reclaimed], [claimed[0].pk])
+        self.assertNotEqual(reclaimed[0].locked_by, claimed[0].locked_by)
+
+    def test_idempotency_keys_deduplicate(self):
+        queue.enqueue('tests.single', {'n': 1}, idempotency_key='once')
+        queue.enqueue('tests.single', {'n': 2}, idempotency_key='once')
+        queue.drain()
+        self.assertEqual(calls, [1])
+        # Kept as done so the key still deduplicates after running
+        self.assertEqual(Task.objects.get().status, 'done')
+        queue.enqueue('tests.single', {'n': 3}, idempotency_key='once')
+        self.assertEqual(queue.drain(), 0)
+        self.assertEqual(calls, [1])
+
+    def test_unknown_names_are_rejected(self):
+        with self.assertRaises(LookupError):
+            queue.enqueue('tests.missing')
+        Task.objects.create(name='tests.missing')
+        queue.run_batch()
+        self.assertIn('tests.missing', Task.objects.get().last_error)
+
+    @override_settings(TASKQUEUE_EAGER=True)
+    def test_eager_mode_runs_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            queue.enqueue_many('tests.batch', [{'n': 1}, {'n': 2}])
+            self.assertEqual(calls, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(calls, [[1, 2]])
+        self.assertFalse(Task.objects.exists())
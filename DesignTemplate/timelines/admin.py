@@ -0,0 +1,17 @@
+from django.contrib import admin
+from playground.admin_performance import LargeTableAdmin
+from playground.deltas import CODE_FIELDS
+from .models import TimelineEntry
+
+
+@admin.register(TimelineEntry)
+class TimelineEntryAdmin(LargeTableAdmin):
+    """Admin for materialized timeline entries"""
+    list_display = ['user', 'author', 'snippet', 'published_at']
+    list_select_related = ['user', 'author', 'snippet']
+    list_defer = [f'snippet__{field}' for field in CODE_FIELDS]
+    raw_id_fields = ['user', 'author', 'snippet']
+    search_fields = ['user__username', 'author__username']
+    search_help_text = 'Exact username'
+    sortable_by = []
+    keyset_field = 'published_at'
@@ -0,0 +1,173 @@
+"""
+Following feeds with fan-out on write.
+
+When a snippet is published, ``fan_out`` copies a TimelineEntry into the
+timeline of every follower of its author, so reading a page of the feed is
+one range scan of the (user, -published_at) index. Authors with more than
+TIMELINE_FANOUT_LIMIT followers are not fanned out: that many inserts per
+publish would swamp the task worker, so their snippets are merged in at read
+time instead, from the Snippet (user, -created_at) index.
+
+Entries are added for new follows (the author's latest few snippets) and
+removed on unfollow and when a snippet stops being public. Deleted snippets
+take their entries with them through the foreign key.
+"""
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import Follow, User
+from playground import sharding
+from playground.deltas import CODE_FIELDS
+from playground.models import Snippet
+from taskqueue.queue import enqueue, enqueue_many
+from .models import TimelineEntry
+
+FANOUT_LIMIT = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 5000)
+FANOUT_BATCH = 1000
+BACKFILL = 20
+PAGE_SIZE = 20
+
+
+def fans_out(author):
+    return author.followers_count <= FANOUT_LIMIT
+
+
+def schedule(snippet):
+    """Queue fan-out for a newly public snippet, or retraction for a hidden one"""
+    if snippet.is_public:
+        enqueue('timelines.fan_out', {
+            'snippet_id': str(snippet.pk),
+            'published_at': timezone.now().isoformat(),
+        })
+    else:
+        enqueue('timelines.retract', {'snippet_id': str(snippet.pk)})
+
+
+def schedule_many(snippet_ids, public):
+    """``schedule`` for many snippets made public (or hidden) together, in one INSERT"""
+    if public:
+        published_at = timezone.now().isoformat()
+        enqueue_many('timelines.fan_out', [
+            {'snippet_id': str(snippet_id), 'published_at': published_at} for snippet_id in snippet_ids
+        ])
+    else:
+        enqueue_many('timelines.retract', [{'snippet_id': str(snippet_id)} for snippet_id in snippet_ids])
+
+
+def fan_out(snippet_id, published_at):
+    """Add a snippet to its author's followers' timelines; returns the number of entries written"""
+    snippet = Snippet.objects.filter(pk=snippet_id, is_public=True).only('pk', 'user_id').first()
+    # The author is in 'default', the snippet maybe on a shard
+    author = snippet and User.objects.filter(pk=snippet.user_id).only('followers_count').first()
+    if not author or not fans_out(author):
+        return 0
+    followers = Follow.objects.filter(following_id=snippet.user_id).order_by('follower_id')
+    written = 0
+    last_id = 0
+    while True:
+        batch = list(followers.filter(follower_id__gt=last_id).values_list('follower_id', flat=True)[:FANOUT_BATCH])
+        if not batch:
+            return written
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(user_id=user_id, snippet_id=snippet.pk, author_id=snippet.user_id, published_at=published_at)
+            for user_id in batch
+        ], ignore_conflicts=True)
+        written += len(batch)
+        last_id = batch[-1]
+
+
+def retract(snippet_id):
+    TimelineEntry.objects.filter(snippet_id=snippet_id).delete()
+
+
+def follow(follower, author):
+    """Follow ``author``; returns False if already following"""
+    if follower.pk == author.pk:
+        raise ValueError('Users cannot follow themselves')
+    with transaction.atomic():
+        _, created = Follow.objects.get_or_create(follower=follower, following=author)
+        if not created:
+            return False
+        User.objects.filter(pk=follower.pk).update(following_count=F('following_count') + 1)
+        User.objects.filter(pk=author.pk).update(followers_count=F('followers_count') + 1)
+        if fans_out(author):
+            # Seed the timeline with the author's latest work
+            recent = author.snippets.filter(is_public=True).order_by('-created_at').values_list('pk', 'created_at')
+            TimelineEntry.objects.bulk_create([
+                TimelineEntry(user=follower, snippet_id=pk, author=author, published_at=created_at)
+                for pk, created_at in recent[:BACKFILL]
+            ], ignore_conflicts=True)
+    return True
+
+
+def unfollow(follower, author):
+    """Stop following ``author``; returns False if not following"""
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(follower=follower, following=author).delete()
+        if not deleted:
+            return False
+        User.objects.filter(pk=follower.pk).update(following_count=F('following_count') - 1)
+        User.objects.filter(pk=author.pk).update(followers_count=F('followers_count') - 1)
+        TimelineEntry.objects.filter(user=follower, author=author).delete()
+    return True
+
+
+def encode_cursor(published_at, pk):
+    return f'{published_at.isoformat()}|{pk}'
+
+
+def decode_cursor(cursor):
+    value, sep, pk = (cursor or '').rpartition('|')
+    position = parse_datetime(value) if sep else None
+    if position is None:
+        return None
+    try:
+        return position, Snippet._meta.pk.to_python(pk)
+    except ValidationError:
+        return None
+
+
+def _before(queryset, cursor, time_field, pk_field):
+    """Rows strictly after ``cursor`` in (time_field, pk_field) descending order"""
+    if cursor is None:
+        return queryset
+    position, pk = cursor
+    # The redundant upper bound lets the database range-scan the index
+    return queryset.filter(
+        Q(**{f'{time_field}__lt': position}) | Q(**{time_field: position, f'{pk_field}__lt': pk}),
+        **{f'{time_field}__lte': position},
+    )
+
+
+def read_timeline(user, cursor=None, limit=PAGE_SIZE):
+    """
+    A page of ``user``'s following feed, newest first.
+
+    Returns (snippets, next cursor or None). Fanned-out entries come from
+    the user's timeline; followed authors over FANOUT_LIMIT contribute their
+    latest public snippets directly, ordered by creation time.
+    """
+    position = decode_cursor(cursor)
+    large = Follow.objects.filter(follower=user, following__followers_count__gt=FANOUT_LIMIT)
+    authors = list(large.values_list('following_id', flat=True))
+
+    # An author who crossed the limit still has entries from before; their snippets
+    # are only pulled, so each has one sort key and the cursor never sees it twice
+    entries = TimelineEntry.objects.filter(user=user).exclude(author_id__in=authors)
+    entries = _before(entries, position, 'published_at', 'snippet_id')
+    rows = list(entries.order_by('-published_at', '-snippet_id').values_list('published_at', 'snippet_id')[:limit])
+    if authors:
+        pulled = _before(Snippet.objects.filter(user__in=authors, is_public=True), position, 'created_at', 'pk')
+        # From whichever shards the authors are on
+        rows += sharding.scatter(pulled.order_by('-created_at', '-pk').values_list('created_at', 'pk')[:limit])
+    page = sorted(rows, reverse=True)[:limit]
+
+    snippets = sharding.with_users(Snippet.objects.filter(is_public=True).defer(*CODE_FIELDS))
+    by_pk = {snippet.pk: snippet for snippet in sharding.fetch(snippets, [pk for _, pk in page])}
+    next_cursor = encode_cursor(*page[-1]) if len(page) == limit else None
+    return [by_pk[pk] for _, pk in page if pk in by_pk], next_cursor
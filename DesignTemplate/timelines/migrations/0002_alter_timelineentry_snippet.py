@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playground', '0008_snippet_location'),
+        ('timelines', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='timelineentry',
+            name='snippet',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='playground.snippet'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db import models
+
+from playground.models import Snippet
+
+
+class TimelineEntry(models.Model):
+    """A followed author's snippet, materialized into one follower's timeline"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline_entries')
+    snippet = models.ForeignKey(Snippet, on_delete=models.CASCADE, related_name='+', db_constraint=False)  # Sharded
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    published_at = models.DateTimeField(help_text="When the snippet was published; the feed's sort key")
+    
+    class Meta:
+        unique_together = ('user', 'snippet')
+        indexes = [
+            # A page of a timeline is one range scan of this index
+            models.Index(fields=['user', '-published_at', '-snippet']),
+        ]
+        verbose_name_plural = 'Timeline entries'
+    
+    def __str__(self):
+        return f"{self.snippet_id} in {self.user_id}'s timeline"
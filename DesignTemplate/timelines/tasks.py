@@ -0,0 +1,18 @@
+"""Deferred timeline fan-out"""
+
+from django.utils.dateparse import parse_datetime
+
+from taskqueue.queue import task
+from . import fanout
+
+
+@task('timelines.fan_out')
+def fan_out(snippet_id, published_at):
+    """Copy a newly published snippet into its author's followers' timelines"""
+    fanout.fan_out(snippet_id, parse_datetime(published_at))
+
+
+@task('timelines.retract')
+def retract(snippet_id):
+    """Remove a snippet that is no longer public from every timeline"""
+    fanout.retract(snippet_id)
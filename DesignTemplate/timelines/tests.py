@@ -0,0 +1,117 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import Follow, User
+from playground.models import Snippet
+from . import fanout
+from .models import TimelineEntry
+
+
+@mock.patch.object(fanout, 'FANOUT_LIMIT', 2)
+class TimelineTests(TestCase):
+
+    def setUp(self):
+        self.reader = User.objects.create_user('reader', 'reader@example.com')
+        self.small = User.objects.create_user('small', 'small@example.com')
+        self.large = User.objects.create_user('large', 'large@example.com')
+        # Three followers puts an author over the patched FANOUT_LIMIT of 2
+        for i in range(3):
+            fan = User.objects.create_user(f'fan{i}', f'fan{i}@example.com')
+            fanout.follow(fan, self.large)
+        self.start = timezone.now() - timedelta(days=1)
+
+    def publish(self, author, minute, is_public=True, fan_out=True):
+        """A snippet created ``minute`` minutes after the start, fanned out (if it does) half a minute later"""
+        snippet = Snippet.objects.create(user=author, title=f'{author.username} {minute}', is_public=is_public)
+        created_at = self.start + timedelta(minutes=minute)
+        Snippet.objects.filter(pk=snippet.pk).update(created_at=created_at)
+        if fan_out:
+            fanout.fan_out(snippet.pk, created_at + timedelta(seconds=30))
+        return snippet
+
+    def read_all(self, limit):
+        """Every page of the reader's feed as lists of titles"""
+        pages, cursor = [], None
+        while True:
+            snippets, cursor = fanout.read_timeline(self.reader, cursor, limit)
+            pages.append([snippet.title for snippet in snippets])
+            if cursor is None:
+                return pages
+
+    def test_fan_out_writes_an_entry_per_follower(self):
+        fanout.follow(self.reader, self.small)
+        snippet = self.publish(self.small, 0)
+        entries = TimelineEntry.objects.filter(snippet_id=snippet.pk)
+        self.assertEqual(list(entries.values_list('user', flat=True)), [self.reader.pk])
+        # Again is a no-op, as when the task is retried
+        fanout.fan_out(snippet.pk, timezone.now())
+        self.assertEqual(entries.count(), 1)
+
+    def test_large_authors_and_private_snippets_are_not_fanned_out(self):
+        fanout.follow(self.reader, self.small)
+        for snippet in (
+            self.publish(self.large, 0, fan_out=False),
+            self.publish(self.small, 1, is_public=False, fan_out=False),
+        ):
+            self.assertEqual(fanout.fan_out(snippet.pk, timezone.now()), 0)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        for minute in range(fanout.BACKFILL + 5):
+            self.publish(self.small, minute, fan_out=False)
+        self.publish(self.small, 100, is_public=False, fan_out=False)
+
+        self.assertTrue(fanout.follow(self.reader, self.small))
+        self.assertFalse(fanout.follow(self.reader, self.small))
+        entries = TimelineEntry.objects.filter(user=self.reader)
+        self.assertEqual(entries.count(), fanout.BACKFILL)
+        self.assertEqual(min(entries.values_list('published_at', flat=True)), self.start + timedelta(minutes=5))
+        self.small.refresh_from_db()
+        self.reader.refresh_from_db()
+        self.assertEqual((self.small.followers_count, self.reader.following_count), (1, 1))
+
+        self.assertTrue(fanout.unfollow(self.reader, self.small))
+        self.assertFalse(fanout.unfollow(self.reader, self.small))
+        self.assertFalse(entries.exists())
+        self.small.refresh_from_db()
+        self.assertEqual(self.small.followers_count, 0)
+
+    def test_fanned_out_and_pulled_snippets_merge_in_order(self):
+        fanout.follow(self.reader, self.small)
+        fanout.follow(self.reader, self.large)
+        for minute in range(0, 20, 2):
+            self.publish(self.small, minute)
+            # The large author's snippets are pulled, sorted by creation
+            self.publish(self.large, minute + 1)
+        titles = [f'{"small" if minute % 2 == 0 else "large"} {minute}' for minute in reversed(range(20))]
+
+        for limit in (1, 3, 7, 20, 50):
+            with self.subTest(limit=limit):
+                pages = self.read_all(limit)
+                self.assertEqual(sum(pages, []), titles)
+                self.assertTrue(all(len(page) == limit for page in pages[:-1]))
+
+    def test_author_crossing_the_limit_appears_once(self):
+        # Fanned out while small, then the author gains followers and is pulled instead
+        fanout.follow(self.reader, self.small)
+        for minute in range(0, 30, 3):
+            self.publish(self.small, minute)
+        fans = User.objects.filter(username__startswith='fan')
+        Follow.objects.bulk_create([Follow(follower=fan, following=self.small) for fan in fans])
+        User.objects.filter(pk=self.small.pk).update(followers_count=4)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader).exists())
+
+        titles = [f'small {minute}' for minute in reversed(range(0, 30, 3))]
+        for limit in (1, 2, 3, 4, 10):
+            with self.subTest(limit=limit):
+                self.assertEqual(sum(self.read_all(limit), []), titles)
+
+    def test_bad_cursors_start_from_the_top(self):
+        fanout.follow(self.reader, self.small)
+        self.publish(self.small, 0)
+        for cursor in ('', 'garbage', 'not-a-date|x', f'{timezone.now().isoformat()}|not-a-uuid'):
+            with self.subTest(cursor=cursor):
+                self.assertEqual([s.title for s in fanout.read_timeline(self.reader, cursor)[0]], ['small 0'])
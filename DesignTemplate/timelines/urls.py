@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'timelines'
+
+urlpatterns = [
+    path('following/', views.following_feed, name='following'),
+]
@@ -0,0 +1,17 @@
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import render
+
+from .fanout import read_timeline
+
+
+@login_required
+def following_feed(request):
+    """Latest snippets from the users the current user follows"""
+    snippets, next_cursor = read_timeline(request.user, request.GET.get('before'))
+    
+    context = {
+        'snippets': snippets,
+        'next_cursor': next_cursor,
+        'following_feed': True,
+    }
+    return render(request, 'playground/feed.html', context)
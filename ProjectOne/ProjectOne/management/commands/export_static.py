@@ -0,0 +1,40 @@
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from ProjectOne.views import EXPORT_PATHS
+
+
+class Command(BaseCommand):
+    help = 'Pre-render every page of the site to HTML files for a static file server'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default=settings.STATIC_EXPORT_ROOT,
+            help='Directory to write to (replaced on every run)'
+        )
+        parser.add_argument('--host', default='localhost', help='Host name to render the pages for (see ALLOWED_HOSTS)')
+
+    def handle(self, *args, **options):
+        output = str(options['output'])
+        started = time.monotonic()
+        client = Client(raise_request_exception=True)
+        # Built next to the output and swapped in, so the site is never half-written
+        staging = output.rstrip(os.sep) + '.tmp'
+        shutil.rmtree(staging, ignore_errors=True)
+        for path in EXPORT_PATHS:
+            response = client.get(path, HTTP_HOST=options['host'])
+            if response.status_code != 200:
+                raise CommandError(f'{path} returned {response.status_code}')
+            target = os.path.join(staging, path.strip('/'), 'index.html')
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(response.content)
+        shutil.rmtree(output, ignore_errors=True)
+        os.replace(staging, output)
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'Exported {len(EXPORT_PATHS)} pages to {output} in {elapsed:.2f}s')
@@ -0,0 +1,88 @@
+"""
+Full-page cache for anonymous GET requests.
+
+The pages of this site are the same for every visitor, so a rendered
+response is kept in process memory, keyed by URL, for PAGE_CACHE_SECONDS
+and replayed without running the view or the rest of the middleware.
+Responses that vary on request headers (Accept-Encoding, once GZipMiddleware
+has compressed them) are stored once per combination of those headers'
+values, so a compressed body is only built once. Requests carrying cookies
+or credentials (e.g. the admin) always go through, and only plain 200
+responses that don't set cookies, vary on them or opt out with
+Cache-Control are stored.
+
+For pages that never change, ``manage.py export_static`` writes them out
+once so a static file server can skip Django entirely.
+"""
+
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import cc_delim_re, get_max_age
+
+CACHE_SECONDS = getattr(settings, 'PAGE_CACHE_SECONDS', 600)
+MAX_ENTRIES = getattr(settings, 'PAGE_CACHE_MAX_ENTRIES', 1000)
+EXCLUDE_PREFIXES = tuple(getattr(settings, 'PAGE_CACHE_EXCLUDE', ['/admin/']))
+
+
+class FullPageCacheMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # key -> (expires, status, headers, body)
+        self.pages = {}
+        # URL -> request headers (META keys) the response for it varies on
+        self.vary = {}
+
+    def __call__(self, request):
+        if not self.cacheable_request(request):
+            return self.get_response(request)
+        # Also validates the Host header, which the skipped middleware would have done
+        url = request.build_absolute_uri()
+        key = self.cache_key(request, url)
+        entry = self.pages.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            _, status, headers, body = entry
+            response = HttpResponse(body, status=status)
+            for header, value in headers:
+                response.headers[header] = value
+            return response
+
+        response = self.get_response(request)
+        if self.cacheable_response(response):
+            if len(self.pages) >= MAX_ENTRIES:
+                self.pages.clear()
+                self.vary.clear()
+            self.vary[url] = tuple(
+                'HTTP_' + header.strip().upper().replace('-', '_')
+                for header in cc_delim_re.split(response.get('Vary', '')) if header.strip()
+            )
+            key = self.cache_key(request, url)
+            timeout = get_max_age(response)
+            timeout = CACHE_SECONDS if timeout is None else min(timeout, CACHE_SECONDS)
+            if timeout > 0:
+                self.pages[key] = (
+                    time.monotonic() + timeout, response.status_code, list(response.items()), response.content
+                )
+        return response
+
+    def cache_key(self, request, url):
+        return (url, *(request.META.get(header, '') for header in self.vary.get(url, ())))
+
+    def cacheable_request(self, request):
+        return (
+            request.method in ('GET', 'HEAD')
+            and not request.COOKIES
+            and 'HTTP_AUTHORIZATION' not in request.META
+            and not request.path.startswith(EXCLUDE_PREFIXES)
+        )
+
+    def cacheable_response(self, response):
+        if response.status_code != 200 or response.streaming or response.cookies:
+            return False
+        vary = {value.strip().lower() for value in cc_delim_re.split(response.get('Vary', ''))}
+        cache_control = response.get('Cache-Control', '').lower()
+        return (
+            'cookie' not in vary and '*' not in vary
+            and 'private' not in cache_control and 'no-store' not in cache_control
+        )
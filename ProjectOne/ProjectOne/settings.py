@@ -37,9 +37,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'ProjectOne',
 ]
 
 MIDDLEWARE = [
+    # First, so cached pages skip the rest of the stack
+    'ProjectOne.middleware.FullPageCacheMiddleware',
+    # Inside the page cache, so cached pages are stored already compressed
+    'django.middleware.gzip.GZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -121,4 +126,14 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-STATICFILES_DIRS = [BASE_DIR / 'static']
\ No newline at end of file
+STATICFILES_DIRS = [BASE_DIR / 'static']
+
+# Rendered pages are kept in memory and replayed to anonymous visitors
+# (ProjectOne.middleware.FullPageCacheMiddleware)
+PAGE_CACHE_SECONDS = 600
+PAGE_CACHE_MAX_ENTRIES = 1000
+PAGE_CACHE_EXCLUDE = ['/admin/']
+
+# `manage.py export_static` writes every page here as <path>/index.html,
+# ready for any static file server
+STATIC_EXPORT_ROOT = BASE_DIR / 'site'
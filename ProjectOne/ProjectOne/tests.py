@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from . import middleware
+from .middleware import FullPageCacheMiddleware
+
+
+class FullPageCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.calls = 0
+        self.headers = {}
+        self.cache = FullPageCacheMiddleware(self.view)
+
+    def view(self, request):
+        """Stands in for the rest of the stack; each body says which call made it"""
+        self.calls += 1
+        response = HttpResponse(f'page {self.calls}')
+        for header, value in self.headers.items():
+            response[header] = value
+        return response
+
+    def get(self, path='/', **headers):
+        return self.cache(self.factory.get(path, headers=headers)).content.decode()
+
+    def test_repeated_requests_are_served_from_the_cache(self):
+        self.assertEqual(self.get(), 'page 1')
+        self.assertEqual(self.get(), 'page 1')
+        self.assertEqual(self.get('/about/'), 'page 2')
+        self.assertEqual(self.get('/?q=1'), 'page 3')
+        self.assertEqual(self.calls, 3)
+
+    def test_cookies_and_credentials_bypass_the_cache(self):
+        self.get()
+        self.assertEqual(self.get(cookie='sessionid=abc'), 'page 2')
+        self.assertEqual(self.get(authorization='Basic dXNlcjpwYXNz'), 'page 3')
+        self.assertEqual(self.get('/admin/'), 'page 4')
+        self.assertEqual(self.get('/admin/'), 'page 5')
+        self.assertEqual(self.cache(self.factory.post('/')).content, b'page 6')
+        self.assertEqual(self.get(), 'page 1')
+
+    def test_responses_that_opt_out_are_not_stored(self):
+        for headers in (
+            {'Vary': 'Cookie'},
+            {'Vary': 'Accept-Encoding, Cookie'},
+            {'Vary': '*'},
+            {'Cache-Control': 'private'},
+            {'Cache-Control': 'no-store'},
+            {'Cache-Control': 'max-age=0'},
+        ):
+            with self.subTest(headers=headers):
+                self.headers = headers
+                first = self.get()
+                self.assertNotEqual(self.get(), first)
+
+    def test_responses_setting_cookies_or_failing_are_not_stored(self):
+        def view(request):
+            self.calls += 1
+            response = HttpResponse(f'page {self.calls}')
+            response.set_cookie('seen', '1')
+            return response
+
+        self.cache.get_response = view
+        self.assertNotEqual(self.get(), self.get())
+
+        self.cache.get_response = lambda request: HttpResponse('missing', status=404)
+        self.get('/missing/')
+        self.assertEqual(self.cache.pages, {})
+
+    def test_varying_responses_are_stored_per_header_value(self):
+        self.headers = {'Vary': 'Accept-Encoding'}
+        self.assertEqual(self.get(accept_encoding='gzip'), 'page 1')
+        self.assertEqual(self.get(accept_encoding='gzip'), 'page 1')
+        self.assertEqual(self.get(accept_encoding='br'), 'page 2')
+        self.assertEqual(self.get(), 'page 3')
+        self.assertEqual(self.get(accept_encoding='br'), 'page 2')
+        self.assertEqual(self.get(accept_encoding='gzip'), 'page 1')
+        self.assertEqual(self.calls, 3)
+
+    def test_entries_expire(self):
+        with mock.patch.object(middleware.time, 'monotonic', return_value=1000):
+            self.get()
+        with mock.patch.object(middleware.time, 'monotonic', return_value=1000 + middleware.CACHE_SECONDS - 1):
+            self.assertEqual(self.get(), 'page 1')
+        with mock.patch.object(middleware.time, 'monotonic', return_value=1000 + middleware.CACHE_SECONDS + 1):
+            self.assertEqual(self.get(), 'page 2')
@@ -27,7 +27,7 @@ urlpatterns = [
     path('about/', views.aboutUs),
     path('Blogs/', views.blogs),
     path('Courses/', views.courses),
-    path('Courses/<int:courseId>/', views.courses)
+    path('Courses/<int:courseId>/', views.course_detail)
     #path('Courses/<courseId>/', views.courses)
     #path('Courses/<str:courseId>/', views.courses)
     #path('Courses/<slug:courseId>/', views.courses)
@@ -1,20 +1,33 @@
 from django.template.loader import get_template
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+# The site's content never changes at runtime, so it is built once at import
+COURSES = ["Python", "Django", "JavaScript", "HTML", "CSS"]
+
+HOME_CONTEXT = {
+    "Title": "Nitin Home Page",
+    "Welcome_Message": "Welcome to Nitin's Django Application",
+    "clist": COURSES,
+    "studentDetails": [
+        {"id": 1, "name": "Alice", "age": 22, "city": "Los Angeles"},
+        {"id": 2, "name": "Bob", "age": 24, "city": "Chicago"},
+        {"id": 3, "name": "Nitin", "age": 25, "city": "New York"}
+    ],
+    "numbers": [multiple * 10 for multiple in range(1, 11)]
+}
+
+# Course IDs are the numbers shown next to each course on the home page
+COURSE_PAGES = {
+    courseId: f"Details of Course ID: {courseId}".encode()
+    for courseId in range(1, len(COURSES) + 1)
+}
+
+# Every page of the site, for `manage.py export_static`
+EXPORT_PATHS = ["/", "/about/", "/Blogs/", "/Courses/"] + [f"/Courses/{courseId}/" for courseId in COURSE_PAGES]
+
 def home(request):
-    data = {
-        "Title": "Nitin Home Page",
-        "Welcome_Message": "Welcome to Nitin's Django Application",
-        "clist": ["Python", "Django", "JavaScript", "HTML", "CSS"],
-        "studentDetails": [
-            {"id": 1, "name": "Alice", "age": 22, "city": "Los Angeles"},
-            {"id": 2, "name": "Bob", "age": 24, "city": "Chicago"},
-            {"id": 3, "name": "Nitin", "age": 25, "city": "New York"}
-        ],
-        "numbers": [multiple * 10 for multiple in range(1, 11)]
-    }
-    return render(request, "index.html", data)
+    return render(request, "index.html", HOME_CONTEXT)
     #try:
         #template = get_template("index.html")
         #return HttpResponse(template.render({}, request))
@@ -31,4 +44,7 @@ def courses(request):
     return HttpResponse("Welcome to Nitins Courses Page")
 
 def course_detail(request, courseId):
-    return HttpResponse(f"Details of Course ID: {courseId}")
\ No newline at end of file
+    try:
+        return HttpResponse(COURSE_PAGES[courseId])
+    except KeyError:
+        raise Http404("No such course")